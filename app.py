@@ -163,6 +163,30 @@ def create_app(config_name=None):
     from modules.offers.redis_state import init_state
     init_state(app.config.get('REDIS_URL'))
 
+    # Cache tabeli settings w pamięci procesu + unieważnianie przez Redis pub/sub
+    from utils.settings_cache import init_settings_cache
+    init_settings_cache(app)
+
+    from utils.pagination import init_count_cache
+    init_count_cache(app)
+
+    # Indeks wyszukiwania — aktualizacja przyrostowa przy flushu sesji
+    from modules.search.service import init_search_index
+    init_search_index(app)
+
+    # Agregaty sprzedaży stron Offer — oznaczanie jako stale przy zmianach zamówień
+    from modules.offers.sales_stats import init_sales_stats
+    init_sales_stats(app)
+
+    # Zadania w tle na wspólnym executorze (limity per typ, kolejka, metryki)
+    from utils.background_jobs import init_background_jobs
+    init_background_jobs(app)
+
+    # Profiler zapytań SQL per endpoint (opt-in, /admin/sql-profile)
+    if app.config.get('SQL_PROFILING_ENABLED'):
+        from utils.query_profiler import init_query_profiler
+        init_query_profiler(app)
+
     # Error handlers (strony błędów)
     register_error_handlers(app)
 
@@ -190,25 +214,16 @@ def create_app(config_name=None):
         else:
             sentry_sdk.set_user(None)
 
-    # Maintenance mode check (cache dostępny globalnie przez app.maintenance_cache)
-    app.maintenance_cache = {'enabled': False, 'checked_at': 0}
-
+    # Maintenance mode check (Settings.get_value czyta z cache ustawień — bez SELECT-a)
     @app.before_request
     def check_maintenance_mode():
-        import time
         from flask_login import current_user
         from flask import g
+        from modules.auth.models import Settings
 
-        # Cache na 10 sekund (nie bije w DB na każdym requeście)
-        now = time.time()
-        if now - app.maintenance_cache['checked_at'] > 10:
-            from modules.auth.models import Settings
-            app.maintenance_cache['enabled'] = Settings.get_value('maintenance_mode', False)
-            app.maintenance_cache['checked_at'] = now
-
-        g.maintenance_mode = app.maintenance_cache['enabled']
+        g.maintenance_mode = Settings.get_value('maintenance_mode', False)
 
-        if not app.maintenance_cache['enabled']:
+        if not g.maintenance_mode:
             return None
 
         # Przepuść statyczne pliki, auth endpointy ORAZ webhook deployu.
@@ -549,193 +564,18 @@ def register_cli_commands(app):
     @_with_request_context
     @click.option('--dry-run', is_flag=True, help='Tylko wyświetl, nie wysyłaj')
     def check_payment_reminders(dry_run):
-        """Sprawdza i wysyła przypomnienia o płatnościach (uruchamiany co godzinę przez cron)."""
-        from modules.orders.models import Order, get_local_now
-        from modules.offers.models import OfferPage
-        from modules.offers.reminder_models import PaymentReminderConfig, PaymentReminderLog
-        from modules.orders.payment_overdue_service import STAGE_DEFINITIONS
-        from modules.auth.models import Settings
-        from utils.email_manager import EmailManager
-        from utils.push_manager import PushManager
-        from utils.activity_logger import log_activity
-        from datetime import timedelta
-
-        now = get_local_now()
-        sent_count = 0
-        pending_reminders = []
-
-        rules = PaymentReminderConfig.query.filter_by(enabled=True).all()
-        click.echo(f"Aktywnych reguł: {len(rules)}")
-
-        # Zamówienia anulowane i te po stronie zwrotów nie mają czego zapłacić —
-        # ponaglenie o wpłatę byłoby dla klienta mylące, a przy zwrocie wręcz
-        # odwrotne do stanu faktycznego (to my jesteśmy mu winni pieniądze).
-        from utils.offer_closure import CLOSED_ORDER_STATUSES
-
-        active_orders = Order.query.filter(~Order.status.in_(CLOSED_ORDER_STATUSES)).all()
-
-        for order in active_orders:
-            for stage, definition in STAGE_DEFINITIONS.items():
-                if not definition['applies'](order):
-                    continue
-
-                status = definition['status'](order)
-                if status not in ('none', 'rejected'):
-                    continue
-
-                amount = definition['amount'](order)
-                if not amount or amount <= 0:
-                    continue
-
-                deadline = definition['deadline'](order)
-
-                for rule in rules:
-                    if rule.reminder_type == 'before_deadline':
-                        if deadline is None:
-                            continue
-                        trigger_time = deadline - timedelta(hours=rule.hours)
-                    elif rule.reminder_type == 'after_order_placed':
-                        if stage != 'product':
-                            continue  # after_order_placed dotyczy tylko etapu produktu
-                        if order.order_type not in ('on_hand', 'preorder'):
-                            continue  # jak przed rozszerzeniem crona — 'exclusive' (strona
-                            # sprzedaży) nie ma tu wchodzić: bez zamkniętej sprzedaży i bez
-                            # ustalonego terminu klient i tak nie może jeszcze zapłacić
-                        trigger_time = order.created_at + timedelta(hours=rule.hours)
-                    else:
-                        continue
-
-                    if trigger_time > now:
-                        continue
-
-                    already_sent = PaymentReminderLog.query.filter_by(
-                        order_id=order.id, config_id=rule.id, stage=stage
-                    ).first()
-                    if already_sent:
-                        continue
-
-                    if dry_run:
-                        click.echo(f"  [DRY RUN] {order.order_number} <- {definition['label']}, {rule.hours}h ({rule.reminder_type})")
-                        sent_count += 1
-                        continue
-
-                    pending_reminders.append({
-                        'order': order,
-                        'config_id': rule.id,
-                        'stage': stage,
-                        'payment_deadline': deadline,
-                        'reminder_context': rule.reminder_type,
-                        'activity_value': f"Wysłano przypomnienie ({definition['label']}, {rule.hours}h, {rule.reminder_type})",
-                        'echo': f"  Wysłano: {order.order_number} ({definition['label']}, {rule.hours}h)",
-                    })
-
-        # Wyślij zebrane przypomnienia JEDNYM połączeniem SMTP (jeden AUTH).
-        # Push/log/PaymentReminderLog rejestrujemy DOPIERO po faktycznej wysyłce maila —
-        # dzięki temu nieudane przypomnienie zostanie ponowione w kolejnym przebiegu cronu.
-        if pending_reminders and not dry_run:
-            from utils.email_sender import send_email_batch_sync
-
-            messages = []
-            valid = []
-            for p in pending_reminders:
-                msg = EmailManager.build_payment_reminder_message(
-                    p['order'],
-                    stage=p['stage'],
-                    payment_deadline=p['payment_deadline'],
-                    reminder_context=p['reminder_context']
-                )
-                if msg is None:
-                    continue
-                messages.append(msg)
-                valid.append(p)
-
-            results = send_email_batch_sync(messages)
-
-            for p, ok in zip(valid, results):
-                if not ok:
-                    continue
-                order = p['order']
-                PushManager.notify_payment_reminder(order, payment_deadline=p['payment_deadline'])
-                db.session.add(PaymentReminderLog(
-                    order_id=order.id, config_id=p['config_id'], stage=p['stage']
-                ))
-                log_activity(
-                    action='payment_reminder_sent',
-                    entity_type='order',
-                    entity_id=order.id,
-                    new_value=p['activity_value']
-                )
-                sent_count += 1
-                click.echo(p['echo'])
-
-        # Sprawdź przekroczone deadline'y (bez zmian — dotyczy tylko OfferPage/E1,
-        # to osobna funkcja: powiadomienie ADMINA, nie klienta)
-        exceeded_pages = OfferPage.query.filter(
-            OfferPage.payment_deadline.isnot(None),
-            OfferPage.payment_deadline < now,
-            OfferPage.is_fully_closed == True
-        ).all()
-
-        exceeded_count = 0
-        exceeded_orders_by_page = {}
-
-        for page in exceeded_pages:
-            orders = Order.query.filter(
-                Order.offer_page_id == page.id,
-                Order.status != 'anulowane'
-            ).all()
-            for order in orders:
-                if order.product_payment_status not in ('none', 'rejected'):
-                    continue
-
-                already_notified = PaymentReminderLog.query.filter_by(
-                    order_id=order.id, config_id=None, reminder_type='deadline_exceeded'
-                ).first()
-                if already_notified:
-                    continue
-
-                if not dry_run:
-                    db.session.add(PaymentReminderLog(
-                        order_id=order.id, config_id=None, reminder_type='deadline_exceeded'
-                    ))
-                    log_activity(
-                        action='payment_deadline_exceeded',
-                        entity_type='order',
-                        entity_id=order.id,
-                        new_value='Przekroczono termin płatności — powiadomiono administrację'
-                    )
+        """Sprawdza i wysyła przypomnienia o płatnościach (uruchamiany co godzinę przez cron).
 
-                if page.id not in exceeded_orders_by_page:
-                    exceeded_orders_by_page[page.id] = {'page': page, 'orders': []}
-                exceeded_orders_by_page[page.id]['orders'].append(order)
-                exceeded_count += 1
-
-        if exceeded_orders_by_page and not dry_run:
-            for page_data in exceeded_orders_by_page.values():
-                EmailManager.notify_admin_deadline_exceeded(
-                    page_data['page'], page_data['orders']
-                )
-
-        if exceeded_count > 0:
-            click.echo(f"  Przekroczone deadline: {exceeded_count} zamówień")
-
-        # Commit
-        if not dry_run:
-            db.session.commit()
-
-            def set_setting(key, value):
-                setting = Settings.query.filter_by(key=key).first()
-                if setting:
-                    setting.value = str(value)
-                else:
-                    setting = Settings(key=key, value=str(value), type='string')
-                    db.session.add(setting)
+        Planowanie zbiorcze (kilka zapytań zamiast pętli per zamówienie) —
+        modules/orders/payment_reminder_planner.py.
+        """
+        from modules.orders.payment_reminder_planner import run_payment_reminders
 
-            set_setting('payment_reminder_last_check', now.strftime('%d/%m/%Y %H:%M'))
-            set_setting('payment_reminder_last_count', str(sent_count))
-            db.session.commit()
+        result = run_payment_reminders(dry_run=dry_run, echo=click.echo)
 
-        click.echo(f"\nGotowe. Wysłano przypomnień: {sent_count}, Przekroczone deadline: {exceeded_count}")
+        phases = ', '.join(f"{name}={ms:.0f}ms" for name, ms in result['timings'].items())
+        click.echo(f"\nGotowe. Wysłano przypomnień: {result['sent']}, Przekroczone deadline: {result['exceeded']}")
+        click.echo(f"Fazy: {phases}")
 
     @app.cli.command('backfill-set-numbers')
     @click.option('--dry-run', is_flag=True, help='Tylko wyświetl bez zapisywania')
@@ -798,6 +638,47 @@ def register_cli_commands(app):
 
         click.echo(f"\n{'[DRY RUN] ' if dry_run else ''}Zaktualizowano: {total_updated} pozycji")
 
+    @app.cli.command('reconcile-offer-inventory')
+    @click.option('--page-id', type=int, default=None, help='Tylko wskazana strona (domyślnie: aktywne i wstrzymane)')
+    def reconcile_offer_inventory(page_id):
+        """Przebudowuje liczniki rezerwacji stron Offer z bazy (cron / po awarii Redis)."""
+        from modules.offers.models import OfferPage
+        from modules.offers.inventory import reconcile_page
+
+        if page_id:
+            page_ids = [page_id]
+        else:
+            page_ids = [p.id for p in OfferPage.query.filter(
+                OfferPage.status.in_(('active', 'paused'))
+            ).all()]
+
+        for pid in page_ids:
+            count = reconcile_page(pid)
+            click.echo(f"  Strona {pid}: przeładowano {count} produktów")
+
+        click.echo(f"\nGotowe. Stron: {len(page_ids)}")
+
+    @app.cli.command('search-reindex')
+    @click.option('--type', 'entity_type', default=None,
+                  type=click.Choice(['product', 'order', 'client', 'shipping_request']),
+                  help='Tylko wskazany typ (domyślnie: wszystkie)')
+    @click.option('--if-empty', is_flag=True,
+                  help='Tylko typy bez żadnego wpisu w indeksie (deploy.sh — backfill po migracji)')
+    def search_reindex(entity_type, if_empty):
+        """Przebudowuje indeks wyszukiwania (po wdrożeniu / po masowych zmianach SQL-em)."""
+        from modules.search.models import SearchDocument
+        from modules.search.service import reindex
+
+        for name in ([entity_type] if entity_type else ['product', 'order', 'client', 'shipping_request']):
+            if if_empty and SearchDocument.query.filter_by(entity_type=name).first() is not None:
+                click.echo(f"  {name}: pominięty (indeks niepusty)")
+                continue
+            count = reindex(name)
+            db.session.commit()
+            click.echo(f"  {name}: {count}")
+
+        click.echo("\nGotowe.")
+
     @app.cli.command('refresh-rates')
     def refresh_rates():
         """Odświeża kursy walut KRW i USD z NBP API (do użycia z cron)."""
@@ -1023,7 +904,8 @@ def register_cli_commands(app):
         import json as _json
         from modules.orders.models import PaymentConfirmation, Order, get_local_now
         from modules.payments.models import PaymentMethod
-        from utils.ocr_verifier import verify_payment_proof, TESSERACT_AVAILABLE
+        from utils import ocr_cache
+        from utils.ocr_verifier import score_proof_text, TESSERACT_AVAILABLE
 
         if not TESSERACT_AVAILABLE:
             click.echo('BŁĄD: Tesseract OCR nie jest dostępny. Zainstaluj: apt install tesseract-ocr tesseract-ocr-pol')
@@ -1062,6 +944,9 @@ def register_cli_commands(app):
         # Wszystkie aktywne metody płatności (do fallback)
         all_methods = PaymentMethod.get_active()
 
+        from utils import ocr_queue
+        use_queue = ocr_queue.enabled() and not dry_run
+
         processed = 0
         skipped = 0
         errors = 0
@@ -1094,10 +979,24 @@ def register_cli_commands(app):
                 processed += len(confs)
                 continue
 
-            # Uruchom OCR
+            # Z kolejką: backfill z niższym priorytetem niż świeże uploady, bez auto-approve
+            if use_queue:
+                ocr_queue.enqueue({
+                    'saved_filename': filename,
+                    'payment_method_id': first_conf.payment_method_id,
+                    'user_id': None,
+                    'order_numbers': order_numbers,
+                    'total_expected': float(total_expected),
+                    'auto_approve': False,
+                }, priority=ocr_queue.PRIORITY_BACKFILL)
+                click.echo(f'  KOLEJKA: {filename} — zamówienia: {", ".join(order_numbers)}')
+                processed += len(confs)
+                continue
+
+            # Uruchom OCR (tekst z cache po SHA-256 pliku — ponowny reprocess nie OCR-uje)
             try:
-                result = verify_payment_proof(
-                    filepath=filepath,
+                result = score_proof_text(
+                    ocr_cache.read_text(filepath),
                     expected_amount=total_expected,
                     order_numbers=order_numbers,
                     payment_method=pm_obj,
@@ -1128,6 +1027,37 @@ def register_cli_commands(app):
 
         prefix = '[DRY RUN] ' if dry_run else ''
         click.echo(f'\n{prefix}Gotowe. Przetworzono: {processed}, Pominięto: {skipped}, Błędów: {errors}')
+        if use_queue:
+            click.echo('Potwierdzenia dodane do kolejki OCR — przetworzy je `flask ocr-worker`.')
+
+
+    @app.cli.command('ocr-worker')
+    @click.option('--processes', type=int, default=None,
+                  help='Liczba procesów OCR (domyślnie OCR_WORKER_PROCESSES lub liczba rdzeni)')
+    @click.option('--once', is_flag=True, help='Przetwórz dostępne zadania i zakończ')
+    def ocr_worker(processes, once):
+        """Przetwarza kolejkę OCR potwierdzeń płatności (ocr_jobs) w puli procesów."""
+        from utils.ocr_queue import run_worker
+        from utils.ocr_verifier import TESSERACT_AVAILABLE
+
+        if not TESSERACT_AVAILABLE:
+            click.echo('BŁĄD: Tesseract OCR nie jest dostępny. Zainstaluj: apt install tesseract-ocr tesseract-ocr-pol')
+            return
+
+        stats = run_worker(processes=processes, once=once)
+        click.echo(f'Gotowe. Przetworzono: {stats["done"]} (z cache: {stats["cached"]}), '
+                   f'Błędów: {stats["failed"]}, Do ponowienia: {stats["retried"]}')
+
+
+    @app.cli.command('email-sender')
+    @click.option('--once', is_flag=True, help='Wyślij oczekujące maile i zakończ')
+    def email_sender(once):
+        """Wysyła maile z kolejki email_outbox (jedno połączenie SMTP, limit tempa)."""
+        from utils.email_outbox import run_sender
+
+        stats = run_sender(once=once)
+        click.echo(f'Gotowe. Wysłano: {stats["sent"]}, Błędów: {stats["failed"]}, '
+                   f'Do ponowienia: {stats["retried"]}')
 
 
     @app.cli.command('audit-offer-images')
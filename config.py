@@ -33,6 +33,76 @@ class Config:
     RATELIMIT_STORAGE_URI = os.getenv('RATELIMIT_STORAGE_URI', 'redis://localhost:6379/1')
     SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE', 'redis://localhost:6379/2')
 
+    # Silnik rezerwacji stron Offer (modules/offers/inventory.py):
+    # 'auto' = liczniki w Redis gdy dostępny, inaczej SELECT FOR UPDATE;
+    # 'counters' = zawsze liczniki; 'locking' = zawsze SELECT FOR UPDATE.
+    OFFERS_RESERVATION_ENGINE = os.getenv('OFFERS_RESERVATION_ENGINE', 'auto')
+
+    # Maksymalny wiek snapshotu dostępności stron Offer (s) — po nim pełny rebuild z bazy
+    OFFERS_AVAILABILITY_MAX_AGE = int(os.getenv('OFFERS_AVAILABILITY_MAX_AGE', 30))
+
+    # Okno scalania broadcastów 'availability_updated' (ms) — zmiany z okna idą jednym emitem.
+    # 0 = emit natychmiast po każdej zmianie.
+    OFFERS_BROADCAST_WINDOW_MS = int(os.getenv('OFFERS_BROADCAST_WINDOW_MS', 150))
+
+    # 'availability_updated' jako delty (tylko zmienione produkty + seq); False = zawsze pełny stan
+    OFFERS_AVAILABILITY_DELTA = os.getenv('OFFERS_AVAILABILITY_DELTA', 'True').lower() == 'true'
+
+    # Co ile sekund reaper (modules/offers/expiry.py) usuwa wszystkie wygasłe rezerwacje; 0 = tylko terminy stron
+    OFFERS_REAPER_INTERVAL = int(os.getenv('OFFERS_REAPER_INTERVAL', 5))
+
+    # Numeracja zamówień (modules/orders/order_numbers.py): ile numerów worker rezerwuje naraz.
+    # 1 = numery rosnące globalnie; >1 = mniej zapisów licznika, ale kolejność między workerami dowolna.
+    ORDER_NUMBER_BLOCK_SIZE = int(os.getenv('ORDER_NUMBER_BLOCK_SIZE', 1))
+
+    # Cache tabeli settings w pamięci procesu (utils/settings_cache.py). Zmiany unieważniane
+    # od razu przez Redis pub/sub; max age (s) to siatka bezpieczeństwa. 0 = bez cache.
+    SETTINGS_CACHE_MAX_AGE = int(os.getenv('SETTINGS_CACHE_MAX_AGE', 60))
+
+    # Cache liczników list zamówień/produktów (utils/pagination.py), TTL w sekundach.
+    # Commit w tym workerze czyści liczniki od razu; inne workery po TTL. 0 = bez cache.
+    LIST_COUNT_CACHE_TTL = int(os.getenv('LIST_COUNT_CACHE_TTL', 30))
+
+    # Import CSV produktów (modules/imports/csv_processor.py): wierszy na porcję —
+    # jedno dopasowanie IN (...), bulk insert/update i commit postępu na porcję.
+    CSV_IMPORT_CHUNK_SIZE = int(os.getenv('CSV_IMPORT_CHUNK_SIZE', 500))
+
+    # Zadania w tle (utils/background_jobs.py) na wspólnym executorze: maks. liczba
+    # oczekujących zadań (łącznie) i limit równoległych zadań per typ (reszta czeka).
+    BACKGROUND_JOBS_MAX_QUEUE = int(os.getenv('BACKGROUND_JOBS_MAX_QUEUE', 100))
+    BACKGROUND_JOBS_CONCURRENCY = {
+        'ocr': int(os.getenv('BACKGROUND_OCR_CONCURRENCY', 2)),
+        'csv_import': int(os.getenv('BACKGROUND_CSV_IMPORT_CONCURRENCY', 1)),
+        'push_broadcast': int(os.getenv('BACKGROUND_PUSH_BROADCAST_CONCURRENCY', 1)),
+        'offer_closure': int(os.getenv('BACKGROUND_OFFER_CLOSURE_CONCURRENCY', 1)),
+    }
+
+    # Kolejka OCR potwierdzeń płatności (utils/ocr_queue.py): upload tylko dopisuje zadanie
+    # do ocr_jobs, Tesseract liczy osobny proces `flask ocr-worker` (pula procesów; 0 = liczba
+    # rdzeni). Domyślnie False = OCR w wątku web workera (utils/background_jobs) — kolejka ma
+    # sens tylko z działającą usługą thunderorders-ocr, więc włącza ją ProductionConfig.
+    OCR_QUEUE_ENABLED = os.getenv('OCR_QUEUE_ENABLED', 'False').lower() == 'true'
+    OCR_WORKER_PROCESSES = int(os.getenv('OCR_WORKER_PROCESSES', 0))
+    OCR_JOB_TIMEOUT = int(os.getenv('OCR_JOB_TIMEOUT', 600))  # s; dłużej 'running' = worker padł
+    # s na jeden plik w procesie OCR; po nim worker zabija pulę (zawieszony Tesseract). < OCR_JOB_TIMEOUT
+    OCR_TASK_TIMEOUT = int(os.getenv('OCR_TASK_TIMEOUT', 180))
+    # Tryb OCR (utils/ocr_verifier.py): 'full' = cała strona (PDF 300 DPI); 'staged' = tani
+    # przebieg lokalizuje linie kwoty/tytułu/odbiorcy, pełny OCR tylko tych pasów (PDF 200 DPI).
+    # Porównanie trafności i czasu: scripts/ocr_benchmark.py
+    OCR_MODE = os.getenv('OCR_MODE', 'full')
+
+    # Profiler zapytań SQL (utils/query_profiler.py): liczba zapytań, czas w bazie,
+    # najwolniejsze zapytania i podejrzenia N+1 per endpoint → /admin/sql-profile
+    SQL_PROFILING_ENABLED = os.getenv('SQL_PROFILING_ENABLED', 'False').lower() == 'true'
+    SQL_PROFILING_N_PLUS_ONE = int(os.getenv('SQL_PROFILING_N_PLUS_ONE', 10))  # powtórzeń kształtu w requeście
+    SQL_PROFILING_SLOW_MS = int(os.getenv('SQL_PROFILING_SLOW_MS', 500))      # log gdy czas w bazie > próg
+    SQL_PROFILING_TOP_N = int(os.getenv('SQL_PROFILING_TOP_N', 5))            # najwolniejszych zapytań per endpoint
+    SQL_PROFILING_SERVER_TIMING = os.getenv('SQL_PROFILING_SERVER_TIMING', 'False').lower() == 'true'
+
+    # Maks. wiek skompilowanego układu strony (modules/offers/layout.py) w sekundach —
+    # zmiany grup wariantowych / is_active produktów nie wołają invalidate()
+    OFFERS_LAYOUT_MAX_AGE = int(os.getenv('OFFERS_LAYOUT_MAX_AGE', 300))
+
     # CORS origins dla Socket.IO (lista po przecinku). Natywna apka mobilna nie wysyła
     # nagłówka Origin → engineio przepuszcza zawsze; lista chroni tylko przeglądarki.
     SOCKETIO_CORS_ORIGINS = [
@@ -73,6 +143,23 @@ class Config:
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER', 'noreply@thunderorders.cloud')
 
+    # Outbox emaili (utils/email_outbox.py): send_email / send_email_batch zapisują wiadomość
+    # w email_outbox, wysyła proces `flask email-sender`. Domyślnie False = wątek w web workerze
+    # — outbox ma sens tylko z działającą usługą thunderorders-email, więc włącza go ProductionConfig.
+    EMAIL_OUTBOX_ENABLED = os.getenv('EMAIL_OUTBOX_ENABLED', 'False').lower() == 'true'
+    # Token bucket: średnio EMAIL_RATE_PER_MINUTE maili/min, do EMAIL_RATE_BURST od razu po przerwie
+    EMAIL_RATE_PER_MINUTE = int(os.getenv('EMAIL_RATE_PER_MINUTE', 30))
+    EMAIL_RATE_BURST = int(os.getenv('EMAIL_RATE_BURST', 5))
+    EMAIL_SMTP_MAX_PER_CONNECTION = int(os.getenv('EMAIL_SMTP_MAX_PER_CONNECTION', 100))  # potem nowy AUTH
+    EMAIL_SMTP_IDLE_TIMEOUT = int(os.getenv('EMAIL_SMTP_IDLE_TIMEOUT', 30))  # s bez maili → zamknij połączenie
+    EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', 8))
+    EMAIL_OUTBOX_SENDING_TIMEOUT = int(os.getenv('EMAIL_OUTBOX_SENDING_TIMEOUT', 300))  # s; dłużej = sender padł
+    EMAIL_OUTBOX_RETENTION_DAYS = int(os.getenv('EMAIL_OUTBOX_RETENTION_DAYS', 7))
+    # Masowe maile (utils/email_batch.py): procesy serializacji MIME (0 = liczba CPU),
+    # pula dopiero od EMAIL_MIME_POOL_MIN wiadomości — mniejsze batche w procesie
+    EMAIL_RENDER_WORKERS = int(os.getenv('EMAIL_RENDER_WORKERS', 0))
+    EMAIL_MIME_POOL_MIN = int(os.getenv('EMAIL_MIME_POOL_MIN', 200))
+
     # Exchange Rate API
     EXCHANGE_RATE_API_KEY = os.getenv('EXCHANGE_RATE_API_KEY')
 
@@ -113,6 +200,10 @@ class Config:
     VAPID_PUBLIC_KEY = os.getenv('VAPID_PUBLIC_KEY', '')
     VAPID_PRIVATE_KEY = os.getenv('VAPID_PRIVATE_KEY', '')
     VAPID_CLAIMS_EMAIL = os.getenv('VAPID_CLAIMS_EMAIL', 'mailto:noreply@thunderorders.cloud')
+    # Masowa wysyłka push (utils/push_bulk.py): równoległe wysyłki HTTP (keep-alive per host)
+    # i rozmiar porcji userów na zapytania IN (...) / zbiorcze UPDATE.
+    PUSH_BULK_WORKERS = int(os.getenv('PUSH_BULK_WORKERS', 16))
+    PUSH_BULK_CHUNK = int(os.getenv('PUSH_BULK_CHUNK', 500))
 
     # Firebase Cloud Messaging (FCM HTTP v1) — kanał push dla apki mobilnej.
     # Puste = FCM wyłączony gracefully (Web Push działa bez zmian). Sekrety NIE w repo.
@@ -153,6 +244,11 @@ class ProductionConfig(Config):
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'  # 'Lax' wymagany dla OAuth (redirect z Google/Facebook)
 
+    # Kolejka OCR i outbox emaili — usługi thunderorders-ocr / thunderorders-email
+    # instaluje i włącza deploy.sh (deploy/*.service)
+    OCR_QUEUE_ENABLED = os.getenv('OCR_QUEUE_ENABLED', 'True').lower() == 'true'
+    EMAIL_OUTBOX_ENABLED = os.getenv('EMAIL_OUTBOX_ENABLED', 'True').lower() == 'true'
+
     # Wymagaj silniejszego SECRET_KEY w produkcji
     @classmethod
     def init_app(cls, app):
@@ -175,6 +271,8 @@ class TestingConfig(Config):
     WTF_CSRF_ENABLED = False  # Wyłącz CSRF w testach
     RATELIMIT_ENABLED = False  # Wyłącz rate limiting w testach (brak Redis)
     SOCKETIO_MESSAGE_QUEUE = None  # test_client nie współpracuje z PubSub managerem (Redis)
+    OFFERS_BROADCAST_WINDOW_MS = 0  # Emit synchroniczny — testy sprawdzają eventy od razu
+    OFFERS_REAPER_INTERVAL = 0  # Bez globalnego sweepu w tle (testy wołają reaper wprost)
 
     # StaticPool: wszystkie operacje używają tej samej in-memory konekcji SQLite.
     # Nadpisuje pool_size/max_overflow z bazowego Config, które są niekompatybilne z SQLite.
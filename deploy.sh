@@ -30,6 +30,26 @@ pip install -r requirements.txt --quiet 2>&1
 echo "$LOG_PREFIX Running migrations..."
 flask db upgrade 2>&1
 
+# Backfill indeksu wyszukiwania (migracja sx2026101701 tworzy puste tabele) — tylko typy
+# bez wpisów, więc kolejne deploye nic nie przebudowują
+echo "$LOG_PREFIX Backfilling search index..."
+flask search-reindex --if-empty 2>&1
+
+# Usługi workerów spoza HTTP/WS (unity w deploy/). Pierwszy deploy instaluje unit i włącza
+# usługę (enable --now) — ProductionConfig zakłada, że workery działają (OCR_QUEUE_ENABLED,
+# EMAIL_OUTBOX_ENABLED). Wymaga reguł sudoers NOPASSWD dla cp/daemon-reload/enable tych unitów;
+# ręcznie (per unit):
+#   sudo cp deploy/thunderorders-ocr.service /etc/systemd/system/
+#   sudo systemctl daemon-reload && sudo systemctl enable --now thunderorders-ocr
+for unit in thunderorders-ocr thunderorders-email; do
+    if [ ! -f "/etc/systemd/system/$unit.service" ]; then
+        echo "$LOG_PREFIX Installing $unit.service..."
+        sudo cp "deploy/$unit.service" /etc/systemd/system/ 2>&1
+        sudo systemctl daemon-reload 2>&1
+        sudo systemctl enable --now "$unit" 2>&1
+    fi
+done
+
 echo "$LOG_PREFIX Restarting application..."
 # Architektura rozdzielona (2026-06-04): HTTP (gthread) + WS (eventlet/Socket.IO).
 # Stara monolityczna usługa `thunderorders` jest martwa (disabled) — NIE restartować jej tutaj,
@@ -49,6 +69,10 @@ rm -f "$LOCK_FILE"
 # nie był restartowany NIGDY (potwierdzone 2026-06-12: ws działał na kodzie
 # sprzed 10h mimo deployu) i procesy serwowały rozjechane wersje kodu.
 sudo systemctl restart thunderorders-ws 2>&1
+# Worker OCR (kolejka ocr_jobs) — też przed -http; przerwane zadania wracają do kolejki po OCR_JOB_TIMEOUT
+sudo systemctl restart thunderorders-ocr 2>&1
+# Sender emaili (email_outbox) — niewysłane maile czekają w tabeli, nic nie ginie przy restarcie
+sudo systemctl restart thunderorders-email 2>&1
 sudo systemctl restart thunderorders-http 2>&1
 
 echo "$LOG_PREFIX Deploy complete!"
@@ -0,0 +1,29 @@
+"""offer page closure state
+
+Postęp zamykania strony w tle (utils/offer_closure.run_offer_closure):
+etap, licznik, błąd i wynik — odpytywany przez modal zamknięcia.
+
+Revision ID: cs2026101701
+Revises: eo2026101701
+Create Date: 2026-10-17 23:05:47.310256
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'cs2026101701'
+down_revision = 'eo2026101701'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('offer_pages', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('closure_state', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('offer_pages', schema=None) as batch_op:
+        batch_op.drop_column('closure_state')
\ No newline at end of file
@@ -0,0 +1,51 @@
+"""email outbox
+
+Trwała kolejka emaili (utils/email_outbox.py): send_email / send_email_batch
+zapisują gotową wiadomość MIME, wysyła `flask email-sender`
+(deploy/thunderorders-email.service).
+
+Revision ID: eo2026101701
+Revises: pb2026101701
+Create Date: 2026-10-17 21:36:52.118406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'eo2026101701'
+down_revision = 'pb2026101701'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('email_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('idempotency_key', sa.String(length=191), nullable=True, comment='Ten sam klucz = ten sam email (dedup)'),
+    sa.Column('sender', sa.String(length=255), nullable=False),
+    sa.Column('recipients', sa.JSON(), nullable=False),
+    sa.Column('subject', sa.String(length=255), nullable=True),
+    sa.Column('message', sa.LargeBinary(length=16777215), nullable=False, comment='Wiadomość MIME (Message.as_bytes)'),
+    sa.Column('status', sa.String(length=20), nullable=False, comment="Status: 'pending', 'sending', 'sent', 'failed'"),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('available_at', sa.DateTime(), nullable=False, comment='Backoff retry'),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('idempotency_key')
+    )
+    with op.batch_alter_table('email_outbox', schema=None) as batch_op:
+        batch_op.create_index('ix_email_outbox_queue', ['status', 'available_at', 'id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_email_outbox_sent_at'), ['sent_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('email_outbox', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_email_outbox_sent_at'))
+        batch_op.drop_index('ix_email_outbox_queue')
+
+    op.drop_table('email_outbox')
@@ -0,0 +1,34 @@
+"""ocr jobs ocr mode
+
+Cache tekstu OCR (utils/ocr_cache.py) zostaje w ocr_jobs.ocr_text — klucz
+to teraz (file_hash, ocr_mode), bo tekst trybu 'staged' różni się od 'full'.
+Istniejące teksty pochodzą z OCR całej strony (jedyny tryb przed OCR_MODE),
+więc server_default 'full' je opisuje.
+
+Revision ID: oc2026101701
+Revises: oq2026101701
+Create Date: 2026-10-17 18:12:44.730215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'oc2026101701'
+down_revision = 'oq2026101701'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ocr_jobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('ocr_mode', sa.String(length=10), nullable=False, server_default='full',
+                                      comment="Tryb OCR tekstu: 'full' / 'staged'"))
+        batch_op.add_column(sa.Column('ocr_ms', sa.Integer(), nullable=True, comment='Czas OCR (ms)'))
+
+
+def downgrade():
+    with op.batch_alter_table('ocr_jobs', schema=None) as batch_op:
+        batch_op.drop_column('ocr_ms')
+        batch_op.drop_column('ocr_mode')
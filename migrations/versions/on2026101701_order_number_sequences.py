@@ -0,0 +1,34 @@
+"""order number sequences
+
+Licznik numerów zamówień per prefiks (PO, OH, EX) — zastępuje wyszukiwanie
+ostatniego zamówienia LIKE 'EX/%' przy każdym place order. Wiersze zakłada
+aplikacja przy pierwszym użyciu prefiksu (high-water mark z orders), więc
+migracja tworzy tylko pustą tabelę.
+
+Revision ID: on2026101701
+Revises: 5d55aefadf79
+Create Date: 2026-10-17 10:12:31.402218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'on2026101701'
+down_revision = '5d55aefadf79'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('order_number_sequences',
+    sa.Column('prefix', sa.String(length=5), nullable=False),
+    sa.Column('last_value', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('prefix')
+    )
+
+
+def downgrade():
+    op.drop_table('order_number_sequences')
@@ -0,0 +1,52 @@
+"""ocr jobs queue
+
+Kolejka OCR potwierdzeń płatności (utils/ocr_queue.py) — zadania dla procesu
+`flask ocr-worker` (deploy/thunderorders-ocr.service) i cache tekstu OCR po
+SHA-256 pliku.
+
+Revision ID: oq2026101701
+Revises: sx2026101701
+Create Date: 2026-10-17 16:40:27.108344
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'oq2026101701'
+down_revision = 'sx2026101701'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ocr_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('proof_file', sa.String(length=255), nullable=False),
+    sa.Column('file_hash', sa.String(length=64), nullable=False, comment='SHA-256 zawartości pliku'),
+    sa.Column('priority', sa.Integer(), nullable=False, comment='Mniejsza = wcześniej (0 upload, 10 backfill)'),
+    sa.Column('status', sa.String(length=20), nullable=False, comment="Status: 'pending', 'running', 'done', 'failed'"),
+    sa.Column('payload', sa.JSON(), nullable=False, comment='task_data dla utils/ocr_background.apply_ocr_result'),
+    sa.Column('ocr_text', sa.Text(), nullable=True, comment='Tekst z Tesseracta (cache po file_hash)'),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('available_at', sa.DateTime(), nullable=False, comment='Backoff retry'),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('ocr_jobs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_ocr_jobs_file_hash'), ['file_hash'], unique=False)
+        batch_op.create_index(batch_op.f('ix_ocr_jobs_proof_file'), ['proof_file'], unique=False)
+        batch_op.create_index('ix_ocr_jobs_queue', ['status', 'priority', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('ocr_jobs', schema=None) as batch_op:
+        batch_op.drop_index('ix_ocr_jobs_queue')
+        batch_op.drop_index(batch_op.f('ix_ocr_jobs_proof_file'))
+        batch_op.drop_index(batch_op.f('ix_ocr_jobs_file_hash'))
+
+    op.drop_table('ocr_jobs')
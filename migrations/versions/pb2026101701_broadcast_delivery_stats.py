@@ -0,0 +1,29 @@
+"""broadcast delivery stats
+
+Statystyki wysyłki push broadcastu (utils/push_bulk.py): wysłane, błędy,
+dezaktywowane subskrypcje, pushe/s.
+
+Revision ID: pb2026101701
+Revises: oc2026101701
+Create Date: 2026-10-17 20:41:08.512904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'pb2026101701'
+down_revision = 'oc2026101701'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('admin_broadcasts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('delivery_stats', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('admin_broadcasts', schema=None) as batch_op:
+        batch_op.drop_column('delivery_stats')
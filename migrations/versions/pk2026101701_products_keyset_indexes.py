@@ -0,0 +1,44 @@
+"""products keyset indexes
+
+Indeksy (name, id), (quantity, id) i (sale_price, id) pod kursory listy produktów w panelu
+(modules/products/routes.py list_products). quantity staje się NOT NULL
+(puste stany magazynowe = 0), żeby porównanie z kursorem nie gubiło wierszy.
+
+Revision ID: pk2026101701
+Revises: sd2026101701
+Create Date: 2026-10-17 11:40:12.504311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'pk2026101701'
+down_revision = 'sd2026101701'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("UPDATE products SET quantity = 0 WHERE quantity IS NULL")
+
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.alter_column('quantity',
+               existing_type=sa.Integer(),
+               nullable=False,
+               server_default='0')
+        batch_op.create_index('ix_products_name_id', ['name', 'id'], unique=False)
+        batch_op.create_index('ix_products_quantity_id', ['quantity', 'id'], unique=False)
+        batch_op.create_index('ix_products_sale_price_id', ['sale_price', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_index('ix_products_sale_price_id')
+        batch_op.drop_index('ix_products_quantity_id')
+        batch_op.drop_index('ix_products_name_id')
+        batch_op.alter_column('quantity',
+               existing_type=sa.Integer(),
+               nullable=True,
+               server_default=None)
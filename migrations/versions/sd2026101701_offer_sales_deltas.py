@@ -0,0 +1,55 @@
+"""offer sales deltas
+
+Delty agregatów sprzedaży stron Offer (modules/offers/sales_stats.py):
+checkout dopisuje wiersz zamiast aktualizować wspólny wiersz strony, więc
+równoległe zamówienia jednej strony nie czekają na siebie. Bez backfillu —
+tabela startuje pusta, istniejące agregaty pozostają aktualne.
+
+Revision ID: sd2026101701
+Revises: ss2026101701
+Create Date: 2026-10-17 09:12:40.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'sd2026101701'
+down_revision = 'ss2026101701'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('offer_sales_deltas',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('offer_page_id', sa.Integer(), nullable=False),
+    sa.Column('item_key', sa.String(length=320), nullable=True),
+    sa.Column('product_id', sa.Integer(), nullable=True),
+    sa.Column('product_name', sa.String(length=255), nullable=True),
+    sa.Column('selected_size', sa.String(length=50), nullable=True),
+    sa.Column('is_custom', sa.Boolean(), nullable=False),
+    sa.Column('is_full_set', sa.Boolean(), nullable=False),
+    sa.Column('is_bonus', sa.Boolean(), nullable=False),
+    sa.Column('first_item_id', sa.Integer(), nullable=True),
+    sa.Column('orders_count', sa.Integer(), nullable=False),
+    sa.Column('customers_count', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('item_count', sa.Integer(), nullable=False),
+    sa.Column('bonus_quantity', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('fulfilled_quantity', sa.Integer(), nullable=False),
+    sa.Column('unfulfilled_quantity', sa.Integer(), nullable=False),
+    sa.Column('unfulfilled_revenue', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['offer_page_id'], ['offer_pages.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('offer_sales_deltas', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_offer_sales_deltas_offer_page_id'), ['offer_page_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('offer_sales_deltas', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_offer_sales_deltas_offer_page_id'))
+    op.drop_table('offer_sales_deltas')
@@ -0,0 +1,60 @@
+"""offer sales stats
+
+Zmaterializowane agregaty sprzedaży stron Offer (modules/offers/sales_stats.py)
+dla get_live_summary / get_page_summary. Bez backfillu — brak wiersza strony
+oznacza przebudowę przy pierwszym odczycie.
+
+Revision ID: ss2026101701
+Revises: cs2026101701
+Create Date: 2026-10-17 23:48:12.604117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ss2026101701'
+down_revision = 'cs2026101701'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('offer_page_sales',
+    sa.Column('offer_page_id', sa.Integer(), nullable=False),
+    sa.Column('orders_count', sa.Integer(), nullable=False),
+    sa.Column('customers_count', sa.Integer(), nullable=False),
+    sa.Column('stale', sa.Boolean(), nullable=False),
+    sa.Column('built_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['offer_page_id'], ['offer_pages.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('offer_page_id')
+    )
+    op.create_table('offer_product_sales',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('offer_page_id', sa.Integer(), nullable=False),
+    sa.Column('item_key', sa.String(length=320), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=True),
+    sa.Column('product_name', sa.String(length=255), nullable=True),
+    sa.Column('selected_size', sa.String(length=50), nullable=True),
+    sa.Column('is_custom', sa.Boolean(), nullable=False),
+    sa.Column('is_full_set', sa.Boolean(), nullable=False),
+    sa.Column('is_bonus', sa.Boolean(), nullable=False),
+    sa.Column('first_item_id', sa.Integer(), nullable=True),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('item_count', sa.Integer(), nullable=False),
+    sa.Column('bonus_quantity', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('fulfilled_quantity', sa.Integer(), nullable=False),
+    sa.Column('unfulfilled_quantity', sa.Integer(), nullable=False),
+    sa.Column('unfulfilled_revenue', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['offer_page_id'], ['offer_pages.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('offer_page_id', 'item_key', name='unique_offer_product_sales_key')
+    )
+
+
+def downgrade():
+    op.drop_table('offer_product_sales')
+    op.drop_table('offer_page_sales')
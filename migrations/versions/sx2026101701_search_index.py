@@ -0,0 +1,67 @@
+"""search index
+
+Indeks wyszukiwania (modules/search): dokumenty, słowa i trigramy dla
+produktów, zamówień, klientów i zleceń wysyłki. Aplikacja utrzymuje go
+przyrostowo; istniejące dane ładuje `flask search-reindex --if-empty`,
+które deploy.sh woła zaraz po `flask db upgrade` (tokenizacja i trigramy
+liczone w Pythonie — modules/search/service.py — więc nie w SQL migracji).
+
+Revision ID: sx2026101701
+Revises: on2026101701
+Create Date: 2026-10-17 14:05:12.553190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'sx2026101701'
+down_revision = 'on2026101701'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('search_documents',
+    sa.Column('entity_type', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('sort_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('entity_type', 'entity_id')
+    )
+    with op.batch_alter_table('search_documents', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_search_documents_owner_id'), ['owner_id'], unique=False)
+
+    op.create_table('search_terms',
+    sa.Column('entity_type', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('term', sa.String(length=64), nullable=False),
+    sa.PrimaryKeyConstraint('entity_type', 'entity_id', 'term')
+    )
+    with op.batch_alter_table('search_terms', schema=None) as batch_op:
+        batch_op.create_index('ix_search_terms_type_term', ['entity_type', 'term'], unique=False)
+
+    op.create_table('search_grams',
+    sa.Column('entity_type', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('gram', sa.String(length=3), nullable=False),
+    sa.PrimaryKeyConstraint('entity_type', 'entity_id', 'gram')
+    )
+    with op.batch_alter_table('search_grams', schema=None) as batch_op:
+        batch_op.create_index('ix_search_grams_type_gram', ['entity_type', 'gram'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('search_grams', schema=None) as batch_op:
+        batch_op.drop_index('ix_search_grams_type_gram')
+    op.drop_table('search_grams')
+
+    with op.batch_alter_table('search_terms', schema=None) as batch_op:
+        batch_op.drop_index('ix_search_terms_type_term')
+    op.drop_table('search_terms')
+
+    with op.batch_alter_table('search_documents', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_search_documents_owner_id'))
+    op.drop_table('search_documents')
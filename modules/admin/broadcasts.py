@@ -5,9 +5,8 @@ Wysyłanie powiadomień broadcast do użytkowników z panelu admina.
 
 import json
 import logging
-import threading
 
-from flask import render_template, request, jsonify, current_app, url_for
+from flask import render_template, request, jsonify, url_for
 from flask_login import login_required, current_user
 from extensions import db
 from utils.decorators import role_required
@@ -90,30 +89,12 @@ def broadcasts_send():
         db.session.add(broadcast)
         db.session.commit()
 
-        # Send notifications in background thread
-        broadcast_id = broadcast.id
-        app = current_app._get_current_object()
-
-        def _send_all():
-            with app.app_context():
-                from utils.push_manager import PushManager
-                tag = f'broadcast-{broadcast_id}'
-                for uid in user_ids:
-                    try:
-                        PushManager.send_to_user(
-                            user_id=uid,
-                            title=title,
-                            body=body or '',
-                            url=url_val or '/',
-                            tag=tag,
-                            notification_type='admin_alerts'
-                        )
-                    except Exception as e:
-                        logger.error(f'Broadcast send error for user {uid}: {e}')
-
-        thread = threading.Thread(target=_send_all)
-        thread.daemon = True
-        thread.start()
+        # Wysyłka hurtowa w tle (shared executor, limit per typ zadania)
+        from utils import background_jobs
+        if not background_jobs.submit('push_broadcast', _send_broadcast, broadcast.id, user_ids):
+            db.session.delete(broadcast)
+            db.session.commit()
+            return jsonify({'success': False, 'message': 'Serwer jest zajęty, spróbuj ponownie za chwilę.'}), 503
 
         return jsonify({
             'success': True,
@@ -127,6 +108,29 @@ def broadcasts_send():
         return jsonify({'success': False, 'message': 'Wystąpił błąd serwera.'}), 500
 
 
+def _send_broadcast(broadcast_id, user_ids):
+    """
+    Zadanie w tle: push broadcastu do wszystkich odbiorców
+    (PushManager.send_to_users) i zapis statystyk dostarczenia.
+    """
+    from utils.push_manager import PushManager
+
+    broadcast = db.session.get(AdminBroadcast, broadcast_id)
+    if not broadcast:
+        return
+    stats = PushManager.send_to_users(
+        user_ids,
+        title=broadcast.title,
+        body=broadcast.body or '',
+        url=broadcast.url or '/',
+        tag=broadcast.tag,
+        notification_type='admin_alerts'
+    )
+    broadcast = db.session.get(AdminBroadcast, broadcast_id)
+    broadcast.delivery_stats = stats
+    db.session.commit()
+
+
 @admin_bp.route('/broadcasts/search-users')
 @login_required
 @role_required('admin', 'mod')
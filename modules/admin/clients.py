@@ -25,6 +25,7 @@ from modules.notifications.models import Notification, PushSubscription, Notific
 from modules.imports.models import CsvImport
 from modules.client.payment_upload_sessions import PaymentUploadSession
 from modules.products.models import CartItem, ProductInteraction
+from modules.search import service as search_index
 from extensions import db
 from utils.decorators import role_required
 from utils.email_sender import send_account_deactivated_email
@@ -515,8 +516,13 @@ def client_delete(id):
         uid = client.id
 
         # --- Nullify nullable FK references to preserve history ---
+        # owner_id w indeksie wyszukiwania — masowy UPDATE omija eventy indeksu
+        order_ids = [oid for (oid,) in db.session.query(Order.id).filter_by(user_id=uid)]
+        request_ids = [rid for (rid,) in db.session.query(ShippingRequest.id).filter_by(user_id=uid)]
         ShippingRequest.query.filter_by(user_id=uid).update({'user_id': None})
         Order.query.filter_by(user_id=uid).update({'user_id': None})
+        search_index.reindex('order', order_ids)
+        search_index.reindex('shipping_request', request_ids)
         Order.query.filter_by(packed_by=uid).update({'packed_by': None})
         OrderComment.query.filter_by(user_id=uid).update({'user_id': None})
         OrderItem.query.filter_by(picked_by=uid).update({'picked_by': None})
@@ -337,6 +337,13 @@ def offers_save(page_id):
 
         db.session.commit()
 
+        # Po commit: zmienione sekcje/limity → układ strony i snapshot dostępności do przebudowy
+        if 'sections' in data:
+            from modules.offers.availability import invalidate as invalidate_availability
+            from modules.offers.layout import invalidate as invalidate_layout
+            invalidate_layout(page.id)
+            invalidate_availability(page.id)
+
         # Po commit: powiadomienia dla sekcji ze zwiększonymi limitami (jak dotąd)
         if limit_changes:
             _send_notifications_for_limit_changes(page.id, limit_changes)
@@ -1104,6 +1111,33 @@ def offers_orders_count(page_id):
     })
 
 
+@admin_bp.route('/offers/<int:page_id>/broadcast-metrics')
+@login_required
+@admin_required
+def offers_broadcast_metrics(page_id):
+    """Metryki scalania broadcastów dostępności strony (ten worker, AJAX)"""
+    from modules.offers.socket_events import get_availability_broadcast_metrics
+    OfferPage.query.get_or_404(page_id)
+    return jsonify({
+        'success': True,
+        'window_ms': current_app.config.get('OFFERS_BROADCAST_WINDOW_MS', 0),
+        'metrics': get_availability_broadcast_metrics(page_id)
+    })
+
+
+@admin_bp.route('/offers/reaper-metrics')
+@login_required
+@admin_required
+def offers_reaper_metrics():
+    """Metryki reapera wygasłych rezerwacji — lag wygaśnięcie → usunięcie (wszystkie workery, AJAX)"""
+    from modules.offers.expiry import reaper_metrics
+    return jsonify({
+        'success': True,
+        'interval_s': current_app.config.get('OFFERS_REAPER_INTERVAL', 0),
+        'metrics': reaper_metrics()
+    })
+
+
 @admin_bp.route('/offers/<int:page_id>/delete', methods=['POST'])
 @login_required
 @admin_required
@@ -1512,14 +1546,14 @@ def offers_close_complete(page_id):
     """
     Całkowicie zamyka stronę Offers.
 
-    Wykonuje:
+    Wykonuje (exclusive — w tle, odpowiedź 202 ze status_url):
     1. Algorytm alokacji setów (pierwsi zamawiający dostają produkty)
     2. Ustawia flagę is_fully_closed
     3. Opcjonalnie wysyła emaile do klientów
 
     Tylko Admin może wykonać tę operację.
     """
-    from utils.offer_closure import close_offer_page
+    from utils.offer_closure import claim_offer_closure, queue_offer_closure
 
     page = OfferPage.query.get_or_404(page_id)
 
@@ -1588,35 +1622,45 @@ def offers_close_complete(page_id):
             'redirect': url_for('admin.offers_list')
         })
 
-    # Exclusive: full closure with set allocation
-    # Pobierz opcję wysyłki emaili
+    # Exclusive: full closure with set allocation — w tle (utils/offer_closure.run_offer_closure),
+    # modal odpytuje offers_close_status o postęp
     send_emails = data.get('send_emails', True)
 
-    try:
-        result = close_offer_page(
-            page_id=page_id,
-            user_id=current_user.id,
-            send_emails=send_emails
-        )
-
-        return jsonify({
-            'success': True,
-            'message': 'Strona została całkowicie zamknięta.',
-            'allocation': result.get('allocation'),
-            'redirect': url_for('admin.offers_summary', page_id=page_id)
-        })
-
-    except ValueError as e:
+    if not claim_offer_closure(page):
+        db.session.rollback()
         return jsonify({
             'success': False,
-            'error': str(e)
-        }), 400
-    except Exception as e:
-        db.session.rollback()
+            'error': 'Zamykanie tej strony już trwa.'
+        }), 409
+
+    if not queue_offer_closure(page, current_user.id, send_emails, request.url_root,
+                               request.remote_addr, request.headers.get('User-Agent', '')[:500]):
         return jsonify({
             'success': False,
-            'error': f'Wystąpił błąd: {str(e)}'
-        }), 500
+            'error': 'Serwer jest zajęty, spróbuj ponownie za chwilę.'
+        }), 503
+
+    return jsonify({
+        'success': True,
+        'queued': True,
+        'message': 'Zamykanie strony rozpoczęte.',
+        'status_url': url_for('admin.offers_close_status', page_id=page_id),
+        'redirect': url_for('admin.offers_summary', page_id=page_id)
+    }), 202
+
+
+@admin_bp.route('/offers/<int:page_id>/close-status')
+@login_required
+@admin_required
+def offers_close_status(page_id):
+    """Postęp zamykania strony w tle (OfferPage.closure_state) — polling z modala."""
+    page = OfferPage.query.get_or_404(page_id)
+    return jsonify({
+        'success': True,
+        'is_fully_closed': bool(page.is_fully_closed),
+        'closure': page.closure_state,
+        'redirect': url_for('admin.offers_summary', page_id=page_id)
+    })
 
 
 # ============================================
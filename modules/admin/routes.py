@@ -633,3 +633,75 @@ def get_offer_pages():
         'remaining': remaining,
         'total': len(offer_pages_all)
     })
+
+
+@admin_bp.route('/sql-profile')
+@login_required
+@role_required('admin')
+def sql_profile():
+    """
+    Agregaty profilera SQL per endpoint (ten worker, JSON).
+
+    Query params:
+    - limit: ile endpointów zwrócić (domyślnie 50, sortowanie po łącznym czasie w bazie)
+    """
+    from flask import current_app
+    from utils.query_profiler import get_stats
+
+    if not current_app.config.get('SQL_PROFILING_ENABLED'):
+        return jsonify({'success': False, 'error': 'profiling_disabled',
+                        'message': 'Profiler SQL jest wyłączony (SQL_PROFILING_ENABLED).'}), 404
+
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify({
+        'success': True,
+        'n_plus_one_threshold': current_app.config.get('SQL_PROFILING_N_PLUS_ONE', 10),
+        'endpoints': get_stats()[:limit]
+    })
+
+
+@admin_bp.route('/sql-profile/reset', methods=['POST'])
+@login_required
+@role_required('admin')
+def sql_profile_reset():
+    """Zeruje agregaty profilera SQL (ten worker)"""
+    from utils.query_profiler import reset_stats
+    reset_stats()
+    return jsonify({'success': True})
+
+
+@admin_bp.route('/background-jobs')
+@login_required
+@role_required('admin')
+def background_jobs_stats():
+    """Kolejki, limity i czasy zadań w tle per typ (ten worker, JSON)"""
+    from utils.background_jobs import get_stats
+    return jsonify({'success': True, 'job_types': get_stats()})
+
+
+@admin_bp.route('/background-jobs/reset', methods=['POST'])
+@login_required
+@role_required('admin')
+def background_jobs_reset():
+    """Zeruje metryki zadań w tle (ten worker)"""
+    from utils.background_jobs import reset_stats
+    reset_stats()
+    return jsonify({'success': True})
+
+
+@admin_bp.route('/email-outbox')
+@login_required
+@role_required('admin')
+def email_outbox_stats():
+    """Głębokość kolejki emaili i tempo wysyłki (email_outbox, JSON)"""
+    from utils.email_outbox import get_stats
+    return jsonify({'success': True, 'outbox': get_stats()})
+
+
+@admin_bp.route('/email-outbox/retry-failed', methods=['POST'])
+@login_required
+@role_required('admin')
+def email_outbox_retry_failed():
+    """Przywraca nieudane maile do kolejki"""
+    from utils.email_outbox import retry_failed
+    return jsonify({'success': True, 'requeued': retry_failed()})
@@ -5,7 +5,6 @@ Internal API endpoints for user preferences and AJAX requests
 
 from flask import jsonify, request
 from flask_login import login_required, current_user
-from sqlalchemy import or_
 from extensions import db
 from . import api_bp
 from utils.decorators import role_required
@@ -140,11 +139,6 @@ def maintenance_toggle():
     new_value = not current
     Settings.set_value('maintenance_mode', str(new_value).lower(), updated_by=current_user.id, type='boolean')
 
-    # Reset cache żeby zmiana była widoczna natychmiast
-    from flask import current_app
-    if hasattr(current_app, 'maintenance_cache'):
-        current_app.maintenance_cache['checked_at'] = 0
-
     return jsonify({
         'success': True,
         'enabled': new_value,
@@ -280,22 +274,14 @@ def search_products():
                 'message': 'Search query must be at least 2 characters'
             }), 400
         else:
-            # Szukanie po słowach (tokenach), nie po całej frazie naraz.
-            # Każde słowo z zapytania musi wystąpić w nazwie/SKU/EAN — dzięki
-            # temu "ateez hig" znajdzie "Ateez  Higher" mimo podwójnej spacji,
-            # innego myślnika czy odwróconej kolejności słów.
-            tokens = query.split()
-            token_filters = [
-                db.or_(
-                    Product.name.ilike(f'%{token}%'),
-                    Product.sku.ilike(f'%{token}%'),
-                    Product.ean.ilike(f'%{token}%')
-                )
-                for token in tokens
-            ]
-            products = Product.query.filter(
-                db.and_(*token_filters)
-            ).filter_by(is_active=True).limit(limit).all()
+            # Szukanie po słowach (tokenach), nie po całej frazie naraz — przez
+            # indeks wyszukiwania. Każde słowo z zapytania musi pasować do
+            # początku słowa w nazwie/SKU/EAN — dzięki temu "ateez hig" znajdzie
+            # "Ateez  Higher" mimo podwójnej spacji, innego myślnika czy
+            # odwróconej kolejności słów.
+            from modules.search import service as search_index
+            hits = search_index.search(query, {'product': limit})
+            products = search_index.load_ordered(Product, hits.get('product'))
 
         # Format results
         results = []
@@ -364,17 +350,10 @@ def search_clients():
                 'message': 'Search query must be at least 3 characters'
             }), 400
 
-        # Search clients (users with role 'client')
-        clients = User.query.filter(
-            User.role == 'client',
-            User.is_active == True,
-            or_(
-                User.first_name.ilike(f'%{query}%'),
-                User.last_name.ilike(f'%{query}%'),
-                User.email.ilike(f'%{query}%'),
-                db.func.concat(User.first_name, ' ', User.last_name).ilike(f'%{query}%')
-            )
-        ).limit(limit).all()
+        # Search clients (users with role 'client') — przez indeks wyszukiwania
+        from modules.search import service as search_index
+        hits = search_index.search(query, {'client': limit})
+        clients = search_index.load_ordered(User, hits.get('client'))
 
         # Format results
         results = []
@@ -497,6 +476,7 @@ def global_search():
     from modules.products.models import Product, ProxyOrder, PolandOrder
     from modules.offers.models import OfferPage
     from modules.auth.models import User
+    from modules.search import service as search_index
 
     query = request.args.get('q', '').strip()
 
@@ -524,24 +504,20 @@ def global_search():
     # For DB searches, require min 2 chars
     if len(query) >= 2:
 
-        # --- Orders ---
+        # Zamówienia, zlecenia wysyłki, produkty i klienci — z indeksu
+        # wyszukiwania, wszystkie kategorie jednym zapytaniem
         if is_admin:
-            orders = Order.query.filter(
-                db.or_(
-                    Order.order_number.ilike(f'%{query}%'),
-                    Order.tracking_number.ilike(f'%{query}%'),
-                    Order.shipping_name.ilike(f'%{query}%')
-                )
-            ).order_by(Order.created_at.desc()).limit(limit_per_category).all()
+            hits = search_index.search(query, {
+                'order': limit_per_category, 'shipping_request': limit_per_category,
+                'product': limit_per_category, 'client': limit_per_category,
+            })
         else:
-            # Client: only own orders
-            orders = Order.query.filter(
-                Order.user_id == current_user.id,
-                db.or_(
-                    Order.order_number.ilike(f'%{query}%'),
-                    Order.tracking_number.ilike(f'%{query}%')
-                )
-            ).order_by(Order.created_at.desc()).limit(limit_per_category).all()
+            hits = search_index.search(query, {
+                'order': limit_per_category, 'shipping_request': limit_per_category,
+            }, owner_id=current_user.id)
+
+        # --- Orders ---
+        orders = search_index.load_ordered(Order, hits.get('order'))
 
         if orders:
             order_results = []
@@ -565,22 +541,7 @@ def global_search():
             results['orders'] = order_results
 
         # --- Shipping Requests ---
-        if is_admin:
-            ship_requests = ShippingRequest.query.filter(
-                db.or_(
-                    ShippingRequest.request_number.ilike(f'%{query}%'),
-                    ShippingRequest.shipping_name.ilike(f'%{query}%'),
-                    ShippingRequest.tracking_number.ilike(f'%{query}%')
-                )
-            ).order_by(ShippingRequest.created_at.desc()).limit(limit_per_category).all()
-        else:
-            ship_requests = ShippingRequest.query.filter(
-                ShippingRequest.user_id == current_user.id,
-                db.or_(
-                    ShippingRequest.request_number.ilike(f'%{query}%'),
-                    ShippingRequest.tracking_number.ilike(f'%{query}%')
-                )
-            ).order_by(ShippingRequest.created_at.desc()).limit(limit_per_category).all()
+        ship_requests = search_index.load_ordered(ShippingRequest, hits.get('shipping_request'))
 
         if ship_requests:
             ship_results = []
@@ -600,14 +561,7 @@ def global_search():
         # --- Admin-only categories ---
         if is_admin:
             # Products
-            products = Product.query.filter(
-                Product.is_active == True,
-                db.or_(
-                    Product.name.ilike(f'%{query}%'),
-                    Product.sku.ilike(f'%{query}%'),
-                    Product.ean.ilike(f'%{query}%')
-                )
-            ).limit(limit_per_category).all()
+            products = search_index.load_ordered(Product, hits.get('product'))
 
             if products:
                 prod_results = []
@@ -626,16 +580,7 @@ def global_search():
                 results['products'] = prod_results
 
             # Clients
-            clients = User.query.filter(
-                User.role == 'client',
-                User.is_active == True,
-                db.or_(
-                    User.first_name.ilike(f'%{query}%'),
-                    User.last_name.ilike(f'%{query}%'),
-                    User.email.ilike(f'%{query}%'),
-                    db.func.concat(User.first_name, ' ', User.last_name).ilike(f'%{query}%')
-                )
-            ).limit(limit_per_category).all()
+            clients = search_index.load_ordered(User, hits.get('client'))
 
             if clients:
                 client_results = []
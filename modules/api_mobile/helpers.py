@@ -50,8 +50,11 @@ def absolute_static_url(path):
     return request.url_root.rstrip('/') + '/static/' + path.lstrip('/')
 
 
-def json_page(items, page, per_page, total, has_next):
-    """Koperta odpowiedzi paginowanej: { success, data: [...], pagination: {...} }."""
+def json_page(items, page, per_page, total, has_next, **extra):
+    """Koperta odpowiedzi paginowanej: { success, data: [...], pagination: {...} }.
+
+    `extra` trafia do obiektu pagination (np. next_cursor w /orders).
+    """
     return jsonify({
         'success': True,
         'data': items,
@@ -60,5 +63,6 @@ def json_page(items, page, per_page, total, has_next):
             'per_page': per_page,
             'total': total,
             'has_next': has_next,
+            **extra,
         },
     }), 200
@@ -209,8 +209,11 @@ def offer_availability(token):
 # Task 6: POST /offers/<token>/{reserve,extend,release} (+ emisje Socket.IO)
 # ---------------------------------------------------------------------------
 
-def _emit_safe(page_id, *, reservations=False, availability=False, schedule=False):
-    """Powtarza emisje Socket.IO tras webowych (best-effort, try/except dla testów)."""
+def _emit_safe(page_id, *, reservations=False, availability=False, schedule=False, expires_at=None):
+    """Powtarza emisje Socket.IO tras webowych (best-effort, try/except dla testów).
+
+    expires_at — znany termin właśnie utworzonej rezerwacji (timer bez zapytania o najbliższy).
+    """
     try:
         from modules.offers.socket_events import (
             emit_reservations_update, broadcast_availability_update, _schedule_expiry_timer)
@@ -219,7 +222,7 @@ def _emit_safe(page_id, *, reservations=False, availability=False, schedule=Fals
         if availability:
             broadcast_availability_update(page_id)
         if schedule:
-            _schedule_expiry_timer(page_id)
+            _schedule_expiry_timer(page_id, expires_at)
     except Exception:
         pass
 
@@ -228,7 +231,7 @@ def _emit_safe(page_id, *, reservations=False, availability=False, schedule=Fals
 @jwt_required()
 @limiter.limit("120 per minute")
 def offer_reserve(token):
-    from modules.offers.reservation import reserve_product, get_section_max_for_product
+    from modules.offers.reservation import reserve_product, reserve_products, get_section_max_for_product
     page = OfferPage.get_by_token(token)
     if not page:
         return json_err('page_not_found', 'Strona ofertowa nie istnieje.', 404)
@@ -245,6 +248,20 @@ def offer_reserve(token):
         return json_err('page_not_active', 'Strona ofertowa nie jest aktywna.', 403)
     body = request.get_json(silent=True) or {}
     session_id = body.get('session_id')
+    if body.get('items') is not None:
+        # Batch { session_id, items: [{product_id, quantity, selected_size}] } — wynik per pozycja
+        if not session_id:
+            return json_err('invalid_input', 'Pole session_id jest wymagane.', 400)
+        ok, result = reserve_products(session_id=session_id, page_id=page.id, items=body['items'],
+                                      user_id=int(get_jwt_identity()))
+        if not ok:
+            status = 400 if result.get('error') == 'invalid_items' else 409
+            code = 'invalid_input' if status == 400 else result.get('error', 'reserve_failed')
+            return json_err(code, result.get('message', ''), status)
+        if result['reserved_count']:
+            _emit_safe(page.id, reservations=True, availability=True, schedule=True,
+                       expires_at=result['expires_at'])
+        return json_ok(result)
     product_id = parse_int(body.get('product_id'), 'product_id', required=True)
     quantity = parse_int(body.get('quantity'), 'quantity', default=1, min_value=1)
     selected_size = body.get('selected_size')
@@ -256,7 +273,8 @@ def offer_reserve(token):
                                  quantity=quantity, section_max=section_max, user_id=user_id,
                                  selected_size=selected_size)
     if ok:
-        _emit_safe(page.id, reservations=True, availability=True, schedule=True)
+        _emit_safe(page.id, reservations=True, availability=True, schedule=True,
+                   expires_at=result['reservation']['expires_at'])
         return json_ok(result)
     details = {k: result[k] for k in ('available_quantity', 'check_back_at') if k in result}
     return jsonify({'success': False, 'error': {
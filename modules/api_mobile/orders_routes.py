@@ -5,9 +5,11 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from extensions import db
 
 from modules.orders.models import Order
+from modules.orders.preload import preload_order_list
 from modules.client.payment_confirmation_service import order_stage_keys
 from . import api_mobile_bp
 from .helpers import json_ok, json_err, json_page, to_grosze
+from utils.pagination import paginate_keyset, cached_count
 from .validators import parse_int, ValidationError
 
 ALLOWED_ORDER_TYPES = ('on_hand', 'exclusive', 'pre_order')
@@ -56,12 +58,18 @@ def orders_list():
             raise ValidationError(f'Nieznany typ zamówienia: {order_type}.')
         query = query.filter(Order.order_type == order_type)
 
-    query = query.order_by(Order.created_at.desc())
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    # Kursor (next_cursor z poprzedniej odpowiedzi) → strona bez OFFSET; page tylko do wyświetlania
+    total = cached_count('orders', ('mobile', user_id, status, order_type), query.count)
+    pagination = paginate_keyset(
+        query, [(Order.created_at, True), (Order.id, True)], page=page, per_page=per_page,
+        after=request.args.get('cursor'), total=total,
+    )
+    preload_order_list(pagination.items, products=False)   # items_count, status, total bez N+1
     return json_page(
         [_serialize_order_brief(o) for o in pagination.items],
         page=pagination.page, per_page=pagination.per_page,
         total=pagination.total, has_next=pagination.has_next,
+        next_cursor=pagination.next_cursor,
     )
 
 
@@ -195,6 +203,7 @@ def client_dashboard():
     if user is None:
         return json_err('user_not_found', 'Nie znaleziono użytkownika.', 404)
     stats = get_client_dashboard_stats(user)
+    preload_order_list(stats['recent_orders']['visible'], products=False)
     return json_ok({
         'orders': stats['orders'],
         'payment': {
@@ -668,9 +668,15 @@ class User(UserMixin, db.Model):
 
         # 3. Zamówienia — user_id → NULL (zachowujemy dla rachunkowości)
         from modules.orders.models import Order, OrderComment, ShippingRequest
+        from modules.search import service as search_index
+        order_ids = [oid for (oid,) in db.session.query(Order.id).filter_by(user_id=user_id)]
+        request_ids = [rid for (rid,) in db.session.query(ShippingRequest.id).filter_by(user_id=user_id)]
         Order.query.filter_by(user_id=user_id).update({'user_id': None})
         OrderComment.query.filter_by(user_id=user_id).update({'user_id': None})
         ShippingRequest.query.filter_by(user_id=user_id).update({'user_id': None})
+        # owner_id w indeksie wyszukiwania — masowy UPDATE omija eventy indeksu
+        search_index.reindex('order', order_ids)
+        search_index.reindex('shipping_request', request_ids)
 
     # ============================================
     # Class Methods
@@ -786,7 +792,7 @@ class Settings(db.Model):
     @classmethod
     def get_value(cls, key, default=None):
         """
-        Pobiera wartość ustawienia
+        Pobiera wartość ustawienia (z cache całej tabeli — utils/settings_cache.py)
 
         Args:
             key (str): Klucz ustawienia
@@ -795,26 +801,17 @@ class Settings(db.Model):
         Returns:
             Wartość ustawienia lub default (skonwertowana na odpowiedni typ)
         """
-        setting = cls.query.filter_by(key=key).first()
-        if not setting:
-            return default
-
-        # Convert value based on type
-        if setting.type == 'boolean':
-            return setting.value.lower() in ('true', '1', 'yes')
-        elif setting.type == 'integer':
-            return int(setting.value)
-        elif setting.type == 'json':
-            import json
-            return json.loads(setting.value)
-        else:  # string
-            return setting.value
+        from utils import settings_cache
+        return settings_cache.get(key, default)
 
     @classmethod
     def set_value(cls, key, value, updated_by=None, type='string', description=None):
         """
         Ustawia wartość ustawienia
 
+        Commit unieważnia cache ustawień we wszystkich workerach
+        (utils/settings_cache.py, kanał Redis).
+
         Args:
             key (str): Klucz ustawienia
             value: Wartość
@@ -134,13 +134,20 @@ def _submit_ocr(user, entries, saved_filename, payment_method_id):
         if not Settings.get_value('ocr_enabled', False):
             return
         total = sum((Decimal(str(e['confirmation'].amount)) for e in entries), Decimal('0.00'))
-        from extensions import executor
-        from utils.ocr_background import process_ocr_verification
-        executor.submit(process_ocr_verification, {
+        task_data = {
             'saved_filename': saved_filename, 'payment_method_id': payment_method_id,
             'user_id': user.id,
             'order_numbers': sorted({e['order'].order_number for e in entries}),
-            'total_expected': float(total)})
+            'total_expected': float(total)}
+        from utils import ocr_queue
+        if ocr_queue.enabled():    # OCR w procesie `flask ocr-worker`, nie w web workerze
+            ocr_queue.enqueue(task_data, priority=ocr_queue.PRIORITY_UPLOAD)
+            return
+        from utils import background_jobs
+        from utils.ocr_background import process_ocr_verification
+        accepted = background_jobs.submit('ocr', process_ocr_verification, task_data)
+        if not accepted:   # kolejka pełna — moderator zweryfikuje ręcznie
+            current_app.logger.warning(f'OCR queue full, skipped OCR for {saved_filename}')
     except Exception as e:
         current_app.logger.error(f'Error submitting OCR background task: {e}')
 
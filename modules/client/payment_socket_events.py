@@ -28,3 +28,28 @@ def notify_payment_uploaded(session_token, filename):
         'filename': filename,
     }, room=room)
     logger.info(f'[PaymentQR] Emit completed for room: {room}')
+
+
+OCR_ADMIN_ROOM = 'payment_ocr_admin'
+
+
+def _ocr_user_room(user_id):
+    return f'payment_ocr_user_{user_id}'
+
+
+@socketio.on('join_payment_ocr')
+def handle_join_payment_ocr(data=None):
+    """Zalogowany klient (i panel admin/mod) nasłuchuje wyników OCR potwierdzeń."""
+    from flask_login import current_user
+    if not current_user or not current_user.is_authenticated:
+        return
+    join_room(_ocr_user_room(current_user.id))
+    if current_user.role in ('admin', 'mod'):
+        join_room(OCR_ADMIN_ROOM)
+
+
+def notify_ocr_result(user_id, payload):
+    """Called when an OCR result is stored (web thread or `flask ocr-worker` via message_queue)."""
+    if user_id:
+        socketio.emit('payment_ocr_result', payload, room=_ocr_user_room(user_id))
+    socketio.emit('payment_ocr_result', payload, room=OCR_ADMIN_ROOM)
@@ -13,7 +13,7 @@ from modules.products.models import (
     Product, ProductType, ProductInteraction, Size, Manufacturer,
     variant_products, product_sizes,
 )
-from sqlalchemy import and_, func, or_
+from sqlalchemy import and_, false, func
 from sqlalchemy.orm import joinedload
 
 
@@ -71,11 +71,9 @@ def build_products_query(on_hand_type, search='', category='', size='',
     ).filter(_base_shop_filter(on_hand_type))
 
     if search:
-        pattern = f'%{search}%'
-        query = query.filter(or_(
-            Product.name.ilike(pattern),
-            Product.sku.ilike(pattern),
-        ))
+        from modules.search.service import matching_ids   # import LOKALNY (search importuje _POLISH_MAP stąd)
+        matched = matching_ids(search, 'product')
+        query = query.filter(Product.id.in_(matched) if matched is not None else false())
 
     if category:
         query = query.join(Product.manufacturer).filter(Manufacturer.name == category)
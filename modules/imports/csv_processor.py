@@ -7,6 +7,7 @@ import os
 import chardet
 from datetime import datetime
 from flask import current_app
+from sqlalchemy import inspect as sa_inspect
 from werkzeug.utils import secure_filename
 from extensions import db
 from modules.products.models import Product
@@ -230,6 +231,21 @@ def match_product(data, match_column):
     return None
 
 
+def clean_foreign_keys(data):
+    """Clean foreign key fields in place: empty → None, string IDs → int"""
+    for fk_field in ['category_id', 'supplier_id', 'manufacturer_id', 'series_id', 'product_type_id']:
+        if fk_field in data and (not data[fk_field] or data[fk_field] == ''):
+            data[fk_field] = None
+
+    # Convert string IDs to integers
+    for fk_field in ['category_id', 'supplier_id', 'manufacturer_id', 'series_id', 'product_type_id']:
+        if fk_field in data and data[fk_field] is not None:
+            try:
+                data[fk_field] = int(data[fk_field])
+            except (ValueError, TypeError):
+                data[fk_field] = None
+
+
 def create_product(data):
     """
     Create new product from data
@@ -249,18 +265,7 @@ def create_product(data):
     # Extract variant_group (many-to-many)
     variant_group = data.pop('_variant_group_obj', None)
 
-    # Clean foreign key fields - convert empty strings to None
-    for fk_field in ['category_id', 'supplier_id', 'manufacturer_id', 'series_id', 'product_type_id']:
-        if fk_field in data and (not data[fk_field] or data[fk_field] == ''):
-            data[fk_field] = None
-
-    # Convert string IDs to integers
-    for fk_field in ['category_id', 'supplier_id', 'manufacturer_id', 'series_id', 'product_type_id']:
-        if fk_field in data and data[fk_field] is not None:
-            try:
-                data[fk_field] = int(data[fk_field])
-            except (ValueError, TypeError):
-                data[fk_field] = None
+    clean_foreign_keys(data)
 
     # Create product
     product = Product(**data)
@@ -305,18 +310,7 @@ def update_product(product, data, skip_empty_values=True):
     # Extract variant_group (many-to-many)
     variant_group = data.pop('_variant_group_obj', None)
 
-    # Clean foreign key fields - convert empty strings to None
-    for fk_field in ['category_id', 'supplier_id', 'manufacturer_id', 'series_id', 'product_type_id']:
-        if fk_field in data and (not data[fk_field] or data[fk_field] == ''):
-            data[fk_field] = None
-
-    # Convert string IDs to integers
-    for fk_field in ['category_id', 'supplier_id', 'manufacturer_id', 'series_id', 'product_type_id']:
-        if fk_field in data and data[fk_field] is not None:
-            try:
-                data[fk_field] = int(data[fk_field])
-            except (ValueError, TypeError):
-                data[fk_field] = None
+    clean_foreign_keys(data)
 
     # Update fields
     for key, value in data.items():
@@ -367,17 +361,286 @@ def update_product(product, data, skip_empty_values=True):
 def process_csv_import(import_id):
     """
     Main function to process CSV import (runs in background)
-    Wraps the actual processing in Flask app context
+    Runs via background_jobs.submit('csv_import', ...) in the submitting
+    app's context (shared engine, no create_app() per task)
 
     Args:
         import_id: CsvImport record ID
     """
-    # Import app here to avoid circular imports
-    from app import create_app
-    app = create_app()
+    _process_csv_import_internal(import_id)
+
+
+# ====================
+# IMPORT PORCJAMI (chunk)
+# ====================
+#
+# Wiersz po wierszu każdy wiersz to: savepoint, SELECT dopasowania po SKU/EAN/id,
+# SELECT-y słowników (kategoria, tagi...) i osobny INSERT/UPDATE przez ORM —
+# dziesiątki tysięcy wierszy dostawcy szły minutami. Teraz na porcję
+# CSV_IMPORT_CHUNK_SIZE wierszy:
+# - walidacja per wiersz (błędy nadal raportowane per wiersz), słowniki z pamięci importu,
+# - dopasowanie całej porcji jednym SELECT ... IN (...),
+# - nowe produkty jednym flushem, istniejące bulk update mapowań, tabele łączące
+#   (tagi, rozmiary, warianty) zbiorczo,
+# - jeden commit i aktualizacja postępu CsvImport na porcję.
+# Gdy zapis porcji się nie uda (np. zduplikowany SKU w bazie), porcja jest
+# powtarzana starą ścieżką wiersz po wierszu, żeby wskazać winne wiersze.
+
+DEFAULT_CHUNK_SIZE = 500
 
-    with app.app_context():
-        _process_csv_import_internal(import_id)
+_PRODUCT_COLUMNS = None
+
+
+def _product_columns():
+    global _PRODUCT_COLUMNS
+    if _PRODUCT_COLUMNS is None:
+        _PRODUCT_COLUMNS = {attr.key for attr in sa_inspect(Product).column_attrs}
+    return _PRODUCT_COLUMNS
+
+
+def iter_csv_rows(file_path, encoding, delimiter, has_headers):
+    """Generator (numer wiersza, wiersz) — plik czytany strumieniowo, bez ładowania całości."""
+    with open(file_path, 'r', encoding=encoding) as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        if has_headers:
+            next(reader, None)
+        yield from enumerate(reader, start=1)
+
+
+def _chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _match_key(data, match_column):
+    """Wartość dopasowania wiersza (jak w match_product) albo None."""
+    value = data.get(match_column) if match_column in ('id', 'sku', 'ean') else None
+    if not value:
+        return None
+    if match_column == 'id':
+        try:
+            return int(value)
+        except (ValueError, TypeError):
+            return None
+    return value
+
+
+def match_products(keys, match_column):
+    """
+    Dopasowanie wielu wierszy jednym zapytaniem.
+
+    Returns:
+        dict: {wartość match_column: product_id} (pierwszy produkt, jak .first())
+    """
+    if not keys:
+        return {}
+    column = getattr(Product, match_column)
+    rows = (
+        db.session.query(column, Product.id)
+        .filter(column.in_(list(keys)))
+        .order_by(Product.id)
+        .all()
+    )
+    matched = {}
+    for key, product_id in rows:
+        matched.setdefault(key, product_id)
+    return matched
+
+
+def _split_on_duplicates(prepared, match_column):
+    """
+    Dzieli porcję tak, by klucz dopasowania nie powtarzał się w jednej partii —
+    drugi wiersz z tym samym SKU ma zaktualizować produkt z pierwszego, więc
+    pierwszy musi być już zapisany, zanim drugi zostanie dopasowany.
+    """
+    batch, keys = [], set()
+    for entry in prepared:
+        key = _match_key(entry[1], match_column)
+        if key is not None and key in keys:
+            yield batch
+            batch, keys = [], set()
+        batch.append(entry)
+        if key is not None:
+            keys.add(key)
+    if batch:
+        yield batch
+
+
+def _replace_links(table, column, links, product_ids):
+    """Przepisuje powiązania produktów w tabeli łączącej (tagi, rozmiary, warianty)."""
+    if product_ids:
+        db.session.execute(table.delete().where(table.c.product_id.in_(product_ids)))
+    rows = [{'product_id': pid, column: other_id} for pid, other_id in sorted(links)]
+    if rows:
+        db.session.execute(table.insert(), rows)
+
+
+def _write_batch(batch, csv_import):
+    """
+    Zapisuje partię zwalidowanych wierszy bulk insertem/updatem.
+
+    Args:
+        batch: [(numer wiersza, dane produktu)] — bez powtórzeń klucza dopasowania
+        csv_import: CsvImport (match_column, skip_empty_values)
+
+    Returns:
+        list[int]: id zaktualizowanych produktów (bulk update omija eventy indeksu wyszukiwania)
+    """
+    from modules.products.models import product_tags, product_sizes, variant_products
+
+    columns = _product_columns()
+    skip_empty = csv_import.skip_empty_values
+    matched = match_products(
+        {k for k in (_match_key(data, csv_import.match_column) for _, data in batch) if k is not None},
+        csv_import.match_column,
+    )
+
+    inserts, updates = [], []         # (mapowanie, dane wiersza)
+    for _, data in batch:
+        data = dict(data)
+        relations = {
+            'tags': data.pop('tags', None),
+            'sizes': data.pop('sizes', None),
+            'variant_group': data.pop('_variant_group_obj', None),
+        }
+        clean_foreign_keys(data)
+        product_id = matched.get(_match_key(data, csv_import.match_column))
+
+        if product_id is None:
+            mapping = {k: v for k, v in data.items() if k in columns}
+            inserts.append((mapping, relations))
+        else:
+            mapping = {k: v for k, v in data.items()
+                       if k in columns and k != 'id' and (v is not None or not skip_empty)}
+            mapping['id'] = product_id
+            mapping['updated_at'] = datetime.now()
+            updates.append((mapping, relations))
+        if mapping.get('quantity', 0) is None:
+            mapping['quantity'] = 0        # pusty stan magazynowy (kolumna NOT NULL)
+
+    if inserts:
+        # Nowe produkty jednym flushem (id potrzebne do tabel łączących; flush
+        # aktualizuje też indeks wyszukiwania). bulk_insert_mappings nie zwraca id.
+        products = [Product(**mapping) for mapping, _ in inserts]
+        db.session.add_all(products)
+        db.session.flush()
+        for (mapping, _), product in zip(inserts, products):
+            mapping['id'] = product.id
+    if updates:
+        db.session.bulk_update_mappings(Product, [m for m, _ in updates])
+
+    # Tabele łączące — jak w create_product/update_product
+    tag_links, tag_replaced = set(), set()
+    size_links, size_replaced = set(), set()
+    group_links, group_replaced = set(), set()
+    group_add_if_empty = {}
+    for (mapping, rel), is_update in [(i, False) for i in inserts] + [(u, True) for u in updates]:
+        product_id = mapping['id']
+        for key, links, replaced in (('tags', tag_links, tag_replaced), ('sizes', size_links, size_replaced)):
+            objects = rel[key]
+            if objects is None or (is_update and skip_empty and len(objects) == 0):
+                continue
+            if is_update:
+                replaced.add(product_id)
+            links.update((product_id, obj.id) for obj in objects)
+        group = rel['variant_group']
+        if group is not None:
+            if is_update and skip_empty:
+                group_add_if_empty[product_id] = group.id
+            else:
+                if is_update:
+                    group_replaced.add(product_id)
+                group_links.add((product_id, group.id))
+
+    if group_add_if_empty:
+        grouped = {pid for (pid,) in db.session.query(variant_products.c.product_id).filter(
+            variant_products.c.product_id.in_(list(group_add_if_empty))
+        ).distinct()}
+        group_links.update((pid, gid) for pid, gid in group_add_if_empty.items() if pid not in grouped)
+
+    _replace_links(product_tags, 'tag_id', tag_links, tag_replaced)
+    _replace_links(product_sizes, 'size_id', size_links, size_replaced)
+    _replace_links(variant_products, 'variant_group_id', group_links, group_replaced)
+
+    return [m['id'] for m, _ in updates]
+
+
+def _import_row(data, csv_import):
+    """Stara ścieżka: jeden wiersz w savepoincie (ponowienie porcji, której bulk się nie udał)."""
+    with db.session.begin_nested():
+        data = dict(data)
+        product = match_product(data, csv_import.match_column)
+        if product:
+            update_product(product, data, skip_empty_values=csv_import.skip_empty_values)
+        else:
+            create_product(data)
+
+
+def _import_chunk(chunk, csv_import, csv_columns, lookups):
+    """
+    Przetwarza porcję wierszy CSV.
+
+    Returns:
+        tuple: (liczba zapisanych wierszy, lista błędów [{row, error, data}])
+    """
+    from modules.search import service as search_index
+
+    errors, prepared = [], []
+    for idx, row in chunk:
+        row_dict = None
+        try:
+            # Skip empty rows
+            if not row or all(not cell.strip() for cell in row):
+                continue
+            if len(row) != len(csv_columns):
+                raise ValueError(f"Liczba kolumn ({len(row)}) nie pasuje do nagłówka ({len(csv_columns)})")
+            row_dict = dict(zip(csv_columns, row))
+            known = set(lookups)
+            try:
+                # Savepoint jak w starej ścieżce: kategorie, tagi itp. utworzone przez
+                # match_or_create_* dla odrzuconego wiersza znikają razem z nim
+                with db.session.begin_nested():
+                    product_data = map_row_to_product(row_dict, csv_import.column_mapping)
+                    row_errors = validate_product_data(product_data, lookups=lookups)
+                    if row_errors:
+                        raise ValueError('; '.join(row_errors))
+            except Exception:
+                for key in set(lookups) - known:
+                    del lookups[key]    # obiekty wycofane razem z savepointem
+                raise
+            prepared.append((idx, product_data, row_dict))
+        except Exception as e:
+            errors.append({'row': idx, 'error': str(e), 'data': row_dict if row_dict else dict(zip(csv_columns, row))})
+
+    successful = 0
+    for batch in _split_on_duplicates(prepared, csv_import.match_column):
+        try:
+            with db.session.begin_nested():
+                updated_ids = _write_batch([(idx, data) for idx, data, _ in batch], csv_import)
+        except Exception as e:
+            print(f"[CSV Import] Bulk write failed ({e}), retrying {len(batch)} rows one by one")
+        else:
+            successful += len(batch)
+            # Bulk UPDATE omija eventy indeksu. Poza try: błąd indeksu nie może
+            # uruchomić ponownego zapisu już zapisanej porcji wiersz po wierszu
+            search_index.reindex('product', updated_ids)
+            continue
+
+        for idx, data, row_dict in batch:
+            try:
+                _import_row(data, csv_import)
+                successful += 1
+            except Exception as e:
+                print(f"[CSV Import] Error on row {idx}: {str(e)}")
+                errors.append({'row': idx, 'error': str(e), 'data': row_dict})
+
+    return successful, errors
 
 
 def _process_csv_import_internal(import_id):
@@ -403,92 +666,25 @@ def _process_csv_import_internal(import_id):
         encoding = detect_encoding(csv_import.temp_file_path)
         delimiter = detect_delimiter(csv_import.temp_file_path, encoding)
 
-        # Open CSV file
-        with open(csv_import.temp_file_path, 'r', encoding=encoding) as f:
-            reader = csv.reader(f, delimiter=delimiter)
-
-            # Skip header if has_headers
-            if csv_import.has_headers:
-                next(reader, None)
-
-            # Get column names from mapping
-            csv_columns = list(csv_import.column_mapping.keys())
-
-            # Process rows in batches
-            BATCH_SIZE = 50
-            batch_count = 0
-
-            for idx, row in enumerate(reader, start=1):
-                row_dict = None
-                try:
-                    # Skip empty rows
-                    if not row or all(not cell.strip() for cell in row):
-                        continue
-
-                    # Map row to dictionary
-                    if len(row) != len(csv_columns):
-                        raise ValueError(f"Liczba kolumn ({len(row)}) nie pasuje do nagłówka ({len(csv_columns)})")
-
-                    row_dict = dict(zip(csv_columns, row))
-
-                    # Use savepoint so a failed row rollbacks cleanly
-                    # without affecting other rows in the batch
-                    with db.session.begin_nested():
-                        # Map to product data
-                        product_data = map_row_to_product(row_dict, csv_import.column_mapping)
-
-                        # Validate
-                        errors = validate_product_data(product_data)
-                        if errors:
-                            raise ValueError('; '.join(errors))
-
-                        # Match existing product (if match_column set)
-                        product = match_product(product_data, csv_import.match_column)
-
-                        if product:
-                            # Update existing
-                            update_product(product, product_data, skip_empty_values=csv_import.skip_empty_values)
-                        else:
-                            # Create new
-                            product = create_product(product_data)
-
-                    csv_import.successful_rows += 1
-
-                except Exception as e:
-                    # Savepoint automatically rolled back — no partial data left
-                    import traceback
-                    print(f"[CSV Import] Error on row {idx}: {str(e)}")
-                    traceback.print_exc()
-
-                    # Log error with row details
-                    error_entry = {
-                        'row': idx,
-                        'error': str(e),
-                        'data': row_dict if row_dict else dict(zip(csv_columns, row))
-                    }
-
-                    if csv_import.error_log is None:
-                        csv_import.error_log = []
-
-                    # Important: Create new list to trigger SQLAlchemy change detection
-                    current_errors = csv_import.error_log.copy()
-                    current_errors.append(error_entry)
-                    csv_import.error_log = current_errors
-
-                    csv_import.failed_rows += 1
-
-                # Update progress
-                csv_import.processed_rows = idx
-
-                # Commit in batches
-                batch_count += 1
-                if batch_count >= BATCH_SIZE:
-                    db.session.commit()
-                    batch_count = 0
-                    print(f"[CSV Import] Progress: {csv_import.processed_rows}/{csv_import.total_rows}")
-
-            # Final commit
+        # Get column names from mapping
+        csv_columns = list(csv_import.column_mapping.keys())
+        chunk_size = current_app.config.get('CSV_IMPORT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+        lookups = {}
+
+        rows = iter_csv_rows(csv_import.temp_file_path, encoding, delimiter, csv_import.has_headers)
+        for chunk in _chunked(rows, chunk_size):
+            successful, errors = _import_chunk(chunk, csv_import, csv_columns, lookups)
+
+            csv_import.successful_rows += successful
+            csv_import.failed_rows += len(errors)
+            if errors:
+                # Important: Create new list to trigger SQLAlchemy change detection
+                csv_import.error_log = (csv_import.error_log or []) + errors
+
+            # Update progress (per chunk)
+            csv_import.processed_rows = chunk[-1][0]
             db.session.commit()
+            print(f"[CSV Import] Progress: {csv_import.processed_rows}/{csv_import.total_rows}")
 
         # Determine final status
         if csv_import.failed_rows == 0:
@@ -511,12 +707,10 @@ def _process_csv_import_internal(import_id):
 
     except Exception as e:
         print(f"[CSV Import] Fatal error: {str(e)}")
+        db.session.rollback()
         csv_import.status = 'failed'
         csv_import.completed_at = datetime.now()
 
-        if csv_import.error_log is None:
-            csv_import.error_log = []
-
         # Important: Create new list to trigger SQLAlchemy change detection
         current_errors = (csv_import.error_log or []).copy()
         current_errors.append({
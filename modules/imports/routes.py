@@ -170,9 +170,13 @@ def start_import():
         db.session.add(csv_import)
         db.session.commit()
 
-        # Start background import with Flask-Executor
-        from extensions import executor
-        executor.submit(process_csv_import, csv_import.id)
+        # Start background import (shared executor, per-type concurrency limit)
+        from utils import background_jobs
+        if not background_jobs.submit('csv_import', process_csv_import, csv_import.id):
+            csv_import.status = 'failed'
+            csv_import.error_log = [{'row': 0, 'error': 'Kolejka zadań w tle jest pełna — spróbuj ponownie za chwilę', 'data': {}}]
+            db.session.commit()
+            return jsonify({'success': False, 'error': 'Serwer jest zajęty, spróbuj ponownie za chwilę'}), 503
 
         return jsonify({
             'success': True,
@@ -6,12 +6,28 @@ import re
 from modules.products.models import Category, Tag, Supplier, Manufacturer, ProductSeries, ProductType, VariantGroup
 
 
-def validate_product_data(data):
+def _lookup(lookups, kind, value, match_or_create):
+    """
+    match_or_create(value) z pamięcią na czas importu — kategorie, tagi itp.
+    powtarzają się w tysiącach wierszy, więc bez tego każdy wiersz robił
+    osobny SELECT na każdy słownik.
+    """
+    if lookups is None:
+        return match_or_create(value)
+    key = (kind, str(value).strip().lower())
+    if key not in lookups:
+        lookups[key] = match_or_create(value)
+    return lookups[key]
+
+
+def validate_product_data(data, lookups=None):
     """
     Validate product data from CSV row
 
     Args:
         data: Dictionary with product fields
+        lookups: Optional dict reused across rows of one import (memo of matched
+            categories, tags, suppliers etc.)
 
     Returns:
         List of error messages (empty if valid)
@@ -24,17 +40,17 @@ def validate_product_data(data):
 
     # Validate category (match by ID or name, create if not exists)
     if 'category_id' in data and data['category_id']:
-        category = match_or_create_category(data['category_id'])
+        category = _lookup(lookups, 'category', data['category_id'], match_or_create_category)
         data['category_id'] = category.id
 
     # Validate supplier (match by ID or name, create if not exists)
     if 'supplier_id' in data and data['supplier_id']:
-        supplier = match_or_create_supplier(data['supplier_id'])
+        supplier = _lookup(lookups, 'supplier', data['supplier_id'], match_or_create_supplier)
         data['supplier_id'] = supplier.id
 
     # Validate manufacturer (match by ID or name, create if not exists)
     if 'manufacturer' in data and data['manufacturer']:
-        manufacturer = match_or_create_manufacturer(data['manufacturer'])
+        manufacturer = _lookup(lookups, 'manufacturer', data['manufacturer'], match_or_create_manufacturer)
         data['manufacturer_id'] = manufacturer.id
         del data['manufacturer']
     elif 'manufacturer' in data:
@@ -42,7 +58,7 @@ def validate_product_data(data):
 
     # Validate series (match by ID or name, create if not exists)
     if 'series' in data and data['series']:
-        series = match_or_create_series(data['series'])
+        series = _lookup(lookups, 'series', data['series'], match_or_create_series)
         data['series_id'] = series.id
         del data['series']
     elif 'series' in data:
@@ -50,7 +66,7 @@ def validate_product_data(data):
 
     # Validate product_type (match by ID or name, create if not exists)
     if 'product_type' in data and data['product_type']:
-        product_type = match_or_create_product_type(data['product_type'])
+        product_type = _lookup(lookups, 'product_type', data['product_type'], match_or_create_product_type)
         data['product_type_id'] = product_type.id
         del data['product_type']
     elif 'product_type' in data:
@@ -61,7 +77,7 @@ def validate_product_data(data):
         tag_names = [t.strip() for t in str(data['tags']).split(',') if t.strip()]
         tag_objects = []
         for tag_name in tag_names:
-            tag = match_or_create_tag(tag_name)
+            tag = _lookup(lookups, 'tag', tag_name, match_or_create_tag)
             tag_objects.append(tag)
         data['tags'] = tag_objects
 
@@ -70,14 +86,14 @@ def validate_product_data(data):
         size_names = [s.strip() for s in str(data['sizes']).split(',') if s.strip()]
         size_objects = []
         for size_name in size_names:
-            size = match_or_create_size(size_name)
+            size = _lookup(lookups, 'size', size_name, match_or_create_size)
             size_objects.append(size)
         data['sizes'] = size_objects
 
     # Validate variant_group (match by ID or name, create if missing)
     if 'variant_group' in data:
         if data['variant_group']:  # Only create if value is not empty
-            variant_group = match_or_create_variant_group(data['variant_group'])
+            variant_group = _lookup(lookups, 'variant_group', data['variant_group'], match_or_create_variant_group)
             # Store in special key to handle after product creation
             data['_variant_group_obj'] = variant_group
         # Always remove from data so it doesn't get passed to Product constructor
@@ -17,6 +17,8 @@ class AdminBroadcast(db.Model):
     target_type = db.Column(db.String(20), nullable=False)  # 'all', 'roles', 'users'
     target_data = db.Column(db.Text, nullable=True)  # JSON: roles list or user IDs list
     sent_count = db.Column(db.Integer, default=0, nullable=False)
+    # Statystyki wysyłki push (push_bulk.send_bulk) — None dopóki wysyłka trwa
+    delivery_stats = db.Column(db.JSON, nullable=True)
     sent_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=get_local_now, nullable=False, index=True)
 
@@ -52,5 +54,10 @@ class AdminBroadcast(db.Model):
         """Live count of read notifications for this broadcast."""
         return Notification.query.filter_by(tag=self.tag, is_read=True).count()
 
+    @property
+    def delivery_rate(self):
+        """Pushe/s z delivery_stats (None, gdy wysyłka jeszcze trwa)."""
+        return (self.delivery_stats or {}).get('per_second')
+
     def __repr__(self):
         return f'<AdminBroadcast {self.id} "{self.title}">'
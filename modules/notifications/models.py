@@ -3,6 +3,7 @@ Push Notification Models
 - PushSubscription: stores browser push subscriptions per user/device
 - NotificationPreference: per-user toggle for each notification category
 - Notification: stored notification record for the notification center
+- EmailOutbox: durable queue of rendered emails sent by `flask email-sender`
 """
 
 from datetime import datetime, timedelta, timezone
@@ -122,3 +123,39 @@ class NotificationPreference(db.Model):
             'sale_date_changes': self.sale_date_changes,
             'order_supplier_ordered': self.order_supplier_ordered,
         }
+
+
+class EmailOutbox(db.Model):
+    """
+    Trwała kolejka emaili (utils/email_outbox.py). send_email / send_email_batch
+    zapisują gotową wiadomość MIME; wysyła osobny proces `flask email-sender`
+    (jedno połączenie SMTP, token bucket, retry z backoffem).
+    """
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_queue', 'status', 'available_at', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(191), nullable=True, unique=True,
+                                comment="Ten sam klucz = ten sam email (dedup)")
+    sender = db.Column(db.String(255), nullable=False)
+    recipients = db.Column(db.JSON, nullable=False)
+    subject = db.Column(db.String(255), nullable=True)
+    message = db.Column(db.LargeBinary(length=16777215), nullable=False, comment="Wiadomość MIME (Message.as_bytes)")
+    status = db.Column(
+        db.String(20),
+        nullable=False,
+        default='pending',
+        comment="Status: 'pending', 'sending', 'sent', 'failed'"
+    )
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+
+    available_at = db.Column(db.DateTime, nullable=False, default=get_local_now, comment="Backoff retry")
+    created_at = db.Column(db.DateTime, nullable=False, default=get_local_now)
+    started_at = db.Column(db.DateTime, nullable=True)
+    sent_at = db.Column(db.DateTime, nullable=True, index=True)
+
+    def __repr__(self):
+        return f'<EmailOutbox {self.id} {self.status} to={self.recipients}>'
@@ -0,0 +1,197 @@
+"""
+Offers Module - Snapshot dostępności strony (cache dla broadcastów)
+
+broadcast_availability_update() przy każdym zdarzeniu (reserve, release,
+order, expiry) budował mapę sekcji i liczył dwa GROUP BY od zera. Tutaj
+trzymamy per-page model {product_id: (total_reserved, total_ordered)} +
+limity sekcji w warstwie state (Redis lub in-memory), z numerem wersji:
+
+- mutacje (rezerwacja, zwolnienie, zamówienie) wołają apply_delta() —
+  HINCRBY na liczbach, bez zapytań do bazy,
+- zdarzenia, których nie da się wyrazić deltą (wygaśnięcie rezerwacji,
+  zmiana sekcji, anulowanie zamówień, auto-increase) wołają invalidate(),
+- get_snapshot() serwuje dane z lokalnego cache procesu, jeśli wersja
+  w state się nie zmieniła; przy zmianie — czyta snapshot ze state;
+  pełny rebuild z bazy tylko przy zimnym starcie, po invalidate() albo
+  gdy snapshot jest starszy niż OFFERS_AVAILABILITY_MAX_AGE.
+
+Snapshot służy do broadcastów (dane poglądowe w UI). Decyzja o przyjęciu
+rezerwacji zawsze zapada w reservation.py/inventory.py, więc chwilowa
+rozbieżność delty z bazą (np. rebuild równoległy z commitem) nie prowadzi
+do oversellingu i znika najpóźniej po MAX_AGE.
+"""
+
+import time
+import logging
+import threading
+
+from flask import current_app
+from sqlalchemy import func
+
+from extensions import db
+from .redis_state import get_state
+
+logger = logging.getLogger(__name__)
+
+# Domyślny maksymalny wiek snapshotu (sekundy), nadpisywany z configu
+_DEFAULT_MAX_AGE = 30
+
+# Ile razy ponawiamy rebuild, gdy w trakcie ktoś zmienił wersję
+_REBUILD_ATTEMPTS = 3
+
+# Lokalny cache procesu: {page_id: (backend, version, snapshot)} — backend w kluczu
+# chroni przed użyciem snapshotu z poprzedniego init_state() (nowy backend = nowe wersje)
+_local = {}
+_local_lock = threading.Lock()
+
+
+def _max_age():
+    try:
+        return current_app.config.get('OFFERS_AVAILABILITY_MAX_AGE', _DEFAULT_MAX_AGE)
+    except RuntimeError:
+        return _DEFAULT_MAX_AGE
+
+
+def _product_entry(section_max, reserved, ordered):
+    """Pojedynczy wpis payloadu availability_updated."""
+    if section_max and section_max > 0:
+        available = max(0, section_max - reserved - ordered)
+    else:
+        available = 999999  # Bez limitu
+    return {
+        'available': available,
+        'total_reserved': reserved,
+        'total_ordered': ordered,
+    }
+
+
+def _query_counts(page_id, product_ids):
+    """Dwa GROUP BY (rezerwacje aktywne + zamówione) — źródło prawdy dla rebuildu."""
+    from .models import OfferReservation
+    from modules.orders.models import Order, OrderItem
+
+    counts = {pid: (0, 0) for pid in product_ids}
+    if not product_ids:
+        return counts
+
+    now = int(time.time())
+    reserved_rows = db.session.query(
+        OfferReservation.product_id,
+        func.sum(OfferReservation.quantity)
+    ).filter(
+        OfferReservation.offer_page_id == page_id,
+        OfferReservation.product_id.in_(product_ids),
+        OfferReservation.expires_at > now
+    ).group_by(OfferReservation.product_id).all()
+    for pid, qty in reserved_rows:
+        counts[pid] = (int(qty or 0), counts[pid][1])
+
+    ordered_rows = db.session.query(
+        OrderItem.product_id,
+        func.sum(OrderItem.quantity)
+    ).join(Order).filter(
+        Order.offer_page_id == page_id,
+        Order.status != 'anulowane',
+        OrderItem.product_id.in_(product_ids)
+    ).group_by(OrderItem.product_id).all()
+    for pid, qty in ordered_rows:
+        counts[pid] = (counts[pid][0], int(qty or 0))
+
+    return counts
+
+
+def rebuild(page_id):
+    """
+    Pełna przebudowa snapshotu z bazy.
+
+    Zapis jest warunkowy (wersja nie może się zmienić w trakcie odczytu) —
+    przy kolizji z równoległą mutacją próbujemy ponownie.
+
+    Returns:
+        dict: snapshot {'version', 'counts', 'section_products', 'built_at'}
+    """
+    from .reservation import get_section_products_map
+
+    state = get_state()
+    snapshot = None
+    for _ in range(_REBUILD_ATTEMPTS):
+        expected = state.availability_version(page_id)
+        section_products = get_section_products_map(page_id)
+        counts = _query_counts(page_id, list(section_products.keys()))
+        built_at = int(time.time())
+        snapshot = {
+            'version': expected,
+            'counts': counts,
+            'section_products': section_products,
+            'built_at': built_at,
+        }
+        version = state.availability_load(page_id, expected, counts, section_products, built_at)
+        if version is not None:
+            snapshot['version'] = version
+            break
+    else:
+        # Ciągłe kolizje (gorący drop) — serwujemy świeże dane bez zapisu do cache
+        logger.info(f"Availability snapshot for page {page_id} not stored (concurrent updates)")
+
+    with _local_lock:
+        _local[page_id] = (state, snapshot['version'], snapshot)
+    return snapshot
+
+
+def get_snapshot(page_id):
+    """
+    Zwraca aktualny snapshot strony — z cache procesu, ze state albo z rebuildu.
+
+    Returns:
+        tuple: (version: int, products_data: dict {str(product_id): {...}})
+    """
+    state = get_state()
+    version = state.availability_version(page_id)
+
+    with _local_lock:
+        cached = _local.get(page_id)
+    snapshot = None
+    if cached and cached[0] is state and cached[1] == version:
+        snapshot = cached[2]
+
+    if snapshot is None:
+        snapshot = state.availability_get(page_id)
+
+    if snapshot is None or int(time.time()) - snapshot['built_at'] > _max_age():
+        snapshot = rebuild(page_id)
+    else:
+        with _local_lock:
+            _local[page_id] = (state, snapshot['version'], snapshot)
+
+    products_data = {}
+    for pid, section_max in snapshot['section_products'].items():
+        reserved, ordered = snapshot['counts'].get(pid, (0, 0))
+        products_data[str(pid)] = _product_entry(section_max, reserved, ordered)
+    return snapshot['version'], products_data
+
+
+def apply_delta(page_id, deltas):
+    """
+    Nanosi zmianę liczb na snapshot (bez zapytań do bazy).
+
+    Args:
+        deltas: dict {product_id: (reserved_delta, ordered_delta)}
+    """
+    deltas = {pid: d for pid, d in deltas.items() if d[0] or d[1]}
+    if not deltas:
+        return
+    try:
+        get_state().availability_apply(page_id, deltas)
+    except Exception as e:
+        logger.error(f"Availability delta failed for page {page_id}: {e}")
+        invalidate(page_id)
+
+
+def invalidate(page_id):
+    """Oznacza snapshot jako nieaktualny — następny get_snapshot() zrobi rebuild."""
+    with _local_lock:
+        _local.pop(page_id, None)
+    try:
+        get_state().availability_invalidate(page_id)
+    except Exception as e:
+        logger.error(f"Availability invalidate failed for page {page_id}: {e}")
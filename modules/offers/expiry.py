@@ -0,0 +1,314 @@
+"""
+Offers Module - Scheduler wygasania rezerwacji (reaper)
+
+Jedyne miejsce, które USUWA wygasłe rezerwacje. Ścieżki requestów (order page,
+snapshot, reserve, extend, place order, liczniki odwiedzających) tylko
+filtrują po expires_at > now — żadnych DELETE-ów, które pod obciążeniem
+dropu kolidowały na tym samym zakresie indeksu i dawały deadlocki.
+
+Zastępuje też threading.Timer per strona (socket_events._schedule_expiry_timer),
+który przy każdej zmianie rezerwacji anulował i tworzył nowy wątek oraz
+pytał bazę o najbliższe expires_at — osobno w każdym workerze.
+
+Jeden wątek na proces:
+- kopiec (heapq) z terminami (due_at, page_id) — per strona trzymamy tylko
+  najwcześniejszy termin, późniejsze zgłoszenia są ignorowane,
+- w każdym ticku zdejmujemy WSZYSTKIE strony z terminem <= teraz i usuwamy
+  ich wygasłe rezerwacje jednym DELETE, potem jeden broadcast na stronę,
+- następne terminy tych stron liczymy jednym GROUP BY,
+- co OFFERS_REAPER_INTERVAL sekund globalny sweep: wszystkie wygasłe
+  rezerwacje (także stron, których ten worker nie zna) jednym DELETE,
+- między workerami deduplikujemy przez claim_once w warstwie state
+  (SET NX w Redis) — dany termin strony / dany sweep obsługuje jeden worker.
+
+reaper_metrics() raportuje opóźnienie między wygaśnięciem a faktycznym
+usunięciem (lag) — to ono mówi, jak długo snapshot dostępności może
+pokazywać sztuki, które już są wolne. Metryki trzymamy w warstwie state
+(Redis), więc endpoint w dowolnym workerze widzi przebiegi wszystkich.
+"""
+
+import time
+import heapq
+import logging
+import threading
+
+from sqlalchemy import func
+
+from extensions import db
+from .redis_state import get_state
+
+logger = logging.getLogger(__name__)
+
+# Jak długo trzymamy claim terminu (s) — wystarczy, by inne workery go pominęły
+_CLAIM_TTL = 60
+
+# Domyślny interwał globalnego sweepu (s), nadpisywany z configu; 0 = wyłączony
+_DEFAULT_SWEEP_INTERVAL = 5
+
+
+class ExpiryScheduler:
+    """Jeden wątek na proces, kopiec terminów wygaśnięcia per strona."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap = []      # [(due_at, page_id)] — mogą być wpisy nieaktualne
+        self._due = {}       # {page_id: due_at} — aktualny termin strony
+        self._app = None
+        self._thread = None
+        self._sweep_interval = 0
+        self._next_sweep = None
+
+    def schedule(self, page_id, expires_at, app):
+        """
+        Zgłasza wygaśnięcie rezerwacji na stronie.
+
+        Rezerwacja jest wygasła gdy expires_at < now (jak w cleanup), więc
+        termin to expires_at + 1. Zwraca True gdy termin strony się przesunął.
+        """
+        due = int(expires_at) + 1
+        with self._cond:
+            self._app = app
+            current = self._due.get(page_id)
+            if current is not None and current <= due:
+                return False
+            self._due[page_id] = due
+            heapq.heappush(self._heap, (due, page_id))
+            self._ensure_thread()
+            self._cond.notify()
+            return True
+
+    def start(self, app):
+        """Uruchamia wątek (jeśli nie działa) i włącza globalny sweep wg configu."""
+        interval = app.config.get('OFFERS_REAPER_INTERVAL', _DEFAULT_SWEEP_INTERVAL)
+        with self._cond:
+            self._app = app
+            if interval != self._sweep_interval:
+                self._sweep_interval = interval
+                self._next_sweep = time.time() + interval if interval else None
+                self._cond.notify()
+            self._ensure_thread()
+
+    def is_scheduled(self, page_id):
+        with self._cond:
+            return page_id in self._due
+
+    def pending(self):
+        """{page_id: due_at} zaplanowanych stron (diagnostyka, testy)."""
+        with self._cond:
+            return dict(self._due)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='offers-expiry', daemon=True)
+            self._thread.start()
+
+    def _pop_due(self, now):
+        """Zdejmuje z kopca strony z terminem <= now (wywoływane pod lockiem)."""
+        due_pages = {}
+        while self._heap and self._heap[0][0] <= now:
+            due, page_id = heapq.heappop(self._heap)
+            if self._due.get(page_id) == due:
+                del self._due[page_id]
+                due_pages[page_id] = due
+        return due_pages
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    # Nieaktualne wpisy (termin strony został przesunięty) — odrzucamy
+                    while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+                        heapq.heappop(self._heap)
+                    now = time.time()
+                    sweep = self._next_sweep is not None and self._next_sweep <= now
+                    if sweep or (self._heap and self._heap[0][0] <= now):
+                        break
+                    wake_at = [t for t in (self._heap[0][0] if self._heap else None,
+                                           self._next_sweep) if t is not None]
+                    self._cond.wait(min(wake_at) - now if wake_at else None)
+                due_pages = self._pop_due(now)
+                if sweep:
+                    self._next_sweep = now + self._sweep_interval
+                app = self._app
+
+            try:
+                with app.app_context():
+                    if due_pages:
+                        self.run_tick(due_pages)
+                    if sweep:
+                        self.sweep(int(now))
+            except Exception:
+                logger.exception(f"Expiry scheduler tick failed (pages {sorted(due_pages)}, sweep={sweep})")
+
+    def run_tick(self, due_pages):
+        """
+        Obsługuje strony, których termin minął: DELETE + broadcast + kolejne terminy.
+
+        Args:
+            due_pages: dict {page_id: due_at}
+
+        Returns:
+            dict: {page_id: liczba usuniętych rezerwacji} (tylko strony obsłużone przez ten worker)
+        """
+        from .socket_events import broadcast_availability_update
+        from . import availability
+
+        state = get_state()
+        claimed = [page_id for page_id, due in due_pages.items()
+                   if state.claim_once(f"offers_expiry:{page_id}:{due}", _CLAIM_TTL)]
+
+        now = int(time.time())
+        expired = expire_reservations(claimed, now) if claimed else {}
+        for page_id in expired:
+            availability.invalidate(page_id)
+            broadcast_availability_update(page_id)
+
+        for page_id, expires_at in next_expiries(list(due_pages), now).items():
+            self.schedule(page_id, expires_at, self._app)
+        return expired
+
+    def sweep(self, now):
+        """
+        Globalny sweep: wszystkie wygasłe rezerwacje jednym DELETE (jeden worker na interwał).
+
+        Returns:
+            dict: {page_id: liczba usuniętych rezerwacji}
+        """
+        from .socket_events import broadcast_availability_update
+        from . import availability
+
+        slot = now // max(1, self._sweep_interval)
+        if not get_state().claim_once(f"offers_reaper_sweep:{slot}", max(1, self._sweep_interval)):
+            return {}
+
+        expired = expire_reservations(None, now)
+        for page_id in expired:
+            availability.invalidate(page_id)
+            broadcast_availability_update(page_id)
+        return expired
+
+
+def expire_reservations(page_ids, now):
+    """
+    Usuwa wygasłe rezerwacje wielu stron jednym DELETE.
+
+    Args:
+        page_ids: lista stron albo None = wszystkie strony (globalny sweep)
+
+    Returns:
+        dict: {page_id: liczba usuniętych} — tylko strony, gdzie coś wygasło
+    """
+    from .models import OfferReservation
+
+    for attempt in range(3):
+        try:
+            query = db.session.query(
+                OfferReservation.offer_page_id,
+                func.count(OfferReservation.id),
+                func.sum(OfferReservation.expires_at),
+                func.min(OfferReservation.expires_at),
+            ).filter(OfferReservation.expires_at < now)
+            if page_ids is not None:
+                query = query.filter(OfferReservation.offer_page_id.in_(page_ids))
+            rows = query.group_by(OfferReservation.offer_page_id).all()
+
+            if rows:
+                OfferReservation.query.filter(
+                    OfferReservation.offer_page_id.in_([row[0] for row in rows]),
+                    OfferReservation.expires_at < now
+                ).delete(synchronize_session=False)
+            db.session.commit()
+            _record_run(rows, now)
+            return {page_id: count for page_id, count, _, _ in rows}
+        except Exception as e:
+            db.session.rollback()
+            if 'Deadlock' in str(e) and attempt < 2:
+                logger.warning(f"Deadlock on batch expiry attempt {attempt + 1}, retrying...")
+                time.sleep(0.1 * (attempt + 1))
+                continue
+            raise
+    return {}
+
+
+def _record_run(rows, now):
+    """Metryki lagu: rows = [(page_id, count, sum(expires_at), min(expires_at))]."""
+    deleted = sum(count for _, count, _, _ in rows)
+    lag_total = sum(count * now - int(exp_sum or 0) for _, count, exp_sum, _ in rows)
+    lag_max = max((now - int(exp_min) for _, _, _, exp_min in rows), default=0)
+    try:
+        get_state().reaper_record(deleted, lag_total, lag_max, now)
+    except Exception as e:
+        # Metryki nie mogą zatrzymać reapera
+        logger.warning(f"Reaper metrics not recorded: {e}")
+
+
+def reaper_metrics():
+    """
+    Metryki reapera wszystkich workerów (warstwa state).
+
+    Returns:
+        dict: runs, deleted, lag_avg_s (średnie opóźnienie usunięcia po wygaśnięciu),
+              lag_max_s, last_lag_max_s, last_run_at, pending_pages (kopiec tego workera)
+    """
+    m = get_state().reaper_metrics_get()
+    return {
+        'runs': m['runs'],
+        'deleted': m['deleted'],
+        'lag_avg_s': round(m['lag_total'] / m['deleted'], 2) if m['deleted'] else None,
+        'lag_max_s': m['lag_max'],
+        'last_lag_max_s': m['last_lag_max'],
+        'last_run_at': m['last_run_at'],
+        'pending_pages': len(_scheduler.pending()),
+    }
+
+
+def next_expiries(page_ids, now):
+    """Najbliższe expires_at (>= now) dla stron — jeden GROUP BY."""
+    from .models import OfferReservation
+
+    if not page_ids:
+        return {}
+    return dict(db.session.query(
+        OfferReservation.offer_page_id,
+        func.min(OfferReservation.expires_at)
+    ).filter(
+        OfferReservation.offer_page_id.in_(page_ids),
+        OfferReservation.expires_at >= now
+    ).group_by(OfferReservation.offer_page_id).all())
+
+
+_scheduler = ExpiryScheduler()
+
+
+def get_scheduler():
+    return _scheduler
+
+
+def schedule_page(page_id, expires_at=None):
+    """
+    Planuje wygaśnięcie dla strony.
+
+    Args:
+        expires_at: znany czas wygaśnięcia (np. z właśnie utworzonej rezerwacji);
+                    None = najbliższe expires_at strony z bazy
+    """
+    from flask import current_app
+
+    app = current_app._get_current_object()
+    _scheduler.start(app)
+
+    # Strona nieznana schedulerowi (np. po restarcie workera) — najbliższy termin
+    # z bazy, żeby nie przegapić wcześniejszych rezerwacji innych sesji
+    if expires_at is None or not _scheduler.is_scheduled(page_id):
+        earliest = next_expiries([page_id], int(time.time())).get(page_id)
+        if earliest is not None:
+            expires_at = earliest if expires_at is None else min(expires_at, earliest)
+    if expires_at is None:
+        return  # Brak aktywnych rezerwacji
+    _scheduler.schedule(page_id, expires_at, app)
+
+
+def ensure_reaper():
+    """Uruchamia reaper w bieżącym workerze (leniwie — przy pierwszym ruchu na stronach offer)."""
+    from flask import current_app
+    _scheduler.start(current_app._get_current_object())
@@ -0,0 +1,230 @@
+"""
+Offers Module - Liczniki dostępności (reservation engine)
+
+Zastępuje ścieżkę SELECT FOR UPDATE w rezerwacjach: zamiast lockować wiersze
+OfferReservation i sumować OrderItem przy każdym kliknięciu, trzymamy per
+(page, product) liczniki zarezerwowanych i zamówionych sztuk w warstwie state
+(Redis lub in-memory, patrz redis_state.py). Decyzja "czy jest dostępne"
+zapada w jednym atomowym kroku (Lua w Redis / lock w in-memory), a wiersz
+OfferReservation jest zapisywany do MySQL dopiero po udanej rezerwacji.
+
+Źródłem prawdy pozostaje baza — liczniki są jej odbiciem:
+- zimny start (brak klucza :ordered) → ensure_loaded() ładuje produkt z bazy,
+  o ile inny worker nie zrobił tego wcześniej (nie nadpisuje jego przyznań),
+- reconcile_page() przebudowuje liczniki całej strony (CLI
+  `reconcile-offer-inventory`, anulowanie zamówień, zmiany admina). Scala stan
+  z bazy z licznikami: rezerwacje przyznane w ostatnich PENDING_GRANT_S
+  sekundach zostają z licznika (ich wiersz może jeszcze nie być zatwierdzony),
+  a zamówienia dopisane do licznika w trakcie reconcile nie przepadają.
+
+Tryb pracy wybiera OFFERS_RESERVATION_ENGINE:
+- 'auto'     — liczniki gdy state jest w Redis, inaczej stara ścieżka z lockami
+               (in-memory nie działa cross-worker, a baza tak),
+- 'counters' — zawsze liczniki (single-worker dev / testy),
+- 'locking'  — zawsze stara ścieżka SELECT FOR UPDATE.
+"""
+
+import time
+import logging
+
+from flask import current_app
+from sqlalchemy import func
+
+from extensions import db
+from .redis_state import get_state, is_redis_backed, INVENTORY_OK, INVENTORY_COLD
+
+logger = logging.getLogger(__name__)
+
+# Jak długo przyznanie w liczniku chroni rezerwację sesji przed reconcile
+# (licznik → INSERT OfferReservation → commit trwa ułamek sekundy).
+PENDING_GRANT_S = 60
+
+
+def is_enabled():
+    """True jeśli rezerwacje mają iść przez liczniki zamiast SELECT FOR UPDATE."""
+    try:
+        mode = current_app.config.get('OFFERS_RESERVATION_ENGINE', 'auto')
+    except RuntimeError:
+        mode = 'auto'
+    if mode == 'counters':
+        return True
+    if mode == 'locking':
+        return False
+    return is_redis_backed()
+
+
+def _load_from_db(page_id, product_ids):
+    """
+    Czyta z bazy aktywne rezerwacje i sumy zamówień dla produktów strony.
+
+    Returns:
+        dict: {product_id: ({session_id: (qty, expires_at)}, ordered)}
+    """
+    from .models import OfferReservation
+    from modules.orders.models import Order, OrderItem
+
+    now = int(time.time())
+    result = {pid: ({}, 0) for pid in product_ids}
+    if not product_ids:
+        return result
+
+    rows = db.session.query(
+        OfferReservation.product_id,
+        OfferReservation.session_id,
+        OfferReservation.quantity,
+        OfferReservation.expires_at,
+    ).filter(
+        OfferReservation.offer_page_id == page_id,
+        OfferReservation.product_id.in_(product_ids),
+        OfferReservation.expires_at > now,
+    ).all()
+    for pid, sid, qty, exp in rows:
+        result[pid][0][sid] = (int(qty), int(exp))
+
+    ordered_rows = db.session.query(
+        OrderItem.product_id,
+        func.sum(OrderItem.quantity)
+    ).join(Order).filter(
+        Order.offer_page_id == page_id,
+        Order.status != 'anulowane',
+        OrderItem.product_id.in_(product_ids)
+    ).group_by(OrderItem.product_id).all()
+    for pid, qty in ordered_rows:
+        result[pid] = (result[pid][0], int(qty or 0))
+
+    return result
+
+
+def ensure_loaded(page_id, product_id):
+    """
+    Ładuje liczniki produktu z bazy (zimny start lub wygasły TTL w Redis).
+
+    Returns:
+        bool: False gdy liczniki załadował już inny worker (zostają nietknięte)
+    """
+    reservations, ordered = _load_from_db(page_id, [product_id])[product_id]
+    return get_state().inventory_load(page_id, product_id, reservations, ordered)
+
+
+def try_reserve(page_id, product_id, session_id, quantity, section_max, expires_at):
+    """
+    Atomowo sprawdza dostępność i dopisuje rezerwację sesji do licznika.
+
+    Args:
+        section_max: limit sekcji (None/0 = bez limitu)
+        expires_at: UNIX timestamp wygaśnięcia rezerwacji sesji
+
+    Returns:
+        tuple: (success: bool, available_after: int | float('inf'))
+    """
+    state = get_state()
+    limit = section_max if section_max and section_max > 0 else 0
+
+    for _ in range(2):
+        status, available = state.inventory_try_reserve(
+            page_id, product_id, session_id, quantity, limit,
+            expires_at, int(time.time())
+        )
+        if status == INVENTORY_COLD:
+            ensure_loaded(page_id, product_id)
+            continue
+        if available < 0:
+            available = float('inf')
+        return status == INVENTORY_OK, available
+
+    # Klucz zniknął między load a reserve (TTL/flush) — traktujemy jak brak miejsca,
+    # klient i tak dostanie komunikat "spróbuj ponownie".
+    logger.warning(f"Inventory counters for page={page_id} product={product_id} not loaded after retry")
+    return False, 0
+
+
+def release(page_id, product_id, session_id, quantity):
+    """Zmniejsza rezerwację sesji w liczniku (po zwolnieniu w bazie)."""
+    get_state().inventory_release(page_id, product_id, session_id, quantity)
+
+
+def set_session_expiry(page_id, session_id, expiries):
+    """
+    Aktualizuje czas wygaśnięcia rezerwacji sesji (extend).
+
+    Args:
+        expiries: dict {product_id: expires_at}
+    """
+    state = get_state()
+    for product_id, expires_at in expiries.items():
+        state.inventory_set_expiry(page_id, product_id, session_id, expires_at)
+
+
+def move_session(page_id, old_session_id, new_session_id, product_ids):
+    """Przenosi rezerwacje w licznikach na nową sesję (przejęcie karty)."""
+    state = get_state()
+    for product_id in product_ids:
+        state.inventory_move_session(page_id, product_id, old_session_id, new_session_id)
+
+
+def commit_order(page_id, session_id, reserved_product_ids, ordered_quantities):
+    """
+    Odzwierciedla złożone zamówienie: rezerwacje sesji → zamówione sztuki.
+
+    Args:
+        reserved_product_ids: produkty, z których zdjęto rezerwacje sesji
+        ordered_quantities: dict {product_id: qty} wszystkich pozycji zamówienia
+    """
+    state = get_state()
+    for product_id in set(reserved_product_ids) | set(ordered_quantities):
+        state.inventory_commit_order(
+            page_id, product_id,
+            session_id if product_id in reserved_product_ids else None,
+            ordered_quantities.get(product_id, 0)
+        )
+
+
+def get_counts(page_id, product_id):
+    """
+    Zwraca (reserved, ordered) z liczników, ładując je przy zimnym starcie.
+    """
+    state = get_state()
+    counts = state.inventory_get(page_id, product_id, int(time.time()))
+    if counts is None:
+        ensure_loaded(page_id, product_id)
+        counts = state.inventory_get(page_id, product_id, int(time.time())) or (0, 0)
+    return counts
+
+
+def reconcile_page(page_id):
+    """
+    Przebudowuje liczniki strony z bazy (źródła prawdy).
+
+    Nie kasuje liczników trwającego dropu: stan :ordered sprzed zapytania do
+    bazy pozwala zachować zamówienia dopisane w międzyczasie, a sesje świeżo
+    przyznane w liczniku zostają (patrz PENDING_GRANT_S). Liczniki produktów,
+    których nie ma już na stronie, są usuwane.
+
+    Returns:
+        int: liczba przeładowanych produktów
+    """
+    from .reservation import get_section_products_map
+
+    product_ids = list(get_section_products_map(page_id).keys())
+    state = get_state()
+    state.inventory_drop_page(page_id, keep=product_ids)
+    now = int(time.time())
+    ordered_before = {}
+    for product_id in product_ids:
+        counts = state.inventory_get(page_id, product_id, now)
+        ordered_before[product_id] = counts[1] if counts is not None else None
+    for product_id, (reservations, ordered) in _load_from_db(page_id, product_ids).items():
+        now = int(time.time())
+        state.inventory_reconcile(page_id, product_id, reservations, ordered,
+                                  ordered_before[product_id], now - PENDING_GRANT_S, now)
+    return len(product_ids)
+
+
+def reconcile_page_safe(page_id):
+    """reconcile_page dla ścieżek post-commit — błąd liczników nie może wywrócić akcji."""
+    if not is_enabled():
+        return
+    try:
+        reconcile_page(page_id)
+    except Exception as e:
+        logger.error(f"Inventory reconcile failed for page {page_id}: {e}")
@@ -0,0 +1,262 @@
+"""
+Offers Module - Skompilowany układ strony (sekcje → produkty → limity)
+
+get_section_max_for_product() robiła do 5 zapytań na wywołanie, a
+get_section_products_map() chodziła po wszystkich sekcjach z osobnym JOIN-em
+na Product dla każdej grupy wariantowej i elementu setu — obie na gorących
+ścieżkach (reserve, availability, każdy broadcast, place order).
+
+Tutaj układ strony budujemy raz (stała liczba zapytań: sekcje, elementy
+setów, członkostwa w grupach wariantowych) do postaci:
+
+    products:     {product_id: {section_id, section_type, max, listed}}
+    set_members:  {product_id: {section_id, quantity_per_set}}
+    set_sections: {section_id: {set_name, set_max_sets, set_product_id, set_image,
+                                products: {product_id: quantity_per_set}}}
+                  (products w kolejności sort_order elementów setu)
+
+i trzymamy go w cache procesu oraz w warstwie state (Redis / in-memory)
+z numerem wersji. Zmiany sekcji (offers_save/_update_sections, auto-increase)
+wołają invalidate(). Członkostwo w grupach wariantowych i is_active produktów
+zmieniają się poza panelem ofert, więc układ jest dodatkowo przebudowywany po
+OFFERS_LAYOUT_MAX_AGE sekundach.
+
+Priorytet limitu produktu (jak dotychczas w get_section_max_for_product):
+sekcja 'product' > sekcja 'variant_group' > element setu bezpośrednio >
+element setu przez grupę wariantową. `listed` = produkt trafia do mapy
+dostępności (produkty z grup wariantowych tylko gdy is_active).
+"""
+
+import time
+import logging
+import threading
+
+from flask import current_app
+
+from extensions import db
+from .redis_state import get_state
+
+logger = logging.getLogger(__name__)
+
+# Domyślny maksymalny wiek układu (sekundy), nadpisywany z configu
+_DEFAULT_MAX_AGE = 300
+
+# Priorytety źródeł limitu (mniejszy = ważniejszy)
+_PRIORITY_PRODUCT = 1
+_PRIORITY_VARIANT_GROUP = 2
+_PRIORITY_SET_ITEM = 3
+_PRIORITY_SET_VARIANT_GROUP = 4
+
+# Lokalny cache procesu: {page_id: (backend, version, OfferPageLayout)}
+_local = {}
+_local_lock = threading.Lock()
+
+
+class OfferPageLayout:
+    """Niemutowalny widok skompilowanego układu strony."""
+
+    def __init__(self, page_id, data):
+        self.page_id = page_id
+        self.built_at = data['built_at']
+        self.products = data['products']
+        self.set_members = data['set_members']
+        self.set_sections = data['set_sections']
+        self.set_product_ids = set(data['set_product_ids'])
+
+    def section_max(self, product_id):
+        """Limit sekcji produktu (None = bez limitu lub produkt spoza strony)."""
+        entry = self.products.get(product_id)
+        return entry['max'] if entry else None
+
+    def section_products(self):
+        """Mapa {product_id: section_max} produktów pokazywanych w dostępności."""
+        return {pid: entry['max'] for pid, entry in self.products.items() if entry['listed']}
+
+    def set_info(self, product_id):
+        """{section_id, quantity_per_set} gdy produkt jest elementem setu, inaczej None."""
+        return self.set_members.get(product_id)
+
+
+def _max_age():
+    try:
+        return current_app.config.get('OFFERS_LAYOUT_MAX_AGE', _DEFAULT_MAX_AGE)
+    except RuntimeError:
+        return _DEFAULT_MAX_AGE
+
+
+def build(page_id):
+    """
+    Buduje układ strony z bazy (3 zapytania niezależnie od liczby sekcji).
+
+    Returns:
+        dict: dane układu (JSON-owalne poza kluczami int — patrz _to_json)
+    """
+    from .models import OfferSection, OfferSetItem
+    from modules.products.models import Product, variant_products
+
+    sections = OfferSection.query.filter_by(
+        offer_page_id=page_id
+    ).order_by(OfferSection.id).all()
+    set_section_ids = [s.id for s in sections if s.section_type == 'set']
+    set_items = OfferSetItem.query.filter(
+        OfferSetItem.section_id.in_(set_section_ids)
+    ).order_by(
+        OfferSetItem.section_id, OfferSetItem.sort_order, OfferSetItem.id
+    ).all() if set_section_ids else []
+
+    # Członkowie grup wariantowych: {vg_id: [(product_id, is_active)]}
+    vg_ids = {s.variant_group_id for s in sections
+              if s.section_type == 'variant_group' and s.variant_group_id}
+    vg_ids |= {i.variant_group_id for i in set_items if i.variant_group_id and not i.product_id}
+    vg_members = {}
+    if vg_ids:
+        rows = db.session.query(
+            variant_products.c.variant_group_id, Product.id, Product.is_active
+        ).join(
+            Product, Product.id == variant_products.c.product_id
+        ).filter(
+            variant_products.c.variant_group_id.in_(vg_ids)
+        ).order_by(Product.id).all()
+        for vg_id, pid, is_active in rows:
+            vg_members.setdefault(vg_id, []).append((pid, bool(is_active)))
+
+    products = {}   # {pid: (priority, entry)}
+
+    def _offer(pid, priority, section, limit, listed):
+        current = products.get(pid)
+        if current is None or priority < current[0]:
+            products[pid] = (priority, {
+                'section_id': section.id,
+                'section_type': section.section_type,
+                'max': limit,
+                'listed': listed or (current is not None and current[1]['listed']),
+            })
+        elif listed and not current[1]['listed']:
+            current[1]['listed'] = True
+
+    sections_by_id = {s.id: s for s in sections}
+    for section in sections:
+        if section.section_type == 'product' and section.product_id:
+            _offer(section.product_id, _PRIORITY_PRODUCT, section, section.max_quantity, True)
+        elif section.section_type == 'variant_group' and section.variant_group_id:
+            for pid, is_active in vg_members.get(section.variant_group_id, []):
+                _offer(pid, _PRIORITY_VARIANT_GROUP, section, section.max_quantity, is_active)
+
+    set_members = {}
+    set_sections = {
+        sid: {
+            'set_name': sections_by_id[sid].set_name,
+            'set_max_sets': sections_by_id[sid].set_max_sets,
+            'set_product_id': sections_by_id[sid].set_product_id,
+            'set_image': sections_by_id[sid].set_image,
+            'products': {},
+        }
+        for sid in set_section_ids
+    }
+    for item in set_items:
+        section = sections_by_id[item.section_id]
+        qps = item.quantity_per_set or 1
+        if item.product_id:
+            members = [(item.product_id, True)]
+            priority = _PRIORITY_SET_ITEM
+        elif item.variant_group_id:
+            members = vg_members.get(item.variant_group_id, [])
+            priority = _PRIORITY_SET_VARIANT_GROUP
+        else:
+            continue
+        for pid, is_active in members:
+            _offer(pid, priority, section, section.set_max_sets, is_active)
+            if is_active:
+                # Jak OfferSetItem.get_products(): z grup tylko aktywne produkty
+                set_members[pid] = {'section_id': section.id, 'quantity_per_set': qps}
+                set_sections[section.id]['products'][pid] = qps
+
+    return {
+        'built_at': int(time.time()),
+        'products': {pid: entry for pid, (_, entry) in products.items()},
+        'set_members': set_members,
+        'set_sections': set_sections,
+        'set_product_ids': sorted({s.set_product_id for s in sections
+                                   if s.section_type == 'set' and s.set_product_id}),
+    }
+
+
+def _to_json(data):
+    """JSON nie ma kluczy int — zamieniamy na str (i z powrotem w _from_json)."""
+    return {
+        'built_at': data['built_at'],
+        'products': {str(k): v for k, v in data['products'].items()},
+        'set_members': {str(k): v for k, v in data['set_members'].items()},
+        'set_sections': {
+            str(sid): dict(sec, products={str(k): v for k, v in sec['products'].items()})
+            for sid, sec in data['set_sections'].items()
+        },
+        'set_product_ids': data['set_product_ids'],
+    }
+
+
+def _from_json(data):
+    return {
+        'built_at': data['built_at'],
+        'products': {int(k): v for k, v in data['products'].items()},
+        'set_members': {int(k): v for k, v in data['set_members'].items()},
+        'set_sections': {
+            int(sid): dict(sec, products={int(k): v for k, v in sec['products'].items()})
+            for sid, sec in data['set_sections'].items()
+        },
+        'set_product_ids': data['set_product_ids'],
+    }
+
+
+def get_layout(page_id):
+    """
+    Zwraca układ strony — z cache procesu, ze state albo budując go z bazy.
+
+    Returns:
+        OfferPageLayout
+    """
+    state = get_state()
+    now = int(time.time())
+    max_age = _max_age()
+
+    try:
+        version, raw = state.layout_get(page_id)
+    except Exception as e:
+        logger.error(f"Layout state read failed for page {page_id}: {e}")
+        return OfferPageLayout(page_id, build(page_id))
+
+    with _local_lock:
+        cached = _local.get(page_id)
+    if cached and cached[0] is state and cached[1] == version and now - cached[2].built_at <= max_age:
+        return cached[2]
+
+    if raw is not None and now - raw['built_at'] <= max_age:
+        layout = OfferPageLayout(page_id, _from_json(raw))
+    else:
+        layout = OfferPageLayout(page_id, build(page_id))
+        try:
+            if not state.layout_store(page_id, version, _to_json({
+                'built_at': layout.built_at,
+                'products': layout.products,
+                'set_members': layout.set_members,
+                'set_sections': layout.set_sections,
+                'set_product_ids': sorted(layout.set_product_ids),
+            })):
+                # Invalidate w trakcie budowania — zbudowany układ mógł być nieaktualny
+                return OfferPageLayout(page_id, build(page_id))
+        except Exception as e:
+            logger.error(f"Layout state write failed for page {page_id}: {e}")
+
+    with _local_lock:
+        _local[page_id] = (state, version, layout)
+    return layout
+
+
+def invalidate(page_id):
+    """Oznacza układ strony jako nieaktualny (po zmianie sekcji/limitów)."""
+    with _local_lock:
+        _local.pop(page_id, None)
+    try:
+        get_state().layout_invalidate(page_id)
+    except Exception as e:
+        logger.error(f"Layout invalidate failed for page {page_id}: {e}")
@@ -128,6 +128,10 @@ class OfferPage(db.Model):
     # Termin płatności za produkt (ustawiany przy zamykaniu strony)
     payment_deadline = db.Column(db.DateTime, nullable=True)
 
+    # Postęp zamykania w tle (utils/offer_closure.run_offer_closure):
+    # {'status', 'stage', 'done', 'total', 'error', 'result', ...}
+    closure_state = db.Column(db.JSON, nullable=True)
+
     # Relationships
     creator = db.relationship('User', backref='offer_pages', foreign_keys=[created_by])
     closed_by = db.relationship('User', foreign_keys=[closed_by_id])
@@ -818,3 +822,93 @@ class OfferBonusRequiredProduct(db.Model):
 
     def __repr__(self):
         return f'<OfferBonusRequiredProduct bonus={self.bonus_id} product={self.product_id}>'
+
+
+class OfferPageSales(db.Model):
+    """
+    Sumy sprzedaży strony oferty (modules/offers/sales_stats.py).
+
+    Liczone po zamówieniach z wyjątkiem 'anulowane'. Utrzymywane deltami przy
+    składaniu/anulowaniu zamówień, przebudowywane po zamknięciu strony albo
+    gdy stale=True (zmiana zamówień poza ścieżkami z deltą).
+    """
+    __tablename__ = 'offer_page_sales'
+
+    offer_page_id = db.Column(db.Integer, db.ForeignKey('offer_pages.id', ondelete='CASCADE'), primary_key=True)
+    orders_count = db.Column(db.Integer, nullable=False, default=0)
+    customers_count = db.Column(db.Integer, nullable=False, default=0)
+    stale = db.Column(db.Boolean, nullable=False, default=False)
+    built_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=get_local_now, onupdate=get_local_now)
+
+    def __repr__(self):
+        return f'<OfferPageSales page={self.offer_page_id} orders={self.orders_count}>'
+
+
+class OfferProductSales(db.Model):
+    """
+    Sprzedaż per (strona, produkt + rozmiar) — wiersz zakładki Produkty
+    w podsumowaniu LIVE i po zamknięciu. Produkty custom kluczowane nazwą.
+    """
+    __tablename__ = 'offer_product_sales'
+
+    id = db.Column(db.Integer, primary_key=True)
+    offer_page_id = db.Column(db.Integer, db.ForeignKey('offer_pages.id', ondelete='CASCADE'), nullable=False)
+    item_key = db.Column(db.String(320), nullable=False)  # "<product_id>:<rozmiar>" albo "custom:<nazwa>"
+    product_id = db.Column(db.Integer, nullable=True)
+    product_name = db.Column(db.String(255), nullable=True)
+    selected_size = db.Column(db.String(50), nullable=True)
+    is_custom = db.Column(db.Boolean, nullable=False, default=False)
+    is_full_set = db.Column(db.Boolean, nullable=False, default=False)
+    is_bonus = db.Column(db.Boolean, nullable=False, default=False)
+    first_item_id = db.Column(db.Integer, nullable=True)  # Kolejność przy równych ilościach
+
+    quantity = db.Column(db.Integer, nullable=False, default=0)             # Wszystkie sztuki (z gratisami)
+    item_count = db.Column(db.Integer, nullable=False, default=0)           # Liczba pozycji zamówień
+    bonus_quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)       # Suma total bez gratisów
+    fulfilled_quantity = db.Column(db.Integer, nullable=False, default=0)   # is_set_fulfilled = True
+    unfulfilled_quantity = db.Column(db.Integer, nullable=False, default=0)  # is_set_fulfilled = False
+    unfulfilled_revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('offer_page_id', 'item_key', name='unique_offer_product_sales_key'),
+    )
+
+    def __repr__(self):
+        return f'<OfferProductSales page={self.offer_page_id} key={self.item_key} qty={self.quantity}>'
+
+
+class OfferSalesDelta(db.Model):
+    """
+    Delta agregatów strony z jednego złożenia/anulowania zamówień — tylko INSERT,
+    więc równoległe checkouty nie czekają na wspólny wiersz. Wiersz z item_key
+    NULL niesie liczniki strony, pozostałe — sumy produktu (ujemne przy anulowaniu).
+    rebuild() wlicza delty do OfferPageSales / OfferProductSales i je usuwa.
+    """
+    __tablename__ = 'offer_sales_deltas'
+
+    id = db.Column(db.Integer, primary_key=True)
+    offer_page_id = db.Column(db.Integer, db.ForeignKey('offer_pages.id', ondelete='CASCADE'),
+                              nullable=False, index=True)
+    item_key = db.Column(db.String(320), nullable=True)   # NULL = liczniki strony
+    product_id = db.Column(db.Integer, nullable=True)
+    product_name = db.Column(db.String(255), nullable=True)
+    selected_size = db.Column(db.String(50), nullable=True)
+    is_custom = db.Column(db.Boolean, nullable=False, default=False)
+    is_full_set = db.Column(db.Boolean, nullable=False, default=False)
+    is_bonus = db.Column(db.Boolean, nullable=False, default=False)
+    first_item_id = db.Column(db.Integer, nullable=True)
+
+    orders_count = db.Column(db.Integer, nullable=False, default=0)
+    customers_count = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+    bonus_quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    fulfilled_quantity = db.Column(db.Integer, nullable=False, default=0)
+    unfulfilled_quantity = db.Column(db.Integer, nullable=False, default=0)
+    unfulfilled_revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<OfferSalesDelta page={self.offer_page_id} key={self.item_key}>'
@@ -11,7 +11,6 @@ from decimal import Decimal
 from sqlalchemy.exc import OperationalError
 from extensions import db
 from .models import OfferReservation, OfferPage, OfferSetBonus, OfferBonusRequiredProduct
-from .reservation import cleanup_expired_reservations
 from modules.orders.models import Order, OrderItem
 from modules.orders.utils import generate_order_number
 from utils.activity_logger import log_activity
@@ -128,6 +127,46 @@ def check_product_availability(reservations, page_id, session_id):
     return True, None
 
 
+def check_product_availability_counters(reservations, page_id, session_id):
+    """
+    Odpowiednik check_product_availability dla silnika liczników (inventory.py).
+
+    Aktywna rezerwacja trzyma już miejsce w liczniku, więc nie trzeba niczego
+    lockować. Rezerwacja, która wygasła między kliknięciem a złożeniem
+    zamówienia, jest ponownie zajmowana atomowym check-and-reserve — jeśli
+    miejsca już nie ma, zwracamy ten sam błąd co ścieżka z lockami.
+
+    Returns:
+        tuple: (available: bool, error: dict or None)
+    """
+    from . import inventory
+    from .reservation import get_section_max_for_product, RESERVATION_DURATION
+
+    now = int(time.time())
+
+    for reservation in sorted(reservations, key=lambda r: r.product_id):
+        if reservation.expires_at > now:
+            continue
+
+        product = reservation.product
+        section_max = get_section_max_for_product(page_id, product.id)
+        ok, available = inventory.try_reserve(
+            page_id, product.id, session_id, reservation.quantity,
+            section_max, now + RESERVATION_DURATION
+        )
+        if not ok:
+            return False, {
+                'error': 'insufficient_availability',
+                'product_id': product.id,
+                'product_name': product.name,
+                'requested': reservation.quantity,
+                'available': int(available),
+                'message': f'Produkt "{product.name}" nie ma wystarczającej dostępności ({int(available)} szt.)'
+            }
+
+    return True, None
+
+
 def place_offer_order(page, session_id, order_note=None, full_set_items=None, user=None,
                       bind_user=False):
     """
@@ -135,13 +174,13 @@ def place_offer_order(page, session_id, order_note=None, full_set_items=None, us
 
     Wrapper z retry na MySQL deadlock 1213. Pierwsza próba i tak ma minimalne
     ryzyko deadlocku dzięki sortowaniu w check_product_availability — retry
-    łapie edge case'y (kolizje z cleanup_expired_reservations, równoległe
+    łapie edge case'y (kolizje z DELETE reapera wygasłych rezerwacji, równoległe
     aktualizacje na orders/order_items).
 
     Bezpieczeństwo retry: deadlock zawsze powoduje pełny rollback w MySQL,
     więc poprzednia próba nie zostawia żadnych częściowo zapisanych danych.
-    generate_order_number to czysty SELECT — kolejny attempt może wygenerować
-    ten sam numer (bo poprzedni nigdy nie został scommitowany).
+    generate_order_number bierze numer z licznika w osobnej transakcji —
+    kolejny attempt dostaje nowy numer (poprzedni zostaje luką w numeracji).
 
     Args:
         bind_user (bool): gdy True, konsumuje wyłącznie rezerwacje należące do
@@ -203,13 +242,11 @@ def _place_offer_order_attempt(page, session_id, order_note=None, full_set_items
     if full_set_items is None:
         full_set_items = []
 
-    # 1. Cleanup expired reservations
-    cleanup_expired_reservations(page.id)
-
-    # 2. Get user's reservations
-    reservations_q = OfferReservation.query.filter_by(
-        session_id=session_id,
-        offer_page_id=page.id
+    # 1-2. Get user's active reservations (wygasłe usuwa reaper — bez DELETE na ścieżce zamówienia)
+    reservations_q = OfferReservation.query.filter(
+        OfferReservation.session_id == session_id,
+        OfferReservation.offer_page_id == page.id,
+        OfferReservation.expires_at > int(time.time())
     )
     if bind_user:
         reservations_q = reservations_q.filter(OfferReservation.user_id == user.id)
@@ -239,8 +276,14 @@ def _place_offer_order_attempt(page, session_id, order_note=None, full_set_items
             }
         return False, {'error': 'no_reservations', 'message': 'Brak produktów w koszyku'}
 
-    # 3. Check product availability (with SELECT FOR UPDATE to prevent race conditions)
-    available, error = check_product_availability(reservations, page.id, session_id)
+    # 3. Check product availability (with SELECT FOR UPDATE to prevent race conditions;
+    #    silnik liczników trzyma miejsce w Redis i nie potrzebuje locków)
+    from . import inventory, sales_stats
+    use_counters = inventory.is_enabled()
+    if use_counters:
+        available, error = check_product_availability_counters(reservations, page.id, session_id)
+    else:
+        available, error = check_product_availability(reservations, page.id, session_id)
     if not available:
         return False, error
 
@@ -264,29 +307,21 @@ def _place_offer_order_attempt(page, session_id, order_note=None, full_set_items
     )
 
     db.session.add(order)
+    sales_stats.track(order)
     db.session.flush()  # Get order.id
 
     # 7. Create order items (offer orders do NOT affect global stock)
     total_amount = Decimal('0.00')
 
-    # Build set mappings for this page
+    # Build set mappings for this page (ze skompilowanego układu strony)
     from .models import OfferSection
-    set_product_ids = set()  # Products that ARE the full set bundle
-    product_set_info = {}    # product_id → {section_id, quantity_per_set}
-    set_sections = OfferSection.query.filter_by(
-        offer_page_id=page.id,
-        section_type='set'
-    ).all()
-    for sec in set_sections:
-        if sec.set_product_id:
-            set_product_ids.add(sec.set_product_id)
-        for set_item in sec.set_items:
-            qps = set_item.quantity_per_set or 1
-            for prod in set_item.get_products():
-                product_set_info[prod.id] = {
-                    'section_id': sec.id,
-                    'quantity_per_set': qps,
-                }
+    from .layout import get_layout
+    layout = get_layout(page.id)
+    set_product_ids = layout.set_product_ids    # Products that ARE the full set bundle
+    product_set_info = layout.set_members       # product_id → {section_id, quantity_per_set}
+    set_sections = OfferSection.query.filter(
+        OfferSection.id.in_(list(layout.set_sections))
+    ).order_by(OfferSection.id).all() if layout.set_sections else []
 
     # Pre-query existing ordered quantities for set products (before this order)
     prev_ordered_map = {}
@@ -601,11 +636,14 @@ def _place_offer_order_attempt(page, session_id, order_note=None, full_set_items
     order.total_amount = total_amount
 
     # 9. Delete all reservations
+    reserved_product_ids = [r.product_id for r in reservations]
+    reserved_quantities = [(r.product_id, r.quantity) for r in reservations]
     for reservation in reservations:
         db.session.delete(reservation)
 
-    # 10. Commit transaction
+    # 10. Commit transaction (agregaty sprzedaży strony — ostatni krok przed commitem)
     try:
+        sales_stats.apply_orders(page.id, [order])
         db.session.commit()
     except OperationalError as e:
         db.session.rollback()
@@ -619,6 +657,34 @@ def _place_offer_order_attempt(page, session_id, order_note=None, full_set_items
         logger.exception('Order commit failed (offer page)')
         return False, {'error': 'database_error', 'message': DATABASE_ERROR_MESSAGE}
 
+    # 10a. Snapshot dostępności + liczniki rezerwacji: rezerwacje sesji → zamówione sztuki
+    try:
+        from . import availability
+        deltas = {}
+        for pid, qty in reserved_quantities:
+            reserved_delta, ordered_delta = deltas.get(pid, (0, 0))
+            deltas[pid] = (reserved_delta - qty, ordered_delta)
+        for item in order.items:
+            reserved_delta, ordered_delta = deltas.get(item.product_id, (0, 0))
+            deltas[item.product_id] = (reserved_delta, ordered_delta + item.quantity)
+        availability.apply_delta(page.id, deltas)
+    except Exception as e:
+        logger.error(f"Availability delta failed for page {page.id}: {e}")
+
+    if use_counters:
+        try:
+            ordered_quantities = {}
+            for item in order.items:
+                ordered_quantities[item.product_id] = ordered_quantities.get(item.product_id, 0) + item.quantity
+            inventory.commit_order(
+                page.id, session_id,
+                reserved_product_ids,
+                ordered_quantities
+            )
+        except Exception as e:
+            logger.error(f"Inventory commit failed for page {page.id}, reconciling: {e}")
+            inventory.reconcile_page_safe(page.id)
+
     # 10b. Check and apply auto-increase if enabled
     try:
         check_and_apply_auto_increase(page.id)
@@ -712,7 +778,7 @@ def _place_offer_order_attempt(page, session_id, order_note=None, full_set_items
         })
 
         # Get full live summary (stats + sets + products) and emit
-        live = get_live_summary(page.id, include_financials=True)
+        live = get_live_summary(page.id, include_financials=True, include_orders=False)
 
         emit_stats_update(page.id, {
             'total_orders': live['total_orders'],
@@ -805,6 +871,7 @@ def place_preorder_order(page, cart_items, order_note=None, user=None):
     """
     from modules.products.models import Product
     from .models import OfferSection, OfferSetBonus, OfferBonusRequiredProduct
+    from . import sales_stats
 
     if user is None:
         from flask_login import current_user as _cu
@@ -843,6 +910,7 @@ def place_preorder_order(page, cart_items, order_note=None, user=None):
     )
 
     db.session.add(order)
+    sales_stats.track(order)
     db.session.flush()
 
     # 4. Create order items
@@ -952,6 +1020,7 @@ def place_preorder_order(page, cart_items, order_note=None, user=None):
     # 6. Update total
     order.total_amount = total_amount
     try:
+        sales_stats.apply_orders(page.id, [order])
         db.session.commit()
     except Exception:
         db.session.rollback()
@@ -1010,7 +1079,7 @@ def place_preorder_order(page, cart_items, order_note=None, user=None):
             'payment_badge': order.payment_badge,
         })
 
-        live = get_live_summary(page.id, include_financials=True)
+        live = get_live_summary(page.id, include_financials=True, include_orders=False)
         emit_stats_update(page.id, {
             'total_orders': live['total_orders'],
             'unique_customers': live['unique_customers'],
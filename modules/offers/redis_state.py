@@ -18,9 +18,30 @@ Klucze w Redis (wszystkie z TTL 1h, odświeżanym przy każdej operacji):
 - reservation_session:{page_id}:{session_id} - STRING sid (dedup po sesji)
 - user_session:{page_id}:{user_id}            - STRING sid (dedup po userze)
 - last_availability:{page_id}   - STRING json (ostatnio rozesłana dostępność)
+- last_availability_seq:{page_id} - STRING int (numer sekwencyjny rozesłanej dostępności)
+- inventory:{page_id}:{product_id}:reserved - HASH {session_id: "qty:expires_at"}
+- inventory:{page_id}:{product_id}:ordered  - STRING int (suma zamówionych sztuk)
+- inventory:{page_id}:{product_id}:granted  - HASH {session_id: granted_at} (ostatnie przyznanie
+                                  w liczniku — rezerwacja może jeszcze nie być w bazie)
+- inventory:{page_id}:products  - SET of product_id (do przebudowy liczników strony)
+- availability:{page_id}        - HASH {r:pid, o:pid, m:pid, built_at} (snapshot dostępności)
+- availability_version:{page_id} - STRING int (wersja snapshotu, rośnie przy każdej zmianie)
+- claim:{key}                   - STRING (SET NX — zadanie obsługuje jeden worker, np. expiry)
+- layout:{page_id}              - STRING json (skompilowany układ sekcji strony, layout.py)
+- layout_version:{page_id}      - STRING int (wersja układu, rośnie przy invalidate)
+- reaper_metrics                - HASH {runs, deleted, lag_total, lag_max, last_lag_max,
+                                  last_run_at} (metryki reapera wszystkich workerów, bez TTL)
+
+Snapshot availability:* obsługuje modules/offers/availability.py.
+Liczniki inventory:* obsługuje modules/offers/inventory.py. Klucz :ordered
+jest znacznikiem "załadowane" — jego brak oznacza zimny start i wymusza
+odbudowę liczników z bazy. Załadowanych liczników nie nadpisujemy: zimny
+start ładuje tylko brakujący klucz, a reconcile scala stan z bazy z tym,
+co workery zmieniły w licznikach w międzyczasie.
 """
 
 import json
+import time
 import logging
 import threading
 
@@ -56,9 +77,68 @@ class OffersStateBackend:
     def get_user_session(self, page_id, user_id): raise NotImplementedError
     def del_user_session(self, page_id, user_id): raise NotImplementedError
 
-    # Last availability (do detekcji zmian → push notifications)
-    def set_last_availability(self, page_id, snapshot): raise NotImplementedError
-    def get_last_availability(self, page_id): raise NotImplementedError
+    # Last availability (delty availability_updated z seq + detekcja zmian → push notifications)
+    def publish_availability(self, page_id, snapshot): raise NotImplementedError
+    def get_published_availability(self, page_id): raise NotImplementedError
+
+    # Liczniki rezerwacji (inventory.py) — atomowe check-and-reserve
+    def inventory_load(self, page_id, product_id, reservations, ordered): raise NotImplementedError
+    def inventory_reconcile(self, page_id, product_id, reservations, ordered, ordered_before,
+                            granted_since, now): raise NotImplementedError
+    def inventory_try_reserve(self, page_id, product_id, session_id, quantity, limit,
+                              expires_at, now): raise NotImplementedError
+    def inventory_release(self, page_id, product_id, session_id, quantity): raise NotImplementedError
+    def inventory_set_expiry(self, page_id, product_id, session_id, expires_at): raise NotImplementedError
+    def inventory_move_session(self, page_id, product_id, old_session_id, new_session_id): raise NotImplementedError
+    def inventory_commit_order(self, page_id, product_id, session_id, ordered_delta): raise NotImplementedError
+    def inventory_get(self, page_id, product_id, now): raise NotImplementedError
+    def inventory_drop_page(self, page_id, keep=()): raise NotImplementedError
+
+    # Snapshot dostępności (availability.py) — wersjonowany, aktualizowany deltami
+    def availability_get(self, page_id): raise NotImplementedError
+    def availability_version(self, page_id): raise NotImplementedError
+    def availability_load(self, page_id, expected_version, counts, section_products,
+                          built_at): raise NotImplementedError
+    def availability_apply(self, page_id, deltas): raise NotImplementedError
+    def availability_invalidate(self, page_id): raise NotImplementedError
+
+    # Jednorazowe "zaklepanie" zadania między workerami (expiry.py)
+    def claim_once(self, key, ttl): raise NotImplementedError
+
+    # Skompilowany układ sekcji strony (layout.py) — wersjonowany
+    def layout_get(self, page_id): raise NotImplementedError
+    def layout_store(self, page_id, expected_version, data): raise NotImplementedError
+    def layout_invalidate(self, page_id): raise NotImplementedError
+
+    # Metryki reapera (expiry.py) — sumowane ze wszystkich workerów
+    def reaper_record(self, deleted, lag_total, lag_max, now): raise NotImplementedError
+    def reaper_metrics_get(self): raise NotImplementedError
+
+
+def _diff_availability(previous, snapshot):
+    """
+    Różnica między rozesłaną a nową dostępnością (klucze = str(product_id)).
+
+    Returns:
+        tuple: (changed: list[str], removed: list[str]) — przy braku poprzedniej
+               wersji obie listy są puste (rozsyłamy pełny snapshot)
+    """
+    if previous is None:
+        return [], []
+    changed = [pid for pid, entry in snapshot.items() if previous.get(pid) != entry]
+    removed = [pid for pid in previous if pid not in snapshot]
+    return changed, removed
+
+
+# Metryki reapera przed pierwszym przebiegiem
+_REAPER_METRICS_EMPTY = {
+    'runs': 0, 'deleted': 0, 'lag_total': 0.0, 'lag_max': 0, 'last_lag_max': 0, 'last_run_at': None,
+}
+
+# Wyniki inventory_try_reserve
+INVENTORY_OK = 1
+INVENTORY_INSUFFICIENT = -1
+INVENTORY_COLD = -2
 
 
 class InMemoryBackend(OffersStateBackend):
@@ -71,6 +151,15 @@ class InMemoryBackend(OffersStateBackend):
         self._reservation_sessions = {}  # {(page_id, session_id): sid}
         self._user_sessions = {}   # {(page_id, user_id): sid}
         self._last_availability = {}  # {page_id: dict}
+        self._last_availability_seq = {}  # {page_id: int}
+        self._inventory = {}       # {(page_id, product_id): {'reserved': {sid: [qty, exp]}, 'ordered': int,
+                                   #                          'granted': {sid: granted_at}}}
+        self._availability = {}    # {page_id: {'counts': {pid: [reserved, ordered]}, 'section_products': {...}, 'built_at': int}}
+        self._claims = {}          # {key: expires_at}
+        self._layouts = {}         # {page_id: dict}
+        self._layout_versions = {}  # {page_id: int}
+        self._availability_versions = {}  # {page_id: int}
+        self._reaper_metrics = dict(_REAPER_METRICS_EMPTY)
         self._lock = threading.RLock()
 
     def add_visitor(self, page_id, room_type, sid):
@@ -144,13 +233,463 @@ class InMemoryBackend(OffersStateBackend):
         with self._lock:
             self._user_sessions.pop((page_id, user_id), None)
 
-    def set_last_availability(self, page_id, snapshot):
+    def publish_availability(self, page_id, snapshot):
         with self._lock:
+            previous = self._last_availability.get(page_id)
+            changed, removed = _diff_availability(previous, snapshot)
+            seq = self._last_availability_seq.get(page_id, 0)
+            if previous is None or changed or removed:
+                seq += 1
+                self._last_availability_seq[page_id] = seq
             self._last_availability[page_id] = snapshot
+            return seq, previous, changed, removed
+
+    def get_published_availability(self, page_id):
+        with self._lock:
+            return (self._last_availability_seq.get(page_id, 0),
+                    self._last_availability.get(page_id))
+
+    def inventory_load(self, page_id, product_id, reservations, ordered):
+        with self._lock:
+            if (page_id, product_id) in self._inventory:
+                return False
+            self._inventory[(page_id, product_id)] = {
+                'reserved': {sid: [qty, exp] for sid, (qty, exp) in reservations.items()},
+                'ordered': int(ordered),
+                'granted': {},
+            }
+            return True
+
+    def inventory_reconcile(self, page_id, product_id, reservations, ordered, ordered_before,
+                            granted_since, now):
+        with self._lock:
+            entry = self._inventory.get((page_id, product_id))
+            if entry is None:
+                return self.inventory_load(page_id, product_id, reservations, ordered)
+            if ordered_before is not None:
+                entry['ordered'] = int(ordered) + entry['ordered'] - ordered_before
+            granted = entry['granted'] = {sid: at for sid, at in entry['granted'].items() if at > granted_since}
+            reserved = {sid: list(value) for sid, value in entry['reserved'].items() if sid in granted}
+            for sid, (qty, exp) in reservations.items():
+                if sid not in granted:
+                    reserved[sid] = [qty, exp]
+            entry['reserved'] = {sid: value for sid, value in reserved.items() if value[1] > now}
+            return True
+
+    def inventory_try_reserve(self, page_id, product_id, session_id, quantity, limit,
+                              expires_at, now):
+        with self._lock:
+            entry = self._inventory.get((page_id, product_id))
+            if entry is None:
+                return INVENTORY_COLD, 0
+            reserved = 0
+            own = 0
+            for sid, (qty, exp) in list(entry['reserved'].items()):
+                if exp <= now:
+                    del entry['reserved'][sid]
+                    continue
+                reserved += qty
+                if sid == session_id:
+                    own = qty
+            available = -1
+            if limit:
+                available = limit - reserved - entry['ordered']
+                if available < quantity:
+                    return INVENTORY_INSUFFICIENT, max(0, available)
+                available -= quantity
+            entry['reserved'][session_id] = [own + quantity, expires_at]
+            entry['granted'][session_id] = now
+            return INVENTORY_OK, available
+
+    def inventory_release(self, page_id, product_id, session_id, quantity):
+        with self._lock:
+            entry = self._inventory.get((page_id, product_id))
+            if entry is None or session_id not in entry['reserved']:
+                return 0
+            qty, exp = entry['reserved'][session_id]
+            left = qty - quantity
+            if left <= 0:
+                del entry['reserved'][session_id]
+                return 0
+            entry['reserved'][session_id] = [left, exp]
+            return left
+
+    def inventory_set_expiry(self, page_id, product_id, session_id, expires_at):
+        with self._lock:
+            entry = self._inventory.get((page_id, product_id))
+            if entry is not None and session_id in entry['reserved']:
+                entry['reserved'][session_id][1] = expires_at
+
+    def inventory_move_session(self, page_id, product_id, old_session_id, new_session_id):
+        with self._lock:
+            entry = self._inventory.get((page_id, product_id))
+            if entry is None or old_session_id not in entry['reserved']:
+                return
+            qty, exp = entry['reserved'].pop(old_session_id)
+            if new_session_id in entry['reserved']:
+                entry['reserved'][new_session_id][0] += qty
+            else:
+                entry['reserved'][new_session_id] = [qty, exp]
+
+    def inventory_commit_order(self, page_id, product_id, session_id, ordered_delta):
+        with self._lock:
+            entry = self._inventory.get((page_id, product_id))
+            if entry is None:
+                return
+            if session_id:
+                entry['reserved'].pop(session_id, None)
+            entry['ordered'] += ordered_delta
+
+    def inventory_get(self, page_id, product_id, now):
+        with self._lock:
+            entry = self._inventory.get((page_id, product_id))
+            if entry is None:
+                return None
+            reserved = sum(qty for qty, exp in entry['reserved'].values() if exp > now)
+            return reserved, entry['ordered']
+
+    def inventory_drop_page(self, page_id, keep=()):
+        keep = {str(product_id) for product_id in keep}
+        with self._lock:
+            for key in [k for k in self._inventory if k[0] == page_id and str(k[1]) not in keep]:
+                del self._inventory[key]
+
+    def availability_get(self, page_id):
+        with self._lock:
+            snap = self._availability.get(page_id)
+            if snap is None:
+                return None
+            return {
+                'version': self._availability_versions.get(page_id, 0),
+                'counts': {pid: tuple(c) for pid, c in snap['counts'].items()},
+                'section_products': dict(snap['section_products']),
+                'built_at': snap['built_at'],
+            }
+
+    def availability_version(self, page_id):
+        with self._lock:
+            return self._availability_versions.get(page_id, 0)
 
-    def get_last_availability(self, page_id):
+    def availability_load(self, page_id, expected_version, counts, section_products, built_at):
         with self._lock:
-            return self._last_availability.get(page_id)
+            if self._availability_versions.get(page_id, 0) != expected_version:
+                return None
+            self._availability[page_id] = {
+                'counts': {pid: list(c) for pid, c in counts.items()},
+                'section_products': dict(section_products),
+                'built_at': built_at,
+            }
+            version = expected_version + 1
+            self._availability_versions[page_id] = version
+            return version
+
+    def availability_apply(self, page_id, deltas):
+        with self._lock:
+            version = self._availability_versions.get(page_id, 0) + 1
+            self._availability_versions[page_id] = version
+            snap = self._availability.get(page_id)
+            if snap is None:
+                return None
+            for pid, (reserved_delta, ordered_delta) in deltas.items():
+                counts = snap['counts'].setdefault(pid, [0, 0])
+                counts[0] = max(0, counts[0] + reserved_delta)
+                counts[1] = max(0, counts[1] + ordered_delta)
+            return version
+
+    def availability_invalidate(self, page_id):
+        with self._lock:
+            self._availability.pop(page_id, None)
+            self._availability_versions[page_id] = self._availability_versions.get(page_id, 0) + 1
+
+    def claim_once(self, key, ttl):
+        now = time.time()
+        with self._lock:
+            if self._claims.get(key, 0) > now:
+                return False
+            self._claims = {k: exp for k, exp in self._claims.items() if exp > now}
+            self._claims[key] = now + ttl
+            return True
+
+    def layout_get(self, page_id):
+        with self._lock:
+            return self._layout_versions.get(page_id, 0), self._layouts.get(page_id)
+
+    def layout_store(self, page_id, expected_version, data):
+        with self._lock:
+            if self._layout_versions.get(page_id, 0) != expected_version:
+                return False
+            self._layouts[page_id] = data
+            return True
+
+    def layout_invalidate(self, page_id):
+        with self._lock:
+            self._layouts.pop(page_id, None)
+            self._layout_versions[page_id] = self._layout_versions.get(page_id, 0) + 1
+
+    def reaper_record(self, deleted, lag_total, lag_max, now):
+        with self._lock:
+            m = self._reaper_metrics
+            m['runs'] += 1
+            m['deleted'] += deleted
+            m['lag_total'] += lag_total
+            m['lag_max'] = max(m['lag_max'], lag_max)
+            m['last_lag_max'] = lag_max
+            m['last_run_at'] = now
+
+    def reaper_metrics_get(self):
+        with self._lock:
+            return dict(self._reaper_metrics)
+
+
+# Lua: atomowe check-and-reserve. Wygasłe wpisy (exp <= now) są usuwane
+# w tym samym przebiegu, więc licznik nie potrzebuje osobnego cleanupu.
+# Zwraca {status, available}; available = -1 gdy brak limitu.
+_LUA_TRY_RESERVE = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+  return {-2, 0}
+end
+local now = tonumber(ARGV[5])
+local reserved = 0
+local own = 0
+local entries = redis.call('HGETALL', KEYS[1])
+for i = 1, #entries, 2 do
+  local qty, exp = string.match(entries[i + 1], '^(%d+):(%d+)$')
+  qty = tonumber(qty)
+  exp = tonumber(exp)
+  if exp <= now then
+    redis.call('HDEL', KEYS[1], entries[i])
+  else
+    reserved = reserved + qty
+    if entries[i] == ARGV[1] then own = qty end
+  end
+end
+local ordered = tonumber(redis.call('GET', KEYS[2]) or '0')
+local limit = tonumber(ARGV[3])
+local quantity = tonumber(ARGV[2])
+local available = -1
+if limit > 0 then
+  available = limit - reserved - ordered
+  if available < quantity then
+    return {-1, math.max(available, 0)}
+  end
+  available = available - quantity
+end
+redis.call('HSET', KEYS[1], ARGV[1], (own + quantity) .. ':' .. ARGV[4])
+redis.call('HSET', KEYS[3], ARGV[1], ARGV[5])
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+redis.call('EXPIRE', KEYS[2], ARGV[6])
+redis.call('EXPIRE', KEYS[3], ARGV[6])
+return {1, available}
+"""
+
+# Lua: zimny start — ładuje liczniki z bazy tylko gdy klucza :ordered nie ma.
+# Inny worker mógł je już załadować i przyznać rezerwacje, których nie ma
+# jeszcze w bazie; nadpisanie zgubiłoby je z licznika (oversell).
+_LUA_INVENTORY_LOAD = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+  return 0
+end
+redis.call('DEL', KEYS[1], KEYS[3])
+for i = 4, #ARGV, 2 do
+  redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[1])
+redis.call('SADD', KEYS[4], ARGV[3])
+redis.call('EXPIRE', KEYS[4], ARGV[1])
+return 1
+"""
+
+# Lua: reconcile z bazą bez gubienia zmian workerów.
+# - :ordered = zamówione w bazie + przyrost licznika od odczytu ARGV[5]
+#   (przed zapytaniem do bazy); '' = licznik był pusty, zostaje bieżący
+#   (załadował go w międzyczasie inny worker).
+# - sesje przyznane w liczniku po ARGV[3] zostają z licznika (ich wiersz
+#   OfferReservation może jeszcze nie być w bazie), pozostałe biorą stan z bazy.
+# Brak :ordered = zimny start, jak _LUA_INVENTORY_LOAD.
+_LUA_INVENTORY_RECONCILE = """
+local now = tonumber(ARGV[4])
+if redis.call('EXISTS', KEYS[2]) == 0 then
+  redis.call('DEL', KEYS[1], KEYS[3])
+  for i = 7, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+  end
+  redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[1])
+else
+  if ARGV[5] ~= '' then
+    local current = tonumber(redis.call('GET', KEYS[2]))
+    redis.call('SET', KEYS[2], tonumber(ARGV[2]) + current - tonumber(ARGV[5]), 'EX', ARGV[1])
+  end
+  local pending = {}
+  local granted = redis.call('HGETALL', KEYS[3])
+  for i = 1, #granted, 2 do
+    if tonumber(granted[i + 1]) > tonumber(ARGV[3]) then
+      pending[granted[i]] = true
+    else
+      redis.call('HDEL', KEYS[3], granted[i])
+    end
+  end
+  local entries = redis.call('HGETALL', KEYS[1])
+  for i = 1, #entries, 2 do
+    if not pending[entries[i]] then
+      redis.call('HDEL', KEYS[1], entries[i])
+    end
+  end
+  for i = 7, #ARGV, 2 do
+    if not pending[ARGV[i]] then
+      redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+  end
+  entries = redis.call('HGETALL', KEYS[1])
+  for i = 1, #entries, 2 do
+    local exp = tonumber(string.match(entries[i + 1], ':(%d+)$'))
+    if exp <= now then
+      redis.call('HDEL', KEYS[1], entries[i])
+    end
+  end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[3], ARGV[1])
+redis.call('SADD', KEYS[4], ARGV[6])
+redis.call('EXPIRE', KEYS[4], ARGV[1])
+return 1
+"""
+
+_LUA_RELEASE = """
+local raw = redis.call('HGET', KEYS[1], ARGV[1])
+if not raw then return 0 end
+local qty, exp = string.match(raw, '^(%d+):(%d+)$')
+local left = tonumber(qty) - tonumber(ARGV[2])
+if left <= 0 then
+  redis.call('HDEL', KEYS[1], ARGV[1])
+  return 0
+end
+redis.call('HSET', KEYS[1], ARGV[1], left .. ':' .. exp)
+return left
+"""
+
+_LUA_SET_EXPIRY = """
+local raw = redis.call('HGET', KEYS[1], ARGV[1])
+if not raw then return 0 end
+local qty = string.match(raw, '^(%d+):')
+redis.call('HSET', KEYS[1], ARGV[1], qty .. ':' .. ARGV[2])
+return 1
+"""
+
+_LUA_MOVE_SESSION = """
+local raw = redis.call('HGET', KEYS[1], ARGV[1])
+if not raw then return 0 end
+local qty, exp = string.match(raw, '^(%d+):(%d+)$')
+redis.call('HDEL', KEYS[1], ARGV[1])
+local other = redis.call('HGET', KEYS[1], ARGV[2])
+if other then
+  local oqty, oexp = string.match(other, '^(%d+):(%d+)$')
+  redis.call('HSET', KEYS[1], ARGV[2], (tonumber(oqty) + tonumber(qty)) .. ':' .. oexp)
+else
+  redis.call('HSET', KEYS[1], ARGV[2], qty .. ':' .. exp)
+end
+return 1
+"""
+
+# Lua: zapis przebudowanego snapshotu tylko gdy nikt w międzyczasie nie
+# zmienił wersji (optymistyczna kontrola — inaczej rebuild jest powtarzany).
+_LUA_AVAILABILITY_LOAD = """
+local current = tonumber(redis.call('GET', KEYS[2]) or '0')
+if current ~= tonumber(ARGV[1]) then
+  return -1
+end
+redis.call('DEL', KEYS[1])
+for i = 3, #ARGV, 2 do
+  redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+local version = redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return version
+"""
+
+# Lua: delta do snapshotu. Wersja rośnie zawsze (także bez snapshotu),
+# żeby równoległy rebuild wykrył zmianę i się powtórzył.
+_LUA_AVAILABILITY_APPLY = """
+local version = redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+if redis.call('EXISTS', KEYS[1]) == 0 then
+  return -1
+end
+for i = 2, #ARGV, 2 do
+  local value = redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+  if value < 0 then
+    redis.call('HSET', KEYS[1], ARGV[i], 0)
+  end
+end
+return version
+"""
+
+# Lua: publikacja dostępności — porównanie z ostatnio rozesłaną, zapis nowej
+# i numer sekwencyjny w jednym kroku (diff liczony raz na zmianę, cross-worker).
+# Seq rośnie tylko gdy coś się zmieniło (albo nie było poprzedniej wersji).
+# Zwraca {seq, poprzedni json | false, changed json, removed json}.
+_LUA_PUBLISH_AVAILABILITY = """
+local raw = redis.call('GET', KEYS[1])
+local new = cjson.decode(ARGV[1])
+local changed, removed = {}, {}
+local function same(a, b)
+  for k, v in pairs(a) do if b[k] ~= v then return false end end
+  for k, v in pairs(b) do if a[k] ~= v then return false end end
+  return true
+end
+if raw then
+  local old = cjson.decode(raw)
+  for pid, entry in pairs(new) do
+    if old[pid] == nil or not same(old[pid], entry) then changed[#changed + 1] = pid end
+  end
+  for pid, _ in pairs(old) do
+    if new[pid] == nil then removed[#removed + 1] = pid end
+  end
+end
+local seq
+if not raw or #changed > 0 or #removed > 0 then
+  seq = redis.call('INCR', KEYS[2])
+else
+  seq = tonumber(redis.call('GET', KEYS[2]) or '0')
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return {seq, raw or false, cjson.encode(changed), cjson.encode(removed)}
+"""
+
+# Lua: zapis układu strony tylko gdy wersja się nie zmieniła w trakcie budowania
+# (invalidate z panelu admina w tym czasie → zbudowany układ jest nieaktualny).
+_LUA_LAYOUT_STORE = """
+local current = tonumber(redis.call('GET', KEYS[2]) or '0')
+if current ~= tonumber(ARGV[1]) then
+  return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+redis.call('SET', KEYS[2], current, 'EX', ARGV[3])
+return 1
+"""
+
+# Lua: przebieg reapera — liczniki + maksimum lagu atomowo (kilka workerów naraz)
+_LUA_REAPER_RECORD = """
+redis.call('HINCRBY', KEYS[1], 'runs', 1)
+redis.call('HINCRBY', KEYS[1], 'deleted', ARGV[1])
+redis.call('HINCRBYFLOAT', KEYS[1], 'lag_total', ARGV[2])
+if tonumber(redis.call('HGET', KEYS[1], 'lag_max') or '0') < tonumber(ARGV[3]) then
+  redis.call('HSET', KEYS[1], 'lag_max', ARGV[3])
+end
+redis.call('HSET', KEYS[1], 'last_lag_max', ARGV[3], 'last_run_at', ARGV[4])
+return 1
+"""
+
+_LUA_COMMIT_ORDER = """
+if redis.call('EXISTS', KEYS[2]) == 0 then return 0 end
+if ARGV[1] ~= '' then
+  redis.call('HDEL', KEYS[1], ARGV[1])
+end
+redis.call('INCRBY', KEYS[2], ARGV[2])
+return 1
+"""
 
 
 class RedisBackend(OffersStateBackend):
@@ -158,6 +697,18 @@ class RedisBackend(OffersStateBackend):
 
     def __init__(self, redis_client):
         self.r = redis_client
+        self._try_reserve = redis_client.register_script(_LUA_TRY_RESERVE)
+        self._inventory_load = redis_client.register_script(_LUA_INVENTORY_LOAD)
+        self._inventory_reconcile = redis_client.register_script(_LUA_INVENTORY_RECONCILE)
+        self._release = redis_client.register_script(_LUA_RELEASE)
+        self._set_expiry = redis_client.register_script(_LUA_SET_EXPIRY)
+        self._move_session = redis_client.register_script(_LUA_MOVE_SESSION)
+        self._commit_order = redis_client.register_script(_LUA_COMMIT_ORDER)
+        self._availability_load = redis_client.register_script(_LUA_AVAILABILITY_LOAD)
+        self._availability_apply = redis_client.register_script(_LUA_AVAILABILITY_APPLY)
+        self._publish_availability = redis_client.register_script(_LUA_PUBLISH_AVAILABILITY)
+        self._layout_store = redis_client.register_script(_LUA_LAYOUT_STORE)
+        self._reaper_record = redis_client.register_script(_LUA_REAPER_RECORD)
 
     def _refresh_ttl(self, key):
         # Best-effort — TTL refresh nie jest krytyczny
@@ -249,12 +800,198 @@ class RedisBackend(OffersStateBackend):
         self.r.delete(f"user_session:{page_id}:{user_id}")
 
     # Last availability
-    def set_last_availability(self, page_id, snapshot):
-        self.r.setex(f"last_availability:{page_id}", _DEFAULT_TTL, json.dumps(snapshot))
+    def publish_availability(self, page_id, snapshot):
+        seq, previous, changed, removed = self._publish_availability(
+            keys=[f"last_availability:{page_id}", f"last_availability_seq:{page_id}"],
+            args=[json.dumps(snapshot), _DEFAULT_TTL],
+        )
+        # cjson koduje pustą tablicę jako {} — normalizujemy do listy
+        return (int(seq), json.loads(previous) if previous else None,
+                list(json.loads(changed) or []), list(json.loads(removed) or []))
+
+    def get_published_availability(self, page_id):
+        seq, raw = self.r.mget(f"last_availability_seq:{page_id}", f"last_availability:{page_id}")
+        return int(seq or 0), json.loads(raw) if raw else None
+
+    # Inventory counters
+    @staticmethod
+    def _inventory_keys(page_id, product_id):
+        base = f"inventory:{page_id}:{product_id}"
+        return [f"{base}:reserved", f"{base}:ordered", f"{base}:granted"]
+
+    @staticmethod
+    def _reservation_args(reservations):
+        args = []
+        for sid, (qty, exp) in reservations.items():
+            args.extend([sid, f"{qty}:{exp}"])
+        return args
+
+    def inventory_load(self, page_id, product_id, reservations, ordered):
+        keys = self._inventory_keys(page_id, product_id) + [f"inventory:{page_id}:products"]
+        return bool(self._inventory_load(
+            keys=keys,
+            args=[_DEFAULT_TTL, int(ordered), product_id] + self._reservation_args(reservations),
+        ))
+
+    def inventory_reconcile(self, page_id, product_id, reservations, ordered, ordered_before,
+                            granted_since, now):
+        keys = self._inventory_keys(page_id, product_id) + [f"inventory:{page_id}:products"]
+        return bool(self._inventory_reconcile(
+            keys=keys,
+            args=[_DEFAULT_TTL, int(ordered), int(granted_since), int(now),
+                  '' if ordered_before is None else int(ordered_before), product_id]
+                 + self._reservation_args(reservations),
+        ))
+
+    def inventory_try_reserve(self, page_id, product_id, session_id, quantity, limit,
+                              expires_at, now):
+        status, available = self._try_reserve(
+            keys=self._inventory_keys(page_id, product_id),
+            args=[session_id, int(quantity), int(limit or 0), int(expires_at), int(now), _DEFAULT_TTL],
+        )
+        return int(status), int(available)
+
+    def inventory_release(self, page_id, product_id, session_id, quantity):
+        return int(self._release(keys=self._inventory_keys(page_id, product_id),
+                                 args=[session_id, int(quantity)]))
+
+    def inventory_set_expiry(self, page_id, product_id, session_id, expires_at):
+        self._set_expiry(keys=self._inventory_keys(page_id, product_id),
+                         args=[session_id, int(expires_at)])
+
+    def inventory_move_session(self, page_id, product_id, old_session_id, new_session_id):
+        self._move_session(keys=self._inventory_keys(page_id, product_id),
+                           args=[old_session_id, new_session_id])
+
+    def inventory_commit_order(self, page_id, product_id, session_id, ordered_delta):
+        self._commit_order(keys=self._inventory_keys(page_id, product_id),
+                           args=[session_id or '', int(ordered_delta)])
+
+    def inventory_get(self, page_id, product_id, now):
+        reserved_key, ordered_key, _granted_key = self._inventory_keys(page_id, product_id)
+        pipe = self.r.pipeline(transaction=False)
+        pipe.get(ordered_key)
+        pipe.hvals(reserved_key)
+        ordered, entries = pipe.execute()
+        if ordered is None:
+            return None
+        reserved = 0
+        for raw in entries:
+            qty, exp = raw.split(':')
+            if int(exp) > now:
+                reserved += int(qty)
+        return reserved, int(ordered)
+
+    def inventory_drop_page(self, page_id, keep=()):
+        products_key = f"inventory:{page_id}:products"
+        keep = {str(product_id) for product_id in keep}
+        dropped = [product_id for product_id in self.r.smembers(products_key) if product_id not in keep]
+        keys = [key for product_id in dropped for key in self._inventory_keys(page_id, product_id)]
+        if not keep:
+            keys.append(products_key)
+        elif dropped:
+            self.r.srem(products_key, *dropped)
+        if keys:
+            self.r.delete(*keys)
+
+    # Availability snapshot
+    @staticmethod
+    def _availability_keys(page_id):
+        return [f"availability:{page_id}", f"availability_version:{page_id}"]
+
+    def availability_get(self, page_id):
+        snap_key, version_key = self._availability_keys(page_id)
+        pipe = self.r.pipeline(transaction=True)
+        pipe.hgetall(snap_key)
+        pipe.get(version_key)
+        raw, version = pipe.execute()
+        if not raw:
+            return None
+        counts = {}
+        section_products = {}
+        for field, value in raw.items():
+            kind, _, pid = field.partition(':')
+            if kind == 'm':
+                section_products[int(pid)] = int(value) if value != '' else None
+            elif kind in ('r', 'o'):
+                reserved, ordered = counts.get(int(pid), (0, 0))
+                if kind == 'r':
+                    counts[int(pid)] = (int(value), ordered)
+                else:
+                    counts[int(pid)] = (reserved, int(value))
+        return {
+            'version': int(version or 0),
+            'counts': counts,
+            'section_products': section_products,
+            'built_at': int(raw.get('built_at', 0)),
+        }
 
-    def get_last_availability(self, page_id):
-        raw = self.r.get(f"last_availability:{page_id}")
-        return json.loads(raw) if raw else None
+    def availability_version(self, page_id):
+        return int(self.r.get(f"availability_version:{page_id}") or 0)
+
+    def availability_load(self, page_id, expected_version, counts, section_products, built_at):
+        args = [int(expected_version), _DEFAULT_TTL, 'built_at', int(built_at)]
+        for pid, section_max in section_products.items():
+            reserved, ordered = counts.get(pid, (0, 0))
+            args.extend([f"r:{pid}", int(reserved), f"o:{pid}", int(ordered),
+                         f"m:{pid}", '' if section_max is None else int(section_max)])
+        version = int(self._availability_load(keys=self._availability_keys(page_id), args=args))
+        return version if version >= 0 else None
+
+    def availability_apply(self, page_id, deltas):
+        args = [_DEFAULT_TTL]
+        for pid, (reserved_delta, ordered_delta) in deltas.items():
+            if reserved_delta:
+                args.extend([f"r:{pid}", int(reserved_delta)])
+            if ordered_delta:
+                args.extend([f"o:{pid}", int(ordered_delta)])
+        version = int(self._availability_apply(keys=self._availability_keys(page_id), args=args))
+        return version if version >= 0 else None
+
+    def availability_invalidate(self, page_id):
+        pipe = self.r.pipeline(transaction=True)
+        pipe.delete(f"availability:{page_id}")
+        pipe.incr(f"availability_version:{page_id}")
+        pipe.expire(f"availability_version:{page_id}", _DEFAULT_TTL)
+        pipe.execute()
+
+    def claim_once(self, key, ttl):
+        return bool(self.r.set(f"claim:{key}", 1, nx=True, ex=ttl))
+
+    # Layout
+    def layout_get(self, page_id):
+        version, raw = self.r.mget(f"layout_version:{page_id}", f"layout:{page_id}")
+        return int(version or 0), json.loads(raw) if raw else None
+
+    def layout_store(self, page_id, expected_version, data):
+        return bool(self._layout_store(
+            keys=[f"layout:{page_id}", f"layout_version:{page_id}"],
+            args=[int(expected_version), json.dumps(data), _DEFAULT_TTL],
+        ))
+
+    def layout_invalidate(self, page_id):
+        pipe = self.r.pipeline(transaction=True)
+        pipe.delete(f"layout:{page_id}")
+        pipe.incr(f"layout_version:{page_id}")
+        pipe.expire(f"layout_version:{page_id}", _DEFAULT_TTL)
+        pipe.execute()
+
+    # Metryki reapera
+    def reaper_record(self, deleted, lag_total, lag_max, now):
+        self._reaper_record(keys=['reaper_metrics'], args=[int(deleted), float(lag_total), int(lag_max), int(now)])
+
+    def reaper_metrics_get(self):
+        raw = self.r.hgetall('reaper_metrics')
+        if not raw:
+            return dict(_REAPER_METRICS_EMPTY)
+        return {
+            'runs': int(raw.get('runs', 0)),
+            'deleted': int(raw.get('deleted', 0)),
+            'lag_total': float(raw.get('lag_total', 0)),
+            'lag_max': int(raw.get('lag_max', 0)),
+            'last_lag_max': int(raw.get('last_lag_max', 0)),
+            'last_run_at': int(raw['last_run_at']) if raw.get('last_run_at') else None,
+        }
 
 
 # Singleton state — inicjalizowane przez init_state() przy starcie aplikacji
@@ -5,7 +5,7 @@ Logika systemu rezerwacji produktów na stronach ofertowych
 
 import time
 from flask import request
-from sqlalchemy import func
+from sqlalchemy import func, or_
 from .models import OfferReservation
 from modules.products.models import Product
 from extensions import db
@@ -15,42 +15,6 @@ RESERVATION_DURATION = 120  # 2 minuty w sekundach
 EXTENSION_DURATION = 60     # 1 minuta w sekundach
 
 
-def cleanup_expired_reservations(page_id, auto_commit=True):
-    """
-    Lazy cleanup - usuwa wygasłe rezerwacje dla danej strony ofertowej
-
-    Args:
-        page_id: ID strony ofertowej
-        auto_commit: Czy commitować od razu (False gdy wywołane wewnątrz większej transakcji)
-
-    Returns:
-        int: Liczba usuniętych rezerwacji
-    """
-    import logging
-    logger = logging.getLogger(__name__)
-
-    for attempt in range(3):
-        try:
-            now = int(time.time())
-            deleted = OfferReservation.query.filter(
-                OfferReservation.offer_page_id == page_id,
-                OfferReservation.expires_at < now
-            ).delete()
-            if auto_commit:
-                db.session.commit()
-            else:
-                db.session.flush()
-            return deleted
-        except Exception as e:
-            db.session.rollback()
-            if 'Deadlock' in str(e) and attempt < 2:
-                logger.warning(f"Deadlock on cleanup attempt {attempt + 1}, retrying...")
-                time.sleep(0.1 * (attempt + 1))
-                continue
-            raise
-    return 0
-
-
 def get_first_reservation_time(session_id, page_id):
     """
     Pobiera czas pierwszej rezerwacji sesji (dla timera)
@@ -62,15 +26,16 @@ def get_first_reservation_time(session_id, page_id):
     Returns:
         int: UNIX timestamp pierwszej rezerwacji lub None
     """
-    reservation = OfferReservation.query.filter_by(
-        session_id=session_id,
-        offer_page_id=page_id
+    reservation = OfferReservation.query.filter(
+        OfferReservation.session_id == session_id,
+        OfferReservation.offer_page_id == page_id,
+        OfferReservation.expires_at > int(time.time())
     ).order_by(OfferReservation.reserved_at).first()
 
     return reservation.reserved_at if reservation else None
 
 
-def get_available_quantity(page_id, product_id, section_max=None, auto_commit=True):
+def get_available_quantity(page_id, product_id, section_max=None):
     """
     Oblicza dostępną ilość produktu (rezerwacje + już złożone zamówienia)
 
@@ -78,16 +43,12 @@ def get_available_quantity(page_id, product_id, section_max=None, auto_commit=Tr
         page_id: ID strony ofertowej
         product_id: ID produktu
         section_max: max_quantity z sekcji ofertowej (może być None dla unlimited)
-        auto_commit: Czy cleanup ma commitować (False w transakcji)
 
     Returns:
         int: Dostępna ilość (może być float('inf') dla unlimited)
     """
     from modules.orders.models import Order, OrderItem
 
-    # Usuń wygasłe rezerwacje
-    cleanup_expired_reservations(page_id, auto_commit=auto_commit)
-
     now = int(time.time())
 
     # Suma zarezerwowanych (aktywnych)
@@ -127,12 +88,13 @@ def get_user_reservation(session_id, page_id, product_id):
         product_id: ID produktu
 
     Returns:
-        OfferReservation: Obiekt rezerwacji lub None
+        OfferReservation: Aktywna rezerwacja lub None (wygasłe czeka na reaper)
     """
-    return OfferReservation.query.filter_by(
-        session_id=session_id,
-        offer_page_id=page_id,
-        product_id=product_id
+    return OfferReservation.query.filter(
+        OfferReservation.session_id == session_id,
+        OfferReservation.offer_page_id == page_id,
+        OfferReservation.product_id == product_id,
+        OfferReservation.expires_at > int(time.time())
     ).first()
 
 
@@ -160,6 +122,13 @@ def reserve_product(session_id, page_id, product_id, quantity, section_max=None,
     import logging
     logger = logging.getLogger(__name__)
 
+    from . import inventory
+    if inventory.is_enabled():
+        return _reserve_product_counters(
+            session_id, page_id, product_id, quantity,
+            section_max=section_max, user_id=user_id, selected_size=selected_size
+        )
+
     for attempt in range(3):
         result = _reserve_product_attempt(
             session_id, page_id, product_id, quantity,
@@ -188,10 +157,8 @@ def _reserve_product_attempt(session_id, page_id, product_id, quantity, section_
     try:
         now = int(time.time())
 
-        # --- JEDNA TRANSAKCJA: cleanup + check + reserve ---
-
-        # 1. Cleanup expired (bez commit - flush only)
-        cleanup_expired_reservations(page_id, auto_commit=False)
+        # --- JEDNA TRANSAKCJA: check + reserve ---
+        # Wygasłych wierszy nie usuwamy (to robi reaper w expiry.py) — filtrujemy po expires_at
 
         # 2. Lockuj aktywne rezerwacje dla tego produktu (SELECT FOR UPDATE)
         #    Inne requesty czekają aż ta transakcja się zakończy
@@ -224,6 +191,14 @@ def _reserve_product_attempt(session_id, page_id, product_id, quantity, section_
             if r.session_id == session_id:
                 user_reservation = r
                 break
+        if user_reservation is None:
+            # Wygasły wiersz sesji (jeszcze nieusunięty przez reaper) — unique constraint
+            # nie pozwoli dodać drugiego, więc zostanie nadpisany w kroku 6
+            user_reservation = OfferReservation.query.filter_by(
+                session_id=session_id,
+                offer_page_id=page_id,
+                product_id=product_id
+            ).with_for_update().first()
 
         if available < quantity:
             # Niewystarczająca dostępność - rollback locka
@@ -247,10 +222,11 @@ def _reserve_product_attempt(session_id, page_id, product_id, quantity, section_
         if not first_reserved_at:
             first_reserved_at = int(time.time())
 
-        extended_reservation = OfferReservation.query.filter_by(
-            session_id=session_id,
-            offer_page_id=page_id,
-            extended=True
+        extended_reservation = OfferReservation.query.filter(
+            OfferReservation.session_id == session_id,
+            OfferReservation.offer_page_id == page_id,
+            OfferReservation.extended == True,
+            OfferReservation.expires_at > now
         ).first()
 
         if extended_reservation:
@@ -259,7 +235,17 @@ def _reserve_product_attempt(session_id, page_id, product_id, quantity, section_
             expires_at = first_reserved_at + RESERVATION_DURATION
 
         # 6. UPSERT rezerwacji
-        if user_reservation:
+        reset_expired_row = False
+        if user_reservation and user_reservation.expires_at <= now:
+            # Wygasły wiersz — zaczynamy od zera zamiast doliczać do starej ilości
+            reset_expired_row = True
+            user_reservation.quantity = quantity
+            user_reservation.reserved_at = first_reserved_at
+            user_reservation.extended = False
+            user_reservation.expires_at = expires_at
+            if selected_size:
+                user_reservation.selected_size = selected_size
+        elif user_reservation:
             user_reservation.quantity += quantity
             user_reservation.expires_at = expires_at
             if selected_size:
@@ -290,6 +276,13 @@ def _reserve_product_attempt(session_id, page_id, product_id, quantity, section_
         # 7. COMMIT - koniec transakcji, zwolnienie locków
         db.session.commit()
 
+        from . import availability
+        if reset_expired_row:
+            # Snapshot mógł jeszcze liczyć wygasłą ilość — delta byłaby błędna
+            availability.invalidate(page_id)
+        else:
+            availability.apply_delta(page_id, {product_id: (quantity, 0)})
+
         remaining_available = available - quantity
         if remaining_available == float('inf'):
             remaining_available = 999999
@@ -322,6 +315,492 @@ def _reserve_product_attempt(session_id, page_id, product_id, quantity, section_
         }
 
 
+def _reserve_product_counters(session_id, page_id, product_id, quantity, section_max=None, user_id=None, selected_size=None):
+    """
+    Rezerwacja przez liczniki (inventory.py) — bez cleanup DELETE i bez SELECT FOR UPDATE.
+
+    Kolejność: odczyt czasu wygaśnięcia sesji (zwykłe SELECT-y) → atomowy
+    check-and-reserve w liczniku → zapis wiersza OfferReservation. Gdy zapis
+    do bazy się nie uda, rezerwacja w liczniku jest wycofywana.
+    """
+    from . import inventory
+
+    now = int(time.time())
+
+    # 1. Czas wygaśnięcia sesji — tylko aktywne wiersze (wygasłe czyści reaper/lazy cleanup)
+    session_reservations = OfferReservation.query.filter(
+        OfferReservation.session_id == session_id,
+        OfferReservation.offer_page_id == page_id,
+        OfferReservation.expires_at > now
+    ).all()
+
+    first_reserved_at = min((r.reserved_at for r in session_reservations), default=now)
+    extended_reservation = next((r for r in session_reservations if r.extended), None)
+    if extended_reservation:
+        expires_at = extended_reservation.expires_at
+    else:
+        expires_at = first_reserved_at + RESERVATION_DURATION
+
+    # 2. Atomowy check-and-reserve
+    ok, available = inventory.try_reserve(
+        page_id, product_id, session_id, quantity, section_max, expires_at
+    )
+    if not ok:
+        earliest_expiry = db.session.query(
+            func.min(OfferReservation.expires_at)
+        ).filter(
+            OfferReservation.offer_page_id == page_id,
+            OfferReservation.product_id == product_id,
+            OfferReservation.session_id != session_id,
+            OfferReservation.expires_at > now
+        ).scalar()
+        return False, {
+            'error': 'insufficient_availability',
+            'message': 'Ktoś właśnie zarezerwował lub zakupił ten produkt.',
+            'available_quantity': int(available) if available != float('inf') else 999999,
+            'check_back_at': earliest_expiry
+        }
+
+    # 3. Zapis do MySQL (miejsce jest już przydzielone w liczniku)
+    try:
+        user_reservation = OfferReservation.query.filter_by(
+            session_id=session_id,
+            offer_page_id=page_id,
+            product_id=product_id
+        ).first()
+
+        reset_expired_row = False
+        if user_reservation:
+            # Wygasły wiersz (jeszcze nieusunięty) — licznik już go pominął, więc
+            # zaczynamy od zera zamiast doliczać do starej ilości.
+            if user_reservation.expires_at <= now:
+                reset_expired_row = True
+                user_reservation.quantity = quantity
+                user_reservation.reserved_at = first_reserved_at
+                user_reservation.extended = False
+            else:
+                user_reservation.quantity += quantity
+            user_reservation.expires_at = expires_at
+            if selected_size:
+                user_reservation.selected_size = selected_size
+        else:
+            try:
+                ip_addr = request.remote_addr or ''
+                user_agent = request.headers.get('User-Agent', '')
+            except (RuntimeError, AttributeError):
+                ip_addr = ''
+                user_agent = ''
+
+            user_reservation = OfferReservation(
+                session_id=session_id,
+                offer_page_id=page_id,
+                product_id=product_id,
+                quantity=quantity,
+                reserved_at=first_reserved_at,
+                expires_at=expires_at,
+                user_id=user_id,
+                ip_address=ip_addr,
+                user_agent=user_agent,
+                selected_size=selected_size
+            )
+            db.session.add(user_reservation)
+
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        inventory.release(page_id, product_id, session_id, quantity)
+        import logging
+        logging.getLogger(__name__).error(
+            f"Reservation write failed (page={page_id}, product={product_id}): {e}"
+        )
+        return False, {
+            'error': 'server_error',
+            'message': 'Wystąpił błąd serwera. Spróbuj ponownie.'
+        }
+
+    from . import availability
+    if reset_expired_row:
+        availability.invalidate(page_id)
+    else:
+        availability.apply_delta(page_id, {product_id: (quantity, 0)})
+
+    return True, {
+        'reservation': {
+            'session_id': session_id,
+            'product_id': product_id,
+            'quantity': user_reservation.quantity,
+            'reserved_at': user_reservation.reserved_at,
+            'expires_at': user_reservation.expires_at,
+            'first_reservation_at': first_reserved_at
+        },
+        'available_quantity': int(available) if available != float('inf') else 999999
+    }
+
+
+# Maks. liczba pozycji w jednym reserve_products (set ma kilka-kilkanaście członków)
+MAX_BATCH_ITEMS = 50
+
+
+def _normalize_batch_items(items):
+    """
+    Scala pozycje batcha po product_id i sortuje rosnąco (kolejność locków).
+
+    Args:
+        items: [{'product_id', 'quantity', 'selected_size'?}, ...]
+
+    Returns:
+        list: [(product_id, quantity, selected_size)] posortowane po product_id
+
+    Raises:
+        ValueError: nieprawidłowa pozycja lub za dużo pozycji
+    """
+    if not isinstance(items, list) or not items:
+        raise ValueError('items must be a non-empty list')
+    if len(items) > MAX_BATCH_ITEMS:
+        raise ValueError(f'too many items (max {MAX_BATCH_ITEMS})')
+
+    merged = {}
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError('invalid item')
+        try:
+            product_id = int(item.get('product_id'))
+            quantity = int(item.get('quantity', 1))
+        except (TypeError, ValueError):
+            raise ValueError('invalid product_id or quantity')
+        if quantity < 1:
+            raise ValueError('quantity must be >= 1')
+        _, total, size = merged.get(product_id, (product_id, 0, None))
+        merged[product_id] = (product_id, total + quantity, item.get('selected_size') or size)
+    return [merged[pid] for pid in sorted(merged)]
+
+
+def reserve_products(session_id, page_id, items, user_id=None):
+    """
+    Rezerwuje kilka produktów naraz (np. wszystkich członków setu).
+
+    Jedna transakcja: jeden SELECT FOR UPDATE na rezerwacjach wszystkich
+    produktów (ORDER BY product_id — ta sama kolejność locków co w
+    check_product_availability), jedno zapytanie o zamówione ilości,
+    jeden COMMIT. Limity z układu strony (layout). Wynik per pozycja —
+    brak miejsca na jeden produkt nie blokuje pozostałych.
+
+    Args:
+        session_id: UUID sesji
+        page_id: ID strony ofertowej
+        items: [{'product_id', 'quantity', 'selected_size'?}, ...]
+
+    Returns:
+        tuple: (success: bool, data: dict)
+            success=True gdy batch został przetworzony (nawet jeśli część pozycji
+            się nie udała); data = {'results': [...], 'reserved_count',
+            'expires_at', 'first_reservation_at'}
+    """
+    import logging
+    logger = logging.getLogger(__name__)
+
+    try:
+        items = _normalize_batch_items(items)
+    except ValueError as e:
+        return False, {'error': 'invalid_items', 'message': str(e)}
+
+    from . import inventory
+    if inventory.is_enabled():
+        return _reserve_products_counters(session_id, page_id, items, user_id=user_id)
+
+    for attempt in range(3):
+        result = _reserve_products_attempt(session_id, page_id, items, user_id=user_id)
+        if result is not None:
+            return result
+
+        logger.warning(f"Deadlock on batch reserve attempt {attempt + 1}/3, page={page_id}")
+        time.sleep(0.1 * (attempt + 1))
+
+    return False, {
+        'error': 'server_error',
+        'message': 'Serwer jest chwilowo przeciążony. Spróbuj ponownie za chwilę.'
+    }
+
+
+def _batch_session_expiry(session_id, page_id, now):
+    """(first_reserved_at, expires_at) sesji — jak w pojedynczej rezerwacji."""
+    session_reservations = OfferReservation.query.filter(
+        OfferReservation.session_id == session_id,
+        OfferReservation.offer_page_id == page_id,
+        OfferReservation.expires_at > now
+    ).all()
+    first_reserved_at = min((r.reserved_at for r in session_reservations), default=now)
+    extended_reservation = next((r for r in session_reservations if r.extended), None)
+    if extended_reservation:
+        return first_reserved_at, extended_reservation.expires_at
+    return first_reserved_at, first_reserved_at + RESERVATION_DURATION
+
+
+def _request_client_info():
+    """IP i User-Agent requestu (SocketIO może nie mieć tych danych)."""
+    try:
+        return request.remote_addr or '', request.headers.get('User-Agent', '')
+    except (RuntimeError, AttributeError):
+        return '', ''
+
+
+def _upsert_batch_reservation(row, session_id, page_id, product_id, quantity, selected_size,
+                              first_reserved_at, expires_at, user_id, now, client_info):
+    """
+    Zapisuje rezerwację pozycji batcha.
+
+    Returns:
+        tuple: (OfferReservation, reset_expired_row: bool)
+    """
+    if row is not None and row.expires_at <= now:
+        # Wygasły wiersz (jeszcze nieusunięty przez reaper) — od zera
+        row.quantity = quantity
+        row.reserved_at = first_reserved_at
+        row.extended = False
+        row.expires_at = expires_at
+        if selected_size:
+            row.selected_size = selected_size
+        return row, True
+    if row is not None:
+        row.quantity += quantity
+        row.expires_at = expires_at
+        if selected_size:
+            row.selected_size = selected_size
+        return row, False
+
+    ip_addr, user_agent = client_info
+    row = OfferReservation(
+        session_id=session_id,
+        offer_page_id=page_id,
+        product_id=product_id,
+        quantity=quantity,
+        reserved_at=first_reserved_at,
+        expires_at=expires_at,
+        user_id=user_id,
+        ip_address=ip_addr,
+        user_agent=user_agent,
+        selected_size=selected_size
+    )
+    db.session.add(row)
+    return row, False
+
+
+def _batch_item_ok(product_id, row, first_reserved_at, available):
+    return {
+        'product_id': product_id,
+        'success': True,
+        'reservation': {
+            'session_id': row.session_id,
+            'product_id': product_id,
+            'quantity': row.quantity,
+            'reserved_at': row.reserved_at,
+            'expires_at': row.expires_at,
+            'first_reservation_at': first_reserved_at
+        },
+        'available_quantity': int(available) if available != float('inf') else 999999
+    }
+
+
+def _batch_item_unavailable(product_id, available, check_back_at):
+    return {
+        'product_id': product_id,
+        'success': False,
+        'error': 'insufficient_availability',
+        'message': 'Ktoś właśnie zarezerwował lub zakupił ten produkt.',
+        'available_quantity': int(available) if available != float('inf') else 999999,
+        'check_back_at': check_back_at
+    }
+
+
+def _batch_item_not_offered(product_id):
+    return {
+        'product_id': product_id,
+        'success': False,
+        'error': 'product_not_found',
+        'message': 'Produkt nie jest dostępny na tej stronie.'
+    }
+
+
+def _reserve_products_attempt(session_id, page_id, items, user_id=None):
+    """Pojedyncza próba batcha. Zwraca None przy deadlocku (sygnał do retry)."""
+    from modules.orders.models import Order, OrderItem
+    from .layout import get_layout
+
+    try:
+        now = int(time.time())
+        layout = get_layout(page_id)
+        product_ids = [pid for pid, _, _ in items]
+
+        # 1. Lock: aktywne rezerwacje produktów + wiersze tej sesji (także wygasłe,
+        #    unique constraint) — jedno zapytanie, locki w kolejności product_id
+        locked = OfferReservation.query.filter(
+            OfferReservation.offer_page_id == page_id,
+            OfferReservation.product_id.in_(product_ids),
+            or_(OfferReservation.expires_at > now, OfferReservation.session_id == session_id)
+        ).order_by(OfferReservation.product_id, OfferReservation.id).with_for_update().all()
+
+        reserved = {}
+        own_rows = {}
+        others_expiry = {}
+        for r in locked:
+            if r.expires_at > now:
+                reserved[r.product_id] = reserved.get(r.product_id, 0) + r.quantity
+                if r.session_id != session_id:
+                    others_expiry[r.product_id] = min(others_expiry.get(r.product_id, r.expires_at), r.expires_at)
+            if r.session_id == session_id:
+                own_rows[r.product_id] = r
+
+        # 2. Zamówione ilości — jedno GROUP BY
+        ordered = dict(db.session.query(
+            OrderItem.product_id,
+            func.sum(OrderItem.quantity)
+        ).join(Order).filter(
+            Order.offer_page_id == page_id,
+            Order.status != 'anulowane',
+            OrderItem.product_id.in_(product_ids)
+        ).group_by(OrderItem.product_id).all())
+
+        first_reserved_at, expires_at = _batch_session_expiry(session_id, page_id, now)
+        client_info = _request_client_info()
+
+        # 3. Pozycje po kolei (już posortowane)
+        results = []
+        deltas = {}
+        reset_expired_row = False
+        for product_id, quantity, selected_size in items:
+            if product_id not in layout.products:
+                results.append(_batch_item_not_offered(product_id))
+                continue
+
+            section_max = layout.section_max(product_id)
+            if section_max is not None and section_max > 0:
+                available = max(0, section_max - reserved.get(product_id, 0) - int(ordered.get(product_id) or 0))
+            else:
+                available = float('inf')
+
+            if available < quantity:
+                results.append(_batch_item_unavailable(product_id, available, others_expiry.get(product_id)))
+                continue
+
+            row, reset = _upsert_batch_reservation(
+                own_rows.get(product_id), session_id, page_id, product_id, quantity, selected_size,
+                first_reserved_at, expires_at, user_id, now, client_info
+            )
+            reset_expired_row = reset_expired_row or reset
+            deltas[product_id] = (quantity, 0)
+            results.append(_batch_item_ok(product_id, row, first_reserved_at, available - quantity))
+
+        if not deltas:
+            db.session.rollback()
+        else:
+            # 4. COMMIT — jeden na cały batch
+            db.session.commit()
+
+            from . import availability
+            if reset_expired_row:
+                availability.invalidate(page_id)
+            else:
+                availability.apply_delta(page_id, deltas)
+
+        return True, {
+            'results': results,
+            'reserved_count': len(deltas),
+            'expires_at': expires_at if deltas else None,
+            'first_reservation_at': first_reserved_at
+        }
+
+    except Exception as e:
+        db.session.rollback()
+
+        if 'Deadlock' in str(e) or 'deadlock' in str(e).lower():
+            return None
+
+        import traceback
+        print(f"[RESERVE BATCH ERROR] {e}")
+        traceback.print_exc()
+        return False, {
+            'error': 'server_error',
+            'message': 'Wystąpił błąd serwera. Spróbuj ponownie.'
+        }
+
+
+def _reserve_products_counters(session_id, page_id, items, user_id=None):
+    """
+    Batch przez liczniki (inventory.py): check-and-reserve w liczniku per pozycja
+    (rosnąco po product_id), potem jeden zapis wierszy do bazy. Gdy zapis się
+    nie uda — wszystkie przydziały w licznikach są wycofywane.
+    """
+    from . import inventory
+    from .layout import get_layout
+
+    now = int(time.time())
+    layout = get_layout(page_id)
+    first_reserved_at, expires_at = _batch_session_expiry(session_id, page_id, now)
+
+    granted = []    # [(product_id, quantity, selected_size, available_after)]
+    results = {}
+    for product_id, quantity, selected_size in items:
+        if product_id not in layout.products:
+            results[product_id] = _batch_item_not_offered(product_id)
+            continue
+        ok, available = inventory.try_reserve(
+            page_id, product_id, session_id, quantity, layout.section_max(product_id), expires_at
+        )
+        if ok:
+            granted.append((product_id, quantity, selected_size, available))
+            continue
+        check_back_at = db.session.query(
+            func.min(OfferReservation.expires_at)
+        ).filter(
+            OfferReservation.offer_page_id == page_id,
+            OfferReservation.product_id == product_id,
+            OfferReservation.session_id != session_id,
+            OfferReservation.expires_at > now
+        ).scalar()
+        results[product_id] = _batch_item_unavailable(product_id, available, check_back_at)
+
+    reset_expired_row = False
+    if granted:
+        try:
+            own_rows = {r.product_id: r for r in OfferReservation.query.filter(
+                OfferReservation.session_id == session_id,
+                OfferReservation.offer_page_id == page_id,
+                OfferReservation.product_id.in_([g[0] for g in granted])
+            ).all()}
+            client_info = _request_client_info()
+            for product_id, quantity, selected_size, available in granted:
+                row, reset = _upsert_batch_reservation(
+                    own_rows.get(product_id), session_id, page_id, product_id, quantity, selected_size,
+                    first_reserved_at, expires_at, user_id, now, client_info
+                )
+                reset_expired_row = reset_expired_row or reset
+                results[product_id] = _batch_item_ok(product_id, row, first_reserved_at, available)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            for product_id, quantity, _, _ in granted:
+                inventory.release(page_id, product_id, session_id, quantity)
+            import logging
+            logging.getLogger(__name__).error(f"Batch reservation write failed (page={page_id}): {e}")
+            return False, {
+                'error': 'server_error',
+                'message': 'Wystąpił błąd serwera. Spróbuj ponownie.'
+            }
+
+        from . import availability
+        if reset_expired_row:
+            availability.invalidate(page_id)
+        else:
+            availability.apply_delta(page_id, {g[0]: (g[1], 0) for g in granted})
+
+    return True, {
+        'results': [results[pid] for pid, _, _ in items],
+        'reserved_count': len(granted),
+        'expires_at': expires_at if granted else None,
+        'first_reservation_at': first_reserved_at
+    }
+
+
 def release_product(session_id, page_id, product_id, quantity, user_id=None):
     """
     Zwalnia rezerwację produktu
@@ -349,6 +828,8 @@ def release_product(session_id, page_id, product_id, quantity, user_id=None):
     if not user_reservation:
         return True, {'reservation': {'quantity': 0}}
 
+    released = min(quantity, user_reservation.quantity)
+    was_active = user_reservation.expires_at > int(time.time())
     user_reservation.quantity -= quantity
 
     if user_reservation.quantity <= 0:
@@ -356,6 +837,14 @@ def release_product(session_id, page_id, product_id, quantity, user_id=None):
 
     db.session.commit()
 
+    if was_active:
+        from . import availability
+        availability.apply_delta(page_id, {product_id: (-released, 0)})
+
+    from . import inventory
+    if inventory.is_enabled():
+        inventory.release(page_id, product_id, session_id, quantity)
+
     return True, {
         'reservation': {
             'quantity': max(0, user_reservation.quantity if user_reservation.quantity > 0 else 0)
@@ -376,9 +865,7 @@ def extend_reservation(session_id, page_id, user_id=None):
     Returns:
         tuple: (success: bool, data: dict)
     """
-    # Cleanup expired BEFORE checking — zapobiega wskrzeszaniu wygasłych rezerwacji
-    cleanup_expired_reservations(page_id)
-
+    # Tylko aktywne wiersze — wygasłych (jeszcze nieusuniętych przez reaper) nie wskrzeszamy
     now = int(time.time())
     query = OfferReservation.query.filter(
         OfferReservation.session_id == session_id,
@@ -409,6 +896,12 @@ def extend_reservation(session_id, page_id, user_id=None):
 
     db.session.commit()
 
+    from . import inventory
+    if inventory.is_enabled():
+        inventory.set_session_expiry(
+            page_id, session_id, {r.product_id: r.expires_at for r in reservations}
+        )
+
     return True, {
         'new_expires_at': reservations[0].expires_at
     }
@@ -418,7 +911,8 @@ def get_section_max_for_product(page_id, product_id):
     """
     Zwraca limit max_quantity dla produktu na stronie ofertowej.
 
-    Sprawdza kolejno:
+    Czyta ze skompilowanego układu strony (layout.get_layout), który
+    rozstrzyga źródło limitu w kolejności:
     1. Sekcja typu 'product' z bezpośrednim product_id
     2. Sekcja typu 'variant_group' z grupą wariantową produktu
     3. Sekcja typu 'set' — element setu z bezpośrednim product_id
@@ -431,65 +925,17 @@ def get_section_max_for_product(page_id, product_id):
     Returns:
         int | None: Limit ilości (None = bez limitu)
     """
-    from .models import OfferSection, OfferSetItem
-    from modules.products.models import variant_products
-
-    # 1. Bezpośrednia sekcja produktowa
-    section = OfferSection.query.filter_by(
-        offer_page_id=page_id,
-        section_type='product',
-        product_id=product_id
-    ).first()
-
-    if section:
-        return section.max_quantity
-
-    # Znajdź grupy wariantowe produktu (potrzebne dla kroków 2-4)
-    product_vg_ids = db.session.query(variant_products.c.variant_group_id).filter(
-        variant_products.c.product_id == product_id
-    ).all()
-    product_vg_ids = [vg_id for (vg_id,) in product_vg_ids]
-
-    # 2. Sekcja variant_group
-    if product_vg_ids:
-        vg_section = OfferSection.query.filter(
-            OfferSection.offer_page_id == page_id,
-            OfferSection.section_type == 'variant_group',
-            OfferSection.variant_group_id.in_(product_vg_ids)
-        ).first()
-
-        if vg_section:
-            return vg_section.max_quantity
-
-    # 3. Bezpośredni element setu
-    set_item = OfferSetItem.query.join(OfferSection).filter(
-        OfferSection.offer_page_id == page_id,
-        OfferSection.section_type == 'set',
-        OfferSetItem.product_id == product_id
-    ).first()
-
-    if set_item:
-        return set_item.section.set_max_sets
-
-    # 4. Element setu przez grupę wariantową
-    if product_vg_ids:
-        set_item_vg = OfferSetItem.query.join(OfferSection).filter(
-            OfferSection.offer_page_id == page_id,
-            OfferSection.section_type == 'set',
-            OfferSetItem.variant_group_id.in_(product_vg_ids)
-        ).first()
-        if set_item_vg:
-            return set_item_vg.section.set_max_sets
-
-    return None
+    from .layout import get_layout
+    return get_layout(page_id).section_max(product_id)
 
 
 def get_section_products_map(page_id):
     """
     Zwraca mapę {product_id: section_max} dla wszystkich produktów na stronie ofertowej.
 
-    Potrzebne do broadcast_availability_update() — zamiast budować mapę
-    za każdym razem w route, robimy to raz.
+    Potrzebne do broadcast_availability_update() — mapa pochodzi ze
+    skompilowanego układu strony, więc nie odpytuje bazy per sekcja.
+    Produkty z grup wariantowych tylko aktywne.
 
     Args:
         page_id: ID strony ofertowej
@@ -497,44 +943,8 @@ def get_section_products_map(page_id):
     Returns:
         dict: {product_id: max_quantity (int lub None)}
     """
-    from .models import OfferSection, OfferSetItem
-    from modules.products.models import Product, VariantGroup
-
-    sections = OfferSection.query.filter_by(offer_page_id=page_id).all()
-    section_products = {}
-
-    for section in sections:
-        if section.section_type == 'product' and section.product_id:
-            section_products[section.product_id] = section.max_quantity
-
-        elif section.section_type == 'variant_group' and section.variant_group_id:
-            products = Product.query.join(
-                Product.variant_groups
-            ).filter(
-                VariantGroup.id == section.variant_group_id,
-                Product.is_active == True
-            ).all()
-            for product in products:
-                section_products[product.id] = section.max_quantity
-
-        elif section.section_type == 'set':
-            product_limit = section.set_max_sets
-            set_items = OfferSetItem.query.filter_by(section_id=section.id).all()
-
-            for set_item in set_items:
-                if set_item.product_id:
-                    section_products[set_item.product_id] = product_limit
-                elif set_item.variant_group_id:
-                    vg_products = Product.query.join(
-                        Product.variant_groups
-                    ).filter(
-                        VariantGroup.id == set_item.variant_group_id,
-                        Product.is_active == True
-                    ).all()
-                    for product in vg_products:
-                        section_products[product.id] = product_limit
-
-    return section_products
+    from .layout import get_layout
+    return get_layout(page_id).section_products()
 
 
 def get_sold_counts(page_id, product_ids):
@@ -673,8 +1083,6 @@ def get_availability_snapshot(page_id, section_products, session_id):
     """
     from modules.orders.models import Order, OrderItem
 
-    cleanup_expired_reservations(page_id)
-
     result = {}
     now = int(time.time())
 
@@ -712,7 +1120,8 @@ def get_availability_snapshot(page_id, section_products, session_id):
         user_rows = OfferReservation.query.filter(
             OfferReservation.session_id == session_id,
             OfferReservation.offer_page_id == page_id,
-            OfferReservation.product_id.in_(product_ids)
+            OfferReservation.product_id.in_(product_ids),
+            OfferReservation.expires_at > now
         ).all()
         user_reserved_by_pid = {r.product_id: r.quantity for r in user_rows}
 
@@ -734,9 +1143,10 @@ def get_availability_snapshot(page_id, section_products, session_id):
         }
 
     # Session info
-    first_reservation = OfferReservation.query.filter_by(
-        session_id=session_id,
-        offer_page_id=page_id
+    first_reservation = OfferReservation.query.filter(
+        OfferReservation.session_id == session_id,
+        OfferReservation.offer_page_id == page_id,
+        OfferReservation.expires_at > now
     ).order_by(OfferReservation.reserved_at).first()
 
     session_info = {
@@ -303,8 +303,6 @@ def order_page(token):
             return render_template('offers/order_page_preorder.html', page=page, sections=sections, bonuses_config_json=bonuses_config)
         else:
             # Exclusive: existing logic with reservations
-            from .reservation import cleanup_expired_reservations
-            cleanup_expired_reservations(page.id)
             bonuses_config = _build_bonuses_config(page, sections)
             return render_template('offers/order_page.html', page=page, sections=sections, bonuses_config_json=bonuses_config)
 
@@ -402,10 +400,7 @@ def reserve(token):
     if not current_user.is_authenticated:
         return jsonify({'success': False, 'error': 'login_required'}), 401
 
-    from .reservation import reserve_product
-    from .models import OfferSection, OfferSetItem
-    from modules.products.models import Product, VariantGroup, variant_products
-    from extensions import db
+    from .reservation import reserve_product, reserve_products, get_section_max_for_product
 
     page = OfferPage.get_by_token(token)
     if not page:
@@ -417,65 +412,38 @@ def reserve(token):
 
     data = request.get_json()
     session_id = data.get('session_id')
+    items = data.get('items')
     product_id = data.get('product_id')
     quantity = data.get('quantity', 1)
     selected_size = data.get('selected_size')
 
-    if not session_id or not product_id:
+    if not session_id or not (product_id or items):
         return jsonify({'success': False, 'error': 'missing_params'}), 400
 
-    section_max = None
-
-    # 1. Check direct product section
-    section = OfferSection.query.filter_by(
-        offer_page_id=page.id,
-        section_type='product',
-        product_id=product_id
-    ).first()
-
-    if section:
-        section_max = section.max_quantity
-    else:
-        # 2. Check if product belongs to a variant_group section (not in set)
-        # First find which variant groups this product belongs to
-        product_vg_ids = db.session.query(variant_products.c.variant_group_id).filter(
-            variant_products.c.product_id == product_id
-        ).all()
-        product_vg_ids = [vg_id for (vg_id,) in product_vg_ids]
-
-        if product_vg_ids:
-            # Check if any of these variant groups has a direct section
-            vg_section = OfferSection.query.filter(
-                OfferSection.offer_page_id == page.id,
-                OfferSection.section_type == 'variant_group',
-                OfferSection.variant_group_id.in_(product_vg_ids)
-            ).first()
-
-            if vg_section:
-                section_max = vg_section.max_quantity
-
-        if section_max is None:
-            # 3. Check if product is directly in a set (via set_items)
-            set_item = OfferSetItem.query.join(OfferSection).filter(
-                OfferSection.offer_page_id == page.id,
-                OfferSection.section_type == 'set',
-                OfferSetItem.product_id == product_id
-            ).first()
-
-            if set_item:
-                # Use set's max_sets limit (ARCHITECTURE: 1 set = 1 of each product)
-                section_max = set_item.section.set_max_sets
-            elif product_vg_ids:
-                # 4. Check if product's variant group is in a set
-                set_item_vg = OfferSetItem.query.join(OfferSection).filter(
-                    OfferSection.offer_page_id == page.id,
-                    OfferSection.section_type == 'set',
-                    OfferSetItem.variant_group_id.in_(product_vg_ids)
-                ).first()
-                if set_item_vg:
-                    section_max = set_item_vg.section.set_max_sets
+    if items:
+        # Batch (np. cały set): jedna transakcja, wynik per pozycja, jeden broadcast
+        success, result = reserve_products(
+            session_id=session_id,
+            page_id=page.id,
+            items=items,
+            user_id=current_user.id
+        )
+        if not success:
+            return jsonify({'success': False, **result}), 400 if result.get('error') == 'invalid_items' else 409
+        if result['reserved_count']:
+            try:
+                from .socket_events import (
+                    emit_reservations_update, broadcast_availability_update, _schedule_expiry_timer
+                )
+                emit_reservations_update(page.id)
+                broadcast_availability_update(page.id)
+                _schedule_expiry_timer(page.id, result.get('expires_at'))
+            except Exception:
+                pass
+        return jsonify({'success': True, **result})
 
     # section_max = None means unlimited (will be treated as float('inf') in reserve_product)
+    section_max = get_section_max_for_product(page.id, product_id)
 
     success, result = reserve_product(
         session_id=session_id,
@@ -489,9 +457,12 @@ def reserve(token):
 
     if success:
         try:
-            from .socket_events import emit_reservations_update, broadcast_availability_update
+            from .socket_events import (
+                emit_reservations_update, broadcast_availability_update, _schedule_expiry_timer
+            )
             emit_reservations_update(page.id)
             broadcast_availability_update(page.id)
+            _schedule_expiry_timer(page.id, result['reservation']['expires_at'])
         except Exception:
             pass
         return jsonify({'success': True, **result})
@@ -683,16 +654,14 @@ def restore(token):
         return jsonify({'success': True, 'cart_items': valid_items})
 
     # Exclusive: existing reservation restore logic
-    from .reservation import cleanup_expired_reservations, get_user_reservation
+    import time
+    from .reservation import get_user_reservation
     from .models import OfferReservation
 
     data = request.get_json()
     session_id = data.get('session_id')
     products = data.get('products', {})
 
-    # Cleanup expired
-    cleanup_expired_reservations(page.id)
-
     restored = {}
     expired = []
 
@@ -715,10 +684,11 @@ def restore(token):
             else:
                 expired.append(product_id)
 
-    # Get session info
-    first_reservation = OfferReservation.query.filter_by(
-        session_id=session_id,
-        offer_page_id=page.id
+    # Get session info (tylko aktywne — wygasłe usuwa reaper)
+    first_reservation = OfferReservation.query.filter(
+        OfferReservation.session_id == session_id,
+        OfferReservation.offer_page_id == page.id,
+        OfferReservation.expires_at > int(time.time())
     ).order_by(OfferReservation.reserved_at).first()
 
     session_info = {}
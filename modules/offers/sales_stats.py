@@ -0,0 +1,500 @@
+"""
+Offers Module - Agregaty sprzedaży stron (podsumowanie LIVE i po zamknięciu)
+
+get_live_summary() / get_page_summary() przy każdym odświeżeniu ładowały
+wszystkie zamówienia strony z pozycjami i sumowały je w Pythonie. Tutaj
+trzymamy w bazie sumy per (strona, produkt + rozmiar) — OfferProductSales —
+i sumy strony — OfferPageSales:
+
+- place_offer_order / place_preorder_order i cancel_offer_orders dopisują
+  delty (OfferSalesDelta) w tej samej transakcji co zamówienie (track()
+  przed flushem, apply_orders() tuż przed commitem) — sam INSERT, więc
+  równoległe checkouty jednej strony nie czekają na wspólny wiersz,
+- odczyt to zapisane sumy + delty; rebuild() przelicza sumy z bazy
+  zamówień i usuwa wliczone delty,
+- zamknięcie strony (zapis zbiorczy z podziałem pozycji) woła rebuild(),
+- każda inna zmiana zamówień strony (edycja pozycji przez admina, status
+  na/z 'anulowane', usunięcie) oznacza agregaty jako stale w hooku
+  after_flush — następny odczyt robi rebuild().
+
+Źródłem prawdy pozostaje baza zamówień: brak wiersza strony = rebuild przy
+pierwszym odczycie. Rezerwacji nie agregujemy (wygasają z upływem czasu) —
+podsumowania czytają je wprost z OfferReservation.
+
+rebuild() działa na osobnym połączeniu (SQLite: savepoint w sesji, jak
+numeracja zamówień) — odczyt z widoku LIVE, broadcastu czy eksportu nie
+commituje transakcji wołającego. Delta i zamówienie są zatwierdzane razem,
+więc migawka przebudowy widzi albo oba, albo żadne z nich.
+"""
+
+import logging
+from contextlib import contextmanager
+from decimal import Decimal
+
+from sqlalchemy import delete, func, insert, inspect, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+# Sumowane kolumny OfferProductSales
+_SALES_FIELDS = (
+    'quantity', 'item_count', 'bonus_quantity', 'revenue',
+    'fulfilled_quantity', 'unfulfilled_quantity', 'unfulfilled_revenue',
+)
+
+# Od tylu delt strony odczyt robi rebuild() zamiast doliczać je w Pythonie
+COMPACT_DELTAS = 500
+
+# Pola OrderItem, od których zależą agregaty (hook after_flush)
+_ITEM_FIELDS = (
+    'order_id', 'product_id', 'custom_name', 'selected_size', 'quantity', 'total',
+    'is_bonus', 'is_set_fulfilled', 'is_custom', 'is_full_set',
+)
+
+
+def item_key(product_id, selected_size, custom_name):
+    """Klucz wiersza — ten sam podział co products_aggregated w podsumowaniach."""
+    if product_id:
+        return f'{product_id}:{selected_size or ""}'
+    return f'custom:{custom_name or "Unknown Product"}'
+
+
+def _empty_row(key):
+    return {
+        'item_key': key,
+        'first_item_id': None,
+        'quantity': 0,
+        'item_count': 0,
+        'bonus_quantity': 0,
+        'revenue': Decimal('0.00'),
+        'fulfilled_quantity': 0,
+        'unfulfilled_quantity': 0,
+        'unfulfilled_revenue': Decimal('0.00'),
+    }
+
+
+def _item_groups(*conditions, conn=None):
+    """
+    Pozycje zamówień zgrupowane w SQL po wszystkim, co rozróżnia wiersze
+    agregatu (klucz + flagi gratisu/realizacji) — wynik ma kilka-kilkadziesiąt
+    wierszy niezależnie od liczby zamówień. conn: połączenie rebuild()
+    (domyślnie sesja).
+    """
+    from modules.orders.models import Order, OrderItem
+    from modules.products.models import Product
+
+    return (db.session if conn is None else conn).execute(
+        select(
+            func.min(OrderItem.id).label('first_item_id'),
+            OrderItem.product_id,
+            Product.name.label('product_name'),
+            OrderItem.custom_name,
+            OrderItem.selected_size,
+            OrderItem.is_custom,
+            OrderItem.is_full_set,
+            OrderItem.is_bonus,
+            OrderItem.is_set_fulfilled,
+            func.coalesce(func.sum(OrderItem.quantity), 0).label('quantity'),
+            func.count(OrderItem.id).label('item_count'),
+            func.coalesce(func.sum(OrderItem.total), 0).label('total'),
+        )
+        .join(Order, OrderItem.order_id == Order.id)
+        .outerjoin(Product, OrderItem.product_id == Product.id)
+        .where(*conditions)
+        .group_by(
+            OrderItem.product_id, Product.name, OrderItem.custom_name, OrderItem.selected_size,
+            OrderItem.is_custom, OrderItem.is_full_set, OrderItem.is_bonus, OrderItem.is_set_fulfilled,
+        )
+    ).mappings().all()
+
+
+def _fold(groups):
+    """
+    Składa grupy w wiersze per item_key. Nazwa i flagi wiersza pochodzą
+    z pierwszej pozycji (najniższe id) — jak w dawnym sumowaniu po zamówieniach.
+    """
+    rows = {}
+    for group in groups:
+        key = item_key(group['product_id'], group['selected_size'], group['custom_name'])
+        row = rows.setdefault(key, _empty_row(key))
+        if row['first_item_id'] is None or group['first_item_id'] < row['first_item_id']:
+            row.update(
+                first_item_id=group['first_item_id'],
+                product_id=group['product_id'],
+                product_name=group['custom_name'] or group['product_name'] or 'Unknown Product',
+                selected_size=group['selected_size'],
+                is_custom=bool(group['is_custom']),
+                is_full_set=bool(group['is_full_set']),
+                is_bonus=bool(group['is_bonus']),
+            )
+
+        quantity = int(group['quantity'])
+        total = Decimal(group['total'])
+        row['quantity'] += quantity
+        row['item_count'] += int(group['item_count'])
+        if group['is_bonus']:
+            row['bonus_quantity'] += quantity
+        else:
+            row['revenue'] += total
+
+        # SQLite zwraca 0/1 — bez porównań `is True`
+        if group['is_set_fulfilled'] is None:
+            continue
+        if group['is_set_fulfilled']:
+            row['fulfilled_quantity'] += quantity
+        else:
+            row['unfulfilled_quantity'] += quantity
+            if not group['is_bonus']:
+                row['unfulfilled_revenue'] += total
+    return rows
+
+
+def _stored_row(row):
+    """Wiersz OfferProductSales w kształcie wiersza _fold() (doliczanie delt)."""
+    return {
+        'item_key': row.item_key,
+        'first_item_id': row.first_item_id,
+        'product_id': row.product_id,
+        'product_name': row.product_name,
+        'selected_size': row.selected_size,
+        'is_custom': row.is_custom,
+        'is_full_set': row.is_full_set,
+        'is_bonus': row.is_bonus,
+        **{field: getattr(row, field) for field in _SALES_FIELDS},
+    }
+
+
+def _add_deltas(totals, rows, deltas):
+    """Dolicza delty do sum strony i wierszy produktów (w miejscu)."""
+    for delta in deltas:
+        if delta.item_key is None:
+            totals['orders_count'] += delta.orders_count
+            totals['customers_count'] += delta.customers_count
+            continue
+        row = rows.get(delta.item_key)
+        if row is None:
+            # Produkt pierwszy raz na stronie — nazwa i flagi z delty
+            row = rows[delta.item_key] = _empty_row(delta.item_key)
+            row.update(
+                first_item_id=delta.first_item_id,
+                product_id=delta.product_id,
+                product_name=delta.product_name,
+                selected_size=delta.selected_size,
+                is_custom=delta.is_custom,
+                is_full_set=delta.is_full_set,
+                is_bonus=delta.is_bonus,
+            )
+        for field in _SALES_FIELDS:
+            row[field] += getattr(delta, field)
+
+
+def _ordered(rows):
+    """Wiersze podsumowania: bez pustych, malejąco po quantity (remis — pierwsza pozycja)."""
+    ordered = sorted(rows.values(), key=lambda r: (-r['quantity'], r['first_item_id'] or 0))
+    return [
+        {field: row[field] for field in ('product_id', 'product_name', 'selected_size', 'is_custom',
+                                         'is_full_set', 'is_bonus', *_SALES_FIELDS)}
+        for row in ordered if row['item_count'] > 0
+    ]
+
+
+@contextmanager
+def _own_transaction():
+    """
+    Połączenie z transakcją niezależną od sesji wołającego. SQLite ma jednego
+    zapisującego naraz — tam savepoint w sesji (jak numeracja zamówień).
+    """
+    if db.engine.dialect.name == 'sqlite':
+        with db.session.begin_nested():
+            yield db.session.connection()
+        return
+    with db.engine.begin() as conn:
+        yield conn
+
+
+# ============================================
+# Delty (składanie / anulowanie zamówień)
+# ============================================
+
+def track(order):
+    """
+    Oznacza zamówienie jako rozliczane przez apply_orders() — hook after_flush
+    nie oznaczy przez nie agregatów jako stale. Wołać przed pierwszym flushem.
+    """
+    db.session.info.setdefault('offer_sales_tracked', set()).add(order)
+
+
+def apply_orders(page_id, orders, sign=1):
+    """
+    Dopisuje delty zamówień do agregatów strony w bieżącej transakcji.
+
+    Sam INSERT (OfferSalesDelta) — bez blokady wspólnego wiersza strony,
+    więc checkouty jednej strony się nie szeregują. Commit po stronie
+    wołającego.
+
+    Args:
+        page_id: ID OfferPage
+        orders: zamówienia strony (z pozycjami już dodanymi do sesji)
+        sign: 1 — złożone, -1 — anulowane (status 'anulowane' już ustawiony)
+    """
+    from .models import OfferSalesDelta
+    from modules.orders.models import Order, OrderItem
+
+    if not orders:
+        return
+    for order in orders:
+        track(order)
+    db.session.flush()
+
+    order_ids = [order.id for order in orders]
+    user_ids = {order.user_id for order in orders if order.user_id}
+
+    # Klient liczy się, dopóki ma na stronie inne nieanulowane zamówienie
+    # (dwa równoległe pierwsze zamówienia klienta policzą go podwójnie do rebuild())
+    customers_delta = 0
+    if user_ids:
+        remaining = set(db.session.scalars(
+            select(Order.user_id).distinct().where(
+                Order.offer_page_id == page_id,
+                Order.status != 'anulowane',
+                Order.user_id.in_(user_ids),
+                Order.id.notin_(order_ids),
+            )
+        ))
+        customers_delta = sign * len(user_ids - remaining)
+
+    # Wiersz sum strony osobno — executemany wymaga tych samych kolumn
+    db.session.execute(insert(OfferSalesDelta).values(
+        offer_page_id=page_id,
+        orders_count=sign * len(orders),
+        customers_count=customers_delta,
+    ))
+    rows = _fold(_item_groups(OrderItem.order_id.in_(order_ids)))
+    if rows:
+        db.session.execute(insert(OfferSalesDelta), [
+            {**row, 'offer_page_id': page_id, **{field: sign * row[field] for field in _SALES_FIELDS}}
+            for row in rows.values()
+        ])
+
+
+def invalidate(page_id):
+    """Oznacza agregaty strony jako nieaktualne — następny odczyt zrobi rebuild()."""
+    from .models import OfferPageSales
+
+    db.session.execute(
+        update(OfferPageSales)
+        .where(OfferPageSales.offer_page_id == page_id)
+        .values(stale=True)
+        .execution_options(synchronize_session=False)
+    )
+
+
+# ============================================
+# Przebudowa i odczyt
+# ============================================
+
+def rebuild(page_id):
+    """
+    Przebudowuje agregaty strony z bazy zamówień (jedno GROUP BY + liczniki)
+    i usuwa wliczone delty.
+
+    Własna transakcja (_own_transaction) — sesja wołającego nie jest
+    commitowana. Blokada wiersza strony szereguje tylko przebudowy tej
+    strony; checkout jej nie bierze.
+
+    Returns:
+        tuple: (totals, rows) jak get_page_stats()
+    """
+    from .models import OfferPageSales, OfferProductSales, OfferSalesDelta, get_local_now
+    from modules.orders.models import Order
+
+    page = OfferPageSales.offer_page_id == page_id
+    with _own_transaction() as conn:
+        if conn.execute(select(OfferPageSales.offer_page_id).where(page)).first() is None:
+            try:
+                with conn.begin_nested():
+                    conn.execute(insert(OfferPageSales).values(
+                        offer_page_id=page_id, orders_count=0, customers_count=0, stale=True,
+                    ))
+            except IntegrityError:
+                pass    # wiersz założyła równoległa przebudowa
+        conn.execute(select(OfferPageSales.offer_page_id).where(page).with_for_update())
+
+        rows = _fold(_item_groups(Order.offer_page_id == page_id, Order.status != 'anulowane', conn=conn))
+        orders_count, customers_count = conn.execute(
+            select(func.count(Order.id), func.count(func.distinct(Order.user_id))).where(
+                Order.offer_page_id == page_id,
+                Order.status != 'anulowane',
+            )
+        ).one()
+        # Tylko delty z tej samej migawki co zliczone zamówienia
+        delta_ids = conn.execute(
+            select(OfferSalesDelta.id).where(OfferSalesDelta.offer_page_id == page_id)
+        ).scalars().all()
+        if delta_ids:
+            conn.execute(delete(OfferSalesDelta).where(OfferSalesDelta.id.in_(delta_ids)))
+
+        conn.execute(delete(OfferProductSales).where(OfferProductSales.offer_page_id == page_id))
+        if rows:
+            conn.execute(insert(OfferProductSales), [
+                {'offer_page_id': page_id, **row} for row in rows.values()
+            ])
+        now = get_local_now()
+        conn.execute(update(OfferPageSales).where(page).values(
+            orders_count=orders_count, customers_count=customers_count,
+            stale=False, built_at=now, updated_at=now,
+        ))
+
+    return {'orders_count': orders_count, 'customers_count': customers_count}, _ordered(rows)
+
+
+def get_page_stats(page_id):
+    """
+    Agregaty sprzedaży strony (zamówienia z wyjątkiem 'anulowane').
+
+    Returns:
+        tuple: (totals, rows)
+            totals: {'orders_count', 'customers_count'}
+            rows: [{'product_id', 'product_name', 'selected_size', 'is_custom',
+                    'is_full_set', 'is_bonus', 'quantity', 'item_count',
+                    'bonus_quantity', 'revenue', 'fulfilled_quantity',
+                    'unfulfilled_quantity', 'unfulfilled_revenue'}, ...]
+                   posortowane malejąco po quantity
+    """
+    from .models import OfferPageSales, OfferProductSales, OfferSalesDelta
+
+    page_row = db.session.execute(
+        select(OfferPageSales)
+        .where(OfferPageSales.offer_page_id == page_id)
+        .execution_options(populate_existing=True)
+    ).scalar_one_or_none()
+    deltas = []
+    if page_row is not None and not page_row.stale:
+        deltas = db.session.execute(
+            select(OfferSalesDelta)
+            .where(OfferSalesDelta.offer_page_id == page_id)
+            .order_by(OfferSalesDelta.id)
+            .limit(COMPACT_DELTAS)
+        ).scalars().all()
+    if page_row is None or page_row.stale or len(deltas) >= COMPACT_DELTAS:
+        result = rebuild(page_id)
+        if page_row is not None:
+            db.session.expire(page_row)     # zapisany przez rebuild() poza sesją
+        return result
+
+    rows = {
+        row.item_key: _stored_row(row)
+        for row in db.session.execute(
+            select(OfferProductSales)
+            .where(OfferProductSales.offer_page_id == page_id)
+            .execution_options(populate_existing=True)
+        ).scalars()
+    }
+    totals = {'orders_count': page_row.orders_count, 'customers_count': page_row.customers_count}
+    _add_deltas(totals, rows, deltas)
+    return totals, _ordered(rows)
+
+
+def rebuild_safe(page_id):
+    """rebuild() bez wyjątków — po błędzie agregaty zostają oznaczone jako stale."""
+    from .models import OfferPageSales
+
+    try:
+        rebuild(page_id)
+    except Exception as e:
+        logger.error(f"Offer sales stats rebuild failed for page {page_id}: {e}")
+        try:
+            with _own_transaction() as conn:
+                conn.execute(
+                    update(OfferPageSales).where(OfferPageSales.offer_page_id == page_id).values(stale=True)
+                )
+        except Exception:
+            logger.exception(f"Offer sales stats for page {page_id}: marking stale failed")
+
+
+# ============================================
+# Hook: zmiany zamówień poza ścieżkami z deltą
+# ============================================
+
+def _changed(obj, fields):
+    attrs = inspect(obj).attrs
+    return any(attrs[field].history.has_changes() for field in fields)
+
+
+def _order_pages(obj):
+    """Strony, których agregaty zmienia flush zamówienia (nowe/usunięte: zawsze)."""
+    attrs = inspect(obj).attrs
+    pages = {obj.offer_page_id, *attrs.offer_page_id.history.deleted}
+    return {page_id for page_id in pages if page_id}
+
+
+def _order_affects_stats(obj):
+    if _changed(obj, ('offer_page_id', 'user_id')):
+        return True
+    history = inspect(obj).attrs.status.history
+    if not history.has_changes():
+        return False
+    # Zmiana między dwoma "żywymi" statusami nie rusza agregatów
+    return not history.deleted or 'anulowane' in (*history.added, *history.deleted)
+
+
+def _on_after_flush(session, flush_context):
+    from .models import OfferPageSales
+    from modules.orders.models import Order, OrderItem
+
+    tracked = session.info.get('offer_sales_tracked', ())
+    tracked_ids = {order.id for order in tracked}
+    order_mapper = inspect(Order)
+    page_ids, order_ids = set(), set()
+
+    def _item(obj):
+        if obj.order_id in tracked_ids:
+            return
+        order = session.identity_map.get(order_mapper.identity_key_from_primary_key((obj.order_id,)))
+        state = inspect(order).dict if order is not None else {}
+        if 'offer_page_id' in state:
+            if state['offer_page_id']:
+                page_ids.add(state['offer_page_id'])
+        elif obj.order_id:
+            order_ids.add(obj.order_id)
+
+    for obj in (*session.new, *session.deleted):
+        if isinstance(obj, Order) and obj not in tracked:
+            page_ids.update(_order_pages(obj))
+        elif isinstance(obj, OrderItem):
+            _item(obj)
+    for obj in session.dirty:
+        if isinstance(obj, Order) and obj not in tracked and _order_affects_stats(obj):
+            page_ids.update(_order_pages(obj))
+        elif isinstance(obj, OrderItem) and _changed(obj, _ITEM_FIELDS):
+            _item(obj)
+
+    if not page_ids and not order_ids:
+        return
+    conditions = []
+    if page_ids:
+        conditions.append(OfferPageSales.offer_page_id.in_(page_ids))
+    if order_ids:
+        conditions.append(OfferPageSales.offer_page_id.in_(
+            select(Order.offer_page_id).where(Order.id.in_(order_ids))
+        ))
+    session.connection().execute(
+        update(OfferPageSales.__table__).where(or_(*conditions)).values(stale=True)
+    )
+
+
+def _on_transaction_end(session):
+    session.info.pop('offer_sales_tracked', None)
+
+
+def init_sales_stats(app):
+    """Podpina oznaczanie agregatów jako stale przy flushu zamówień (wołane z create_app)."""
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    if not event.contains(Session, 'after_flush', _on_after_flush):
+        event.listen(Session, 'after_flush', _on_after_flush)
+        event.listen(Session, 'after_commit', _on_transaction_end)
+        event.listen(Session, 'after_rollback', _on_transaction_end)
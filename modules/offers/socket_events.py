@@ -26,15 +26,11 @@ from .redis_state import get_state
 # zewnętrzne locki nie są potrzebne.
 #
 # WYJĄTKI (zostają per-worker, bo to obiekty Python a nie dane):
-# - _expiry_timers (threading.Timer per page) — każdy worker odpala swój timer,
-#   to OK bo finalnie i tak rezerwacja ma TTL w DB i Redis-state
+# - scheduler wygasania rezerwacji (expiry.py) — jeden wątek na worker,
+#   terminy stron deduplikowane między workerami przez claim_once w state
 # - _broadcast_threads, _broadcast_stop_events (visitor count broadcast loops) —
 #   per worker, dedup w przyszłości przez SETNX(broadcast_owner:{page_id})
 
-# Per-worker timers/threads (nie udostępniane między workerami)
-_expiry_timers = {}        # { page_id: threading.Timer }
-_expiry_lock = threading.Lock()
-
 
 # =============================================
 # HELPERY ROOMÓW
@@ -61,10 +57,9 @@ def _get_visitor_counts(page_id):
     # Aktywne rezerwacje (odświeżane przy każdym cyklu broadcastu)
     try:
         from .models import OfferReservation
-        from .reservation import cleanup_expired_reservations
-        cleanup_expired_reservations(page_id)
-        counts['active_reservations'] = OfferReservation.query.filter_by(
-            offer_page_id=page_id
+        counts['active_reservations'] = OfferReservation.query.filter(
+            OfferReservation.offer_page_id == page_id,
+            OfferReservation.expires_at > int(time.time())
         ).count()
     except Exception as e:
         db.session.rollback()
@@ -124,93 +119,172 @@ def _stop_broadcast_thread(page_id):
 # BROADCAST DOSTĘPNOŚCI PRODUKTÓW
 # =============================================
 
+class AvailabilityBroadcastScheduler:
+    """
+    Scala zmiany dostępności w oknie czasowym w jeden emit per strona.
+
+    Przy dropie 200 kliknięć "rezerwuj" w tej samej sekundzie dawało 200
+    emitów 'availability_updated' do całego rooma. Scheduler:
+    - pierwsze zgłoszenie dla strony planuje flush za `window` sekund,
+    - kolejne zgłoszenia w oknie tylko się doliczają (bez nowego timera),
+    - flush zdejmuje stan "pending" PRZED odczytem snapshotu, więc każda
+      zmiana po nim planuje następny flush — emit końcowy (trailing) jest
+      gwarantowany, a opóźnienie ograniczone do długości okna.
+
+    Per worker (jak scheduler wygasania) — każdy proces scala własne zdarzenia.
+    Okno 0 = emit synchroniczny (zachowanie sprzed schedulera, testy).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}   # {page_id: {'first_at': float, 'requests': int}}
+        self._metrics = {}   # {page_id: {...}} — patrz metrics()
+
+    def request(self, page_id, window, app):
+        """Zgłasza zmianę dostępności strony; zwraca True gdy zaplanowano nowy flush."""
+        with self._lock:
+            pending = self._pending.get(page_id)
+            if pending is not None:
+                pending['requests'] += 1
+                return False
+            self._pending[page_id] = {'first_at': time.monotonic(), 'requests': 1}
+
+        timer = threading.Timer(window, self._flush, [page_id, app])
+        timer.daemon = True
+        timer.start()
+        return True
+
+    def _flush(self, page_id, app):
+        with self._lock:
+            pending = self._pending.pop(page_id, None)
+        if pending is None:
+            return
+        try:
+            with app.app_context():
+                _emit_availability_update(page_id)
+        except Exception as e:
+            print(f"[AVAILABILITY BROADCAST] Error for page {page_id}: {e}")
+            return
+        self.record(page_id, pending['requests'], time.monotonic() - pending['first_at'])
+
+    def record(self, page_id, requests, latency):
+        """Zapisuje metryki jednego emitu: ile zgłoszeń scalono i po jakim czasie."""
+        with self._lock:
+            m = self._metrics.setdefault(page_id, {
+                'requests': 0, 'emits': 0, 'latency_total': 0.0, 'latency_max': 0.0,
+                'last_latency': 0.0,
+            })
+            m['requests'] += requests
+            m['emits'] += 1
+            m['latency_total'] += latency
+            m['latency_max'] = max(m['latency_max'], latency)
+            m['last_latency'] = latency
+
+    def metrics(self, page_id):
+        """
+        Metryki schedulera dla strony (od startu procesu).
+
+        Returns:
+            dict: requests, emits, coalescing_ratio (zgłoszenia / emit),
+                  latency_avg_ms, latency_max_ms, last_latency_ms, pending
+        """
+        with self._lock:
+            m = dict(self._metrics.get(page_id) or {})
+            pending = page_id in self._pending
+        emits = m.get('emits', 0)
+        return {
+            'requests': m.get('requests', 0),
+            'emits': emits,
+            'coalescing_ratio': round(m['requests'] / emits, 2) if emits else None,
+            'latency_avg_ms': round(m['latency_total'] / emits * 1000, 1) if emits else None,
+            'latency_max_ms': round(m.get('latency_max', 0.0) * 1000, 1),
+            'last_latency_ms': round(m.get('last_latency', 0.0) * 1000, 1),
+            'pending': pending,
+        }
+
+
+_availability_scheduler = AvailabilityBroadcastScheduler()
+
+
+def get_availability_broadcast_metrics(page_id):
+    """Metryki scalania broadcastów dostępności dla strony (ten worker)."""
+    return _availability_scheduler.metrics(page_id)
+
+
 def broadcast_availability_update(page_id):
     """
-    Emituje 'availability_updated' do rooma kupujących.
+    Zgłasza zmianę dostępności — emit 'availability_updated' do rooma kupujących.
 
-    Dane są globalne (nie per-user) — klient śledzi swój user_reserved
-    z lokalnego stanu koszyka.
+    Zmiany z okna OFFERS_BROADCAST_WINDOW_MS są scalane w jeden emit
+    (AvailabilityBroadcastScheduler). Okno 0 = emit od razu.
 
     Wywoływana po: reserve, release, extend, order placed, expiry timer.
     """
-    from .reservation import (
-        get_section_products_map, cleanup_expired_reservations
-    )
-    from .models import OfferReservation
-    from modules.orders.models import Order, OrderItem
-    from extensions import db
-    from sqlalchemy import func
-
-    cleanup_expired_reservations(page_id)
-
-    section_products = get_section_products_map(page_id)
-    now = int(time.time())
-    product_ids = list(section_products.keys())
-    products_data = {}
-
-    # Batch: total_reserved per product (1 query zamiast N)
-    total_reserved_by_pid = {}
-    if product_ids:
-        rows = db.session.query(
-            OfferReservation.product_id,
-            func.sum(OfferReservation.quantity)
-        ).filter(
-            OfferReservation.offer_page_id == page_id,
-            OfferReservation.product_id.in_(product_ids),
-            OfferReservation.expires_at > now
-        ).group_by(OfferReservation.product_id).all()
-        total_reserved_by_pid = {pid: int(qty or 0) for pid, qty in rows}
-
-    # Batch: total_ordered per product (1 query zamiast N)
-    total_ordered_by_pid = {}
-    if product_ids:
-        rows = db.session.query(
-            OrderItem.product_id,
-            func.sum(OrderItem.quantity)
-        ).join(Order).filter(
-            Order.offer_page_id == page_id,
-            Order.status != 'anulowane',
-            OrderItem.product_id.in_(product_ids)
-        ).group_by(OrderItem.product_id).all()
-        total_ordered_by_pid = {pid: int(qty or 0) for pid, qty in rows}
-
-    for product_id, section_max in section_products.items():
-        total_reserved = total_reserved_by_pid.get(product_id, 0)
-        total_ordered = total_ordered_by_pid.get(product_id, 0)
-
-        if section_max and section_max > 0:
-            available = max(0, section_max - total_reserved - total_ordered)
-        else:
-            available = 999999  # Bez limitu
-
-        products_data[str(product_id)] = {
-            'available': available,
-            'total_reserved': total_reserved,
-            'total_ordered': total_ordered,
-        }
+    from flask import current_app
 
-    room = _get_visitor_room(page_id, 'order')
-    socketio.emit('availability_updated', {
-        'products': products_data,
-        'timestamp': int(time.time()),
-    }, to=room)
+    window_ms = current_app.config.get('OFFERS_BROADCAST_WINDOW_MS', 0)
+    if window_ms and window_ms > 0:
+        _availability_scheduler.request(
+            page_id, window_ms / 1000.0, current_app._get_current_object()
+        )
+        return
 
-    # Sprawdź subskrypcje powiadomień (dostępność wróciła)
-    _check_notification_subscriptions(page_id, products_data)
+    started = time.monotonic()
+    _emit_availability_update(page_id)
+    _availability_scheduler.record(page_id, 1, time.monotonic() - started)
 
 
-def _check_notification_subscriptions(page_id, current_availability):
+def _emit_availability_update(page_id):
     """
-    Sprawdza czy produkty, które były niedostępne, stały się ponownie dostępne.
-    Jeśli tak — wysyła SocketIO push lub email fallback.
+    Emituje 'availability_updated' do rooma kupujących.
+
+    Dane są globalne (nie per-user) — klient śledzi swój user_reserved
+    z lokalnego stanu koszyka. Liczby pochodzą z wersjonowanego snapshotu
+    (availability.py) aktualizowanego deltami — pełne przeliczenie z bazy
+    tylko przy zimnym starcie lub po invalidate().
+
+    Protokół (OFFERS_AVAILABILITY_DELTA):
+    - 'full'  — wszystkie produkty strony (pierwszy broadcast, tryb bez delt),
+    - 'delta' — tylko zmienione wpisy + `removed` (produkty zdjęte ze strony).
+    Każdy payload niesie `seq` — rośnie o 1 przy każdej zmianie. Różnica
+    liczona raz na zmianę (publish_availability w state), nie per klient.
+    Klient, który zobaczy lukę w seq, pobiera pełny stan przez
+    'resync_offer_availability'. Wpisy są wartościami absolutnymi, więc
+    ponowne nałożenie tej samej delty jest nieszkodliwe.
     """
-    state = get_state()
-    old = state.get_last_availability(page_id) or {}
-    state.set_last_availability(page_id, current_availability)
+    from flask import current_app
+    from . import availability
+
+    version, products_data = availability.get_snapshot(page_id)
+    seq, previous, changed, removed = get_state().publish_availability(page_id, products_data)
+
+    if previous is None or not current_app.config.get('OFFERS_AVAILABILITY_DELTA', True):
+        payload = {'mode': 'full', 'products': products_data}
+    elif changed or removed:
+        payload = {
+            'mode': 'delta',
+            'products': {pid: products_data[pid] for pid in changed},
+            'removed': removed,
+        }
+    else:
+        return  # Nic się nie zmieniło od ostatniego broadcastu
+
+    payload.update({
+        'seq': seq,
+        'version': version,
+        'timestamp': int(time.time()),
+    })
+    room = _get_visitor_room(page_id, 'order')
+    socketio.emit('availability_updated', payload, to=room)
+
+    # Sprawdź subskrypcje powiadomień (dostępność wróciła)
+    if previous:
+        _notify_newly_available(page_id, products_data, previous)
 
-    if not old:
-        return  # Pierwsza iteracja — brak porównania
 
+def _notify_newly_available(page_id, current_availability, old):
+    """Push/email dla produktów, których dostępność wzrosła z 0 (old → current)."""
+    state = get_state()
     newly_available = []
     for product_id_str, data in current_availability.items():
         old_data = old.get(product_id_str, {})
@@ -319,86 +393,18 @@ def _check_notification_subscriptions(page_id, current_availability):
 # SERVER-SIDE EXPIRY TIMER
 # =============================================
 
-def _schedule_expiry_timer(page_id):
+def _schedule_expiry_timer(page_id, expires_at=None):
     """
-    Planuje timer wygaśnięcia dla najbliższej rezerwacji na stronie.
+    Zgłasza wygaśnięcie rezerwacji strony do schedulera (expiry.py).
 
-    Po wygaśnięciu — czyści rezerwacje i broadcastuje nową dostępność.
-    """
-    from .models import OfferReservation
-    from flask import current_app
-
-    app = current_app._get_current_object()
+    Po wygaśnięciu — scheduler czyści rezerwacje i broadcastuje nową dostępność.
 
-    with _expiry_lock:
-        # Anuluj istniejący timer
-        old_timer = _expiry_timers.pop(page_id, None)
-        if old_timer:
-            old_timer.cancel()
-
-        # Znajdź najbliższe wygaśnięcie
-        now = int(time.time())
-        earliest = OfferReservation.query.filter(
-            OfferReservation.offer_page_id == page_id,
-            OfferReservation.expires_at > now
-        ).order_by(OfferReservation.expires_at.asc()).first()
-
-        if not earliest:
-            return  # Brak aktywnych rezerwacji
-
-        delay = max(1, earliest.expires_at - now)
-
-        timer = threading.Timer(delay, _on_expiry_fired, [page_id, app])
-        timer.daemon = True
-        timer.start()
-        _expiry_timers[page_id] = timer
-
-
-def _on_expiry_fired(page_id, app):
+    Args:
+        expires_at: znany czas wygaśnięcia (oszczędza zapytanie o najbliższe
+                    expires_at); None = najbliższe z bazy
     """
-    Callback gdy timer wygaśnięcia się odpala.
-
-    Czyści wygasłe rezerwacje, broadcastuje dostępność,
-    i planuje następny timer.
-    """
-    try:
-        with app.app_context():
-            from .reservation import cleanup_expired_reservations
-            cleanup_expired_reservations(page_id)
-            broadcast_availability_update(page_id)
-            # Zaplanuj timer dla następnego wygaśnięcia
-            _schedule_expiry_timer_internal(page_id, app)
-    except Exception as e:
-        print(f"[EXPIRY TIMER] Error for page {page_id}: {e}")
-
-
-def _schedule_expiry_timer_internal(page_id, app):
-    """
-    Wewnętrzna wersja _schedule_expiry_timer — nie wymaga current_app
-    (używana z wątku tła, gdzie app jest już przekazane).
-    """
-    from .models import OfferReservation
-
-    with _expiry_lock:
-        old_timer = _expiry_timers.pop(page_id, None)
-        if old_timer:
-            old_timer.cancel()
-
-        now = int(time.time())
-        earliest = OfferReservation.query.filter(
-            OfferReservation.offer_page_id == page_id,
-            OfferReservation.expires_at > now
-        ).order_by(OfferReservation.expires_at.asc()).first()
-
-        if not earliest:
-            return
-
-        delay = max(1, earliest.expires_at - now)
-
-        timer = threading.Timer(delay, _on_expiry_fired, [page_id, app])
-        timer.daemon = True
-        timer.start()
-        _expiry_timers[page_id] = timer
+    from .expiry import schedule_page
+    schedule_page(page_id, expires_at)
 
 
 # =============================================
@@ -584,7 +590,13 @@ def handle_join_offer_reservation(data):
                             # Przenieś rezerwację na nową sesję
                             res.session_id = session_id
 
+                    moved_product_ids = [res.product_id for res in old_reservations]
                     db.session.commit()
+
+                    from . import inventory
+                    if inventory.is_enabled():
+                        inventory.move_session(page_id, transferred_from_session,
+                                               session_id, moved_product_ids)
                     print(f"[SOCKET] Transferred {len(old_reservations)} reservations "
                           f"from session {transferred_from_session[:8]}... to {session_id[:8]}...")
             except Exception as e:
@@ -603,6 +615,18 @@ def handle_join_offer_reservation(data):
 
         _broadcast_visitor_counts(page_id)
 
+        # Reaper wygasłych rezerwacji (expiry.py) — startuje leniwie w workerze z ruchem
+        try:
+            from .expiry import ensure_reaper
+            ensure_reaper()
+        except Exception as e:
+            import logging
+            logging.getLogger(__name__).error(f"Expiry reaper start failed: {e}")
+
+        # Seq PRZED snapshotem — broadcast, który wyprzedzi ack, ma seq > ack.seq
+        # i zostanie nałożony przez klienta (wpisy absolutne, więc bez szkody)
+        availability_seq, _ = state.get_published_availability(page_id)
+
         # Pobierz snapshot dostępności
         section_products = get_section_products_map(page_id)
         products_data, session_info = get_availability_snapshot(
@@ -623,6 +647,7 @@ def handle_join_offer_reservation(data):
             'success': True,
             'products': products_data,
             'session': session_info,
+            'seq': availability_seq,
         }
 
     except Exception as e:
@@ -632,6 +657,32 @@ def handle_join_offer_reservation(data):
         return {'success': False, 'error': 'server_error', 'message': str(e)}
 
 
+@socketio.on('resync_offer_availability')
+def handle_resync_offer_availability(data):
+    """
+    Pełny stan dostępności dla klienta, który wykrył lukę w seq delt.
+
+    Data: { page_id }
+    Return (ack): { success, products: {...}, seq }
+    """
+    page_id = data.get('page_id') if data else None
+    if not page_id:
+        return {'success': False, 'error': 'missing_params'}
+    page_id = int(page_id)
+
+    state = get_state()
+    client = state.get_client(flask_request.sid)
+    if not client or client.get('role') != 'reservation' or int(client.get('page_id') or 0) != page_id:
+        return {'success': False, 'error': 'not_joined'}
+
+    seq, products = state.get_published_availability(page_id)
+    if products is None:
+        # Nic jeszcze nie rozesłano — pierwszy broadcast i tak będzie pełny
+        from . import availability
+        _, products = availability.get_snapshot(page_id)
+    return {'success': True, 'products': products, 'seq': seq}
+
+
 @socketio.on('reserve_product')
 def handle_reserve_product(data):
     """
@@ -686,9 +737,9 @@ def handle_reserve_product(data):
             broadcast_availability_update(page_id)
             # Aktualizuj admin dashboard
             emit_reservations_update(page_id)
-            # Zaplanuj/aktualizuj expiry timer
+            # Zaplanuj/aktualizuj expiry timer (pojedyncza rezerwacja — termin w result['reservation'])
             try:
-                _schedule_expiry_timer(page_id)
+                _schedule_expiry_timer(page_id, result['reservation']['expires_at'])
             except Exception as e:
                 import logging
                 logging.getLogger(__name__).error(f"Schedule expiry timer failed for page {page_id}: {e}")
@@ -702,6 +753,60 @@ def handle_reserve_product(data):
         return {'success': False, 'error': 'server_error', 'message': str(e)}
 
 
+@socketio.on('reserve_products')
+def handle_reserve_products(data):
+    """
+    Rezerwuje kilka produktów naraz (np. cały set) — jedna transakcja, jeden broadcast.
+
+    Data: { page_id, session_id, items: [{product_id, quantity, selected_size?}] }
+    Return (ack): { success, results: [{product_id, success, reservation? | error?}],
+                    reserved_count, expires_at, first_reservation_at, error? }
+    """
+    from .reservation import reserve_products
+
+    page_id = data.get('page_id')
+    session_id = data.get('session_id')
+    items = data.get('items')
+    sid = flask_request.sid
+
+    if not page_id or not session_id or not items:
+        return {'success': False, 'error': 'missing_params'}
+
+    page_id = int(page_id)
+
+    client = get_state().get_client(sid)
+    if not client or client.get('role') != 'reservation':
+        return {'success': False, 'error': 'not_connected'}
+
+    if not client.get('user_id'):
+        return {'success': False, 'error': 'login_required'}
+
+    try:
+        success, result = reserve_products(
+            session_id=session_id,
+            page_id=page_id,
+            items=items,
+            user_id=client.get('user_id')
+        )
+
+        if success and result.get('reserved_count'):
+            broadcast_availability_update(page_id)
+            emit_reservations_update(page_id)
+            try:
+                _schedule_expiry_timer(page_id, result.get('expires_at'))
+            except Exception as e:
+                import logging
+                logging.getLogger(__name__).error(f"Schedule expiry timer failed for page {page_id}: {e}")
+
+        return {'success': success, **result}
+
+    except Exception as e:
+        import traceback
+        print(f"[SOCKET] reserve_products ERROR: {e}")
+        traceback.print_exc()
+        return {'success': False, 'error': 'server_error', 'message': str(e)}
+
+
 @socketio.on('release_product')
 def handle_release_product(data):
     """
@@ -774,7 +879,7 @@ def handle_extend_reservation(data):
         broadcast_availability_update(page_id)
         # Przelicz expiry timer
         try:
-            _schedule_expiry_timer(page_id)
+            _schedule_expiry_timer(page_id, result.get('new_expires_at'))
         except Exception as e:
             import logging
             logging.getLogger(__name__).error(f"Schedule expiry timer failed for page {page_id}: {e}")
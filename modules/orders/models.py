@@ -5,6 +5,7 @@ Orders Module - Database Models
 Models for orders management:
 - OrderStatus: Lookup table for order statuses
 - OrderType: Lookup table for order types (Pre-order, On-hand, Offer)
+- OrderNumberSequence: Per-prefix counter for order numbers (modules/orders/order_numbers.py)
 - Order: Main order model
 - OrderItem: Order line items (products in order)
 - OrderComment: Comments/messages for orders (admin <-> client communication)
@@ -13,6 +14,7 @@ Models for orders management:
 - ShippingRequest: Shipping request model (groups orders for shipment)
 - ShippingRequestOrder: Junction table between ShippingRequest and Order
 - PaymentConfirmation: Potwierdzenia płatności dla zamówień Offer
+- OcrJob: Kolejka OCR potwierdzeń płatności (utils/ocr_queue.py)
 """
 
 from datetime import datetime, timezone, timedelta
@@ -118,6 +120,22 @@ class OrderType(db.Model):
         return self.name
 
 
+class OrderNumberSequence(db.Model):
+    """
+    Per-prefix order number counter (PO, OH, EX).
+    last_value = last sequence handed out; updated atomically by
+    modules/orders/order_numbers.py — no scanning of orders.
+    """
+    __tablename__ = 'order_number_sequences'
+
+    prefix = db.Column(db.String(5), primary_key=True)
+    last_value = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=get_local_now, onupdate=get_local_now)
+
+    def __repr__(self):
+        return f'<OrderNumberSequence {self.prefix}={self.last_value}>'
+
+
 class WmsStatus(db.Model):
     """
     WMS (Warehouse Management System) status lookup table.
@@ -171,8 +189,13 @@ class Order(db.Model):
     created_by_admin_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
     created_by_admin = db.relationship('User', foreign_keys=[created_by_admin_id])
 
-    # Status (foreign key to order_statuses)
-    status = db.Column(db.String(50), db.ForeignKey('order_statuses.slug'), default='nowe')
+    # Status (foreign key to order_statuses). active_history: poprzedni status znany także
+    # po expire (commit) — agregaty stron (modules/offers/sales_stats.py) odróżniają po nim
+    # zmianę między "żywymi" statusami od zmiany z/na 'anulowane'
+    status = db.column_property(
+        db.Column(db.String(50), db.ForeignKey('order_statuses.slug'), default='nowe'),
+        active_history=True,
+    )
     status_rel = db.relationship('OrderStatus', back_populates='orders', foreign_keys=[status])
     type_rel = db.relationship('OrderType', back_populates='orders', foreign_keys=[order_type])
 
@@ -813,7 +836,10 @@ class Order(db.Model):
         # nie jest „opłacone", bo nie było czego opłacać.
         if due > Decimal('0.00') and paid >= due:
             return {'state': 'paid', 'label': 'Opłacone'}
-        has_pending = self.payment_confirmations.filter_by(status='pending').first() is not None
+        if hasattr(self, '_cached_has_pending_confirmation'):
+            has_pending = self._cached_has_pending_confirmation
+        else:
+            has_pending = self.payment_confirmations.filter_by(status='pending').first() is not None
         if has_pending:
             return {'state': 'pending', 'label': 'Wgrane potwierdzenie'}
         return {'state': 'unpaid', 'label': 'Nieopłacone'}
@@ -844,7 +870,8 @@ class Order(db.Model):
 
     def _get_cached_confirmation(self, stage):
         """Zwraca PaymentConfirmation dla etapu z `_cached_payment_confirmations`,
-        jeśli batch preload je ustawił (get_overdue_orders_summary), inaczej None."""
+        jeśli batch preload je ustawił (get_overdue_orders_summary,
+        modules/orders/preload.py), inaczej None."""
         if hasattr(self, '_cached_payment_confirmations'):
             return self._cached_payment_confirmations.get(stage)
         return None
@@ -1760,3 +1787,43 @@ class PaymentConfirmation(db.Model):
 
     def __repr__(self):
         return f'<PaymentConfirmation {self.id} Order:{self.order_id} Stage:{self.payment_stage} Status:{self.status}>'
+
+
+class OcrJob(db.Model):
+    """
+    Kolejka OCR potwierdzeń płatności (utils/ocr_queue.py).
+    Web worker tylko dopisuje zadanie; Tesseract liczy osobny proces
+    `flask ocr-worker`. ocr_text to cache wyniku OCR po (file_hash, ocr_mode) —
+    ten sam plik nie jest OCR-owany drugi raz (reprocess, retry, re-upload).
+    """
+    __tablename__ = 'ocr_jobs'
+    __table_args__ = (
+        db.Index('ix_ocr_jobs_queue', 'status', 'priority', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    proof_file = db.Column(db.String(255), nullable=False, index=True)
+    file_hash = db.Column(db.String(64), nullable=False, index=True, comment="SHA-256 zawartości pliku")
+    priority = db.Column(db.Integer, nullable=False, default=0, comment="Mniejsza = wcześniej (0 upload, 10 backfill)")
+    status = db.Column(
+        db.String(20),
+        nullable=False,
+        default='pending',
+        comment="Status: 'pending', 'running', 'done', 'failed'"
+    )
+    payload = db.Column(db.JSON, nullable=False, comment="task_data dla utils/ocr_background.apply_ocr_result")
+    ocr_text = db.Column(db.Text, nullable=True, comment="Tekst z Tesseracta (cache po file_hash)")
+    ocr_mode = db.Column(db.String(10), nullable=False, default='full', server_default='full',
+                         comment="Tryb OCR tekstu: 'full' / 'staged'")
+    ocr_ms = db.Column(db.Integer, nullable=True, comment="Czas OCR (ms)")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+
+    available_at = db.Column(db.DateTime, nullable=False, default=get_local_now, comment="Backoff retry")
+    created_at = db.Column(db.DateTime, nullable=False, default=get_local_now)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<OcrJob {self.id} {self.proof_file} {self.status} p{self.priority}>'
+
@@ -0,0 +1,132 @@
+"""
+Numeracja zamówień — licznik per prefiks
+=========================================
+
+generate_order_number szukał ostatniego zamówienia z danym prefiksem
+(LIKE 'EX/%' ORDER BY id DESC) i dodawał 1. Równoległe place order w czasie
+dropu liczyły ten sam numer, wpadały na unikalny indeks orders.order_number
+i kręciły się w pętli retry place_offer_order.
+
+Teraz numer pochodzi z tabeli order_number_sequences (jeden wiersz na prefiks):
+- UPDATE last_value = last_value + N w OSOBNEJ, krótkiej transakcji —
+  blokada wiersza trwa milisekundy, a nie do commita zamówienia,
+- O(1), bez skanowania orders; jedyny skan to jednorazowe założenie wiersza
+  (high-water mark z istniejących zamówień),
+- ORDER_NUMBER_BLOCK_SIZE > 1: worker rezerwuje od razu blok numerów i wydaje
+  je z pamięci (mniej round-tripów, ale numery między workerami nie są
+  rosnące, a niewykorzystana końcówka bloku przepada przy restarcie).
+
+Numer raz wydany nie wraca — rollback zamówienia zostawia lukę w numeracji
+(w zamian żadne dwie transakcje nie dostaną tego samego numeru).
+
+SQLite (testy, benchmark): UPDATE idzie w transakcji sesji i zostaje
+zatwierdzony razem z zamówieniem. SQLite i tak ma jednego pisarza naraz,
+a osobna konekcja czekałaby na blokadę zapisu trzymaną przez sesję
+(BEGIN IMMEDIATE w benchmarku; StaticPool w testach to w ogóle ta sama konekcja).
+Rollback sesji cofa tam też licznik — bloki > 1 na SQLite tylko przy
+transakcjach, które się commitują.
+"""
+
+import logging
+import threading
+
+from flask import current_app
+from sqlalchemy import update, select, insert
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from modules.orders.models import Order, OrderNumberSequence
+
+logger = logging.getLogger(__name__)
+
+_blocks = {}            # {prefix: [next_value, last_value]} — zarezerwowane, niewydane numery
+_blocks_lock = threading.Lock()
+
+
+def _high_water_mark(conn, prefix):
+    """Najwyższy wydany numer wg starej metody (ostatnie zamówienie z prefiksem)."""
+    last_number = conn.execute(
+        select(Order.order_number)
+        .where(Order.order_number.like(f'{prefix}/%'))
+        .order_by(Order.id.desc())
+        .limit(1)
+    ).scalar()
+    if not last_number:
+        return 0
+    try:
+        return int(last_number.split('/')[-1])
+    except (ValueError, IndexError):
+        return 0
+
+
+def _increment(conn, prefix, count):
+    """UPDATE licznika o count. Zwraca nowy last_value albo None, gdy brak wiersza."""
+    result = conn.execute(
+        update(OrderNumberSequence)
+        .where(OrderNumberSequence.prefix == prefix)
+        .values(last_value=OrderNumberSequence.last_value + count)
+    )
+    if result.rowcount == 0:
+        return None
+    return conn.execute(
+        select(OrderNumberSequence.last_value).where(OrderNumberSequence.prefix == prefix)
+    ).scalar()
+
+
+def _seed(conn, prefix):
+    conn.execute(insert(OrderNumberSequence).values(
+        prefix=prefix, last_value=_high_water_mark(conn, prefix)
+    ))
+    logger.info(f"Order number sequence '{prefix}' created")
+
+
+def _reserve_block(prefix, count):
+    """Rezerwuje count kolejnych numerów. Zwraca (pierwszy, ostatni)."""
+    engine = db.engine
+
+    if engine.dialect.name == 'sqlite':
+        conn = db.session.connection()
+        last = _increment(conn, prefix, count)
+        if last is None:
+            _seed(conn, prefix)
+            last = _increment(conn, prefix, count)
+        return last - count + 1, last
+
+    with engine.begin() as conn:
+        last = _increment(conn, prefix, count)
+    if last is None:
+        try:
+            with engine.begin() as conn:
+                _seed(conn, prefix)
+        except IntegrityError:
+            pass  # inny worker założył wiersz równolegle
+        with engine.begin() as conn:
+            last = _increment(conn, prefix, count)
+    return last - count + 1, last
+
+
+def next_sequence(prefix):
+    """
+    Następny numer sekwencji dla prefiksu (PO, OH, EX).
+
+    Przy ORDER_NUMBER_BLOCK_SIZE > 1 wydaje z bloku zarezerwowanego przez ten
+    proces, po wyczerpaniu rezerwuje kolejny.
+    """
+    block_size = max(1, current_app.config.get('ORDER_NUMBER_BLOCK_SIZE', 1))
+    if block_size == 1:
+        return _reserve_block(prefix, 1)[0]
+
+    with _blocks_lock:
+        block = _blocks.get(prefix)
+        if not block or block[0] > block[1]:
+            first, last = _reserve_block(prefix, block_size)
+            block = _blocks[prefix] = [first, last]
+        value = block[0]
+        block[0] += 1
+    return value
+
+
+def reset_blocks():
+    """Porzuca zarezerwowane bloki tego procesu (testy, zmiana bazy)."""
+    with _blocks_lock:
+        _blocks.clear()
@@ -0,0 +1,480 @@
+"""
+Planer przypomnień o płatnościach — zbiorcza wersja `flask check-payment-reminders`.
+
+Stary cron ładował wszystkie niezamknięte zamówienia i dla każdej trójki
+zamówienie × etap × reguła wołał lazy-loady STAGE_DEFINITIONS (potwierdzenia,
+partie PL, zlecenia wysyłki) oraz osobne `PaymentReminderLog...first()`.
+Przy rosnącej historii to dziesiątki tysięcy zapytań co godzinę. Tutaj
+przebieg ma stałą liczbę faz (czasy w `timings`, wypisywane przez CLI):
+
+1. candidates — jedno zapytanie SQL na etap (E1-E4): zamówienia, dla których
+   któraś reguła mogła już wystartować, z gotowym terminem etapu (MIN po
+   partiach PL, pierwsze zlecenie wysyłki z terminem),
+2. preload — statusy potwierdzeń i wysłane przypomnienia kandydatów do
+   słownika/zbioru (paczkami po CHUNK_SIZE id),
+3. plan — należne trójki (zamówienie, etap, reguła) liczone w pamięci,
+4. send — paczkami: obiekty Order tylko dla należnych przypomnień, jedno
+   połączenie SMTP na paczkę, logi zbiorczo i commit po każdej paczce.
+
+Warunki etapów odpowiadają STAGE_DEFINITIONS (applies / status / kwota > 0 /
+termin), przepisanym na kolumny — lambdy działają na obiektach. Zmiana reguły
+etapu wymaga zmiany w obu miejscach; test porównuje plan z pętlą po
+STAGE_DEFINITIONS.
+"""
+import json
+import logging
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from sqlalchemy import and_, exists, func, or_
+
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+# Rozmiar paczki id w IN (...) i paczki wysyłki (jedno połączenie SMTP)
+CHUNK_SIZE = 500
+
+# Etap przypomnienia → PaymentConfirmation.payment_stage
+CONFIRMATION_STAGES = {
+    'product': 'product',
+    'shipping_kr': 'korean_shipping',
+    'customs_vat': 'customs_vat',
+    'domestic_shipping': 'domestic_shipping',
+}
+
+# Statusy etapu, przy których przypomnienie jest należne
+_DUE_STATUSES = ('none', 'rejected')
+
+# after_order_placed — tylko E1 tych typów (jak przed rozszerzeniem crona:
+# 'exclusive' bez zamkniętej sprzedaży i terminu nie ma jak zapłacić)
+AFTER_ORDER_TYPES = ('on_hand', 'preorder')
+
+
+@contextmanager
+def _phase(timings, name):
+    """Dolicza czas bloku [ms] do timings[name]."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = round(timings.get(name, 0) + (time.perf_counter() - started) * 1000, 1)
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# ============================================
+# Kandydaci (SQL)
+# ============================================
+
+def _candidate_columns():
+    from modules.orders.models import Order
+    return (Order.id, Order.order_number, Order.order_type, Order.created_at)
+
+
+def _active_order():
+    """Anulowane i zwroty nie mają czego zapłacić — ponaglenie byłoby mylące
+    (przy zwrocie to my jesteśmy winni klientowi pieniądze)."""
+    from modules.orders.models import Order
+    from utils.offer_closure import CLOSED_ORDER_STATUSES
+    return ~Order.status.in_(CLOSED_ORDER_STATUSES)
+
+
+def _product_candidates(now, before_hours, after_hours):
+    """E1: termin strony Offer albo created_at (after_order_placed)."""
+    from modules.orders.models import Order
+    from modules.offers.models import OfferPage
+
+    windows = []
+    if before_hours is not None:
+        windows.append(OfferPage.payment_deadline <= now + timedelta(hours=before_hours))
+    if after_hours is not None:
+        windows.append(and_(
+            Order.order_type.in_(AFTER_ORDER_TYPES),
+            Order.created_at <= now - timedelta(hours=after_hours),
+        ))
+    if not windows:
+        return []
+
+    return (
+        db.session.query(*_candidate_columns(), OfferPage.payment_deadline.label('deadline'))
+        .outerjoin(OfferPage, OfferPage.id == Order.offer_page_id)
+        .filter(_active_order(), Order.total_amount > 0, or_(*windows))
+        .order_by(Order.id)
+        .all()
+    )
+
+
+def _poland_candidates(now, before_hours, deadline_column, *conditions):
+    """E2/E3: najwcześniejszy termin z nieanulowanych partii PL zamówienia
+    (Order.get_shipping_kr_deadline / get_customs_vat_deadline)."""
+    from modules.orders.models import Order
+    from modules.products.models import PolandOrder, PolandOrderItem, PolandOrderItemOrder
+
+    deadline = func.min(deadline_column)
+    return (
+        db.session.query(*_candidate_columns(), deadline.label('deadline'))
+        .join(PolandOrderItemOrder, PolandOrderItemOrder.order_id == Order.id)
+        .join(PolandOrderItem, PolandOrderItem.id == PolandOrderItemOrder.poland_order_item_id)
+        .join(PolandOrder, PolandOrder.id == PolandOrderItem.poland_order_id)
+        .filter(_active_order(), PolandOrder.status != 'anulowane', deadline_column.isnot(None), *conditions)
+        .group_by(*_candidate_columns())
+        .having(deadline <= now + timedelta(hours=before_hours))
+        .order_by(Order.id)
+        .all()
+    )
+
+
+def _domestic_candidates(now, before_hours):
+    """E4: termin pierwszego zlecenia wysyłki, które go ma (Order.get_shipping_pl_deadline)."""
+    from modules.orders.models import Order, ShippingRequest, ShippingRequestOrder
+
+    first_link = (
+        db.session.query(
+            ShippingRequestOrder.order_id.label('order_id'),
+            func.min(ShippingRequestOrder.id).label('link_id'),
+        )
+        .join(ShippingRequest, ShippingRequest.id == ShippingRequestOrder.shipping_request_id)
+        .filter(ShippingRequest.payment_deadline.isnot(None))
+        .group_by(ShippingRequestOrder.order_id)
+        .subquery()
+    )
+    return (
+        db.session.query(*_candidate_columns(), ShippingRequest.payment_deadline.label('deadline'))
+        .join(first_link, first_link.c.order_id == Order.id)
+        .join(ShippingRequestOrder, ShippingRequestOrder.id == first_link.c.link_id)
+        .join(ShippingRequest, ShippingRequest.id == ShippingRequestOrder.shipping_request_id)
+        .filter(
+            _active_order(),
+            Order.shipping_cost > 0,
+            ShippingRequest.payment_deadline <= now + timedelta(hours=before_hours),
+        )
+        .order_by(Order.id)
+        .all()
+    )
+
+
+def _load_candidates(rules, now):
+    """{etap: [wiersz(id, order_number, order_type, created_at, deadline)]} w kolejności STAGE_DEFINITIONS.
+
+    Okno czasowe z najdłuższego wyprzedzenia reguł — reszta zamówień nie może
+    mieć należnego przypomnienia, więc nie wychodzi z bazy.
+    """
+    from modules.orders.models import Order
+
+    before = [rule.hours for rule in rules if rule.reminder_type == 'before_deadline']
+    after = [rule.hours for rule in rules if rule.reminder_type == 'after_order_placed']
+    before_hours = max(before) if before else None
+    after_hours = min(after) if after else None
+
+    candidates = {'product': _product_candidates(now, before_hours, after_hours)}
+    if before_hours is None:
+        return candidates
+
+    from modules.products.models import PolandOrder
+    candidates['shipping_kr'] = _poland_candidates(
+        now, before_hours, PolandOrder.payment_deadline,
+        Order.payment_stages == 4, Order.proxy_shipping_cost > 0,
+    )
+    candidates['customs_vat'] = _poland_candidates(
+        now, before_hours, PolandOrder.customs_payment_deadline,
+        or_(Order.order_type.is_(None), Order.order_type != 'on_hand'), Order.customs_vat_sale_cost > 0,
+    )
+    candidates['domestic_shipping'] = _domestic_candidates(now, before_hours)
+    return candidates
+
+
+# ============================================
+# Preload i plan
+# ============================================
+
+def _confirmation_statuses(order_ids):
+    """{(order_id, payment_stage): status} — pierwsze potwierdzenie etapu wg id,
+    jak `_cached_payment_confirmations` w get_overdue_orders_summary."""
+    from modules.orders.models import PaymentConfirmation
+
+    statuses = {}
+    for chunk in _chunks(order_ids):
+        rows = (
+            db.session.query(PaymentConfirmation.order_id, PaymentConfirmation.payment_stage, PaymentConfirmation.status)
+            .filter(PaymentConfirmation.order_id.in_(chunk))
+            .order_by(PaymentConfirmation.id)
+        )
+        for order_id, payment_stage, status in rows:
+            statuses.setdefault((order_id, payment_stage), status)
+    return statuses
+
+
+def _sent_reminders(order_ids, rule_ids):
+    """Zbiór (order_id, config_id, stage) już wysłanych przypomnień."""
+    from modules.offers.reminder_models import PaymentReminderLog
+
+    sent = set()
+    if not rule_ids:
+        return sent
+    for chunk in _chunks(order_ids):
+        rows = (
+            db.session.query(PaymentReminderLog.order_id, PaymentReminderLog.config_id, PaymentReminderLog.stage)
+            .filter(PaymentReminderLog.order_id.in_(chunk), PaymentReminderLog.config_id.in_(rule_ids))
+        )
+        sent.update(tuple(row) for row in rows)
+    return sent
+
+
+def _trigger_time(reminder_type, offset, stage, order_type, created_at, deadline):
+    if reminder_type == 'before_deadline':
+        return deadline - offset if deadline else None
+    if reminder_type == 'after_order_placed':
+        if stage != 'product' or order_type not in AFTER_ORDER_TYPES or not created_at:
+            return None
+        return created_at + offset
+    return None
+
+
+def plan_payment_reminders(rules, now, timings=None):
+    """Należne przypomnienia jako lista dictów, po (zamówienie, etap, reguła).
+
+    Nic nie wysyła i nie zapisuje — używane przez run_payment_reminders,
+    --dry-run i benchmark.
+    """
+    timings = timings if timings is not None else {}
+    if not rules:
+        return []
+
+    with _phase(timings, 'candidates'):
+        candidates = {stage: [tuple(row) for row in rows] for stage, rows in _load_candidates(rules, now).items()}
+
+    with _phase(timings, 'preload'):
+        order_ids = sorted({row[0] for rows in candidates.values() for row in rows})
+        statuses = _confirmation_statuses(order_ids)
+        sent = _sent_reminders(order_ids, [rule.id for rule in rules])
+
+    with _phase(timings, 'plan'):
+        # Atrybuty ORM reguł czytane raz, nie per kandydat
+        specs = [(index, rule, rule.id, rule.reminder_type, timedelta(hours=rule.hours))
+                 for index, rule in enumerate(rules)]
+        due = []
+        for stage_index, (stage, rows) in enumerate(candidates.items()):
+            confirmation_stage = CONFIRMATION_STAGES[stage]
+            for order_id, order_number, order_type, created_at, deadline in rows:
+                if statuses.get((order_id, confirmation_stage), 'none') not in _DUE_STATUSES:
+                    continue
+                for rule_index, rule, rule_id, reminder_type, offset in specs:
+                    trigger_time = _trigger_time(reminder_type, offset, stage, order_type, created_at, deadline)
+                    if trigger_time is None or trigger_time > now or (order_id, rule_id, stage) in sent:
+                        continue
+                    due.append(((order_id, stage_index, rule_index), {
+                        'order_id': order_id,
+                        'order_number': order_number,
+                        'stage': stage,
+                        'rule': rule,
+                        'payment_deadline': deadline,
+                    }))
+        due.sort(key=lambda item: item[0])
+    return [reminder for _, reminder in due]
+
+
+# ============================================
+# Wysyłka i zapis
+# ============================================
+
+def _load_orders(order_ids):
+    """{id: Order} z relacjami i `_cached_payment_confirmations` dla buildera maila."""
+    from sqlalchemy.orm import joinedload
+    from modules.orders.models import Order, PaymentConfirmation
+
+    orders = {
+        order.id: order
+        for order in Order.query.filter(Order.id.in_(order_ids)).options(
+            joinedload(Order.user), joinedload(Order.offer_page)
+        )
+    }
+    confirmations = {}
+    for conf in PaymentConfirmation.query.filter(PaymentConfirmation.order_id.in_(order_ids)).order_by(PaymentConfirmation.id):
+        confirmations.setdefault(conf.order_id, {}).setdefault(conf.payment_stage, conf)
+    for order in orders.values():
+        order._cached_payment_confirmations = confirmations.get(order.id, {})
+    return orders
+
+
+def _send_chunk(reminders, now, echo):
+    """Wysyła paczkę jednym połączeniem SMTP; log i push tylko dla faktycznie wysłanych.
+
+    Commit po paczce — przerwany przebieg nie wyśle ponownie tego,
+    co już poszło, a nieudane przypomnienia wrócą w kolejnym przebiegu.
+    """
+    from modules.admin.models import ActivityLog
+    from modules.offers.reminder_models import PaymentReminderLog
+    from modules.orders.payment_overdue_service import STAGE_DEFINITIONS
+    from utils.email_manager import EmailManager
+    from utils.email_sender import send_email_batch_sync
+    from utils.push_manager import PushManager
+
+    orders = _load_orders(sorted({reminder['order_id'] for reminder in reminders}))
+
+    messages = []
+    valid = []
+    for reminder in reminders:
+        order = orders.get(reminder['order_id'])
+        if order is None:
+            continue
+        msg = EmailManager.build_payment_reminder_message(
+            order,
+            stage=reminder['stage'],
+            payment_deadline=reminder['payment_deadline'],
+            reminder_context=reminder['rule'].reminder_type,
+        )
+        if msg is None:
+            continue
+        messages.append(msg)
+        valid.append(reminder)
+
+    results = send_email_batch_sync(messages)
+
+    logs = []
+    activities = []
+    for reminder, ok in zip(valid, results):
+        if not ok:
+            continue
+        order = orders[reminder['order_id']]
+        rule = reminder['rule']
+        label = STAGE_DEFINITIONS[reminder['stage']]['label']
+        PushManager.notify_payment_reminder(order, payment_deadline=reminder['payment_deadline'])
+        logs.append({'order_id': order.id, 'config_id': rule.id, 'stage': reminder['stage'], 'sent_at': now})
+        activities.append({
+            'user_id': None,
+            'action': 'payment_reminder_sent',
+            'entity_type': 'order',
+            'entity_id': order.id,
+            'new_value': json.dumps(
+                f"Wysłano przypomnienie ({label}, {rule.hours}h, {rule.reminder_type})", ensure_ascii=False
+            ),
+            'created_at': now,
+        })
+        echo(f"  Wysłano: {order.order_number} ({label}, {rule.hours}h)")
+
+    if logs:
+        db.session.bulk_insert_mappings(PaymentReminderLog, logs)
+        db.session.bulk_insert_mappings(ActivityLog, activities)
+    db.session.commit()
+    return len(logs)
+
+
+def _process_deadline_exceeded(now, dry_run, echo):
+    """Przekroczony termin E1 na zamkniętych stronach — powiadomienie ADMINA (raz na zamówienie).
+
+    Zamówienia już zgłoszone odpada w SQL (NOT EXISTS po logu), nie w pętli.
+    """
+    from modules.admin.models import ActivityLog
+    from modules.offers.models import OfferPage
+    from modules.offers.reminder_models import PaymentReminderLog
+    from modules.orders.models import Order
+    from utils.email_manager import EmailManager
+
+    already_notified = exists().where(and_(
+        PaymentReminderLog.order_id == Order.id,
+        PaymentReminderLog.config_id.is_(None),
+        PaymentReminderLog.reminder_type == 'deadline_exceeded',
+    ))
+    rows = (
+        db.session.query(Order.id, Order.offer_page_id)
+        .join(OfferPage, OfferPage.id == Order.offer_page_id)
+        .filter(
+            OfferPage.payment_deadline.isnot(None),
+            OfferPage.payment_deadline < now,
+            OfferPage.is_fully_closed == True,
+            Order.status != 'anulowane',
+            ~already_notified,
+        )
+        .order_by(OfferPage.id, Order.id)
+        .all()
+    )
+    statuses = _confirmation_statuses([row.id for row in rows])
+    exceeded = [row for row in rows if statuses.get((row.id, 'product'), 'none') in _DUE_STATUSES]
+
+    if exceeded and not dry_run:
+        db.session.bulk_insert_mappings(PaymentReminderLog, [
+            {'order_id': row.id, 'config_id': None, 'reminder_type': 'deadline_exceeded', 'sent_at': now}
+            for row in exceeded
+        ])
+        db.session.bulk_insert_mappings(ActivityLog, [{
+            'user_id': None,
+            'action': 'payment_deadline_exceeded',
+            'entity_type': 'order',
+            'entity_id': row.id,
+            'new_value': json.dumps('Przekroczono termin płatności — powiadomiono administrację', ensure_ascii=False),
+            'created_at': now,
+        } for row in exceeded])
+        db.session.commit()
+
+        order_ids_by_page = {}
+        for row in exceeded:
+            order_ids_by_page.setdefault(row.offer_page_id, []).append(row.id)
+        for page_id, order_ids in order_ids_by_page.items():
+            orders = []
+            for chunk in _chunks(order_ids):
+                orders.extend(Order.query.filter(Order.id.in_(chunk)).order_by(Order.id).all())
+            EmailManager.notify_admin_deadline_exceeded(db.session.get(OfferPage, page_id), orders)
+
+    if exceeded:
+        echo(f"  Przekroczone deadline: {len(exceeded)} zamówień")
+    return len(exceeded)
+
+
+def _set_setting(key, value):
+    from modules.auth.models import Settings
+
+    setting = Settings.query.filter_by(key=key).first()
+    if setting:
+        setting.value = str(value)
+    else:
+        db.session.add(Settings(key=key, value=str(value), type='string'))
+
+
+def run_payment_reminders(dry_run=False, now=None, echo=print, chunk_size=CHUNK_SIZE):
+    """Pełny przebieg crona przypomnień. Wymaga kontekstu requestu (url_for w mailach).
+
+    Returns:
+        dict: sent, exceeded, planned i timings ({faza: ms}).
+    """
+    from modules.offers.reminder_models import PaymentReminderConfig
+    from modules.orders.models import get_local_now
+    from modules.orders.payment_overdue_service import STAGE_DEFINITIONS
+
+    now = now or get_local_now()
+    timings = {}
+    started = time.perf_counter()
+
+    with _phase(timings, 'rules'):
+        rules = PaymentReminderConfig.query.filter_by(enabled=True).order_by(PaymentReminderConfig.id).all()
+    echo(f"Aktywnych reguł: {len(rules)}")
+
+    due = plan_payment_reminders(rules, now, timings)
+
+    sent_count = 0
+    with _phase(timings, 'send'):
+        if dry_run:
+            for reminder in due:
+                rule = reminder['rule']
+                echo(f"  [DRY RUN] {reminder['order_number']} <- {STAGE_DEFINITIONS[reminder['stage']]['label']}, "
+                     f"{rule.hours}h ({rule.reminder_type})")
+            sent_count = len(due)
+        else:
+            for chunk in _chunks(due, chunk_size):
+                sent_count += _send_chunk(chunk, now, echo)
+
+    with _phase(timings, 'deadline_exceeded'):
+        exceeded_count = _process_deadline_exceeded(now, dry_run, echo)
+
+    if not dry_run:
+        _set_setting('payment_reminder_last_check', now.strftime('%d/%m/%Y %H:%M'))
+        _set_setting('payment_reminder_last_count', str(sent_count))
+        db.session.commit()
+
+    timings['total'] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(f"[PAYMENT-REMINDERS] planned={len(due)} sent={sent_count} exceeded={exceeded_count} timings={timings}")
+    return {'planned': len(due), 'sent': sent_count, 'exceeded': exceeded_count, 'timings': timings}
@@ -0,0 +1,147 @@
+"""
+Orders Module - Batch preload dla list zamówień
+================================================
+
+Szablony list zamówień dotykają per wiersz: potwierdzeń płatności (ikona
+płatności, payment_badge, stage_X_confirmation — relacja dynamic, więc każdy
+odczyt to osobny SELECT), przesyłek (ikona wysyłki), zlecenia wysyłki,
+klienta, statusu/typu, strony offer, pozycji i ich produktów ze zdjęciem.
+Przy 100 wierszach na stronę dawało to setki zapytań.
+
+preload_order_list() wypełnia to wszystko dla całej strony zamówień stałą
+liczbą zapytań (niezależną od liczby wierszy):
+- relacje zwykłe (user, shipments, shipping_request_orders, items, offer_page,
+  status_rel, type_rel) — przez set_committed_value, jakby były załadowane,
+- potwierdzenia płatności — w `_cached_payment_confirmations` (ten sam hook,
+  którego używa get_overdue_orders_summary) i `_cached_has_pending_confirmation`,
+- główne zdjęcia produktów — w `_cached_primary_image` (Product.primary_image).
+
+Używane przez: admin_list, client_list, offers_live (get_live_summary),
+mobilne /orders.
+"""
+
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from modules.orders.models import (
+    OrderItem, OrderShipment, OrderStatus, OrderType,
+    PaymentConfirmation, ShippingRequest, ShippingRequestOrder,
+)
+
+
+def _group_by(rows, key):
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(key(row), []).append(row)
+    return grouped
+
+
+def _preload_primary_images(products):
+    """Główne zdjęcie (is_primary, inaczej pierwsze) dla wielu produktów jednym zapytaniem."""
+    from modules.products.models import ProductImage
+
+    product_ids = [p.id for p in products]
+    if not product_ids:
+        return
+    images = (
+        ProductImage.query
+        .filter(ProductImage.product_id.in_(product_ids))
+        .order_by(ProductImage.product_id, ProductImage.id)
+        .all()
+    )
+    by_product = _group_by(images, lambda img: img.product_id)
+    for product in products:
+        product_images = by_product.get(product.id, [])
+        primary = next((img for img in product_images if img.is_primary), None)
+        product._cached_primary_image = primary or (product_images[0] if product_images else None)
+
+
+def preload_order_list(orders, items=True, products=True):
+    """
+    Ładuje dane potrzebne listom zamówień dla wszystkich `orders` naraz.
+
+    Args:
+        orders (list[Order]): Zamówienia (np. pagination.items)
+        items (bool): Czy ładować pozycje (items_count, sorted_items, effective_total)
+        products (bool): Czy ładować produkty pozycji i ich główne zdjęcia
+
+    Returns:
+        list[Order]: Te same zamówienia (dla wygody w wyrażeniach)
+    """
+    from modules.auth.models import User
+    from modules.offers.models import OfferPage
+
+    orders = list(orders)
+    if not orders:
+        return orders
+    order_ids = [order.id for order in orders]
+
+    # Klienci
+    user_ids = {order.user_id for order in orders if order.user_id}
+    users = {u.id: u for u in User.query.filter(User.id.in_(user_ids)).all()} if user_ids else {}
+
+    # Statusy i typy — małe tabele słownikowe, relacja po slug (nie PK), więc
+    # bez preloadu każdy wiersz robił osobny SELECT
+    statuses = {s.slug: s for s in OrderStatus.query.all()}
+    types = {t.slug: t for t in OrderType.query.all()}
+
+    # Strony offer
+    page_ids = {order.offer_page_id for order in orders if order.offer_page_id}
+    pages = {p.id: p for p in OfferPage.query.filter(OfferPage.id.in_(page_ids)).all()} if page_ids else {}
+
+    # Potwierdzenia płatności — pierwsze (wg id) per etap, jak .first() w propertach
+    confirmations = (
+        PaymentConfirmation.query
+        .filter(PaymentConfirmation.order_id.in_(order_ids))
+        .order_by(PaymentConfirmation.id)
+        .all()
+    )
+    confirmations_by_order = _group_by(confirmations, lambda c: c.order_id)
+
+    # Przesyłki (kolejność jak w relacji: najnowsze pierwsze)
+    shipments = (
+        OrderShipment.query
+        .filter(OrderShipment.order_id.in_(order_ids))
+        .order_by(OrderShipment.created_at.desc())
+        .all()
+    )
+    shipments_by_order = _group_by(shipments, lambda s: s.order_id)
+
+    # Zlecenia wysyłki razem ze statusem zlecenia
+    request_links = (
+        ShippingRequestOrder.query
+        .filter(ShippingRequestOrder.order_id.in_(order_ids))
+        .options(joinedload(ShippingRequestOrder.shipping_request).joinedload(ShippingRequest.status_rel))
+        .order_by(ShippingRequestOrder.id)
+        .all()
+    )
+    links_by_order = _group_by(request_links, lambda link: link.order_id)
+
+    items_by_order = {}
+    if items:
+        query = OrderItem.query.filter(OrderItem.order_id.in_(order_ids)).order_by(OrderItem.id)
+        if products:
+            query = query.options(joinedload(OrderItem.product))
+        order_items = query.all()
+        items_by_order = _group_by(order_items, lambda i: i.order_id)
+        if products:
+            _preload_primary_images({i.product for i in order_items if i.product is not None})
+
+    for order in orders:
+        set_committed_value(order, 'user', users.get(order.user_id))
+        set_committed_value(order, 'status_rel', statuses.get(order.status))
+        set_committed_value(order, 'type_rel', types.get(order.order_type))
+        set_committed_value(order, 'offer_page', pages.get(order.offer_page_id))
+        set_committed_value(order, 'shipments', shipments_by_order.get(order.id, []))
+        set_committed_value(order, 'shipping_request_orders', links_by_order.get(order.id, []))
+        if items:
+            set_committed_value(order, 'items', items_by_order.get(order.id, []))
+
+        by_stage = {}
+        order_confirmations = confirmations_by_order.get(order.id, [])
+        for conf in order_confirmations:
+            by_stage.setdefault(conf.payment_stage, conf)
+        order._cached_payment_confirmations = by_stage
+        order._cached_has_pending_confirmation = any(c.status == 'pending' for c in order_confirmations)
+
+    return orders
@@ -37,6 +37,7 @@ from modules.orders.wms_utils import COURIER_NAMES
 from extensions import db
 from utils.decorators import role_required
 from utils.activity_logger import log_activity
+from utils.pagination import paginate_keyset, cached_count
 # from modules.emails.sender import send_email  # Uncomment when email module is ready
 
 
@@ -176,25 +177,37 @@ def admin_list():
     sort_by = request.args.get('sort', 'created_at')
     sort_order = request.args.get('order', 'desc')
 
+    # Klucz sortowania + id jako rozstrzygnięcie remisów (kursor musi być unikalny)
+    descending = sort_order == 'desc'
     if sort_by == 'order_number':
-        query = query.order_by(Order.order_number.desc() if sort_order == 'desc' else Order.order_number.asc())
+        sort_keys = [(Order.order_number, descending), (Order.id, descending)]
     elif sort_by == 'total_amount':
-        query = query.order_by(Order.total_amount.desc() if sort_order == 'desc' else Order.total_amount.asc())
+        sort_keys = [(Order.total_amount, descending), (Order.id, descending)]
     else:  # Default: created_at
-        query = query.order_by(Order.created_at.desc() if sort_order == 'desc' else Order.created_at.asc())
+        sort_keys = [(Order.created_at, descending), (Order.id, descending)]
 
-    # Pagination
+    # Pagination: Następna/Poprzednia po kursorze (bez OFFSET), total z cache liczników
     page = request.args.get('page', 1, type=int)
     per_page = int(filter_form.per_page.data) if filter_form.per_page.data else 20
 
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    count_key = ('admin_list', tuple(sorted(
+        (k, tuple(request.args.getlist(k))) for k in request.args
+        if k not in ('page', 'after', 'before', 'sort', 'order', 'per_page')
+    )))
+    total = cached_count('orders', count_key, lambda: query.order_by(None).count())
+    pagination = paginate_keyset(
+        query, sort_keys, page=page, per_page=per_page,
+        after=request.args.get('after'), before=request.args.get('before'), total=total,
+    )
+
+    # Płatności, wysyłki, klienci, pozycje — dla całej strony stałą liczbą zapytań
+    from modules.orders.preload import preload_order_list
+    preload_order_list(pagination.items)
 
-    # Get status counts for sidebar
-    status_counts = db.session.query(
-        Order.status,
-        func.count(Order.id)
-    ).group_by(Order.status).all()
-    status_counts_dict = {status: count for status, count in status_counts}
+    # Get status counts for sidebar (GROUP BY po całej tabeli — z cache liczników)
+    status_counts_dict = cached_count('orders', 'status_counts', lambda: dict(
+        db.session.query(Order.status, func.count(Order.id)).group_by(Order.status).all()
+    ))
 
     # Get all statuses with their counts
     all_statuses = OrderStatus.query.filter_by(is_active=True).order_by(OrderStatus.sort_order).all()
@@ -210,8 +223,8 @@ def admin_list():
             'count': count
         })
 
-    # Filter args without 'page' to avoid duplicate in pagination url_for
-    filter_args = {k: v for k, v in request.args.items() if k != 'page'}
+    # Filter args without 'page' and cursors to avoid duplicates in pagination url_for
+    filter_args = {k: v for k, v in request.args.items() if k not in ('page', 'after', 'before')}
 
     from utils.supplier_order_state import get_supplier_states_for_orders
     supplier_states = get_supplier_states_for_orders(pagination.items)
@@ -1666,10 +1679,8 @@ def client_list():
     date_to = request.args.get('date_to')
     search_query = request.args.get('search', '').strip()
     payment_status_filter = request.args.get('payment_status', '').strip()
-    # Base query (only user's orders) with eager loading
-    query = Order.query.filter_by(user_id=current_user.id).options(
-        db.joinedload(Order.items).joinedload(OrderItem.product)
-    )
+    # Base query (only user's orders); relacje ładuje preload_order_list po paginacji
+    query = Order.query.filter_by(user_id=current_user.id)
 
     # Apply filters
     if statuses_filter:
@@ -1700,19 +1711,26 @@ def client_list():
     # Payment status filter
     query = apply_payment_status_filter(query, payment_status_filter)
 
-    # Sorting
-    query = query.order_by(Order.created_at.desc())
-
-    # Pagination
+    # Pagination: najnowsze pierwsze, Następna/Poprzednia po kursorze (created_at, id)
     page = request.args.get('page', 1, type=int)
     per_page = 20
 
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    count_key = ('client_list', current_user.id, tuple(sorted(
+        (k, v) for k, v in request.args.items() if k not in ('page', 'after', 'before')
+    )))
+    total = cached_count('orders', count_key, lambda: query.order_by(None).count())
+    pagination = paginate_keyset(
+        query, [(Order.created_at, True), (Order.id, True)], page=page, per_page=per_page,
+        after=request.args.get('after'), before=request.args.get('before'), total=total,
+    )
+
+    from modules.orders.preload import preload_order_list
+    preload_order_list(pagination.items)
 
     # Get statuses for filter dropdown
     statuses = OrderStatus.query.filter_by(is_active=True).order_by(OrderStatus.sort_order).all()
 
-    filter_args = {k: v for k, v in request.args.items() if k != 'page'}
+    filter_args = {k: v for k, v in request.args.items() if k not in ('page', 'after', 'before')}
 
     from utils.supplier_order_state import get_supplier_states_for_orders
     supplier_states = get_supplier_states_for_orders(pagination.items)
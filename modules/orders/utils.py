@@ -11,7 +11,7 @@ Helper functions for orders management:
 
 import re
 from extensions import db
-from modules.orders.models import Order, OrderType
+from modules.orders.models import OrderType
 
 
 # ====================
@@ -25,38 +25,27 @@ def generate_order_number(order_type_slug):
     Format: {PREFIX}/{SEQUENCE}
     Examples: PO/00000001, OH/00000002, EX/00000003
 
+    Sequence comes from the per-prefix counter (modules/orders/order_numbers.py),
+    so concurrent transactions never get the same number.
+
     Args:
         order_type_slug (str): Order type slug ('pre_order', 'on_hand', 'exclusive')
 
     Returns:
         str: Formatted order number
     """
+    from modules.orders.order_numbers import next_sequence
+
     # Get order type to retrieve prefix
     order_type = OrderType.query.filter_by(slug=order_type_slug).first()
     if not order_type:
         raise ValueError(f"Invalid order type: {order_type_slug}")
 
     prefix = order_type.prefix  # PO, OH, or EX
-
-    # Find the highest order number for this type
-    last_order = Order.query.filter(
-        Order.order_number.like(f"{prefix}/%")
-    ).order_by(
-        Order.id.desc()
-    ).first()
-
-    if last_order:
-        # Extract sequence number from last order
-        try:
-            last_sequence = int(last_order.order_number.split('/')[-1])
-            next_sequence = last_sequence + 1
-        except (ValueError, IndexError):
-            next_sequence = 1
-    else:
-        next_sequence = 1
+    sequence = next_sequence(prefix)
 
     # Format: PREFIX/00000001
-    return f"{prefix}/{next_sequence:08d}"
+    return f"{prefix}/{sequence:08d}"
 
 
 # ====================
@@ -208,7 +208,7 @@ class Product(db.Model):
     margin = db.Column(db.Numeric(5, 2), nullable=True)  # Percentage
 
     # Stock
-    quantity = db.Column(db.Integer, default=0)
+    quantity = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.id'), nullable=True)
 
     # Description
@@ -233,12 +233,22 @@ class Product(db.Model):
     variant_groups = db.relationship('VariantGroup', secondary=variant_products, backref='products')
     order_items = db.relationship('OrderItem', back_populates='product', lazy='dynamic')
 
+    # Kursory listy produktów w panelu (sortowanie po nazwie / stanie / cenie + id)
+    __table_args__ = (
+        db.Index('ix_products_name_id', 'name', 'id'),
+        db.Index('ix_products_quantity_id', 'quantity', 'id'),
+        db.Index('ix_products_sale_price_id', 'sale_price', 'id'),
+    )
+
     def __repr__(self):
         return f'<Product {self.name}>'
 
     @property
     def primary_image(self):
         """Get primary image or first image"""
+        # Batch preload list zamówień (modules/orders/preload.py)
+        if hasattr(self, '_cached_primary_image'):
+            return self._cached_primary_image
         primary = self.images.filter_by(is_primary=True).first()
         if primary:
             return primary
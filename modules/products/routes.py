@@ -5,7 +5,7 @@ CRUD operations for products, categories, tags, and suppliers
 
 from flask import render_template, request, redirect, url_for, flash, jsonify, current_app, Response
 from flask_login import login_required, current_user
-from sqlalchemy import or_
+from sqlalchemy import false, or_
 from werkzeug.utils import secure_filename
 import os
 import io
@@ -28,6 +28,8 @@ from modules.products.forms import (
 from extensions import db
 from utils.decorators import role_required
 from utils.activity_logger import log_activity
+from utils.pagination import paginate_keyset, cached_count
+from modules.search import service as search_index
 
 
 # ==========================================
@@ -99,20 +101,15 @@ def list_products():
     sort_order = request.args.get('order', 'desc')
 
     # Secondary sort by ID for consistent ordering when primary values are equal
-    id_tiebreak = Product.id.desc() if sort_order == 'desc' else Product.id.asc()
-
-    if sort_by == 'name':
-        primary = Product.name.asc() if sort_order == 'asc' else Product.name.desc()
-    elif sort_by == 'sku':
-        primary = Product.sku.asc() if sort_order == 'asc' else Product.sku.desc()
-    elif sort_by == 'price':
-        primary = Product.sale_price.asc() if sort_order == 'asc' else Product.sale_price.desc()
-    elif sort_by == 'quantity':
-        primary = Product.quantity.asc() if sort_order == 'asc' else Product.quantity.desc()
-    else:  # created_at (default)
-        primary = Product.created_at.desc() if sort_order == 'desc' else Product.created_at.asc()
-
-    query = query.order_by(primary, id_tiebreak)
+    descending = sort_order == 'desc'
+    sort_columns = {
+        'name': Product.name,
+        'sku': Product.sku,
+        'price': Product.sale_price,
+        'quantity': Product.quantity,
+    }
+    primary = sort_columns.get(sort_by, Product.created_at)  # created_at (default)
+    sort_keys = [(primary, descending), (Product.id, descending)]
 
     # Pagination
     page = request.args.get('page', 1, type=int)
@@ -131,7 +128,20 @@ def list_products():
         elif per_page > 10000:
             per_page = 10000
 
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    # Total z cache liczników (klucz = filtry, bez sortowania i strony)
+    count_key = tuple(sorted(
+        (k, tuple(request.args.getlist(k)))
+        for k in request.args if k not in ('page', 'per_page', 'sort', 'order', 'after', 'before')
+    ))
+    total = cached_count('products', count_key, lambda: query.order_by(None).count())
+
+    # Kursor dla created_at, name, quantity i sale_price (indeksy z id) — sku może
+    # być NULL, tam zostaje OFFSET
+    pagination = paginate_keyset(
+        query, sort_keys, page=page, per_page=per_page,
+        after=request.args.get('after'), before=request.args.get('before'),
+        total=total, cursors=sort_by != 'sku',
+    )
     products = pagination.items
 
     return render_template(
@@ -183,7 +193,7 @@ def create_product():
             purchase_currency=form.purchase_currency.data,
             purchase_price_pln=form.purchase_price_pln.data,
             margin=form.margin.data,
-            quantity=form.quantity.data,
+            quantity=form.quantity.data or 0,
             supplier_id=form.supplier_id.data if form.supplier_id.data != 0 and current_user.role == 'admin' else None,
             description=form.description.data,
             is_active=form.is_active.data,
@@ -337,7 +347,7 @@ def edit_product(product_id):
         product.purchase_currency = form.purchase_currency.data
         product.purchase_price_pln = form.purchase_price_pln.data
         product.margin = form.margin.data
-        product.quantity = form.quantity.data
+        product.quantity = form.quantity.data or 0
         product.description = form.description.data
         product.is_active = form.is_active.data
         product.is_gratis = 'is_gratis' in request.form
@@ -773,6 +783,7 @@ def bulk_activate():
             {'is_active': True},
             synchronize_session=False
         )
+        search_index.reindex('product', product_ids)  # masowy UPDATE omija eventy indeksu
         db.session.commit()
 
         return jsonify({
@@ -808,6 +819,7 @@ def bulk_deactivate():
             {'is_active': False},
             synchronize_session=False
         )
+        search_index.reindex('product', product_ids)  # masowy UPDATE omija eventy indeksu
         db.session.commit()
 
         return jsonify({
@@ -931,6 +943,7 @@ def bulk_delete():
             deleted_count = Product.query.filter(Product.id.in_(products_to_delete)).delete(
                 synchronize_session=False
             )
+            search_index.remove('product', products_to_delete)
 
         # Soft delete products in orders (deactivate instead of deleting)
         if products_to_deactivate:
@@ -938,6 +951,7 @@ def bulk_delete():
                 {'is_active': False},
                 synchronize_session=False
             )
+            search_index.reindex('product', products_to_deactivate)
             deactivated_count = len(products_to_deactivate)
 
         db.session.commit()
@@ -2647,16 +2661,13 @@ def search_products():
 
     # Apply search filter
     if query:
-        search_conditions = [
-            Product.name.ilike(f'%{query}%'),
-            Product.sku.ilike(f'%{query}%'),
-            Product.ean.ilike(f'%{query}%')
-        ]
+        matched = search_index.matching_ids(query, 'product')
+        search_conditions = [Product.id.in_(matched)] if matched is not None else []
         # Add ID search if query is a number
         if query.isdigit():
             search_conditions.append(Product.id == int(query))
 
-        products_query = products_query.filter(or_(*search_conditions))
+        products_query = products_query.filter(or_(*search_conditions) if search_conditions else false())
 
     # Apply filters
     if category_id:
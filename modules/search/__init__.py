@@ -0,0 +1,8 @@
+"""
+Search Module - indeks wyszukiwania
+===================================
+
+Wspólny indeks dla wyszukiwarki globalnej (api.global_search), wyszukiwarek
+produktów (api.search_products, products.search_products, sklep on-hand)
+i klientów (api.search_clients). Bez blueprintu — tylko modele i serwis.
+"""
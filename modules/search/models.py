@@ -0,0 +1,53 @@
+"""
+Search Module - Models
+======================
+
+search_documents  — jeden wiersz na indeksowany obiekt (produkt, zamówienie,
+                    klient, zlecenie wysyłki): właściciel, widoczność, data sortowania
+search_terms      — znormalizowane słowa obiektu (zapytania prefiksowe LIKE 'abc%')
+search_grams      — trigramy słów (zapytania z literówkami)
+
+Wiersze utrzymuje modules/search/service.py (eventy sesji), nie modele ORM.
+"""
+
+from extensions import db
+
+
+class SearchDocument(db.Model):
+    """Indeksowany obiekt. Klucz: (entity_type, entity_id)."""
+    __tablename__ = 'search_documents'
+
+    entity_type = db.Column(db.String(20), primary_key=True)   # product|order|client|shipping_request
+    entity_id = db.Column(db.Integer, primary_key=True)
+    owner_id = db.Column(db.Integer, nullable=True, index=True)  # user_id (zamówienia, zlecenia)
+    is_active = db.Column(db.Boolean, nullable=False, default=True)
+    sort_at = db.Column(db.DateTime, nullable=True)              # created_at obiektu
+
+    def __repr__(self):
+        return f'<SearchDocument {self.entity_type}:{self.entity_id}>'
+
+
+class SearchTerm(db.Model):
+    """Słowo obiektu po normalizacji (małe litery, bez polskich znaków)."""
+    __tablename__ = 'search_terms'
+
+    entity_type = db.Column(db.String(20), primary_key=True)
+    entity_id = db.Column(db.Integer, primary_key=True)
+    term = db.Column(db.String(64), primary_key=True)
+
+    __table_args__ = (
+        db.Index('ix_search_terms_type_term', 'entity_type', 'term'),
+    )
+
+
+class SearchGram(db.Model):
+    """Trigram słowa obiektu, dopełnionego '_' z obu stron (jak spacje w pg_trgm)."""
+    __tablename__ = 'search_grams'
+
+    entity_type = db.Column(db.String(20), primary_key=True)
+    entity_id = db.Column(db.Integer, primary_key=True)
+    gram = db.Column(db.String(3), primary_key=True)
+
+    __table_args__ = (
+        db.Index('ix_search_grams_type_gram', 'entity_type', 'gram'),
+    )
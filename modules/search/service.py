@@ -0,0 +1,362 @@
+"""
+Search Module - Serwis indeksu
+==============================
+
+Wyszukiwarki robiły ilike('%q%') po kilku kolumnach orders, products, users
+i shipping_requests — bez szansy na indeks, czyli pełny skan tabel przy
+każdym znaku wpisanym w pole wyszukiwania.
+
+Indeks (modules/search/models.py):
+- tekst z pól obiektu jest normalizowany (małe litery, polskie znaki jak
+  w shop_service._POLISH_MAP, reszta diakrytyków przez NFKD) i dzielony na
+  słowa [a-z0-9]+ → search_terms; numery z zerami wiodącymi dostają też
+  wariant bez zer (PO/00000042 → "po", "00000042", "42"),
+- słowa literowe → trigramy w search_grams (literówki),
+- aktualizacja przyrostowa: after_flush sesji przepisuje wiersze indeksu
+  zmienionych obiektów w TEJ SAMEJ transakcji (rollback cofa też indeks);
+  zmiana pól spoza indeksu (status, kwoty) nie dotyka indeksu.
+
+Zapytanie: każde słowo zapytania musi pasować do obiektu prefiksem słowa
+(LIKE 'abc%' po indeksie (entity_type, term)); słowa ≥ 4 liter pasują też
+przez trigramy (co najmniej połowa trigramów). Trafienia prefiksowe są
+wyżej niż przybliżone. search() zwraca wyniki wielu kategorii z osobnymi
+limitami jednym zapytaniem (ROW_NUMBER() OVER (PARTITION BY entity_type)).
+
+Różnica względem ilike: dopasowanie jest od początku słowa, nie w środku
+("ateez" znajdzie "Ateez Higher", "eez" już nie).
+
+Masowe UPDATE/DELETE przez Query (bez obiektów w sesji) omijają eventy —
+takie miejsca wołają reindex()/remove(). Pełna przebudowa: flask search-reindex.
+"""
+
+import math
+import re
+import unicodedata
+
+from sqlalchemy import and_, case, delete, func, insert, inspect, or_, select, tuple_
+
+from extensions import db
+from modules.client.shop_service import _POLISH_MAP
+from modules.search.models import SearchDocument, SearchTerm, SearchGram
+
+# Min. długość słowa zapytania dla dopasowania przez trigramy
+FUZZY_MIN_LENGTH = 4
+# Jaka część trigramów słowa zapytania musi wystąpić w obiekcie
+FUZZY_MIN_OVERLAP = 0.5
+
+_TERM_MAX_LENGTH = 64
+
+# Źródła indeksu: klasa modelu (ładowana leniwie), pola tekstowe, właściciel,
+# widoczność i pola, od których zależy widoczność
+_SOURCES = {
+    'product': {
+        'model': ('modules.products.models', 'Product'),
+        'fields': ('name', 'sku', 'ean'),
+        'owner': None,
+        'active': lambda p: p.is_active is not False,
+        'active_fields': ('is_active',),
+    },
+    'order': {
+        'model': ('modules.orders.models', 'Order'),
+        'fields': ('order_number', 'tracking_number', 'shipping_name'),
+        'owner': 'user_id',
+        'active': lambda o: True,
+        'active_fields': (),
+    },
+    'client': {
+        'model': ('modules.auth.models', 'User'),
+        'fields': ('first_name', 'last_name', 'email'),
+        'owner': None,
+        'active': lambda u: u.role == 'client' and u.is_active is not False,
+        'active_fields': ('role', 'is_active'),
+    },
+    'shipping_request': {
+        'model': ('modules.orders.models', 'ShippingRequest'),
+        'fields': ('request_number', 'shipping_name', 'tracking_number'),
+        'owner': 'user_id',
+        'active': lambda r: True,
+        'active_fields': (),
+    },
+}
+
+_types_by_class = {}    # {klasa modelu: entity_type}, wypełniane w init_search_index()
+
+
+# ====================
+# NORMALIZACJA
+# ====================
+
+def normalize(text):
+    """Małe litery, bez polskich znaków i innych diakrytyków."""
+    text = (text or '').translate(_POLISH_MAP)
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return text.lower()
+
+
+def tokenize(text):
+    """Słowa [a-z0-9]+ po normalizacji, w kolejności, bez powtórzeń."""
+    return list(dict.fromkeys(
+        word[:_TERM_MAX_LENGTH] for word in re.findall(r'[a-z0-9]+', normalize(text))
+    ))
+
+
+def _terms(texts):
+    terms = set()
+    for text in texts:
+        for word in tokenize(text):
+            terms.add(word)
+            stripped = word.lstrip('0')
+            if word.isdigit() and stripped and stripped != word:
+                terms.add(stripped)
+    return terms
+
+
+def trigrams(word):
+    """Trigramy słowa dopełnionego '_' ('_hi', 'er_'), '_' zamiast spacji z pg_trgm."""
+    padded = f'_{word}_'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _grams(terms):
+    grams = set()
+    for term in terms:
+        if not term.isdigit():
+            grams |= trigrams(term)
+    return grams
+
+
+# ====================
+# ZAPIS INDEKSU
+# ====================
+
+def _model(entity_type):
+    module_name, class_name = _SOURCES[entity_type]['model']
+    module = __import__(module_name, fromlist=[class_name])
+    return getattr(module, class_name)
+
+
+def _write(conn, entity_type, objects):
+    """Przepisuje wiersze indeksu dla obiektów jednego typu."""
+    source = _SOURCES[entity_type]
+    ids = [obj.id for obj in objects]
+    _delete(conn, entity_type, ids)
+
+    documents, terms, grams = [], [], []
+    for obj in objects:
+        words = _terms(getattr(obj, field) for field in source['fields'])
+        documents.append({
+            'entity_type': entity_type,
+            'entity_id': obj.id,
+            'owner_id': getattr(obj, source['owner']) if source['owner'] else None,
+            'is_active': bool(source['active'](obj)),
+            'sort_at': getattr(obj, 'created_at', None),
+        })
+        terms.extend({'entity_type': entity_type, 'entity_id': obj.id, 'term': t} for t in words)
+        grams.extend({'entity_type': entity_type, 'entity_id': obj.id, 'gram': g} for g in _grams(words))
+
+    if documents:
+        conn.execute(insert(SearchDocument), documents)
+    if terms:
+        conn.execute(insert(SearchTerm), terms)
+    if grams:
+        conn.execute(insert(SearchGram), grams)
+
+
+def _delete(conn, entity_type, ids):
+    if not ids:
+        return
+    for model in (SearchTerm, SearchGram, SearchDocument):
+        conn.execute(delete(model).where(model.entity_type == entity_type, model.entity_id.in_(ids)))
+
+
+def reindex(entity_type, ids=None, batch_size=500):
+    """
+    Przebudowuje indeks obiektów typu (ids=None — wszystkich) w bieżącej sesji.
+    Dla masowych UPDATE przez Query i komendy search-reindex. Commit po stronie wołającego.
+
+    Returns:
+        int: Liczba zaindeksowanych obiektów
+    """
+    model = _model(entity_type)
+    conn = db.session.connection()
+    if ids is None:
+        conn.execute(delete(SearchTerm).where(SearchTerm.entity_type == entity_type))
+        conn.execute(delete(SearchGram).where(SearchGram.entity_type == entity_type))
+        conn.execute(delete(SearchDocument).where(SearchDocument.entity_type == entity_type))
+        query = model.query.order_by(model.id)
+    else:
+        ids = list(ids)
+        if not ids:
+            return 0
+        _delete(conn, entity_type, ids)   # także obiekty, których już nie ma
+        query = model.query.filter(model.id.in_(ids)).order_by(model.id)
+
+    count, last_id = 0, 0
+    while True:
+        batch = query.filter(model.id > last_id).limit(batch_size).all()
+        if not batch:
+            break
+        _write(conn, entity_type, batch)
+        count += len(batch)
+        last_id = batch[-1].id
+    return count
+
+
+def remove(entity_type, ids):
+    """Usuwa obiekty z indeksu (masowy DELETE przez Query). Commit po stronie wołającego."""
+    _delete(db.session.connection(), entity_type, list(ids))
+
+
+def _indexed_change(obj, entity_type):
+    """Czy flush zmienił pole, od którego zależy wpis w indeksie."""
+    source = _SOURCES[entity_type]
+    attrs = inspect(obj).attrs
+    fields = [*source['fields'], *source['active_fields'], 'created_at']
+    if source['owner']:
+        fields.append(source['owner'])
+    return any(field in attrs and attrs[field].history.has_changes() for field in fields)
+
+
+def _on_after_flush(session, flush_context):
+    changed, removed = {}, {}
+    for obj in session.new:
+        entity_type = _types_by_class.get(type(obj))
+        if entity_type:
+            changed.setdefault(entity_type, []).append(obj)
+    for obj in session.dirty:
+        entity_type = _types_by_class.get(type(obj))
+        if entity_type and _indexed_change(obj, entity_type):
+            changed.setdefault(entity_type, []).append(obj)
+    for obj in session.deleted:
+        entity_type = _types_by_class.get(type(obj))
+        if entity_type:
+            removed.setdefault(entity_type, []).append(inspect(obj).identity[0])
+
+    if not changed and not removed:
+        return
+    conn = session.connection()
+    for entity_type, objects in changed.items():
+        _write(conn, entity_type, objects)
+    for entity_type, ids in removed.items():
+        _delete(conn, entity_type, ids)
+
+
+def init_search_index(app):
+    """Podpina przyrostową aktualizację indeksu (wołane z create_app)."""
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    for entity_type in _SOURCES:
+        _types_by_class[_model(entity_type)] = entity_type
+
+    if not event.contains(Session, 'after_flush', _on_after_flush):
+        event.listen(Session, 'after_flush', _on_after_flush)
+
+
+# ====================
+# ZAPYTANIA
+# ====================
+
+def _token_matches(token, types):
+    """(dopasowanie prefiksem, dopasowanie prefiksem LUB trigramami) dla słowa zapytania."""
+    doc_key = tuple_(SearchDocument.entity_type, SearchDocument.entity_id)
+    prefix = doc_key.in_(
+        select(SearchTerm.entity_type, SearchTerm.entity_id)
+        .where(SearchTerm.entity_type.in_(types), SearchTerm.term.like(f'{token}%'))
+    )
+    if len(token) < FUZZY_MIN_LENGTH or token.isdigit():
+        return prefix, prefix
+
+    grams = trigrams(token)
+    fuzzy = doc_key.in_(
+        select(SearchGram.entity_type, SearchGram.entity_id)
+        .where(SearchGram.entity_type.in_(types), SearchGram.gram.in_(grams))
+        .group_by(SearchGram.entity_type, SearchGram.entity_id)
+        .having(func.count() >= math.ceil(len(grams) * FUZZY_MIN_OVERLAP))
+    )
+    return prefix, or_(prefix, fuzzy)
+
+
+def _match_conditions(query, types, owner_id=None, fuzzy=True):
+    tokens = tokenize(query)
+    if not tokens:
+        return None, None
+    matches = [_token_matches(token, types) for token in tokens]
+    conditions = [
+        SearchDocument.entity_type.in_(types),
+        SearchDocument.is_active == True,  # noqa: E712
+        *[(either if fuzzy else prefix) for prefix, either in matches],
+    ]
+    if owner_id is not None:
+        conditions.append(SearchDocument.owner_id == owner_id)
+    exact = and_(*[prefix for prefix, _ in matches])
+    return conditions, exact
+
+
+def search(query, limits, owner_id=None, fuzzy=True):
+    """
+    Wyszukuje w wielu kategoriach jednym zapytaniem.
+
+    Args:
+        query (str): Tekst wpisany przez użytkownika
+        limits (dict): {entity_type: limit}, np. {'order': 5, 'product': 5}
+        owner_id (int): Tylko obiekty tego użytkownika (panel klienta)
+        fuzzy (bool): Czy dopuszczać dopasowania z literówką
+
+    Returns:
+        dict: {entity_type: [entity_id, ...]} — najpierw trafienia prefiksowe,
+        potem najnowsze; kategorie bez trafień pominięte
+    """
+    types = list(limits)
+    conditions, exact = _match_conditions(query, types, owner_id, fuzzy)
+    if conditions is None:
+        return {}
+
+    ranked = (
+        select(
+            SearchDocument.entity_type,
+            SearchDocument.entity_id,
+            func.row_number().over(
+                partition_by=SearchDocument.entity_type,
+                order_by=(
+                    case((exact, 0), else_=1),
+                    SearchDocument.sort_at.desc(),
+                    SearchDocument.entity_id.desc(),
+                ),
+            ).label('position'),
+        )
+        .where(*conditions)
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(ranked.c.entity_type, ranked.c.entity_id)
+        .where(or_(*[
+            and_(ranked.c.entity_type == entity_type, ranked.c.position <= limit)
+            for entity_type, limit in limits.items()
+        ]))
+        .order_by(ranked.c.entity_type, ranked.c.position)
+    ).all()
+
+    results = {}
+    for entity_type, entity_id in rows:
+        results.setdefault(entity_type, []).append(entity_id)
+    return results
+
+
+def matching_ids(query, entity_type, owner_id=None, fuzzy=True):
+    """
+    Podzapytanie id pasujących obiektów — do Model.id.in_(...) razem z innymi
+    filtrami (sklep, wyszukiwarka produktów z filtrami). None dla pustego zapytania.
+    """
+    conditions, _ = _match_conditions(query, [entity_type], owner_id, fuzzy)
+    if conditions is None:
+        return None
+    return select(SearchDocument.entity_id).where(*conditions)
+
+
+def load_ordered(model, ids):
+    """Obiekty w kolejności ids (wyniki search()), pomija usunięte w międzyczasie."""
+    if not ids:
+        return []
+    by_id = {obj.id: obj for obj in model.query.filter(model.id.in_(ids)).all()}
+    return [by_id[i] for i in ids if i in by_id]
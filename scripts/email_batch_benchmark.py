@@ -0,0 +1,160 @@
+"""
+Benchmark masowych maili — prepare_email per odbiorca vs prepare_email_batch.
+
+Mierzy pełny koszt przygotowania wiadomości do outboxu (render + MIME, bez SMTP)
+dla N syntetycznych odbiorców:
+
+1. legacy — prepare_email per odbiorca + Message.as_bytes (tak jak przed
+   utils/email_batch.py: szablon, context processors i logo per mail),
+2. batch — prepare_email_batch z serializacją MIME w procesie (workers=1),
+3. batch_pool — prepare_email_batch z pulą procesów MIME (--workers).
+
+Szablony: new_offer_page (kontekst odbiorcy = imię → jeden render ze
+znacznikami) i offer_closure (listy produktów → render per odbiorca na
+wspólnym kontekście). Wynik: czas [ms], ms/mail i przyspieszenie vs legacy.
+
+Przykład:
+    python scripts/email_batch_benchmark.py --recipients 1000 --workers 4 --output email_bench.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TEMPLATES = ('new_offer_page', 'offer_closure')
+MODES = ('legacy', 'batch', 'batch_pool')
+
+
+def build_app():
+    """Aplikacja 'testing' (in-memory SQLite — context processors mają bazę)."""
+    from app import create_app
+    from extensions import db
+
+    app = create_app('testing')
+    app.config['EMAIL_MIME_POOL_MIN'] = 1
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def _recipients(template, count):
+    """Syntetyczni odbiorcy: (subject, shared, recipients) dla prepare_email_batch."""
+    if template == 'new_offer_page':
+        shared = {'page_name': 'Drop #42', 'page_url': 'https://example.com/offers/drop-42'}
+        recipients = [
+            {'to': f'klient{i}@example.com', 'idempotency_key': f'bench:{i}', 'user_name': f'Klient {i}'}
+            for i in range(count)
+        ]
+        return 'Nowy drop: Drop #42 - ThunderOrders', shared, recipients
+
+    shared = {
+        'page_name': 'Drop #42',
+        'payment_methods': [{'name': 'Przelew bankowy'}, {'name': 'BLIK'}],
+        'payment_deadline': None,
+    }
+    recipients = []
+    for i in range(count):
+        items = [
+            {'product_name': f'Album {n}', 'selected_size': None, 'quantity': 1 + n % 2,
+             'price': 49.0 + n, 'is_fulfilled': n != 3}
+            for n in range(5)
+        ]
+        total = Decimal('250.00')
+        recipients.append({
+            'to': f'klient{i}@example.com',
+            'idempotency_key': f'bench:{i}',
+            'customer_name': f'Klient {i}',
+            'items': items,
+            'fulfilled_items': [it for it in items if it['is_fulfilled']],
+            'fulfilled_total': total,
+            'shipping_cost': Decimal('0.00'),
+            'grand_total': total,
+            'order_number': f'ST/{i:08d}',
+            'upload_payment_url': f'https://example.com/orders/{i}?action=upload_payment',
+        })
+    return 'Podsumowanie zamówienia - Drop #42 - ThunderOrders', shared, recipients
+
+
+def _legacy(template, subject, shared, recipients):
+    from utils.email_sender import prepare_email
+
+    raws = []
+    for r in recipients:
+        context = {k: v for k, v in r.items() if k not in ('to', 'idempotency_key')}
+        msg = prepare_email(r['to'], subject, template, idempotency_key=r['idempotency_key'],
+                            **shared, **context)
+        raws.append(msg.as_bytes())
+    return raws
+
+
+def _batch(template, subject, shared, recipients, workers):
+    from utils.email_batch import prepare_email_batch
+
+    messages = prepare_email_batch(template, subject, recipients, shared=shared, workers=workers)
+    return [msg.mime for msg in messages]
+
+
+def run(args):
+    app = build_app()
+    result = {
+        'params': {'recipients': args.recipients, 'workers': args.workers, 'templates': args.templates},
+        'templates': {},
+    }
+    with app.app_context(), app.test_request_context():
+        for template in args.templates:
+            subject, shared, recipients = _recipients(template, args.recipients)
+            runners = {
+                'legacy': lambda: _legacy(template, subject, shared, recipients),
+                'batch': lambda: _batch(template, subject, shared, recipients, workers=1),
+                'batch_pool': lambda: _batch(template, subject, shared, recipients, workers=args.workers),
+            }
+            rows = {}
+            for mode in MODES:
+                started = time.perf_counter()
+                raws = runners[mode]()
+                elapsed = (time.perf_counter() - started) * 1000
+                rows[mode] = {
+                    'messages': len(raws),
+                    'total_ms': round(elapsed, 1),
+                    'per_mail_ms': round(elapsed / max(len(raws), 1), 3),
+                }
+            base = rows['legacy']['total_ms']
+            for row in rows.values():
+                row['speedup'] = round(base / row['total_ms'], 2) if row['total_ms'] else None
+            result['templates'][template] = rows
+    return result
+
+
+def print_report(result):
+    params = result['params']
+    print(f"\n=== EMAIL BATCH BENCHMARK ({params['recipients']} odbiorców, pula: {params['workers']} proc.) ===")
+    print(f"  {'szablon':<18}{'tryb':<12}{'maile':>7}{'ms':>10}{'ms/mail':>10}{'x':>8}")
+    for template, rows in result['templates'].items():
+        for mode, row in rows.items():
+            print(f"  {template:<18}{mode:<12}{row['messages']:>7}{row['total_ms']:>10.1f}"
+                  f"{row['per_mail_ms']:>10.3f}{row['speedup']:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark przygotowania masowych maili (render + MIME).')
+    parser.add_argument('--recipients', type=int, default=1000, help='liczba syntetycznych odbiorców')
+    parser.add_argument('--templates', nargs='+', choices=TEMPLATES, default=list(TEMPLATES))
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='procesy serializacji MIME dla trybu batch_pool')
+    parser.add_argument('--output', help='ścieżka pliku JSON z wynikiem')
+    args = parser.parse_args()
+
+    result = run(args)
+    print_report(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"\n  Zapisano: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""
+Benchmark OCR potwierdzeń płatności — tryby 'full' i 'staged' (OCR_MODE).
+
+Dla każdego potwierdzenia z zestawu i każdego trybu mierzy czas
+read_proof_text() i trafność wyniku względem oczekiwanych danych:
+- kwota: score_amount() = 'exact' / 'imprecise_exact',
+- tytuł: score_transfer_title() znajduje wszystkie numery zamówień.
+Raport: trafność [%], średni i p95 czas na potwierdzenie [ms], przyspieszenie
+względem 'full' oraz koszt trafienia w cache (SHA-256 pliku zamiast OCR).
+
+Zestaw:
+- --fixtures KATALOG — pliki potwierdzeń + expected.json:
+      {"plik.png": {"amount": "150.00", "order_numbers": ["PO/00000001"]}, ...}
+  (prawdziwe screenshoty nie są w repo — dane klientów),
+- --generate N — syntetyczne screenshoty przelewów (PIL) z losową kwotą
+  i numerami zamówień; wynik trafności to tylko sanity check.
+
+Przykład:
+    python scripts/ocr_benchmark.py --generate 20
+    python scripts/ocr_benchmark.py --fixtures ~/ocr-proofs --output ocr.json
+
+Wymaga binarki tesseract (z tesseract-ocr-pol) i poppler-utils dla PDF.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ORDER_PREFIXES = ('PO', 'EX', 'OH')
+
+
+# ============================================
+# Zestaw potwierdzeń
+# ============================================
+
+def load_fixtures(directory):
+    """[(ścieżka, kwota, numery zamówień)] z expected.json."""
+    with open(os.path.join(directory, 'expected.json'), encoding='utf-8') as f:
+        expected = json.load(f)
+    return [
+        (os.path.join(directory, name), Decimal(str(item['amount'])), item.get('order_numbers', []))
+        for name, item in sorted(expected.items())
+    ]
+
+
+def _format_amount(amount):
+    whole, cents = f'{amount:.2f}'.split('.')
+    return f'{int(whole):,}'.replace(',', ' ') + f',{cents} PLN'
+
+
+def generate_fixtures(directory, count, seed):
+    """Syntetyczne screenshoty przelewów z aplikacji bankowej (1080 px szerokości)."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    rng = random.Random(seed)
+    font = ImageFont.load_default(size=34)
+    small = ImageFont.load_default(size=26)
+    fixtures = []
+    for i in range(count):
+        amount = Decimal(rng.randint(1000, 250000)) / 100
+        numbers = [f'{rng.choice(ORDER_PREFIXES)}/{rng.randint(1, 99999):08d}'
+                   for _ in range(rng.randint(1, 2))]
+
+        image = Image.new('RGB', (1080, 2200), (245, 245, 247))
+        draw = ImageDraw.Draw(image)
+        draw.rectangle((0, 0, 1080, 260), fill=(20, 60, 140))
+        draw.ellipse((60, 70, 180, 190), fill=(250, 200, 40))
+        draw.text((220, 105), 'Mój Bank', font=font, fill='white')
+        draw.text((60, 330), 'Przelew został wysłany', font=font, fill=(30, 30, 30))
+
+        y = 460
+        for label, value in (
+            ('Kwota', _format_amount(amount)),
+            ('Tytuł przelewu', 'Zamówienie ' + ', '.join(numbers)),
+            ('Odbiorca', 'ThunderOrders sp. z o.o.'),
+            ('Na rachunek', 'PL61 1090 1014 0000 0712 1981 2874'),
+            ('Data realizacji', f'2026-10-{rng.randint(1, 28):02d}'),
+        ):
+            draw.text((60, y), label, font=small, fill=(110, 110, 120))
+            draw.text((60, y + 40), value, font=font, fill=(20, 20, 20))
+            y += 150
+
+        # Dół ekranu: przyciski i ilustracja — bez treści dla weryfikacji
+        for j in range(rng.randint(6, 12)):
+            x, top = rng.randint(0, 900), rng.randint(1350, 1900)
+            draw.rectangle((x, top, x + 160, top + 120), fill=tuple(rng.randint(150, 240) for _ in range(3)))
+        for k, label in enumerate(('Udostępnij', 'Gotowe')):
+            draw.rounded_rectangle((60, 1960 + k * 110, 1020, 2050 + k * 110), radius=40, fill=(20, 60, 140))
+            draw.text((420, 1985 + k * 110), label, font=font, fill='white')
+
+        path = os.path.join(directory, f'proof_{i:03d}.png')
+        image.save(path)
+        fixtures.append((path, amount, numbers))
+    return fixtures
+
+
+# ============================================
+# Pomiar
+# ============================================
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_mode(fixtures, mode):
+    from utils.ocr_verifier import read_proof_text, extract_amounts, score_amount, score_transfer_title
+
+    rows = []
+    for path, amount, numbers in fixtures:
+        started = time.perf_counter()
+        text = read_proof_text(path, mode) or ''
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        _, amount_details = score_amount(extract_amounts(text), amount)
+        _, title_details = score_transfer_title(text, numbers)
+        rows.append({
+            'file': os.path.basename(path),
+            'ms': round(elapsed_ms, 1),
+            'amount_ok': amount_details['match'] in ('exact', 'imprecise_exact'),
+            'title_ok': title_details['match'] == 'full' or not numbers,
+        })
+
+    times = [r['ms'] for r in rows]
+    return {
+        'mode': mode,
+        'proofs': len(rows),
+        'amount_accuracy': round(100 * sum(r['amount_ok'] for r in rows) / len(rows), 1),
+        'title_accuracy': round(100 * sum(r['title_ok'] for r in rows) / len(rows), 1),
+        'mean_ms': round(statistics.mean(times), 1),
+        'p95_ms': round(_percentile(times, 95), 1),
+        'rows': rows,
+    }
+
+
+def measure_cache_hit(fixtures):
+    """Koszt trafienia w cache: sam SHA-256 pliku (odczyt z ocr_jobs to 1 SELECT po indeksie file_hash)."""
+    from utils.ocr_cache import file_hash
+
+    started = time.perf_counter()
+    for path, _, _ in fixtures:
+        file_hash(path)
+    return round((time.perf_counter() - started) * 1000 / len(fixtures), 2)
+
+
+def print_report(results, cache_ms):
+    baseline = next((r['mean_ms'] for r in results if r['mode'] == 'full'), None)
+    print(f"{'tryb':<8} {'plików':>6} {'kwota %':>8} {'tytuł %':>8} {'śr. ms':>9} {'p95 ms':>9} {'vs full':>8}")
+    for r in results:
+        speedup = f"{baseline / r['mean_ms']:.2f}x" if baseline and r['mean_ms'] else '-'
+        print(f"{r['mode']:<8} {r['proofs']:>6} {r['amount_accuracy']:>8} {r['title_accuracy']:>8} "
+              f"{r['mean_ms']:>9} {r['p95_ms']:>9} {speedup:>8}")
+    print(f'cache hit (SHA-256 pliku): {cache_ms} ms / potwierdzenie')
+    for r in results:
+        misses = [row['file'] for row in r['rows'] if not (row['amount_ok'] and row['title_ok'])]
+        if misses:
+            print(f"{r['mode']}: błędne odczyty: {', '.join(misses)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark OCR potwierdzeń płatności (full vs staged).')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--fixtures', help='Katalog z potwierdzeniami i expected.json')
+    source.add_argument('--generate', type=int, metavar='N', help='Wygeneruj N syntetycznych potwierdzeń')
+    parser.add_argument('--modes', default='full,staged', help='Tryby OCR (domyślnie full,staged)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Zapisz wynik jako JSON')
+    args = parser.parse_args()
+
+    import pytesseract
+    try:
+        pytesseract.get_tesseract_version()
+    except Exception as e:
+        sys.exit(f'Tesseract niedostępny: {e}')
+
+    from utils.ocr_verifier import OCR_MODES
+    modes = [m.strip() for m in args.modes.split(',') if m.strip()]
+    unknown = set(modes) - set(OCR_MODES)
+    if unknown:
+        sys.exit(f'Nieznane tryby: {", ".join(sorted(unknown))} (dostępne: {", ".join(OCR_MODES)})')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.generate:
+            fixtures = generate_fixtures(tmp, args.generate, args.seed)
+        else:
+            fixtures = load_fixtures(args.fixtures)
+        results = [run_mode(fixtures, mode) for mode in modes]
+        cache_ms = measure_cache_hit(fixtures)
+
+    print_report(results, cache_ms)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'results': results, 'cache_hit_ms': cache_ms}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,536 @@
+"""
+Benchmark dropu ofert — bez infrastruktury produkcyjnej (CI / laptop).
+
+Następca scripts/stress_test.py i scripts/realistic_chaos_test.py, które
+wymagają konkretnej strony (79), gunicornów, nginx i Redis. Tutaj:
+
+1. Aplikacja startuje w procesie z konfiguracją 'testing' (in-memory state,
+   bez rate limitów); baza: plik SQLite w katalogu tymczasowym albo
+   --database-url (np. MySQL — realne SELECT FOR UPDATE i deadlocki).
+2. Seed: syntetyczna strona exclusive z N sekcjami produktowymi i opcjonalnym
+   setem (M członków), zadany limit, U kupujących.
+3. U wątków-kupujących startuje jednocześnie (Barrier) i przechodzi scenariusz:
+   join (Socket.IO) → reserve (pojedynczo lub batch setu) → release części →
+   extend → place-order. Transport: http, socketio albo mix (co drugi kupujący).
+4. Raport per (transport, operacja): liczba, błędy wg kodu, p50/p95/p99 [ms],
+   średnia liczba zapytań SQL; kontrola oversellingu (zamówione + aktywne
+   rezerwacje <= limit) dla każdego produktu z limitem.
+5. Wynik zapisywany jako JSON (z hashem commita) — --compare porównuje z
+   poprzednim plikiem, żeby wyłapać regresje między commitami.
+
+Przykład:
+    python scripts/offers_benchmark.py --buyers 40 --products 6 --set-members 8 \\
+        --limit 5 --transport mix --output bench.json
+    python scripts/offers_benchmark.py ... --compare bench.json
+
+SQLite: transakcje zaczynają się od BEGIN IMMEDIATE (zapisy są serializowane,
+więc kontrola oversellingu ma sens, ale liczby mierzą jednego pisarza naraz).
+Realistyczne latencje pod kontencją — tylko z --database-url do MySQL.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Operacje w kolejności raportu
+OPERATIONS = ('join', 'reserve', 'reserve_batch', 'release', 'extend', 'place_order')
+
+
+# ============================================
+# Aplikacja i seed
+# ============================================
+
+def build_app(database_url, broadcast_window_ms):
+    """Tworzy aplikację 'testing' z podmienioną bazą (konfiguracja 'benchmark')."""
+    import config as config_module
+    from app import create_app
+    from extensions import db
+
+    engine_options = {}
+    if database_url.startswith('sqlite'):
+        engine_options = {'connect_args': {'check_same_thread': False, 'timeout': 30}}
+
+    class BenchmarkConfig(config_module.TestingConfig):
+        SQLALCHEMY_DATABASE_URI = database_url
+        SQLALCHEMY_ENGINE_OPTIONS = engine_options
+        OFFERS_BROADCAST_WINDOW_MS = broadcast_window_ms
+
+    config_module.config['benchmark'] = BenchmarkConfig
+    app = create_app('benchmark')
+
+    with app.app_context():
+        if database_url.startswith('sqlite'):
+            _sqlite_begin_immediate(db.engine)
+        db.create_all()
+    return app
+
+
+def _sqlite_begin_immediate(engine):
+    """
+    pysqlite nie wysyła BEGIN przed SELECT-ami, więc dwa wątki mogą przeczytać
+    tę samą dostępność i obaj zapisać. BEGIN IMMEDIATE = blokada zapisu od
+    początku transakcji (zamiennik SELECT FOR UPDATE w SQLite).
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'connect')
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def _begin(conn):
+        conn.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+def seed(app, products, set_members, limit, buyers):
+    """
+    Syntetyczna strona exclusive.
+
+    Returns:
+        dict: page_id, token, product_ids, set_product_ids, limits, user_ids
+    """
+    from extensions import db
+    from modules.auth.models import User
+    from modules.products.models import Product
+    from modules.orders.models import OrderType
+    from modules.offers.models import OfferPage, OfferSection, OfferSetItem
+
+    with app.app_context():
+        if not OrderType.query.filter_by(slug='exclusive').first():
+            db.session.add(OrderType(slug='exclusive', name='Exclusive', prefix='EX'))
+
+        admin = User(email=f'bench-admin-{uuid.uuid4().hex[:8]}@local.test', role='admin',
+                     is_active=True, email_verified=True)
+        db.session.add(admin)
+        db.session.flush()
+
+        page = OfferPage(name='Benchmark drop', token=OfferPage.generate_token(), status='active',
+                         page_type='exclusive', payment_stages=3, created_by=admin.id)
+        db.session.add(page)
+        db.session.flush()
+
+        def _product(name):
+            p = Product(name=name, sale_price=10, quantity=0)
+            db.session.add(p)
+            db.session.flush()
+            return p
+
+        product_ids = []
+        for i in range(products):
+            p = _product(f'Bench produkt {i + 1}')
+            db.session.add(OfferSection(offer_page_id=page.id, section_type='product',
+                                        product_id=p.id, max_quantity=limit, sort_order=i))
+            product_ids.append(p.id)
+
+        set_product_ids = []
+        if set_members:
+            section = OfferSection(offer_page_id=page.id, section_type='set', set_name='Bench set',
+                                   set_max_sets=limit, sort_order=products)
+            db.session.add(section)
+            db.session.flush()
+            for i in range(set_members):
+                p = _product(f'Bench set {i + 1}')
+                db.session.add(OfferSetItem(section_id=section.id, product_id=p.id,
+                                            quantity_per_set=1, sort_order=i))
+                set_product_ids.append(p.id)
+
+        users = []
+        for i in range(buyers):
+            u = User(email=f'bench{i}-{uuid.uuid4().hex[:8]}@local.test', role='client',
+                     is_active=True, email_verified=True)
+            db.session.add(u)
+            users.append(u)
+        db.session.commit()
+
+        return {
+            'page_id': page.id,
+            'token': page.token,
+            'product_ids': product_ids,
+            'set_product_ids': set_product_ids,
+            'limits': {pid: limit for pid in product_ids + set_product_ids},
+            'user_ids': [u.id for u in users],
+        }
+
+
+# ============================================
+# Pomiar: latencje i zapytania per operacja
+# ============================================
+
+class Recorder:
+    """Zbiera latencje, wyniki i liczbę zapytań SQL per (transport, operacja)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.latencies = defaultdict(list)      # {(transport, op): [ms]}
+        self.outcomes = defaultdict(Counter)    # {(transport, op): Counter(kod)}
+        self.queries = defaultdict(int)         # {(transport, op): suma zapytań}
+        self.background_queries = 0
+
+    def attach(self, engine):
+        from sqlalchemy import event
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def _count(conn, cursor, statement, parameters, context, executemany):
+            current = getattr(self._local, 'current', None)
+            if current is not None:
+                current[0] += 1
+            else:
+                with self._lock:
+                    self.background_queries += 1
+
+    def measure(self, transport, op, fn):
+        """Wykonuje fn() i zapisuje czas, liczbę zapytań i kod wyniku."""
+        counter = [0]
+        self._local.current = counter
+        start = time.perf_counter()
+        try:
+            result = fn()
+            outcome = 'ok' if result.get('success') else _error_code(result)
+        except Exception as e:
+            result = None
+            outcome = f'exception:{type(e).__name__}'
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self._local.current = None
+        with self._lock:
+            self.latencies[(transport, op)].append(elapsed)
+            self.outcomes[(transport, op)][outcome] += 1
+            self.queries[(transport, op)] += counter[0]
+        return result
+
+    def report(self):
+        rows = {}
+        for key in sorted(self.latencies, key=lambda k: (k[0], OPERATIONS.index(k[1]))):
+            samples = sorted(self.latencies[key])
+            count = len(samples)
+            rows[f'{key[0]}.{key[1]}'] = {
+                'count': count,
+                'outcomes': dict(self.outcomes[key]),
+                'p50_ms': round(_percentile(samples, 50), 2),
+                'p95_ms': round(_percentile(samples, 95), 2),
+                'p99_ms': round(_percentile(samples, 99), 2),
+                'max_ms': round(samples[-1], 2),
+                'queries_avg': round(self.queries[key] / count, 2),
+            }
+        return rows
+
+
+def _error_code(result):
+    error = result.get('error')
+    if isinstance(error, dict):      # koperta mobile API
+        return error.get('code', 'error')
+    return error or 'error'
+
+
+def _percentile(samples, pct):
+    """Percentyl metodą nearest-rank (samples posortowane)."""
+    if not samples:
+        return 0.0
+    rank = max(1, -(-pct * len(samples) // 100))
+    return samples[int(rank) - 1]
+
+
+# ============================================
+# Kupujący
+# ============================================
+
+class Buyer:
+    """Symulowany kupujący: klient HTTP (sesja Flask-Login) + opcjonalnie Socket.IO."""
+
+    def __init__(self, app, seed_data, user_id, transport, recorder, rng):
+        self.app = app
+        self.seed = seed_data
+        self.user_id = user_id
+        self.transport = transport
+        self.recorder = recorder
+        self.rng = rng
+        self.session_id = str(uuid.uuid4())
+        self.http = app.test_client()
+        with self.http.session_transaction() as sess:
+            sess['_user_id'] = str(user_id)
+            sess['_fresh'] = True
+        self.sio = None
+
+    def _url(self, action):
+        return f"/offer/{self.seed['token']}/{action}"
+
+    def _post(self, action, payload):
+        resp = self.http.post(self._url(action), json={'session_id': self.session_id, **payload})
+        return resp.get_json() or {'success': False, 'error': f'http_{resp.status_code}'}
+
+    def _emit(self, event, payload):
+        ack = self.sio.emit(event, {'page_id': self.seed['page_id'], 'session_id': self.session_id,
+                                    **payload}, callback=True)
+        return ack or {'success': False, 'error': 'no_ack'}
+
+    def connect(self):
+        if self.transport != 'socketio':
+            return
+        from extensions import socketio
+        self.sio = socketio.test_client(self.app, flask_test_client=self.http)
+        self.recorder.measure(self.transport, 'join', lambda: self.sio.emit('join_offer_reservation', {
+            'page_id': self.seed['page_id'],
+            'session_id': self.session_id,
+            'user_id': self.user_id,
+            'token': self.seed['token'],
+        }, callback=True) or {'success': False, 'error': 'no_ack'})
+
+    def reserve(self, product_id, quantity=1):
+        if self.sio:
+            call = lambda: self._emit('reserve_product', {'product_id': product_id, 'quantity': quantity})
+        else:
+            call = lambda: self._post('reserve', {'product_id': product_id, 'quantity': quantity})
+        return self.recorder.measure(self.transport, 'reserve', call)
+
+    def reserve_batch(self, product_ids):
+        items = [{'product_id': pid, 'quantity': 1} for pid in product_ids]
+        if self.sio:
+            call = lambda: self._emit('reserve_products', {'items': items})
+        else:
+            call = lambda: self._post('reserve', {'items': items})
+        return self.recorder.measure(self.transport, 'reserve_batch', call)
+
+    def release(self, product_id, quantity=1):
+        if self.sio:
+            # release_product nie zwraca ack — sukces = brak wyjątku
+            call = lambda: (self.sio.emit('release_product', {
+                'page_id': self.seed['page_id'], 'session_id': self.session_id,
+                'product_id': product_id, 'quantity': quantity}) or {'success': True})
+        else:
+            call = lambda: self._post('release', {'product_id': product_id, 'quantity': quantity})
+        return self.recorder.measure(self.transport, 'release', call)
+
+    def extend(self):
+        if self.sio:
+            call = lambda: self._emit('extend_reservation', {})
+        else:
+            call = lambda: self._post('extend', {})
+        return self.recorder.measure(self.transport, 'extend', call)
+
+    def place_order(self):
+        # Składanie zamówienia jest tylko po HTTP (także dla klientów Socket.IO)
+        return self.recorder.measure(self.transport, 'place_order',
+                                     lambda: self._post('place-order', {'full_set_items': []}))
+
+    def run(self, barrier, picks, release_probability, batch_set):
+        self.connect()
+        barrier.wait()
+
+        reserved = []
+        if batch_set and self.seed['set_product_ids']:
+            result = self.reserve_batch(self.seed['set_product_ids'])
+            if result and result.get('success'):
+                reserved += [r['product_id'] for r in result.get('results', []) if r.get('success')]
+
+        for product_id in self.rng.sample(self.seed['product_ids'], min(picks, len(self.seed['product_ids']))):
+            result = self.reserve(product_id)
+            if result and result.get('success'):
+                reserved.append(product_id)
+
+        for product_id in list(reserved):
+            if self.rng.random() < release_probability:
+                self.release(product_id)
+                reserved.remove(product_id)
+
+        if reserved:
+            self.extend()
+            self.place_order()
+
+    def close(self):
+        if self.sio and self.sio.is_connected():
+            self.sio.disconnect()
+
+
+# ============================================
+# Kontrola oversellingu
+# ============================================
+
+def oversell_check(app, seed_data):
+    """
+    Dla każdego produktu z limitem: zamówione (bez anulowanych) + aktywne rezerwacje <= limit.
+
+    Returns:
+        dict: {'ok': bool, 'products': {product_id: {limit, ordered, reserved}}}
+    """
+    from sqlalchemy import func
+    from extensions import db
+    from modules.orders.models import Order, OrderItem
+    from modules.offers.models import OfferReservation
+
+    page_id = seed_data['page_id']
+    now = int(time.time())
+    with app.app_context():
+        ordered = dict(db.session.query(OrderItem.product_id, func.sum(OrderItem.quantity)).join(Order).filter(
+            Order.offer_page_id == page_id, Order.status != 'anulowane'
+        ).group_by(OrderItem.product_id).all())
+        reserved = dict(db.session.query(OfferReservation.product_id, func.sum(OfferReservation.quantity)).filter(
+            OfferReservation.offer_page_id == page_id, OfferReservation.expires_at > now
+        ).group_by(OfferReservation.product_id).all())
+
+    products = {}
+    ok = True
+    for product_id, limit in seed_data['limits'].items():
+        entry = {'limit': limit, 'ordered': int(ordered.get(product_id) or 0),
+                 'reserved': int(reserved.get(product_id) or 0)}
+        entry['oversold'] = entry['ordered'] + entry['reserved'] > limit
+        ok = ok and not entry['oversold']
+        products[str(product_id)] = entry
+    return {'ok': ok, 'products': products}
+
+
+# ============================================
+# Raport i porównanie
+# ============================================
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def print_report(result):
+    print(f"\n=== OFFERS BENCHMARK ({result['commit'] or 'no git'}) ===")
+    print(f"  {result['params']['buyers']} kupujących, transport={result['params']['transport']}, "
+          f"czas={result['duration_s']}s, baza={result['params']['database']}")
+    print(f"  {'operacja':<26}{'n':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'sql/op':>8}  wyniki")
+    for name, row in result['operations'].items():
+        print(f"  {name:<26}{row['count']:>6}{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}"
+              f"{row['p99_ms']:>9.1f}{row['queries_avg']:>8.1f}  {row['outcomes']}")
+    print(f"  zapytania w tle (timery/wątki): {result['background_queries']}")
+    oversold = [pid for pid, p in result['oversell']['products'].items() if p['oversold']]
+    if result['oversell']['ok']:
+        print("  ✅ OVERSELL OK — żaden produkt nie przekroczył limitu")
+    else:
+        print(f"  ❌ OVERSELL — przekroczony limit dla produktów: {oversold}")
+
+
+def compare(result, baseline_path):
+    """Wypisuje różnice p95 i zapytań/op względem poprzedniego wyniku."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\n=== PORÓWNANIE z {baseline_path} ({baseline.get('commit')}) ===")
+    for name, row in result['operations'].items():
+        base = baseline.get('operations', {}).get(name)
+        if not base:
+            print(f"  {name:<26} (brak w bazowym wyniku)")
+            continue
+        p95_delta = row['p95_ms'] - base['p95_ms']
+        q_delta = row['queries_avg'] - base['queries_avg']
+        print(f"  {name:<26} p95 {base['p95_ms']:.1f} → {row['p95_ms']:.1f} ms ({p95_delta:+.1f}), "
+              f"sql/op {base['queries_avg']:.1f} → {row['queries_avg']:.1f} ({q_delta:+.1f})")
+
+
+# ============================================
+# Main
+# ============================================
+
+def run(args):
+    tmpdir = None
+    database_url = args.database_url
+    if not database_url:
+        tmpdir = tempfile.mkdtemp(prefix='offers-bench-')
+        database_url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+
+    app = build_app(database_url, args.broadcast_window_ms)
+    seed_data = seed(app, args.products, args.set_members, args.limit, args.buyers)
+
+    from extensions import db
+    recorder = Recorder()
+    with app.app_context():
+        recorder.attach(db.engine)
+
+    rng = random.Random(args.seed)
+    buyers = []
+    for i, user_id in enumerate(seed_data['user_ids']):
+        if args.transport == 'mix':
+            transport = 'socketio' if i % 2 else 'http'
+        else:
+            transport = args.transport
+        buyers.append(Buyer(app, seed_data, user_id, transport, recorder, random.Random(rng.random())))
+
+    barrier = threading.Barrier(len(buyers))
+    errors = []
+
+    def _worker(buyer):
+        try:
+            buyer.run(barrier, args.picks, args.release_probability, not args.no_set_batch)
+        except Exception as e:
+            errors.append(f'{type(e).__name__}: {e}')
+            barrier.abort()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=_worker, args=(b,), name=f'buyer-{i}') for i, b in enumerate(buyers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    duration = time.perf_counter() - started
+    for b in buyers:
+        b.close()
+
+    result = {
+        'commit': _git_commit(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'params': {
+            'buyers': args.buyers, 'products': args.products, 'set_members': args.set_members,
+            'limit': args.limit, 'picks': args.picks, 'release_probability': args.release_probability,
+            'transport': args.transport, 'seed': args.seed, 'set_batch': not args.no_set_batch,
+            'database': database_url.split(':', 1)[0],
+        },
+        'duration_s': round(duration, 3),
+        'operations': recorder.report(),
+        'background_queries': recorder.background_queries,
+        'oversell': oversell_check(app, seed_data),
+        'worker_errors': errors,
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dropu ofert (reserve/release/extend/place-order).')
+    parser.add_argument('--buyers', type=int, default=20, help='liczba jednoczesnych kupujących')
+    parser.add_argument('--products', type=int, default=4, help='liczba sekcji produktowych')
+    parser.add_argument('--set-members', type=int, default=0, help='liczba produktów w secie (0 = bez setu)')
+    parser.add_argument('--limit', type=int, default=5, help='limit sekcji (max_quantity / set_max_sets)')
+    parser.add_argument('--picks', type=int, default=2, help='ile produktów rezerwuje każdy kupujący')
+    parser.add_argument('--release-probability', type=float, default=0.3,
+                        help='szansa zwolnienia każdej udanej rezerwacji przed zamówieniem')
+    parser.add_argument('--transport', choices=('http', 'socketio', 'mix'), default='mix')
+    parser.add_argument('--no-set-batch', action='store_true', help='nie rezerwuj setu przez reserve_products')
+    parser.add_argument('--broadcast-window-ms', type=int, default=0,
+                        help='OFFERS_BROADCAST_WINDOW_MS (0 = broadcast synchronicznie w operacji)')
+    parser.add_argument('--database-url', help='SQLAlchemy URL (domyślnie tymczasowy plik SQLite)')
+    parser.add_argument('--seed', type=int, default=1, help='seed generatora losowego')
+    parser.add_argument('--output', help='ścieżka pliku JSON z wynikiem')
+    parser.add_argument('--compare', help='poprzedni wynik JSON do porównania')
+    args = parser.parse_args()
+
+    result = run(args)
+    print_report(result)
+    if result['worker_errors']:
+        print(f"  ⚠️  błędy wątków: {result['worker_errors'][:3]}")
+    if args.compare:
+        compare(result, args.compare)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"\n  Zapisano: {args.output}")
+
+    sys.exit(0 if result['oversell']['ok'] and not result['worker_errors'] else 1)
+
+
+if __name__ == '__main__':
+    main()
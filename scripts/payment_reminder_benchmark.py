@@ -0,0 +1,258 @@
+"""
+Benchmark crona przypomnień o płatnościach — planer zbiorczy vs dawna pętla.
+
+Seed (bulk insert, in-memory SQLite z konfiguracji 'testing'):
+N syntetycznych zamówień rozłożonych na strony Offer (część zamkniętych,
+z terminem w przeszłości / za chwilę / za miesiąc), on_hand sprzed kilku dni,
+zamówienia 4-płatnościowe z partiami PL (terminy E2/E3), zlecenia wysyłki
+(E4), potwierdzenia płatności i wcześniej wysłane przypomnienia.
+
+Tryby:
+1. planner — run_payment_reminders(dry_run=True): czasy faz (rules,
+   candidates, preload, plan, send, deadline_exceeded) i liczba zapytań SQL,
+2. legacy (--legacy) — dawna pętla zamówienie × etap × reguła po
+   STAGE_DEFINITIONS z `.first()` na PaymentReminderLog; wolna (minuty przy
+   50k), dlatego opcjonalna. Porównuje też plan z wynikiem pętli.
+
+Przykład:
+    python scripts/payment_reminder_benchmark.py --orders 50000 --output reminders_bench.json
+    python scripts/payment_reminder_benchmark.py --orders 5000 --legacy
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def build_app():
+    """Aplikacja 'testing' (in-memory SQLite, StaticPool)."""
+    from app import create_app
+    from extensions import db
+
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def seed(count, seed_value=42):
+    """Wstawia `count` zamówień z zależnościami; zwraca liczniki seedu."""
+    from extensions import db
+    from modules.auth.models import User
+    from modules.offers.models import OfferPage
+    from modules.offers.reminder_models import PaymentReminderConfig, PaymentReminderLog
+    from modules.orders.models import (
+        Order, PaymentConfirmation, ShippingRequest, ShippingRequestOrder, get_local_now,
+    )
+    from modules.products.models import (
+        PolandOrder, PolandOrderItem, PolandOrderItemOrder, Product, ProxyOrder, ProxyOrderItem,
+    )
+
+    rnd = random.Random(seed_value)
+    now = get_local_now()
+    users = max(count // 10, 1)
+    db.session.bulk_insert_mappings(User, [
+        {'id': i, 'email': f'klient{i}@example.com', 'role': 'client', 'is_active': True, 'email_verified': True}
+        for i in range(1, users + 1)
+    ])
+
+    # Strony: zamknięte po terminie, zamknięte z terminem za chwilę, otwarte z odległym terminem
+    page_deadlines = [now - timedelta(days=rnd.randint(1, 400)) for _ in range(40)]
+    page_deadlines += [now + timedelta(hours=rnd.randint(1, 30)) for _ in range(5)]
+    page_deadlines += [now + timedelta(days=30)] * 5
+    db.session.bulk_insert_mappings(OfferPage, [
+        {'id': i, 'name': f'Drop {i}', 'token': f'drop-{i}', 'status': 'ended', 'created_by': 1,
+         'payment_deadline': deadline, 'is_fully_closed': deadline < now + timedelta(days=2)}
+        for i, deadline in enumerate(page_deadlines, start=1)
+    ])
+
+    batches = max(count // 250, 1)
+    db.session.bulk_insert_mappings(Product, [
+        {'id': 1, 'name': 'Album', 'sale_price': Decimal('10.00'), 'quantity': 0}
+    ])
+    db.session.bulk_insert_mappings(ProxyOrder, [
+        {'id': i, 'order_number': f'PRX/{i:05d}', 'order_type': 'polska'} for i in range(1, batches + 1)
+    ])
+    db.session.bulk_insert_mappings(ProxyOrderItem, [
+        {'id': i, 'proxy_order_id': i, 'product_id': 1, 'quantity': 1,
+         'unit_price': Decimal('10.00'), 'total_price': Decimal('10.00')}
+        for i in range(1, batches + 1)
+    ])
+    db.session.bulk_insert_mappings(PolandOrder, [
+        {'id': i, 'order_number': f'PRX/PL/{i:05d}', 'proxy_order_id': i,
+         'payment_deadline': now + timedelta(hours=rnd.randint(-2000, 200)),
+         'customs_payment_deadline': now + timedelta(hours=rnd.randint(-2000, 200)) if i % 2 else None}
+        for i in range(1, batches + 1)
+    ])
+    db.session.bulk_insert_mappings(PolandOrderItem, [
+        {'id': i, 'poland_order_id': i, 'proxy_order_item_id': i, 'product_id': 1, 'quantity': 1}
+        for i in range(1, batches + 1)
+    ])
+    db.session.bulk_insert_mappings(ShippingRequest, [
+        {'id': i, 'request_number': f'WYS/{i:06d}', 'payment_deadline': now + timedelta(hours=rnd.randint(-2000, 100))}
+        for i in range(1, batches + 1)
+    ])
+
+    rules = [
+        {'id': 1, 'reminder_type': 'before_deadline', 'hours': 24, 'payment_stage': 'product', 'enabled': True},
+        {'id': 2, 'reminder_type': 'before_deadline', 'hours': 2, 'payment_stage': 'product', 'enabled': True},
+        {'id': 3, 'reminder_type': 'after_order_placed', 'hours': 48, 'payment_stage': 'product', 'enabled': True},
+    ]
+    db.session.bulk_insert_mappings(PaymentReminderConfig, rules)
+
+    orders, links, shipping_links, confirmations, logs = [], [], [], [], []
+    statuses = ('nowe', 'oczekujace', 'dostarczone', 'spakowane', 'anulowane')
+    for i in range(1, count + 1):
+        kind = rnd.random()
+        order = {
+            'id': i, 'order_number': f'ST/{i:08d}', 'user_id': rnd.randint(1, users),
+            'status': rnd.choice(statuses), 'total_amount': Decimal('100.00'),
+            'created_at': now - timedelta(hours=rnd.randint(1, 24 * 400)),
+            'order_type': 'exclusive', 'shipping_cost': Decimal('0.00'),
+        }
+        if kind < 0.7:
+            order['offer_page_id'] = rnd.randint(1, len(page_deadlines))
+        elif kind < 0.8:
+            order['order_type'] = 'on_hand'
+        else:
+            order.update(payment_stages=4, proxy_shipping_cost=Decimal('15.00'), customs_vat_sale_cost=Decimal('30.00'))
+            links.append({'poland_order_item_id': rnd.randint(1, batches), 'order_id': i, 'quantity': 1})
+        if rnd.random() < 0.1:
+            order['shipping_cost'] = Decimal('20.00')
+            shipping_links.append({'shipping_request_id': rnd.randint(1, batches), 'order_id': i})
+        orders.append(order)
+        if rnd.random() < 0.6:
+            confirmations.append({'order_id': i, 'payment_stage': 'product', 'amount': Decimal('100.00'),
+                                  'status': rnd.choice(('approved', 'approved', 'pending', 'rejected'))})
+        if rnd.random() < 0.3:
+            logs.append({'order_id': i, 'config_id': 1, 'stage': 'product'})
+    db.session.bulk_insert_mappings(Order, orders)
+    db.session.bulk_insert_mappings(PolandOrderItemOrder, links)
+    db.session.bulk_insert_mappings(ShippingRequestOrder, shipping_links)
+    db.session.bulk_insert_mappings(PaymentConfirmation, confirmations)
+    db.session.bulk_insert_mappings(PaymentReminderLog, logs)
+    db.session.commit()
+    return {'orders': count, 'users': users, 'pages': len(page_deadlines), 'poland_batches': batches,
+            'poland_links': len(links), 'shipping_links': len(shipping_links),
+            'confirmations': len(confirmations), 'logs': len(logs)}
+
+
+def _legacy_plan(now):
+    """Dawna pętla crona (bez wysyłki): (order_id, etap, reguła) po STAGE_DEFINITIONS."""
+    from modules.offers.reminder_models import PaymentReminderConfig, PaymentReminderLog
+    from modules.orders.models import Order
+    from modules.orders.payment_overdue_service import STAGE_DEFINITIONS
+    from utils.offer_closure import CLOSED_ORDER_STATUSES
+
+    rules = PaymentReminderConfig.query.filter_by(enabled=True).order_by(PaymentReminderConfig.id).all()
+    due = []
+    for order in Order.query.filter(~Order.status.in_(CLOSED_ORDER_STATUSES)).order_by(Order.id):
+        for stage, definition in STAGE_DEFINITIONS.items():
+            if not definition['applies'](order) or definition['status'](order) not in ('none', 'rejected'):
+                continue
+            amount = definition['amount'](order)
+            if not amount or amount <= 0:
+                continue
+            deadline = definition['deadline'](order)
+            for rule in rules:
+                if rule.reminder_type == 'before_deadline':
+                    if deadline is None:
+                        continue
+                    trigger_time = deadline - timedelta(hours=rule.hours)
+                elif stage == 'product' and order.order_type in ('on_hand', 'preorder'):
+                    trigger_time = order.created_at + timedelta(hours=rule.hours)
+                else:
+                    continue
+                if trigger_time <= now and not PaymentReminderLog.query.filter_by(
+                        order_id=order.id, config_id=rule.id, stage=stage).first():
+                    due.append((order.id, stage, rule.id))
+    return due
+
+
+def _count_queries(fn):
+    from sqlalchemy import event
+    from extensions import db
+
+    counter = {'n': 0}
+
+    def _on_execute(*args):
+        counter['n'] += 1
+
+    event.listen(db.engine, 'before_cursor_execute', _on_execute)
+    try:
+        started = time.perf_counter()
+        value = fn()
+        elapsed = (time.perf_counter() - started) * 1000
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', _on_execute)
+    return value, round(elapsed, 1), counter['n']
+
+
+def run(args):
+    from extensions import db
+    from modules.offers.reminder_models import PaymentReminderConfig
+    from modules.orders.models import get_local_now
+    from modules.orders.payment_reminder_planner import plan_payment_reminders, run_payment_reminders
+
+    app = build_app()
+    result = {'params': {'orders': args.orders, 'legacy': args.legacy}}
+    with app.app_context(), app.test_request_context():
+        started = time.perf_counter()
+        result['seed'] = seed(args.orders)
+        result['seed']['ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+        now = get_local_now()
+        summary, elapsed, queries = _count_queries(
+            lambda: run_payment_reminders(dry_run=True, now=now, echo=lambda line: None)
+        )
+        result['planner'] = {'planned': summary['planned'], 'exceeded': summary['exceeded'],
+                             'total_ms': elapsed, 'queries': queries, 'timings': summary['timings']}
+
+        if args.legacy:
+            db.session.expire_all()
+            legacy, elapsed, queries = _count_queries(lambda: _legacy_plan(now))
+            rules = PaymentReminderConfig.query.filter_by(enabled=True).order_by(PaymentReminderConfig.id).all()
+            planned = [(r['order_id'], r['stage'], r['rule'].id) for r in plan_payment_reminders(rules, now)]
+            result['legacy'] = {'planned': len(legacy), 'total_ms': elapsed, 'queries': queries,
+                                'matches_planner': legacy == planned,
+                                'speedup': round(elapsed / result['planner']['total_ms'], 1)}
+    return result
+
+
+def print_report(result):
+    planner = result['planner']
+    print(f"\n=== PAYMENT REMINDER BENCHMARK ({result['params']['orders']} zamówień) ===")
+    print(f"  seed: {result['seed']['ms']:.0f} ms")
+    print(f"  planner: {planner['planned']} przypomnień, {planner['exceeded']} po terminie, "
+          f"{planner['total_ms']:.0f} ms, {planner['queries']} zapytań")
+    for phase, ms in planner['timings'].items():
+        print(f"    {phase:<20}{ms:>10.1f} ms")
+    if 'legacy' in result:
+        legacy = result['legacy']
+        print(f"  legacy: {legacy['planned']} przypomnień, {legacy['total_ms']:.0f} ms, {legacy['queries']} zapytań, "
+              f"x{legacy['speedup']}, zgodny plan: {legacy['matches_planner']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark planera przypomnień o płatnościach.')
+    parser.add_argument('--orders', type=int, default=50000, help='liczba syntetycznych zamówień')
+    parser.add_argument('--legacy', action='store_true', help='porównaj z dawną pętlą (wolne)')
+    parser.add_argument('--output', help='ścieżka pliku JSON z wynikiem')
+    args = parser.parse_args()
+
+    result = run(args)
+    print_report(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False, default=str)
+        print(f"\n  Zapisano: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -21,6 +21,9 @@ Sprawdzane inwarianty:
 - Visitor count: cross-process aktualizuje się real-time
 - Auto-increase: triggeruje gdy ≥50% produktów osiągnie 100%
 - Brak deadlocków, brak crashy workerów, brak tracebacków w logach
+
+Test całego stacku produkcyjnego. Powtarzalny benchmark bez infrastruktury
+(CI, laptop, porównanie między commitami): scripts/offers_benchmark.py.
 """
 import asyncio
 import random
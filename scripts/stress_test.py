@@ -15,6 +15,9 @@ Wymaga:
 - HTTP gunicorn na 127.0.0.1:8000, WS gunicorn na 127.0.0.1:8001
 - nginx na localhost:8090 (routuje /socket.io/ na 8001, reszta na 8000)
 - Redis na localhost:6379
+
+Test całego stacku produkcyjnego. Powtarzalny benchmark bez infrastruktury
+(CI, laptop, porównanie między commitami): scripts/offers_benchmark.py.
 """
 import asyncio
 import time
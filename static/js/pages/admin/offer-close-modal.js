@@ -77,6 +77,48 @@
         btn.querySelector('.btn-text').style.display = loading ? 'none' : 'inline';
         btn.querySelector('.btn-loading').style.display = loading ? 'inline-flex' : 'none';
         btn.disabled = loading;
+        if (!loading) setLoadingText('Przetwarzanie...');
+    }
+
+    function setLoadingText(text) {
+        const el = document.querySelector('#closeCompleteBtn .btn-loading-text');
+        if (el) el.textContent = text;
+    }
+
+    // Etapy zamykania w tle (utils/offer_closure.py, OfferPage.closure_state)
+    const CLOSURE_STAGES = {
+        queued: 'W kolejce...',
+        loading: 'Wczytywanie zamówień...',
+        allocating: 'Alokacja setów...',
+        saving: 'Zapisywanie...',
+        notifying: 'Wysyłka powiadomień...'
+    };
+    const CLOSURE_POLL_MS = 1000;
+
+    function describeClosure(closure) {
+        const label = CLOSURE_STAGES[closure.stage] || 'Przetwarzanie...';
+        return closure.total ? `${label} ${closure.done || 0}/${closure.total}` : label;
+    }
+
+    // Odpytuje status zamykania w tle aż do końca; rozwiązuje się danymi statusu.
+    function waitForClosure(statusUrl, onProgress) {
+        return new Promise((resolve, reject) => {
+            function poll() {
+                fetch(statusUrl, { headers: { 'Accept': 'application/json' } })
+                    .then(r => r.json())
+                    .then(data => {
+                        const closure = data.closure || {};
+                        if (closure.status === 'done' || closure.status === 'failed') {
+                            resolve(data);
+                            return;
+                        }
+                        if (onProgress) onProgress(describeClosure(closure));
+                        setTimeout(poll, CLOSURE_POLL_MS);
+                    })
+                    .catch(reject);
+            }
+            poll();
+        });
     }
 
     function postCloseComplete(pageId, sendEmails, paymentDeadline) {
@@ -147,7 +189,14 @@
 
         setLoading(true);
         try {
-            const data = await postCloseComplete(closePageId, sendEmails, paymentDeadline);
+            let data = await postCloseComplete(closePageId, sendEmails, paymentDeadline);
+            if (data.success && data.status_url) {
+                // Zamykanie w tle — czekaj na koniec, pokazując etap
+                const status = await waitForClosure(data.status_url, setLoadingText);
+                if (status.closure.status === 'failed') {
+                    data = { success: false, error: status.closure.error };
+                }
+            }
             if (data.success) {
                 // Redirect to summary page
                 if (data.redirect) {
@@ -179,7 +228,14 @@
         let ok = 0, fail = 0;
         for (const id of ids) {
             try {
-                const data = await postCloseComplete(id, sendEmails, paymentDeadline);
+                let data = await postCloseComplete(id, sendEmails, paymentDeadline);
+                if (data.success && data.status_url) {
+                    const status = await waitForClosure(data.status_url,
+                        text => setLoadingText(`${ok + fail + 1}/${ids.length}: ${text}`));
+                    if (status.closure.status === 'failed') {
+                        data = { success: false, error: status.closure.error };
+                    }
+                }
                 if (data.success) { ok++; } else { fail++; console.error('close-complete failed for', id, data.error); }
             } catch (e) {
                 fail++;
@@ -98,6 +98,7 @@ window.toggleOrderItems = function(orderId, totalItems) {
 
     // QR Upload state
     var paymentSocket = null;
+    var ocrSocket = null; // wyniki OCR wgranych potwierdzeń ('payment_ocr_result')
     var currentQrSessionToken = null;
     var qrUploadedFilename = null;
 
@@ -1033,6 +1034,7 @@ window.toggleOrderItems = function(orderId, totalItems) {
                                 updateCardStageStatus(us.order_id, us.stage, us.status);
                             });
                         }
+                        listenForOcrResult();
                         selectedOrders.clear();
                         selectedStages.clear();
                         document.querySelectorAll('.order-checkbox').forEach(function (cb) {
@@ -1325,6 +1327,37 @@ window.toggleOrderItems = function(orderId, totalItems) {
 
     var qrPollInterval = null;
 
+    /**
+     * Po wgraniu potwierdzenia OCR liczy się w tle (wątek lub `flask ocr-worker`).
+     * Wynik przychodzi eventem 'payment_ocr_result' do pokoju użytkownika —
+     * auto-zatwierdzone etapy zmieniają status bez przeładowania strony.
+     */
+    function listenForOcrResult() {
+        if (ocrSocket || typeof io === 'undefined') return;
+
+        try {
+            ocrSocket = io({ transports: ['websocket', 'polling'] });
+
+            // Także po reconnect — pokój nie przetrwa nowego połączenia
+            ocrSocket.on('connect', function() {
+                ocrSocket.emit('join_payment_ocr');
+            });
+
+            ocrSocket.on('payment_ocr_result', function(data) {
+                var autoApproved = false;
+                (data.confirmations || []).forEach(function(conf) {
+                    updateCardStageStatus(conf.order_id, conf.payment_stage, conf.status);
+                    if (conf.auto_approved) autoApproved = true;
+                });
+                if (autoApproved) {
+                    showToast('Płatność zweryfikowana automatycznie i zatwierdzona!', 'success');
+                }
+            });
+        } catch (e) {
+            console.error('Socket.IO unavailable:', e);
+        }
+    }
+
     function connectPaymentSocket(sessionToken) {
         if (paymentSocket) {
             paymentSocket.disconnect();
@@ -921,6 +921,8 @@ let reservationState = {
     countdownInterval: null,
     socketConnected: false,     // Czy SocketIO jest połączony
     forceDisconnected: false,   // Czy sesja została przejęta
+    availabilitySeq: null,      // Seq ostatnio nałożonego availability_updated (null = brak bazy)
+    resyncPending: false,       // Czy trwa pobieranie pełnego stanu po luce w seq
 };
 
 // Generate UUID v4
@@ -1008,14 +1010,28 @@ function initSocketConnection() {
     });
 
     // --- AVAILABILITY UPDATED (broadcast z serwera) ---
+    // mode 'full' = wszystkie produkty, 'delta' = tylko zmienione (seq rośnie o 1 na zmianę)
     socket.on('availability_updated', function(data) {
-        if (data && data.products) {
-            Object.entries(data.products).forEach(([productId, productData]) => {
-                updateProductAvailability(productId, productData);
-            });
-            // Re-ewaluuj kupony bonusowe (dostępność mogła się zmienić po auto-increase)
-            evaluateBonuses();
+        if (!data || !data.products) return;
+
+        const seq = data.seq;
+        const lastSeq = reservationState.availabilitySeq;
+        if (data.mode === 'delta' && seq != null && lastSeq != null && seq <= lastSeq) {
+            return;  // Już nałożone (snapshot z join/resync był nowszy)
+        }
+
+        Object.entries(data.products).forEach(([productId, productData]) => {
+            updateProductAvailability(productId, productData);
+        });
+        // Re-ewaluuj kupony bonusowe (dostępność mogła się zmienić po auto-increase)
+        evaluateBonuses();
+
+        if (seq == null) return;
+        if (data.mode === 'delta' && (lastSeq == null || seq > lastSeq + 1)) {
+            // Luka w seq — przegapiliśmy deltę, pobierz pełny stan
+            _resyncAvailability();
         }
+        reservationState.availabilitySeq = Math.max(seq, lastSeq || 0);
     });
 
     // --- PAGE STATUS CHANGED (admin zmienił status) ---
@@ -1093,6 +1109,28 @@ function _syncCartFromSnapshot(products) {
     }
 }
 
+/**
+ * Pobiera pełny stan dostępności po wykryciu luki w seq delt availability_updated.
+ */
+function _resyncAvailability() {
+    const socket = window.offerSocket;
+    if (!socket || !socket.connected || reservationState.resyncPending) return;
+
+    reservationState.resyncPending = true;
+    socket.emit('resync_offer_availability', {
+        page_id: window.offerPageId,
+    }, function(response) {
+        reservationState.resyncPending = false;
+        if (!response || !response.success) return;
+
+        Object.entries(response.products || {}).forEach(([productId, data]) => {
+            updateProductAvailability(productId, data);
+        });
+        evaluateBonuses();
+        reservationState.availabilitySeq = Math.max(response.seq || 0, reservationState.availabilitySeq || 0);
+    });
+}
+
 /**
  * Dołącza do rooma rezerwacji i pobiera snapshot dostępności.
  */
@@ -1110,6 +1148,7 @@ function _joinReservationRoom() {
         if (response && response.success) {
             console.log('[SocketIO] Dołączono do rezerwacji, snapshot otrzymany');
             reservationState.socketConnected = true;
+            reservationState.availabilitySeq = response.seq != null ? response.seq : null;
             reservationState.forceDisconnected = false;
 
             // Odblokuj przyciski (mogły być zablokowane przez force_disconnect)
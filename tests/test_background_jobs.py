@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def jobs(app):
+    from utils import background_jobs
+    app.config['BACKGROUND_JOBS_MAX_QUEUE'] = 3
+    app.config['BACKGROUND_JOBS_CONCURRENCY'] = {'slow': 1}
+    background_jobs.init_background_jobs(app)
+    background_jobs._types.clear()
+    yield background_jobs
+    background_jobs._types.clear()
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timeout'
+        time.sleep(0.01)
+
+
+def _stats(jobs, job_type):
+    return next(s for s in jobs.get_stats() if s['job_type'] == job_type)
+
+
+def test_job_runs_in_owning_app_with_shared_engine(app, db, jobs):
+    from flask import current_app
+    seen = {}
+    done = threading.Event()
+
+    def job(value):
+        seen['app'] = current_app._get_current_object()
+        seen['engine'] = db.engine
+        seen['value'] = value
+        done.set()
+
+    assert jobs.submit('quick', job, 42) is True
+    assert done.wait(5)
+    assert seen == {'app': app, 'engine': db.engine, 'value': 42}
+    _wait_for(lambda: _stats(jobs, 'quick')['completed'] == 1)
+
+
+def test_job_gets_blank_request_instead_of_submitting_one(app, jobs):
+    from flask import request
+    seen = {}
+    done = threading.Event()
+
+    def job():
+        seen['path'], seen['args'] = request.path, dict(request.args)
+        done.set()
+
+    with app.test_request_context('/admin/offers/1/close-complete?token=secret'):
+        assert jobs.submit('quick', job) is True
+    assert done.wait(5)
+    assert seen == {'path': '/', 'args': {}}
+
+
+def test_concurrency_limit_and_bounded_queue(app, jobs):
+    release = threading.Event()
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def job():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        release.wait(5)
+        with lock:
+            active[0] -= 1
+
+    accepted = [jobs.submit('slow', job) for _ in range(5)]
+    # 1 uruchomione + 3 w kolejce, piąte odrzucone
+    assert accepted == [True, True, True, True, False]
+    stats = _stats(jobs, 'slow')
+    assert (stats['running'], stats['pending'], stats['rejected']) == (1, 3, 1)
+
+    release.set()
+    _wait_for(lambda: _stats(jobs, 'slow')['completed'] == 4)
+    assert peak[0] == 1
+
+
+def test_failed_job_is_counted_and_timed(app, jobs):
+    def job():
+        time.sleep(0.02)
+        raise RuntimeError('boom')
+
+    jobs.submit('broken', job)
+    _wait_for(lambda: _stats(jobs, 'broken')['failed'] == 1)
+    stats = _stats(jobs, 'broken')
+    assert stats['running'] == 0 and stats['completed'] == 0
+    assert stats['max_run_ms'] >= 20
@@ -0,0 +1,116 @@
+import pytest
+
+
+@pytest.fixture
+def run_import(app, db, make_user, tmp_path):
+    from modules.imports.models import CsvImport
+    from modules.imports.csv_processor import _process_csv_import_internal, auto_map_columns
+
+    user = make_user(role='admin')
+
+    def _run(lines, **kwargs):
+        path = tmp_path / f'import{len(lines)}.csv'
+        path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+        columns = lines[0].split(';')
+        csv_import = CsvImport(
+            filename=path.name, user_id=user.id, total_rows=len(lines) - 1,
+            temp_file_path=str(path), column_mapping=auto_map_columns(columns),
+            processed_rows=0, successful_rows=0, failed_rows=0, **kwargs,
+        )
+        db.session.add(csv_import)
+        db.session.commit()
+        _process_csv_import_internal(csv_import.id)
+        return db.session.get(CsvImport, csv_import.id)
+    return _run
+
+
+def test_import_creates_updates_and_reports_rows(app, db, run_import, make_product):
+    from modules.products.models import Product
+    app.config['CSV_IMPORT_CHUNK_SIZE'] = 2
+    existing = make_product(name='Stara nazwa', sku='SKU-1', sale_price=10)
+
+    result = run_import([
+        'nazwa;sku;cena;tagi;kategoria',
+        'Nowa nazwa;SKU-1;15;;',
+        'Album A;SKU-2;20;kpop, album;Albumy',
+        ';SKU-3;30;;',
+        'Album B;SKU-4;abc;;',
+        'Album C;SKU-5;40;album;Albumy',
+    ], match_column='sku')
+
+    assert result.status == 'partial'
+    assert (result.successful_rows, result.failed_rows, result.processed_rows) == (3, 2, 5)
+    assert [e['row'] for e in result.error_log] == [3, 4]
+
+    db.session.expire_all()
+    assert db.session.get(Product, existing.id).name == 'Nowa nazwa'
+    album_a = Product.query.filter_by(sku='SKU-2').one()
+    album_c = Product.query.filter_by(sku='SKU-5').one()
+    assert sorted(t.name for t in album_a.tags) == ['album', 'kpop']
+    assert [t.name for t in album_c.tags] == ['album']
+    assert album_a.category_id == album_c.category_id is not None
+
+
+def test_duplicate_key_in_chunk_updates_first_row(app, db, run_import):
+    from modules.products.models import Product
+    result = run_import([
+        'nazwa;sku;cena',
+        'Pierwsza;DUP-1;10',
+        'Druga;DUP-1;12',
+    ], match_column='sku')
+
+    assert result.status == 'completed'
+    products = Product.query.filter_by(sku='DUP-1').all()
+    assert [(p.name, float(p.sale_price)) for p in products] == [('Druga', 12.0)]
+
+
+def test_failed_bulk_write_falls_back_to_rows(app, db, run_import):
+    from modules.products.models import Product
+    # Ten sam SKU w dwóch wierszach przy dopasowaniu po EAN — bulk insert
+    # łamie unikalność sku, ścieżka wiersz po wierszu wskazuje drugi wiersz
+    result = run_import([
+        'nazwa;sku;ean;cena',
+        'Pierwsza;SAME;5901234123457;10',
+        'Druga;SAME;5901234123464;10',
+    ], match_column='ean')
+
+    assert (result.successful_rows, result.failed_rows) == (1, 1)
+    assert result.error_log[0]['row'] == 2
+    assert Product.query.filter_by(sku='SAME').one().name == 'Pierwsza'
+
+
+def test_imported_products_are_searchable(app, db, run_import):
+    from modules.search.service import search
+    run_import(['nazwa;sku;cena', 'Żółty miś;MIS-1;10'], match_column='sku')
+    assert len(search('zolty', {'product': 5})['product']) == 1
+
+
+def test_rejected_row_leaves_no_created_dictionaries(app, db, run_import):
+    from modules.products.models import Category, Product
+    result = run_import([
+        'nazwa;sku;cena;kategoria',
+        'Album A;SKU-1;abc;Tylko odrzucony',
+        'Album B;SKU-2;10;Wspólna',
+        'Album C;SKU-3;abc;Wspólna',
+        'Album D;SKU-4;20;Wspólna',
+    ], match_column='sku')
+
+    assert (result.successful_rows, result.failed_rows) == (2, 2)
+    assert Category.query.filter_by(name='Tylko odrzucony').count() == 0
+    shared = Category.query.filter_by(name='Wspólna').one()
+    assert {p.category_id for p in Product.query} == {shared.id}
+
+
+def test_index_failure_does_not_rewrite_saved_chunk(app, db, run_import, monkeypatch):
+    from modules.imports import csv_processor
+    from modules.search import service as search_index
+    rows_retried = []
+    monkeypatch.setattr(csv_processor, '_import_row', lambda data, csv_import: rows_retried.append(data))
+
+    def _broken_reindex(entity_type, ids=None, batch_size=500):
+        raise RuntimeError('index unavailable')
+    monkeypatch.setattr(search_index, 'reindex', _broken_reindex)
+
+    result = run_import(['nazwa;sku;cena', 'Album A;SKU-1;10'], match_column='sku')
+
+    assert rows_retried == [] and result.status == 'failed'
@@ -0,0 +1,117 @@
+"""Masowe maile (utils/email_batch.py): wspólny render, render per odbiorca, pula MIME."""
+import email
+import email.header
+from decimal import Decimal
+
+import pytest
+
+
+@pytest.fixture
+def mail_context(app):
+    # Osobny kontekst aplikacji — current_user z renderingu nie zostaje w g testu
+    with app.app_context(), app.test_request_context():
+        yield app
+
+
+def test_shared_render_matches_prepare_email(mail_context):
+    from utils.email_batch import prepare_email_batch
+    from utils.email_sender import prepare_email
+
+    names = ['Jan', '<b>Ala & Ola</b>']
+    messages = prepare_email_batch(
+        'new_offer_page', 'Nowy drop',
+        [{'to': f'k{i}@example.com', 'idempotency_key': f'drop:{i}', 'user_name': name}
+         for i, name in enumerate(names)] + [{'to': None, 'user_name': 'Bez adresu'}],
+        shared={'page_name': 'Drop', 'page_url': 'https://example.com/drop'},
+        workers=1,
+    )
+
+    assert [m.recipients for m in messages] == [['k0@example.com'], ['k1@example.com']]
+    for msg, name in zip(messages, names):
+        legacy = prepare_email(msg.recipients[0], 'Nowy drop', 'new_offer_page', user_name=name,
+                               page_name='Drop', page_url='https://example.com/drop')
+        assert msg.html == legacy.html and msg.body == legacy.body
+        assert msg.mime.startswith(b'Content-Type: multipart/mixed')
+    assert '&lt;b&gt;Ala &amp; Ola&lt;/b&gt;' in messages[1].html
+    assert messages[1].idempotency_key == 'drop:1'
+
+
+def test_structured_context_renders_per_recipient(mail_context):
+    from utils.email_batch import prepare_email_batch
+
+    recipients = [{
+        'to': f'k{i}@example.com',
+        'subject': f'Zamówienie ST/{i}',
+        'customer_name': f'Klient {i}',
+        'items': [{'product_name': f'Album {i}', 'quantity': 1, 'price': 10.0, 'is_fulfilled': True}],
+        'fulfilled_total': Decimal('10.00'),
+        'shipping_cost': Decimal('0.00'),
+        'grand_total': Decimal('10.00'),
+        'order_number': f'ST/{i}',
+        'upload_payment_url': 'https://example.com/orders/1?action=upload_payment',
+    } for i in range(2)]
+
+    messages = prepare_email_batch('offer_closure', 'Podsumowanie', recipients, workers=1, shared={
+        'page_name': 'Drop', 'payment_methods': [{'name': 'BLIK'}], 'payment_deadline': None})
+
+    assert [m.subject for m in messages] == ['Zamówienie ST/0', 'Zamówienie ST/1']
+    assert 'Album 0' in messages[0].html and 'Album 1' not in messages[0].html
+    assert 'Album 1' in messages[1].html and 'BLIK' in messages[1].html
+
+
+def test_filtered_variable_falls_back_to_per_recipient_render(mail_context, monkeypatch):
+    from jinja2 import TemplateNotFound
+    from utils.email_batch import _BatchTemplate
+    env = mail_context.jinja_env
+    sources = {'emails/shout.html': '<p>{{ user_name }}: CZEŚĆ {{ user_name|upper }}, {{ page_name }}</p>'}
+
+    def _get_template(name):
+        if name not in sources:
+            raise TemplateNotFound(name)
+        return env.from_string(sources[name])
+
+    monkeypatch.setattr(env, 'get_template', _get_template)
+    template = _BatchTemplate(mail_context, 'shout', {'page_name': 'Drop'})
+
+    # |upper zmienia klucz znacznika — KeyError przy wypełnianiu, nie wyjątek z split()
+    assert template.split(['user_name'], {'user_name': 'Ala'}) is False
+    assert template.render({'user_name': 'Ola'})[0] == '<p>Ola: CZEŚĆ OLA, Drop</p>'
+
+
+def test_mime_pool_serializes_in_worker_processes(mail_context):
+    from utils.email_batch import prepare_email_batch
+    mail_context.config['EMAIL_MIME_POOL_MIN'] = 1
+
+    messages = prepare_email_batch(
+        'new_offer_page', 'Nowy drop: Żółw',
+        [{'to': f'k{i}@example.com', 'user_name': f'Klient {i}'} for i in range(3)],
+        shared={'page_name': 'Drop', 'page_url': 'https://example.com/drop'},
+        workers=2,
+    )
+
+    parsed = [email.message_from_bytes(m.mime) for m in messages]
+    assert [p['To'] for p in parsed] == ['k0@example.com', 'k1@example.com', 'k2@example.com']
+    assert str(email.header.make_header(email.header.decode_header(parsed[0]['Subject']))) == 'Nowy drop: Żółw'
+    assert parsed[2]['Message-ID'] == messages[2].msgId
+    html = next(part for part in parsed[1].walk() if part.get_content_type() == 'text/html')
+    assert 'Klient 1' in html.get_payload(decode=True).decode()
+
+
+def test_new_offer_page_notification_enqueues_batch(app, db, make_user):
+    from modules.notifications.models import EmailOutbox
+    from modules.offers.models import OfferPage
+    from utils.email_manager import EmailManager
+    app.config['EMAIL_OUTBOX_ENABLED'] = True
+    page = OfferPage(name='Drop', token='drop-token', created_by=make_user(role='admin').id)
+    db.session.add(page)
+    db.session.commit()
+    clients = [make_user(email=f'c{i}@example.com', first_name=f'Klient{i}') for i in range(3)]
+
+    with app.app_context(), app.test_request_context():
+        sent = EmailManager.notify_new_offer_page(page, clients)
+        EmailManager.notify_new_offer_page(page, clients)
+
+    assert sent == 3
+    rows = EmailOutbox.query.order_by(EmailOutbox.id).all()
+    assert [r.idempotency_key for r in rows] == [f'new-offer-page:{page.id}:{c.id}' for c in clients]
+    assert b'Klient2' in rows[2].message
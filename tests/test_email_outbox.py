@@ -0,0 +1,139 @@
+"""Outbox emaili (utils/email_outbox.py): kolejka, dedup, sender, retry, limiter."""
+import smtplib
+
+import pytest
+
+
+class _FakeSMTP:
+    instances = []
+
+    def __init__(self, fail=None):
+        self.sent = []
+        self.fail = fail if fail is not None else []      # wspólna lista dla kolejnych połączeń
+        self.closed = False
+        _FakeSMTP.instances.append(self)
+
+    def sendmail(self, sender, recipients, raw):
+        if self.fail:
+            raise self.fail.pop(0)
+        self.sent.append((sender, recipients, raw))
+
+    def quit(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def _outbox_enabled(app):
+    # Domyślnie outbox wyłączony (włącza go ProductionConfig)
+    app.config['EMAIL_OUTBOX_ENABLED'] = True
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    from utils import email_outbox
+    _FakeSMTP.instances = []
+    failures = []
+    monkeypatch.setattr(email_outbox, '_open_smtp', lambda: _FakeSMTP(failures))
+    return failures
+
+
+def _messages(count, key_prefix=None):
+    from flask import current_app
+    from utils.email_sender import prepare_email
+    # Osobny kontekst aplikacji — current_user z renderingu nie zostaje w g testu
+    with current_app.app_context(), current_app.test_request_context():
+        return [
+            prepare_email(f'klient{i}@example.com', f'Temat {i}', 'new_offer_page',
+                          idempotency_key=f'{key_prefix}:{i}' if key_prefix else None,
+                          user_name='Jan', page_name='Drop', page_url='https://example.com/drop')
+            for i in range(count)
+        ]
+
+
+def test_batch_enqueues_once_per_idempotency_key(app, db):
+    from utils.email_sender import send_email_batch
+    from modules.notifications.models import EmailOutbox
+
+    send_email_batch(_messages(3, key_prefix='drop-1'))
+    send_email_batch(_messages(4, key_prefix='drop-1'))      # 3 już w kolejce → 1 nowy
+    send_email_batch(_messages(2))                           # bez klucza — zawsze
+
+    rows = EmailOutbox.query.order_by(EmailOutbox.id).all()
+    assert len(rows) == 6
+    assert rows[0].recipients == ['klient0@example.com'] and rows[0].status == 'pending'
+    assert b'Temat 0' in rows[0].message
+
+
+def test_sender_reuses_one_connection(app, db, smtp):
+    from utils import email_outbox
+    from modules.notifications.models import EmailOutbox
+    app.config['EMAIL_RATE_BURST'] = 10
+    email_outbox.enqueue(_messages(5))
+
+    stats = email_outbox.run_sender(once=True)
+
+    assert stats == {'sent': 5, 'failed': 0, 'retried': 0}
+    assert len(_FakeSMTP.instances) == 1 and len(_FakeSMTP.instances[0].sent) == 5
+    assert _FakeSMTP.instances[0].closed
+    assert {r.status for r in EmailOutbox.query} == {'sent'}
+    assert email_outbox.get_stats()['sent_last_minute'] == 5
+
+
+def test_transient_error_retries_and_permanent_fails(app, db, smtp):
+    from utils import email_outbox
+    from modules.notifications.models import EmailOutbox
+    smtp.extend([smtplib.SMTPResponseException(454, b'Too many emails'),
+                 smtplib.SMTPRecipientsRefused({'x@example.com': (550, b'no such user')})])
+    first, second = email_outbox.enqueue(_messages(2)) and EmailOutbox.query.order_by(EmailOutbox.id).all()
+
+    stats = email_outbox.run_sender(once=True)
+
+    assert stats == {'sent': 0, 'failed': 1, 'retried': 1}
+    db.session.refresh(first)
+    db.session.refresh(second)
+    assert first.status == 'pending' and first.available_at > first.started_at
+    assert second.status == 'failed' and 'SMTPRecipientsRefused' in second.error
+    # Błąd zamyka połączenie — kolejna wiadomość idzie nowym
+    assert len(_FakeSMTP.instances) == 2
+    assert email_outbox.retry_failed() == 1
+    assert email_outbox.get_stats()['pending'] == 2
+
+
+def test_claim_size_fits_in_sending_timeout(app, db, smtp, monkeypatch):
+    from utils import email_outbox
+    assert email_outbox.claim_limit(50, 30 / 60.0, 300) == 50
+    assert email_outbox.claim_limit(50, 30 / 60.0, 60) == 15      # 0.5/s × 30 s
+    assert email_outbox.claim_limit(50, 1 / 60.0, 60) == 1
+
+    limits = []
+    monkeypatch.setattr(email_outbox, 'claim', lambda limit: limits.append(limit) or [])
+    app.config.update(EMAIL_RATE_PER_MINUTE=12, EMAIL_OUTBOX_SENDING_TIMEOUT=100)
+    email_outbox.run_sender(once=True)
+    assert limits == [10]
+
+
+def test_token_bucket_allows_burst_then_paces():
+    from utils.email_outbox import TokenBucket
+    now = [0.0]
+    sleeps = []
+
+    def _sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    bucket = TokenBucket(rate=0.5, burst=3, clock=lambda: now[0], sleep=_sleep)
+    assert [bucket.acquire() for _ in range(3)] == [0, 0, 0]
+    assert bucket.acquire() == pytest.approx(2.0)
+    now[0] += 10                                             # przerwa → znów seria
+    assert bucket.acquire() == 0 and sleeps == [pytest.approx(2.0)]
+
+
+def test_admin_outbox_endpoint(app, db, client, make_user, login):
+    from utils import email_outbox
+    email_outbox.enqueue(_messages(2))
+    login(make_user(role='admin', profile_completed=True))
+
+    data = client.get('/admin/email-outbox').get_json()
+
+    assert data['success'] and data['outbox']['pending'] == 2
+    assert data['outbox']['oldest_pending_seconds'] is not None
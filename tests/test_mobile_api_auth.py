@@ -384,7 +384,6 @@ def test_jwt_expired_token_envelope(client, db, make_user, app):
 def test_maintenance_mode_mobile_api(client, db, app):
     from modules.auth.models import Settings
     Settings.set_value('maintenance_mode', True, type='boolean')
-    app.maintenance_cache = {'enabled': False, 'checked_at': 0}  # wymuś świeży odczyt z DB
 
     # health i app-version działają mimo maintenance (apka wykrywa stan serwera)
     assert client.get('/api/mobile/v1/health').status_code == 200
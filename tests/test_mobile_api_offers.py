@@ -151,6 +151,24 @@ def test_reserve_then_availability_reflects(client, db, make_user, make_product)
     assert a.get_json()['data']['products'][str(prod.id)]['available'] == 3
 
 
+def test_reserve_schedules_expiry_timer_with_reservation_deadline(client, db, make_user, make_product,
+                                                                  monkeypatch):
+    from modules.offers import socket_events
+    from modules.offers.models import OfferSection, OfferReservation
+    scheduled = []
+    monkeypatch.setattr(socket_events, '_schedule_expiry_timer',
+                        lambda page_id, expires_at=None: scheduled.append((page_id, expires_at)))
+    h, _ = _auth(client, db, make_user)
+    page = _make_page(db, 'active')
+    prod = make_product(sale_price='10.00')
+    db.session.add(OfferSection(offer_page_id=page.id, section_type='product',
+                                product_id=prod.id, max_quantity=5, sort_order=0)); db.session.commit()
+    r = client.post(f'/api/mobile/v1/offers/{page.token}/reserve', headers=h,
+                    json={'session_id': 'mine', 'product_id': prod.id, 'quantity': 1})
+    assert r.status_code == 200
+    assert scheduled == [(page.id, OfferReservation.query.one().expires_at)]
+
+
 def test_reserve_insufficient_409(client, db, make_user, make_product):
     from modules.offers.models import OfferSection, OfferReservation
     import time
@@ -169,6 +187,44 @@ def test_reserve_insufficient_409(client, db, make_user, make_product):
     assert r.get_json()['error']['code'] == 'insufficient_availability'
 
 
+def test_reserve_batch_returns_per_item_results(client, db, make_user, make_product):
+    from modules.offers.models import OfferSection, OfferReservation
+    h, _ = _auth(client, db, make_user)
+    page = _make_page(db, 'active')
+    prod_a, prod_b, outside = (make_product(sale_price='10.00') for _ in range(3))
+    db.session.add_all([
+        OfferSection(offer_page_id=page.id, section_type='product',
+                     product_id=prod_a.id, max_quantity=5, sort_order=0),
+        OfferSection(offer_page_id=page.id, section_type='product',
+                     product_id=prod_b.id, max_quantity=1, sort_order=1),
+    ]); db.session.commit()
+    r = client.post(f'/api/mobile/v1/offers/{page.token}/reserve', headers=h, json={
+        'session_id': 'mine',
+        'items': [{'product_id': prod_b.id, 'quantity': 2},
+                  {'product_id': prod_a.id, 'quantity': 1},
+                  {'product_id': prod_a.id, 'quantity': 1},     # scalane z poprzednią pozycją
+                  {'product_id': outside.id, 'quantity': 1}]})
+    assert r.status_code == 200
+    data = r.get_json()['data']
+    assert data['reserved_count'] == 1
+    assert [(i['product_id'], i['success']) for i in data['results']] == sorted(
+        [(prod_a.id, True), (prod_b.id, False), (outside.id, False)])
+    results = {i['product_id']: i for i in data['results']}
+    assert results[prod_a.id]['reservation']['quantity'] == 2
+    assert results[prod_b.id]['error'] == 'insufficient_availability'
+    assert results[outside.id]['error'] == 'product_not_found'
+    assert [(res.product_id, res.quantity) for res in OfferReservation.query.all()] == [(prod_a.id, 2)]
+
+
+def test_reserve_batch_invalid_items_400(client, db, make_user):
+    h, _ = _auth(client, db, make_user)
+    page = _make_page(db, 'active')
+    r = client.post(f'/api/mobile/v1/offers/{page.token}/reserve', headers=h,
+                    json={'session_id': 'mine', 'items': [{'product_id': 'x'}]})
+    assert r.status_code == 400
+    assert r.get_json()['error']['code'] == 'invalid_input'
+
+
 def test_extend_once_then_already_extended(client, db, make_user, make_product):
     # reserve → extend (200) → extend ponownie (400 already_extended)
     from modules.offers.models import OfferSection
@@ -103,9 +103,14 @@ def test_orders_pagination(client, db, make_user, make_order):
     for _ in range(3):
         make_order(u)
     r = client.get('/api/mobile/v1/orders?per_page=2&page=1', headers=h)
-    assert r.get_json()['pagination'] == {'page': 1, 'per_page': 2, 'total': 3, 'has_next': True}
+    pagination = r.get_json()['pagination']
+    cursor = pagination.pop('next_cursor')
+    assert pagination == {'page': 1, 'per_page': 2, 'total': 3, 'has_next': True}
     r2 = client.get('/api/mobile/v1/orders?per_page=2&page=2', headers=h)
     assert r2.get_json()['pagination']['has_next'] is False
+    r3 = client.get(f'/api/mobile/v1/orders?per_page=2&page=2&cursor={cursor}', headers=h)
+    assert r3.get_json()['data'] == r2.get_json()['data']
+    assert r3.get_json()['pagination']['next_cursor'] is None
 
 
 def test_order_detail_requires_jwt(client, db, make_user, make_order):
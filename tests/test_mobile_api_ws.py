@@ -49,8 +49,10 @@ def _ws_handlers(app):
     from modules.offers.socket_events import (
         handle_join_offer_reservation,
         handle_reserve_product,
+        handle_reserve_products,
         handle_release_product,
         handle_extend_reservation,
+        handle_resync_offer_availability,
     )
     from modules.offers.redis_state import init_state
 
@@ -64,8 +66,10 @@ def _ws_handlers(app):
     socketio.on_event('disconnect', handle_disconnect)
     socketio.on_event('join_offer_reservation', handle_join_offer_reservation)
     socketio.on_event('reserve_product', handle_reserve_product)
+    socketio.on_event('reserve_products', handle_reserve_products)
     socketio.on_event('release_product', handle_release_product)
     socketio.on_event('extend_reservation', handle_extend_reservation)
+    socketio.on_event('resync_offer_availability', handle_resync_offer_availability)
     yield
 
 
@@ -488,3 +492,64 @@ def test_ws_web_also_receives_broadcast_from_app_reserve(app, db, make_user, mak
 
     web.disconnect()
     apk.disconnect()
+
+
+def test_ws_resync_returns_full_state_with_seq(app, db, make_user, make_product):
+    """
+    Klient z luką w seq delt 'availability_updated' pobiera pełny stan przez
+    'resync_offer_availability' — seq w odpowiedzi = seq ostatniego broadcastu.
+    """
+    u_web = make_user()
+    page = _make_offer_page(db, u_web)
+    prod = make_product()
+    _add_product_section(db, page, prod, max_quantity=10)
+
+    web = _connect_web(app)
+    joined = _join(web, page, 'web-resync-S', user_id=u_web.id)
+    assert joined['success'] is True and 'seq' in joined
+    assert _reserve(web, page, 'web-resync-S', prod, quantity=2)['success'] is True
+
+    broadcasts = [m['args'][0] for m in web.get_received() if m['name'] == 'availability_updated']
+    resync = web.emit('resync_offer_availability', {'page_id': page.id}, callback=True)
+    assert resync['success'] is True
+    assert resync['seq'] == broadcasts[-1]['seq']
+    assert resync['products'][str(prod.id)]['total_reserved'] == 2
+
+    # Sid spoza rooma rezerwacji nie dostaje stanu
+    outsider = _connect_web(app)
+    assert outsider.emit('resync_offer_availability', {'page_id': page.id},
+                         callback=True)['success'] is False
+
+    web.disconnect()
+    outsider.disconnect()
+
+
+def test_ws_reserve_products_batch_single_broadcast(app, db, make_user, make_product):
+    """
+    'reserve_products' rezerwuje kilka produktów w jednym wywołaniu: wynik per pozycja,
+    brak miejsca na jednym produkcie nie blokuje reszty, jeden broadcast dostępności.
+    """
+    u_web = make_user()
+    page = _make_offer_page(db, u_web)
+    prod_a, prod_b = make_product(), make_product()
+    _add_product_section(db, page, prod_a, max_quantity=10)
+    _add_product_section(db, page, prod_b, max_quantity=1)
+
+    web = _connect_web(app)
+    assert _join(web, page, 'web-batch-S', user_id=u_web.id)['success'] is True
+    web.get_received()
+
+    ack = web.emit('reserve_products', {
+        'page_id': page.id,
+        'session_id': 'web-batch-S',
+        'items': [{'product_id': prod_b.id, 'quantity': 2},
+                  {'product_id': prod_a.id, 'quantity': 3}],
+    }, callback=True)
+
+    assert ack['success'] is True and ack['reserved_count'] == 1
+    by_product = {r['product_id']: r for r in ack['results']}
+    assert by_product[prod_a.id]['reservation']['quantity'] == 3
+    assert by_product[prod_b.id]['error'] == 'insufficient_availability'
+    assert _names(web.get_received()).count('availability_updated') == 1
+
+    web.disconnect()
@@ -0,0 +1,114 @@
+"""Cache tekstu OCR (utils/ocr_cache.py) i regiony trybu staged (utils/ocr_verifier.py)."""
+import os
+import shutil
+from decimal import Decimal
+
+import pytest
+
+
+@pytest.fixture
+def proof(tmp_path):
+    from PIL import Image
+    path = tmp_path / 'proof.png'
+    Image.new('RGB', (60, 40), 'white').save(path)
+    return str(path)
+
+
+@pytest.fixture
+def ocr_calls(monkeypatch):
+    from utils import ocr_verifier
+    calls = []
+
+    def fake_read(filepath, mode='full'):
+        calls.append((os.path.basename(filepath), mode))
+        return 'Kwota 150,00 PLN'
+    monkeypatch.setattr(ocr_verifier, 'read_proof_text', fake_read)
+    return calls
+
+
+def _job(db, filepath):
+    """Zadanie kolejki dla pliku — cache tekstu żyje w ocr_jobs."""
+    from modules.orders.models import OcrJob
+    from utils import ocr_cache
+    job = OcrJob(proof_file=os.path.basename(filepath), file_hash=ocr_cache.file_hash(filepath), payload={})
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def test_same_content_is_ocred_once_per_mode(app, db, proof, tmp_path, ocr_calls):
+    from utils import ocr_cache
+    copy = str(tmp_path / 'copy.png')
+    shutil.copy(proof, copy)
+    _job(db, proof)
+    _job(db, copy)
+
+    assert ocr_cache.read_text(proof) == 'Kwota 150,00 PLN'
+    assert ocr_cache.read_text(copy) == 'Kwota 150,00 PLN'       # ta sama zawartość
+    assert ocr_cache.read_text(proof, mode='staged') == 'Kwota 150,00 PLN'
+    assert ocr_calls == [('proof.png', 'full'), ('proof.png', 'staged')]
+
+
+def test_read_text_leaves_commit_to_caller(app, db, proof, ocr_calls):
+    from utils import ocr_cache
+    from modules.orders.models import OcrJob
+    job_id = _job(db, proof).id
+
+    ocr_cache.read_text(proof)
+    db.session.rollback()
+
+    assert db.session.get(OcrJob, job_id).ocr_text is None
+    ocr_cache.read_text(proof)
+    db.session.commit()
+    assert db.session.get(OcrJob, job_id).ocr_mode == 'full' and len(ocr_calls) == 2
+
+
+def test_retry_after_scoring_error_reuses_text(app, db, proof, ocr_calls, monkeypatch):
+    from utils import ocr_background, ocr_verifier
+    monkeypatch.setattr(ocr_background.time, 'sleep', lambda *_: None)
+    real_score, failures = ocr_verifier.score_proof_text, []
+
+    def flaky_score(*args, **kwargs):
+        if not failures:
+            failures.append(1)
+            raise RuntimeError('deadlock')
+        return real_score(*args, **kwargs)
+    monkeypatch.setattr(ocr_verifier, 'score_proof_text', flaky_score)
+
+    result = ocr_background._verify_with_retry({
+        'filepath': proof, 'expected_amount': Decimal('150'), 'order_numbers': []})
+    assert result['details']['amount']['match'] == 'exact'
+    assert len(ocr_calls) == 1
+
+
+def test_staged_regions_cover_value_lines_only():
+    from utils.ocr_verifier import _regions_from_words
+    # Przebieg lokalizujący w skali 0.5: logo, etykieta kwoty, kwota, stopka
+    words = [
+        ('MójBank', 1, 10, 20), ('Kwota', 2, 100, 10), ('150,00', 3, 115, 10),
+        ('PLN', 3, 115, 10), ('Pomoc', 4, 400, 10),
+    ]
+    data = {
+        'text': [w[0] for w in words], 'block_num': [1] * 5, 'par_num': [1] * 5,
+        'line_num': [w[1] for w in words], 'top': [w[2] for w in words],
+        'height': [w[3] for w in words],
+    }
+    # Dwie sąsiednie linie łączą się w jeden pas (w pikselach oryginału)
+    assert _regions_from_words(data, 0.5, 1000) == [(190, 291)]
+
+
+def test_staged_falls_back_to_full_page(monkeypatch):
+    from PIL import Image
+    from utils import ocr_verifier
+    image = Image.new('L', (200, 400), 255)
+    seen = []
+
+    def fake_extract(img):
+        seen.append(img.size)
+        return 'Kwota' if len(seen) == 1 else 'Kwota 10,00 zł'
+    monkeypatch.setattr(ocr_verifier, 'extract_text', fake_extract)
+
+    # Pas bez kwoty w tekście → OCR całej strony
+    monkeypatch.setattr(ocr_verifier, 'locate_regions', lambda img: [(0, 40)])
+    assert ocr_verifier.extract_text_staged(image) == 'Kwota 10,00 zł'
+    assert [size[1] for size in seen] == [200, 2000]
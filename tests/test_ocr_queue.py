@@ -0,0 +1,178 @@
+"""Kolejka OCR potwierdzeń (utils/ocr_queue.py): priorytety, dedup, cache, worker."""
+import os
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+
+
+@pytest.fixture
+def proofs(app):
+    from PIL import Image
+    from utils.ocr_background import proof_path
+    created = []
+
+    def _make(name, color='white'):
+        path = proof_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        Image.new('RGB', (60, 40), color).save(path)
+        created.append(path)
+        return name
+    yield _make
+    for path in created:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _confirmation(db, make_user, make_order, proof_file, amount='150.00'):
+    from modules.orders.models import PaymentConfirmation
+    order = make_order(make_user(), order_type='on_hand', status='nowe')
+    conf = PaymentConfirmation(order_id=order.id, payment_stage='product', amount=Decimal(amount),
+                               proof_file=proof_file, status='pending')
+    db.session.add(conf)
+    db.session.commit()
+    return conf
+
+
+def _task(proof_file, **extra):
+    return {'saved_filename': proof_file, 'payment_method_id': None, 'user_id': None,
+            'order_numbers': ['PO/00000001'], 'total_expected': 150.0, **extra}
+
+
+def test_uploads_before_backfill_and_dedup(app, db, proofs):
+    from utils import ocr_queue
+    from modules.orders.models import OcrJob
+    old, fresh = proofs('old.png'), proofs('fresh.png')
+
+    backfill = ocr_queue.enqueue(_task(old, auto_approve=False), priority=ocr_queue.PRIORITY_BACKFILL)
+    upload = ocr_queue.enqueue(_task(fresh))
+    again = ocr_queue.enqueue(_task(fresh, total_expected=200.0))
+    assert again.id == upload.id and OcrJob.query.count() == 2
+    assert again.payload['total_expected'] == 200.0
+    # Backfill nie nadpisuje czekającego uploadu (priorytet, auto-approve)
+    assert ocr_queue.enqueue(_task(fresh, auto_approve=False),
+                             priority=ocr_queue.PRIORITY_BACKFILL).payload.get('auto_approve', True)
+
+    assert [j.id for j in ocr_queue.claim(1)] == [upload.id]
+    assert [j.id for j in ocr_queue.claim(5)] == [backfill.id]
+    assert ocr_queue.claim(5) == []
+    assert db.session.get(OcrJob, upload.id).attempts == 1
+
+
+def test_cached_text_skips_ocr_and_auto_approves(app, db, proofs, make_user, make_order, monkeypatch):
+    from utils import ocr_queue
+    from utils.ocr_verifier import score_proof_text
+    from modules.orders.models import OcrJob
+    from modules.auth.models import Settings
+    Settings.set_value('ocr_auto_approve_threshold', 10, type='integer')
+    monkeypatch.setattr(ocr_queue, '_new_pool', lambda processes: pytest.fail('OCR not cached'))
+
+    first, copy = proofs('first.png'), proofs('copy.png')      # ta sama zawartość → ten sam hash
+    conf = _confirmation(db, make_user, make_order, copy)
+    text = 'Przelew 150,00 PLN tytuł PO/00000001'
+    done = ocr_queue.enqueue(_task(first))
+    done.status, done.ocr_text = 'done', text
+    db.session.commit()
+
+    ocr_queue.enqueue(_task(copy, order_numbers=[conf.order.order_number]))
+    stats = ocr_queue.run_worker(processes=1, once=True)
+
+    assert stats == {'done': 1, 'failed': 0, 'retried': 0, 'cached': 1}
+    expected = score_proof_text(text, Decimal('150'), [conf.order.order_number])['score']
+    db.session.refresh(conf)
+    assert conf.ocr_score == expected and conf.status == 'approved' and conf.auto_approved
+    assert OcrJob.query.filter_by(proof_file=copy).one().status == 'done'
+
+
+def test_worker_runs_ocr_in_process_pool(app, db, proofs, make_user, make_order):
+    from utils import ocr_queue
+    from modules.orders.models import OcrJob
+    a, b = proofs('a.png'), proofs('b.png', color='black')
+    conf = _confirmation(db, make_user, make_order, a)
+    ocr_queue.enqueue(_task(a))
+    ocr_queue.enqueue(_task(b, auto_approve=False), priority=ocr_queue.PRIORITY_BACKFILL)
+
+    stats = ocr_queue.run_worker(processes=2, once=True)
+
+    assert stats['done'] == 2 and stats['cached'] == 0
+    jobs = OcrJob.query.order_by(OcrJob.id).all()
+    assert [j.status for j in jobs] == ['done', 'done']
+    assert all(j.ocr_text is not None for j in jobs)       # cache dla kolejnych zadań
+    db.session.refresh(conf)
+    assert conf.ocr_details is not None and conf.status == 'pending'
+
+
+def test_failed_job_is_retried_with_backoff(app, db, proofs):
+    from utils import ocr_queue
+    from utils.ocr_background import MAX_OCR_RETRIES
+    from modules.orders.models import OcrJob
+    job = ocr_queue.enqueue(_task(proofs('x.png')))
+    ocr_queue.claim(1)
+
+    assert ocr_queue._fail(job.id, RuntimeError('tesseract crashed')) == 'retried'
+    job = db.session.get(OcrJob, job.id)
+    assert job.status == 'pending' and job.available_at > job.started_at
+    assert ocr_queue.claim(1) == []                          # backoff
+
+    job.attempts = MAX_OCR_RETRIES
+    db.session.commit()
+    assert ocr_queue._fail(job.id, RuntimeError('tesseract crashed')) == 'failed'
+
+
+def test_requeue_stale_skips_jobs_still_running_here(app, db, proofs):
+    from utils import ocr_queue
+    from modules.orders.models import OcrJob, get_local_now
+    mine = ocr_queue.enqueue(_task(proofs('mine.png')))
+    lost = ocr_queue.enqueue(_task(proofs('lost.png', color='black')))
+    ocr_queue.claim(2)
+    OcrJob.query.update({'started_at': get_local_now() - timedelta(hours=1)})
+    db.session.commit()
+
+    assert ocr_queue.requeue_stale(600, exclude_ids=[mine.id]) == 1
+    assert db.session.get(OcrJob, mine.id).status == 'running'
+    assert db.session.get(OcrJob, lost.id).status == 'pending'
+
+
+def _hang(filepath, mode):
+    time.sleep(60)
+
+
+def test_hung_ocr_process_is_killed_after_task_timeout(app, db, proofs, monkeypatch):
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    from utils import ocr_queue
+    from modules.orders.models import OcrJob
+    # fork: proces OCR dziedziczy podmienione _read_timed (spawn zaimportowałby oryginał)
+    monkeypatch.setattr(ocr_queue, '_new_pool', lambda processes: ProcessPoolExecutor(
+        max_workers=processes, mp_context=multiprocessing.get_context('fork')))
+    monkeypatch.setattr(ocr_queue, '_read_timed', _hang)
+    app.config['OCR_TASK_TIMEOUT'] = 1
+    job = ocr_queue.enqueue(_task(proofs('hung.png')))
+
+    started = time.monotonic()
+    stats = ocr_queue.run_worker(processes=1, once=True, poll_interval=0.2)
+
+    assert time.monotonic() - started < 10
+    assert stats['retried'] == 1 and stats['done'] == 0
+    job = db.session.get(OcrJob, job.id)
+    assert job.status == 'pending' and 'exceeded' in job.error
+
+
+def test_ocr_result_reaches_client_joined_from_upload_page(app, db, client, login, make_user):
+    from extensions import socketio
+    from modules.client.payment_socket_events import handle_join_payment_ocr, notify_ocr_result
+    # Handler na świeżym serwerze Socket.IO tego testu (patrz _ws_handlers w test_mobile_api_ws.py)
+    socketio.on_event('join_payment_ocr', handle_join_payment_ocr)
+    owner, other = make_user(), make_user()
+    login(owner)
+    tc = socketio.test_client(app, flask_test_client=client)
+    tc.emit('join_payment_ocr')          # static/js/pages/client/payment-confirmations.js
+    tc.get_received()
+
+    notify_ocr_result(other.id, {'proof_file': 'x.png', 'confirmations': []})
+    notify_ocr_result(owner.id, {'proof_file': 'y.png', 'confirmations': []})
+
+    received = [e for e in tc.get_received() if e['name'] == 'payment_ocr_result']
+    assert [e['args'][0]['proof_file'] for e in received] == ['y.png']
+    tc.disconnect()
@@ -0,0 +1,188 @@
+"""Zamknięcie strony (utils/offer_closure.py): alokacja w pamięci, zapis zbiorczy, zadanie w tle."""
+import re
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event
+
+
+@pytest.fixture
+def pushe(monkeypatch):
+    """Push bez wątku i bez FCM — zbiera wywołania _fire_and_forget."""
+    from utils.push_manager import PushManager
+
+    zlapane = []
+    monkeypatch.setattr(PushManager, '_fire_and_forget', staticmethod(lambda **kwargs: zlapane.append(kwargs)))
+    return zlapane
+
+
+@pytest.fixture
+def set_page(db, make_user, make_product):
+    """Zakończona strona exclusive z setem A + B (po 1 sztuce na komplet)."""
+    from modules.offers.models import OfferPage, OfferSection, OfferSetItem
+
+    admin = make_user(role='admin')
+    page = OfferPage(name='Drop', token='drop', status='ended', created_by=admin.id)
+    db.session.add(page)
+    db.session.commit()
+    section = OfferSection(offer_page_id=page.id, section_type='set', set_name='Komplet')
+    db.session.add(section)
+    db.session.commit()
+    a, b, gift = make_product(name='A', sale_price=10), make_product(name='B', sale_price=20), make_product(name='G')
+    db.session.add_all([
+        OfferSetItem(section_id=section.id, product_id=a.id, quantity_per_set=1, sort_order=0),
+        OfferSetItem(section_id=section.id, product_id=b.id, quantity_per_set=1, sort_order=1),
+    ])
+    db.session.commit()
+    return {'page': page, 'admin': admin, 'a': a, 'b': b, 'gift': gift}
+
+
+def _order(db, make_user, make_order, page, items, minute):
+    """Zamówienie z pozycjami [(produkt, ilość, cena, bonus)], created_at rosnące z `minute`."""
+    from datetime import datetime
+    from modules.orders.models import OrderItem
+
+    order = make_order(make_user(), offer_page_id=page.id, created_at=datetime(2026, 10, 1, 12, minute))
+    for product, qty, price, bonus in items:
+        db.session.add(OrderItem(order_id=order.id, product_id=product.id, quantity=qty,
+                                 price=Decimal(price), total=Decimal(price) * qty, is_bonus=bonus))
+    db.session.commit()
+    return order
+
+
+def test_closure_allocates_splits_and_logs_in_bulk(app, db, make_user, make_order, set_page, pushe):
+    from modules.admin.models import ActivityLog
+    from modules.orders.models import Order, OrderItem
+    from utils.offer_closure import close_offer_page
+    page, a, b, gift = set_page['page'], set_page['a'], set_page['b'], set_page['gift']
+    first = _order(db, make_user, make_order, page, [(a, 1, '10', False), (b, 1, '20', False)], 1)
+    split = _order(db, make_user, make_order, page, [(a, 2, '10', False), (b, 1, '20', False)], 2)
+    late = _order(db, make_user, make_order, page, [(a, 1, '10', False), (gift, 1, '0', True)], 3)
+
+    with app.test_request_context():
+        result = close_offer_page(page.id, set_page['admin'].id, send_emails=False)
+
+    assert result['allocation']['sets'][0]['complete_sets'] == 2
+    assert {k: result['status_updates'][k] for k in ('fully_fulfilled', 'partially_fulfilled', 'not_fulfilled')} \
+        == {'fully_fulfilled': 1, 'partially_fulfilled': 1, 'not_fulfilled': 1}
+    db.session.expire_all()
+    assert page.is_fully_closed and page.closed_by_id == set_page['admin'].id
+
+    items = OrderItem.query.filter_by(order_id=split.id, product_id=a.id).order_by(OrderItem.id).all()
+    assert [(i.quantity, i.fulfilled_quantity, i.is_set_fulfilled, i.total) for i in items] == [
+        (1, 1, True, Decimal('10.00')), (0, 0, False, Decimal('0.00'))]
+    assert db.session.get(Order, split.id).total_amount == Decimal('30.00')
+    assert db.session.get(Order, first.id).status == 'oczekujace'
+
+    late = db.session.get(Order, late.id)
+    assert late.status == 'anulowane' and late.total_amount == Decimal('0.00')
+    assert all(i.quantity == 0 for i in late.items)
+
+    actions = [log.action for log in ActivityLog.query.filter_by(entity_type='order')]
+    assert actions.count('offer_closure_fulfillment') == 3
+    assert actions.count('order_status_auto_updated') == 3
+    assert len(pushe) == 3
+
+
+def test_closure_writes_do_not_grow_with_order_count(app, db, make_user, make_order, set_page, pushe):
+    from utils.offer_closure import close_offer_page
+    page, a, b = set_page['page'], set_page['a'], set_page['b']
+    for minute in range(12):
+        _order(db, make_user, make_order, page, [(a, 1, '10', False), (b, 1 + minute % 2, '20', False)], minute)
+
+    writes = []
+    pattern = re.compile(r'^\s*(UPDATE|INSERT INTO|SELECT)\b.*?\b(order_items|orders|activity_log)\b', re.S)
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        match = pattern.match(statement)
+        if match and not statement.lstrip().startswith('SELECT'):
+            writes.append(match.group(2))
+
+    event.listen(db.engine, 'before_cursor_execute', _count)
+    try:
+        with app.test_request_context():
+            close_offer_page(page.id, set_page['admin'].id, send_emails=False)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', _count)
+
+    # Jedno UPDATE/INSERT per tabela i kształt wiersza (executemany), nie per zamówienie
+    assert len(writes) <= 6, writes
+
+
+def test_close_endpoint_queues_job_and_reports_progress(app, db, client, make_user, make_order, login,
+                                                       set_page, pushe, monkeypatch):
+    from utils import background_jobs
+    page, a, b = set_page['page'], set_page['a'], set_page['b']
+    _order(db, make_user, make_order, page, [(a, 1, '10', False), (b, 1, '20', False)], 1)
+    queued = []
+    monkeypatch.setattr(background_jobs, 'submit', lambda job_type, fn, *args: queued.append((job_type, fn, args)) or True)
+    login(make_user(role='admin', profile_completed=True))
+
+    response = client.post(f'/admin/offers/{page.id}/close-complete',
+                           json={'payment_deadline': '2099-01-01T12:00', 'send_emails': False},
+                           headers={'User-Agent': 'Panel/1.0'}, environ_base={'REMOTE_ADDR': '10.0.0.7'})
+
+    assert response.status_code == 202
+    status_url = response.get_json()['status_url']
+    assert client.get(status_url).get_json()['closure']['status'] == 'queued'
+    # Drugie kliknięcie w trakcie — odrzucone
+    assert client.post(f'/admin/offers/{page.id}/close-complete',
+                       json={'payment_deadline': '2099-01-01T12:00'}).status_code == 409
+
+    job_type, fn, args = queued[0]
+    assert job_type == 'offer_closure'
+    with app.app_context():
+        fn(*args)
+    # Zadanie commituje we własnym kontekście — sesja testu ma starą stronę
+    db.session.expire_all()
+
+    status = client.get(status_url).get_json()
+    assert status['is_fully_closed'] is True
+    assert status['closure']['status'] == 'done'
+    assert status['closure']['result']['status_updates']['fully_fulfilled'] == 1
+    # Logi zadania w tle mają IP i User-Agent admina z requestu
+    from modules.admin.models import ActivityLog
+    log = ActivityLog.query.filter_by(action='offer_closure_fulfillment').one()
+    assert (log.ip_address, log.user_agent) == ('10.0.0.7', 'Panel/1.0')
+
+
+def test_claim_is_atomic_and_takes_over_stale_closure(db, set_page):
+    from datetime import timedelta
+    from modules.offers.models import get_local_now
+    from utils.offer_closure import claim_offer_closure
+    page = set_page['page']
+
+    assert claim_offer_closure(page) is True
+    # Drugi claim (równoległe kliknięcie) widzi już 'queued'
+    assert claim_offer_closure(page) is False
+    db.session.commit()
+
+    stale = (get_local_now() - timedelta(minutes=30)).isoformat()
+    page.closure_state = {'status': 'running', 'stage': 'saving', 'updated_at': stale}
+    db.session.commit()
+    assert claim_offer_closure(page) is True
+    db.session.commit()
+    db.session.refresh(page)
+    assert page.closure_state['status'] == 'queued'
+
+
+def test_closure_reads_set_members_from_layout(app, db, make_user, make_order, set_page, pushe, monkeypatch):
+    from modules.offers.models import OfferSection, OfferSetItem
+    from utils.offer_closure import close_offer_page, get_live_summary
+    page, a, b = set_page['page'], set_page['a'], set_page['b']
+    _order(db, make_user, make_order, page, [(a, 2, '10', False), (b, 1, '20', False)], 1)
+
+    def _orm_traversal(*args, **kwargs):
+        raise AssertionError('set members must come from modules/offers/layout')
+
+    monkeypatch.setattr(OfferSection, 'get_set_items_ordered', _orm_traversal)
+    monkeypatch.setattr(OfferSetItem, 'get_products', _orm_traversal)
+
+    with app.test_request_context():
+        live = get_live_summary(page.id, include_orders=False)
+        result = close_offer_page(page.id, set_page['admin'].id, send_emails=False)
+
+    assert [(p['product_name'], p['quantity_per_set']) for p in live['sets'][0]['products']] == [('A', 1), ('B', 1)]
+    products = result['allocation']['sets'][0]['products']
+    assert [(p['product_name'], p['total_ordered']) for p in products] == [('A', 2), ('B', 1)]
+    assert result['allocation']['sets'][0]['complete_sets'] == 1
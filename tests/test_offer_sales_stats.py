@@ -0,0 +1,184 @@
+"""Agregaty sprzedaży stron Offer (modules/offers/sales_stats.py) i podsumowania na nich."""
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+
+@pytest.fixture
+def page(db, make_user):
+    from modules.offers.models import OfferPage
+
+    page = OfferPage(name='Drop', token='drop', status='active', created_by=make_user(role='admin').id)
+    db.session.add(page)
+    db.session.commit()
+    return page
+
+
+@pytest.fixture
+def place(db, make_user, make_order, page):
+    """Zamówienie strony z pozycjami [(produkt, ilość, cena, bonus)]; tracked=True — ścieżka z deltą."""
+    from modules.offers import sales_stats
+    from modules.orders.models import Order, OrderItem
+
+    counter = {'n': 0}
+
+    def _place(items, user=None, tracked=False):
+        user = user or make_user()
+        if not tracked:
+            order = make_order(user, offer_page_id=page.id, created_at=datetime(2026, 10, 1, 12, counter['n']))
+        else:
+            order = Order(order_number=f'TR/{counter["n"]}', user_id=user.id, status='nowe',
+                          offer_page_id=page.id, total_amount=Decimal('0.00'))
+            db.session.add(order)
+            sales_stats.track(order)
+            db.session.flush()
+        counter['n'] += 1
+        for product, qty, price, bonus in items:
+            db.session.add(OrderItem(order_id=order.id, product_id=product.id, quantity=qty,
+                                     price=Decimal(price), total=Decimal(price) * qty, is_bonus=bonus))
+        if tracked:
+            sales_stats.apply_orders(page.id, [order])
+        db.session.commit()
+        return order
+    return _place
+
+
+def _rows(rows):
+    return {(r['product_name'], r['selected_size']): (r['quantity'], r['item_count'], r['bonus_quantity'], r['revenue'])
+            for r in rows}
+
+
+def test_first_read_builds_and_placement_applies_delta(db, page, place, make_product, make_user):
+    from modules.offers import sales_stats
+    from modules.offers.models import OfferPageSales
+    a, b = make_product(name='A'), make_product(name='B')
+    buyer = make_user()
+    place([(a, 2, '10', False), (b, 1, '0', True)], user=buyer)
+    place([(a, 1, '10', False)])
+
+    totals, rows = sales_stats.get_page_stats(page.id)
+
+    assert totals == {'orders_count': 2, 'customers_count': 2}
+    assert _rows(rows) == {('A', None): (3, 2, 0, Decimal('30.00')), ('B', None): (1, 1, 1, Decimal('0.00'))}
+    built_at = db.session.get(OfferPageSales, page.id).built_at
+
+    # Ten sam klient, nowy produkt — delta w transakcji zamówienia, bez przebudowy
+    place([(a, 1, '10', False), (b, 2, '5', False)], user=buyer, tracked=True)
+
+    totals, rows = sales_stats.get_page_stats(page.id)
+    page_row = db.session.get(OfferPageSales, page.id)
+    assert not page_row.stale and page_row.built_at == built_at
+    assert totals == {'orders_count': 3, 'customers_count': 2}
+    assert _rows(rows) == {('A', None): (4, 3, 0, Decimal('40.00')), ('B', None): (3, 2, 1, Decimal('10.00'))}
+
+
+def test_untracked_change_marks_stale_and_next_read_rebuilds(db, page, place, make_product):
+    from modules.offers import sales_stats
+    from modules.offers.models import OfferPageSales
+    from modules.orders.models import OrderItem
+    a = make_product(name='A')
+    order = place([(a, 2, '10', False)])
+    sales_stats.get_page_stats(page.id)
+
+    # Edycja pozycji przez admina — poza ścieżką z deltą
+    item = OrderItem.query.filter_by(order_id=order.id).one()
+    item.quantity, item.total = 5, Decimal('50.00')
+    db.session.commit()
+    assert db.session.get(OfferPageSales, page.id).stale is True
+
+    _, rows = sales_stats.get_page_stats(page.id)
+    assert _rows(rows) == {('A', None): (5, 1, 0, Decimal('50.00'))}
+    assert db.session.get(OfferPageSales, page.id).stale is False
+
+    # Zmiana statusu między "żywymi" statusami nie unieważnia agregatów
+    order.status = 'oczekujace'
+    db.session.commit()
+    assert db.session.get(OfferPageSales, page.id).stale is False
+
+
+def test_cancel_offer_orders_subtracts_cancelled_orders(db, page, place, make_product, make_user):
+    from modules.offers import sales_stats
+    from modules.offers.models import OfferPageSales
+    from utils.offer_closure import cancel_offer_orders
+    a = make_product(name='A')
+    buyer = make_user()
+    first = place([(a, 2, '10', False)], user=buyer)
+    place([(a, 1, '10', False)], user=buyer)
+    other = place([(a, 3, '10', False)])
+    sales_stats.get_page_stats(page.id)
+
+    result = cancel_offer_orders(page.id, [first.id, other.id], 'Brak towaru', None, notify=False)
+
+    assert result['cancelled'] == 2
+    assert db.session.get(OfferPageSales, page.id).stale is False
+    totals, rows = sales_stats.get_page_stats(page.id)
+    assert totals == {'orders_count': 1, 'customers_count': 1}
+    assert _rows(rows) == {('A', None): (1, 1, 0, Decimal('10.00'))}
+
+
+def test_live_summary_reads_aggregates_and_loads_orders_on_demand(app, db, page, place, make_product):
+    from modules.offers.models import OfferSection, OfferSetItem
+    from utils.offer_closure import get_live_summary
+    a, b, gift = make_product(name='A'), make_product(name='B'), make_product(name='G')
+    section = OfferSection(offer_page_id=page.id, section_type='set', set_name='Komplet', set_max_sets=3)
+    db.session.add(section)
+    db.session.commit()
+    db.session.add_all([
+        OfferSetItem(section_id=section.id, product_id=a.id, quantity_per_set=1, sort_order=0),
+        OfferSetItem(section_id=section.id, product_id=b.id, quantity_per_set=1, sort_order=1),
+    ])
+    db.session.commit()
+    place([(a, 2, '10', False), (b, 1, '20', False)])
+    place([(b, 1, '20', False), (gift, 1, '0', True)], tracked=True)
+
+    with app.test_request_context():
+        light = get_live_summary(page.id, include_orders=False)
+        full = get_live_summary(page.id)
+
+    assert light['orders'] == [] and len(full['orders']) == 2
+    assert {k: light[k] for k in ('total_orders', 'unique_customers', 'total_items', 'total_bonus_items', 'total_revenue')} \
+        == {'total_orders': 2, 'unique_customers': 2, 'total_items': 4, 'total_bonus_items': 1, 'total_revenue': 60.0}
+    matrix = {p['product_name']: p['total_ordered'] for p in light['sets'][0]['products']}
+    assert matrix == {'A': 2, 'B': 2} and light['sets'][0]['ordered_sets'] == 2
+    assert [(p['product_name'], p['total_quantity'], p['revenue']) for p in light['products_aggregated']] \
+        == [('A', 2, 20.0), ('B', 2, 40.0), ('G', 1, 0.0)]
+    assert len(light['order_timestamps']) == 2
+
+
+def test_checkout_appends_delta_and_read_compacts_them(db, page, place, make_product, monkeypatch):
+    from modules.offers import sales_stats
+    from modules.offers.models import OfferPageSales, OfferSalesDelta
+    a = make_product(name='A')
+    place([(a, 1, '10', False)])
+    sales_stats.get_page_stats(page.id)
+    updated_at = db.session.get(OfferPageSales, page.id).updated_at
+
+    place([(a, 2, '10', False)], tracked=True)
+    place([(a, 1, '10', False)], tracked=True)
+
+    # Checkout nie dotyka wiersza strony — tylko dopisuje delty (liczniki + produkt)
+    assert db.session.get(OfferPageSales, page.id).updated_at == updated_at
+    assert OfferSalesDelta.query.filter_by(offer_page_id=page.id).count() == 4
+    totals, rows = sales_stats.get_page_stats(page.id)
+    assert totals['orders_count'] == 3 and _rows(rows) == {('A', None): (4, 3, 0, Decimal('40.00'))}
+
+    monkeypatch.setattr(sales_stats, 'COMPACT_DELTAS', 4)
+    assert sales_stats.get_page_stats(page.id) == (totals, rows)
+    assert OfferSalesDelta.query.filter_by(offer_page_id=page.id).count() == 0
+    assert db.session.get(OfferPageSales, page.id).orders_count == 3
+
+
+def test_rebuild_from_read_path_does_not_commit_callers_work(db, page, place, make_product):
+    from modules.offers import sales_stats
+    from modules.offers.models import OfferPage
+    a = make_product(name='A')
+    place([(a, 1, '10', False)])
+
+    # Niezapisana zmiana wołającego + odczyt z przebudową (brak agregatów)
+    db.session.get(OfferPage, page.id).name = 'Niezapisana'
+    totals, _ = sales_stats.get_page_stats(page.id)
+    assert totals['orders_count'] == 1
+
+    db.session.rollback()
+    assert db.session.get(OfferPage, page.id).name == 'Drop'
@@ -0,0 +1,135 @@
+from decimal import Decimal
+import time
+
+
+def _page_with_product(db, make_user, make_product, max_quantity=5):
+    from modules.offers.models import OfferPage, OfferSection
+    make_user()  # created_by=1
+    page = OfferPage(name='Drop', token=OfferPage.generate_token(), status='active',
+                     page_type='exclusive', payment_stages=3, created_by=1)
+    db.session.add(page); db.session.commit()
+    prod = make_product(sale_price=Decimal('20.00'))
+    db.session.add(OfferSection(offer_page_id=page.id, section_type='product',
+                                product_id=prod.id, max_quantity=max_quantity, sort_order=0))
+    db.session.commit()
+    return page, prod
+
+
+def _add_reservation(db, page, prod, session_id, qty):
+    from modules.offers.models import OfferReservation
+    now = int(time.time())
+    db.session.add(OfferReservation(session_id=session_id, offer_page_id=page.id, product_id=prod.id,
+                                    quantity=qty, reserved_at=now, expires_at=now + 120))
+    db.session.commit()
+
+
+def test_snapshot_built_from_db(app, db, make_user, make_product):
+    from modules.offers import availability
+    page, prod = _page_with_product(db, make_user, make_product, max_quantity=5)
+    _add_reservation(db, page, prod, 'sess-a', 2)
+
+    version, products = availability.get_snapshot(page.id)
+    assert version >= 1
+    assert products[str(prod.id)] == {'available': 3, 'total_reserved': 2, 'total_ordered': 0}
+
+
+def test_snapshot_served_from_cache_until_invalidated(app, db, make_user, make_product):
+    from modules.offers import availability
+    page, prod = _page_with_product(db, make_user, make_product, max_quantity=5)
+    version, _ = availability.get_snapshot(page.id)
+
+    # Zmiana w bazie z pominięciem delty — cache jej nie widzi...
+    _add_reservation(db, page, prod, 'sess-a', 1)
+    again, products = availability.get_snapshot(page.id)
+    assert again == version
+    assert products[str(prod.id)]['total_reserved'] == 0
+
+    # ...dopóki snapshot nie zostanie unieważniony
+    availability.invalidate(page.id)
+    rebuilt, products = availability.get_snapshot(page.id)
+    assert rebuilt > version
+    assert products[str(prod.id)]['total_reserved'] == 1
+
+
+def test_delta_updates_snapshot_and_version(app, db, make_user, make_product):
+    from modules.offers import availability
+    page, prod = _page_with_product(db, make_user, make_product, max_quantity=5)
+    version, _ = availability.get_snapshot(page.id)
+
+    availability.apply_delta(page.id, {prod.id: (2, 0)})
+    availability.apply_delta(page.id, {prod.id: (-1, 1)})
+    new_version, products = availability.get_snapshot(page.id)
+
+    assert new_version == version + 2
+    assert products[str(prod.id)] == {'available': 3, 'total_reserved': 1, 'total_ordered': 1}
+
+
+def test_reserve_and_release_apply_deltas(app, db, make_user, make_product):
+    from modules.offers import availability
+    from modules.offers.reservation import reserve_product, release_product
+    page, prod = _page_with_product(db, make_user, make_product, max_quantity=5)
+    availability.get_snapshot(page.id)
+
+    assert reserve_product('sess-a', page.id, prod.id, 3, section_max=5, user_id=1)[0]
+    _, products = availability.get_snapshot(page.id)
+    assert products[str(prod.id)]['available'] == 2
+
+    release_product('sess-a', page.id, prod.id, 1)
+    _, products = availability.get_snapshot(page.id)
+    assert products[str(prod.id)]['total_reserved'] == 2
+
+
+def test_stale_rebuild_is_not_stored(app, db, make_user, make_product):
+    from modules.offers.redis_state import get_state
+    page, prod = _page_with_product(db, make_user, make_product)
+    state = get_state()
+
+    expected = state.availability_version(page.id)
+    state.availability_apply(page.id, {prod.id: (1, 0)})   # równoległa mutacja w trakcie rebuildu
+    assert state.availability_load(page.id, expected, {prod.id: (0, 0)}, {prod.id: 5}, 0) is None
+    assert state.availability_get(page.id) is None
+
+
+def _capture_emits(monkeypatch):
+    from modules.offers import socket_events
+    sent = []
+    monkeypatch.setattr(socket_events.socketio, 'emit',
+                        lambda event, payload, to=None: sent.append((event, payload)))
+    return sent
+
+
+def test_broadcast_sends_full_then_deltas_with_seq(app, db, make_user, make_product, monkeypatch):
+    from modules.offers.socket_events import broadcast_availability_update
+    from modules.offers.reservation import reserve_product
+    page, prod = _page_with_product(db, make_user, make_product, max_quantity=5)
+    other = make_product(sale_price=Decimal('10.00'))
+    from modules.offers.models import OfferSection
+    db.session.add(OfferSection(offer_page_id=page.id, section_type='product',
+                                product_id=other.id, max_quantity=2, sort_order=1))
+    db.session.commit()
+    sent = _capture_emits(monkeypatch)
+
+    broadcast_availability_update(page.id)
+    assert reserve_product('sess-a', page.id, prod.id, 2, section_max=5, user_id=1)[0]
+    broadcast_availability_update(page.id)
+    broadcast_availability_update(page.id)   # bez zmian — brak emitu
+
+    payloads = [p for e, p in sent if e == 'availability_updated']
+    assert [p['mode'] for p in payloads] == ['full', 'delta']
+    assert set(payloads[0]['products']) == {str(prod.id), str(other.id)}
+    assert payloads[1]['products'] == {str(prod.id): {'available': 3, 'total_reserved': 2, 'total_ordered': 0}}
+    assert payloads[1]['seq'] == payloads[0]['seq'] + 1
+
+
+def test_delta_mode_can_be_disabled(app, db, make_user, make_product, monkeypatch):
+    from modules.offers.socket_events import broadcast_availability_update
+    from modules.offers.reservation import reserve_product
+    page, prod = _page_with_product(db, make_user, make_product)
+    app.config['OFFERS_AVAILABILITY_DELTA'] = False
+    sent = _capture_emits(monkeypatch)
+
+    broadcast_availability_update(page.id)
+    assert reserve_product('sess-a', page.id, prod.id, 1, section_max=5, user_id=1)[0]
+    broadcast_availability_update(page.id)
+
+    assert [p['mode'] for e, p in sent if e == 'availability_updated'] == ['full', 'full']
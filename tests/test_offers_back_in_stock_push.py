@@ -28,16 +28,24 @@ def _setup_subscription(db, make_user, make_product):
 
 
 def _seed_old_unavailable(page_id, product_id):
-    """Produkt był niedostępny (available=0) w poprzednim snapshocie."""
+    """Produkt był niedostępny (available=0) w poprzednio rozesłanej dostępności."""
     from modules.offers.redis_state import get_state
-    get_state().set_last_availability(page_id, {str(product_id): {'available': 0}})
+    get_state().publish_availability(page_id, {str(product_id): {'available': 0}})
+
+
+def _broadcast_back_in_stock(monkeypatch, page_id, product_id):
+    """Broadcast delty, w której produkt wraca na stan (available 0 → 5)."""
+    from modules.offers import availability, socket_events
+    monkeypatch.setattr(availability, 'get_snapshot',
+                        lambda pid: (1, {str(product_id): {'available': 5}}))
+    monkeypatch.setattr(socket_events.socketio, 'emit', lambda *args, **kwargs: None)
+    socket_events._emit_availability_update(page_id)
 
 
 def test_back_in_stock_offline_fires_push_alongside_email(
         app, db, make_user, make_product, monkeypatch):
     """User offline (brak aktywnego sid) + produkt wraca na stan → notify_back_in_stock
     wołane (Web Push + FCM) ORAZ e-mail nadal wysłany (parytet). Flaga notified=True."""
-    from modules.offers.socket_events import _check_notification_subscriptions
     from utils.push_manager import PushManager
 
     user, product, page, sub = _setup_subscription(db, make_user, make_product)
@@ -57,7 +65,7 @@ def test_back_in_stock_offline_fires_push_alongside_email(
     monkeypatch.setattr(PushManager, 'notify_back_in_stock', fake_push)
 
     with app.test_request_context():
-        _check_notification_subscriptions(page.id, {str(product.id): {'available': 5}})
+        _broadcast_back_in_stock(monkeypatch, page.id, product.id)
 
     # E-mail nadal wołany (parytet — push jest OBOK, nie zamiast)
     assert len(calls['email']) == 1
@@ -73,8 +81,7 @@ def test_back_in_stock_offline_fires_push_alongside_email(
 def test_back_in_stock_push_error_does_not_break_email(
         app, db, make_user, make_product, monkeypatch):
     """Wyjątek z notify_back_in_stock NIE może wywrócić przepływu: e-mail wysłany,
-    flaga notified ustawiona, brak propagacji wyjątku z _check_notification_subscriptions."""
-    from modules.offers.socket_events import _check_notification_subscriptions
+    flaga notified ustawiona, brak propagacji wyjątku z broadcastu dostępności."""
     from utils.push_manager import PushManager
 
     user, product, page, sub = _setup_subscription(db, make_user, make_product)
@@ -94,7 +101,7 @@ def test_back_in_stock_push_error_does_not_break_email(
 
     with app.test_request_context():
         # Nie może podnieść wyjątku — push owinięty w try/except
-        _check_notification_subscriptions(page.id, {str(product.id): {'available': 5}})
+        _broadcast_back_in_stock(monkeypatch, page.id, product.id)
 
     assert len(calls['email']) == 1
     db.session.refresh(sub)
@@ -0,0 +1,30 @@
+import argparse
+import importlib.util
+import os
+
+
+def _load_benchmark():
+    path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scripts', 'offers_benchmark.py')
+    spec = importlib.util.spec_from_file_location('offers_benchmark', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_benchmark_smoke_run_reports_operations_and_oversell(tmp_path):
+    bench = _load_benchmark()
+    args = argparse.Namespace(
+        buyers=4, products=2, set_members=3, limit=2, picks=2, release_probability=0.5,
+        transport='http', no_set_batch=False, broadcast_window_ms=0,
+        database_url=f"sqlite:///{tmp_path / 'bench.db'}", seed=3,
+    )
+
+    result = bench.run(args)
+
+    assert result['worker_errors'] == []
+    assert result['oversell']['ok'] is True
+    reserve = result['operations']['http.reserve']
+    assert reserve['count'] == 8
+    assert reserve['queries_avg'] > 0
+    assert {'p50_ms', 'p95_ms', 'p99_ms'} <= set(reserve)
+    assert result['operations']['http.reserve_batch']['count'] == 4
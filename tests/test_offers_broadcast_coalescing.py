@@ -0,0 +1,68 @@
+import threading
+
+
+def _scheduler_with_counter(monkeypatch):
+    from modules.offers import socket_events
+    emitted = []
+    done = threading.Event()
+
+    def _fake_emit(page_id):
+        emitted.append(page_id)
+        done.set()
+
+    monkeypatch.setattr(socket_events, '_emit_availability_update', _fake_emit)
+    return socket_events.AvailabilityBroadcastScheduler(), emitted, done
+
+
+def test_burst_is_coalesced_into_one_emit(app, monkeypatch):
+    scheduler, emitted, done = _scheduler_with_counter(monkeypatch)
+
+    scheduled = [scheduler.request(7, 0.05, app) for _ in range(20)]
+    assert scheduled.count(True) == 1
+    assert done.wait(2)
+
+    metrics = scheduler.metrics(7)
+    assert emitted == [7]
+    assert metrics['requests'] == 20
+    assert metrics['emits'] == 1
+    assert metrics['coalescing_ratio'] == 20
+    assert metrics['latency_max_ms'] >= 40
+    assert metrics['pending'] is False
+
+
+def test_request_after_flush_schedules_trailing_emit(app, monkeypatch):
+    scheduler, emitted, done = _scheduler_with_counter(monkeypatch)
+
+    scheduler.request(7, 0.01, app)
+    assert done.wait(2)
+    done.clear()
+
+    # Zmiana po flushu nie może przepaść — nowy timer
+    assert scheduler.request(7, 0.01, app) is True
+    assert done.wait(2)
+    assert emitted == [7, 7]
+
+
+def test_zero_window_emits_synchronously(app, monkeypatch):
+    from modules.offers import socket_events
+    emitted = []
+    monkeypatch.setattr(socket_events, '_emit_availability_update', emitted.append)
+
+    with app.app_context():
+        app.config['OFFERS_BROADCAST_WINDOW_MS'] = 0
+        socket_events.broadcast_availability_update(3)
+    assert emitted == [3]
+    assert socket_events.get_availability_broadcast_metrics(3)['emits'] >= 1
+
+
+def test_metrics_endpoint_for_admin(app, db, client, make_user, login):
+    from modules.offers.models import OfferPage
+    admin = make_user(role='admin', profile_completed=True)
+    page = OfferPage(name='Drop', token=OfferPage.generate_token(), status='active',
+                     page_type='exclusive', payment_stages=3, created_by=admin.id)
+    db.session.add(page); db.session.commit()
+
+    login(admin)
+    resp = client.get(f'/admin/offers/{page.id}/broadcast-metrics')
+    assert resp.status_code == 200
+    assert set(resp.get_json()['metrics']) >= {'requests', 'emits', 'coalescing_ratio', 'latency_avg_ms'}
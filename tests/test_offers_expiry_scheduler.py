@@ -0,0 +1,155 @@
+import time
+
+
+def _page(db, make_user):
+    from modules.offers.models import OfferPage
+    make_user()  # created_by=1
+    page = OfferPage(name='Drop', token=OfferPage.generate_token(), status='active',
+                     page_type='exclusive', payment_stages=3, created_by=1)
+    db.session.add(page); db.session.commit()
+    return page
+
+
+def _reservation(db, page, product, session_id, expires_at):
+    from modules.offers.models import OfferReservation
+    db.session.add(OfferReservation(session_id=session_id, offer_page_id=page.id, product_id=product.id,
+                                    quantity=1, reserved_at=expires_at - 120, expires_at=expires_at))
+    db.session.commit()
+
+
+def test_schedule_keeps_earliest_deadline_per_page(app):
+    from modules.offers.expiry import ExpiryScheduler
+    scheduler = ExpiryScheduler()
+    future = int(time.time()) + 600
+
+    assert scheduler.schedule(1, future, app) is True
+    assert scheduler.schedule(1, future + 30, app) is False     # późniejszy — ignorowany
+    assert scheduler.schedule(1, future - 30, app) is True      # wcześniejszy — przesuwa
+    assert scheduler.pending() == {1: future - 29}
+
+
+def test_tick_expires_many_pages_and_reschedules(app, db, make_user, make_product, monkeypatch):
+    from modules.offers import socket_events
+    from modules.offers.expiry import ExpiryScheduler
+    from modules.offers.models import OfferReservation
+    broadcasts = []
+    monkeypatch.setattr(socket_events, 'broadcast_availability_update', broadcasts.append)
+
+    page_a, page_b = _page(db, make_user), _page(db, make_user)
+    prod = make_product()
+    now = int(time.time())
+    _reservation(db, page_a, prod, 'a-old', now - 5)
+    _reservation(db, page_a, prod, 'a-new', now + 300)
+    _reservation(db, page_b, prod, 'b-old', now - 5)
+
+    scheduler = ExpiryScheduler()
+    scheduler.schedule(page_a.id, now + 600, app)   # ustawia app dla wątku schedulera
+    expired = scheduler.run_tick({page_a.id: now - 4, page_b.id: now - 4})
+
+    assert expired == {page_a.id: 1, page_b.id: 1}
+    assert sorted(broadcasts) == sorted([page_a.id, page_b.id])
+    assert [r.session_id for r in OfferReservation.query.all()] == ['a-new']
+    assert scheduler.pending() == {page_a.id: now + 301}
+
+
+def test_tick_skips_deadline_claimed_by_other_worker(app, db, make_user, make_product, monkeypatch):
+    from modules.offers import socket_events
+    from modules.offers.expiry import ExpiryScheduler
+    from modules.offers.redis_state import get_state
+    monkeypatch.setattr(socket_events, 'broadcast_availability_update', lambda page_id: None)
+
+    page = _page(db, make_user)
+    now = int(time.time())
+    _reservation(db, page, make_product(), 'old', now - 5)
+
+    # Inny worker zaklepał już ten termin
+    assert get_state().claim_once(f"offers_expiry:{page.id}:{now - 4}", 60)
+    assert ExpiryScheduler().run_tick({page.id: now - 4}) == {}
+
+
+def test_sweep_reaps_all_pages_and_reports_lag(app, db, make_user, make_product, monkeypatch):
+    from modules.offers import socket_events
+    from modules.offers.expiry import ExpiryScheduler, reaper_metrics
+    from modules.offers.models import OfferReservation
+    monkeypatch.setattr(socket_events, 'broadcast_availability_update', lambda page_id: None)
+
+    page_a, page_b = _page(db, make_user), _page(db, make_user)
+    prod = make_product()
+    now = int(time.time())
+    _reservation(db, page_a, prod, 'a-old', now - 10)
+    _reservation(db, page_b, prod, 'b-old', now - 4)
+    _reservation(db, page_b, prod, 'b-new', now + 300)
+    before = reaper_metrics()
+
+    assert ExpiryScheduler().sweep(now) == {page_a.id: 1, page_b.id: 1}
+    assert [r.session_id for r in OfferReservation.query.all()] == ['b-new']
+
+    metrics = reaper_metrics()
+    assert metrics['deleted'] - before['deleted'] == 2
+    assert metrics['last_lag_max_s'] == 10
+
+
+def test_reaper_metrics_are_shared_between_workers(app, client, make_user, login, monkeypatch):
+    from modules.offers import redis_state
+    from modules.offers.redis_state import InMemoryBackend
+    shared = InMemoryBackend()          # w produkcji: wspólny Redis wszystkich workerów
+    monkeypatch.setattr(redis_state, '_backend', shared)
+
+    # Przebiegi reapera w innym workerze — endpoint czyta je z backendu stanu, nie z pamięci modułu
+    shared.reaper_record(deleted=2, lag_total=12, lag_max=10, now=1000)
+    shared.reaper_record(deleted=1, lag_total=3, lag_max=3, now=1005)
+    login(make_user(role='admin', profile_completed=True))
+
+    metrics = client.get('/admin/offers/reaper-metrics').get_json()['metrics']
+    assert {k: metrics[k] for k in ('runs', 'deleted', 'lag_avg_s', 'lag_max_s', 'last_lag_max_s', 'last_run_at')} \
+        == {'runs': 2, 'deleted': 3, 'lag_avg_s': 5.0, 'lag_max_s': 10, 'last_lag_max_s': 3, 'last_run_at': 1005}
+
+
+def test_read_paths_ignore_expired_rows_without_deleting(app, db, make_user, make_product):
+    from modules.offers.models import OfferReservation, OfferSection
+    from modules.offers.reservation import get_availability_snapshot, reserve_product
+    page = _page(db, make_user)
+    prod = make_product()
+    db.session.add(OfferSection(offer_page_id=page.id, section_type='product',
+                                product_id=prod.id, max_quantity=2, sort_order=0))
+    db.session.commit()
+    _reservation(db, page, prod, 'sess-a', int(time.time()) - 5)
+
+    products, session = get_availability_snapshot(page.id, {prod.id: 2}, 'sess-a')
+    assert products[str(prod.id)]['user_reserved'] == 0
+    assert session['has_reservations'] is False
+    assert OfferReservation.query.count() == 1          # odczyt nic nie usunął
+
+    # Rezerwacja nadpisuje wygasły wiersz sesji zamiast doliczać do starej ilości
+    ok, result = reserve_product('sess-a', page.id, prod.id, 2, section_max=2, user_id=1)
+    assert ok and result['reservation']['quantity'] == 2
+    assert result['reservation']['expires_at'] > int(time.time())
+
+
+def test_reserve_routes_schedule_timer_with_reservation_deadline(client, db, make_user, make_product,
+                                                                 login, monkeypatch):
+    from modules.offers import socket_events
+    from modules.offers.models import OfferReservation, OfferSection
+    scheduled = []
+    monkeypatch.setattr(socket_events, '_schedule_expiry_timer',
+                        lambda page_id, expires_at=None: scheduled.append((page_id, expires_at)))
+
+    page = _page(db, make_user)
+    prod_a, prod_b = make_product(), make_product()
+    db.session.add_all([
+        OfferSection(offer_page_id=page.id, section_type='product', product_id=prod_a.id,
+                     max_quantity=5, sort_order=0),
+        OfferSection(offer_page_id=page.id, section_type='product', product_id=prod_b.id,
+                     max_quantity=5, sort_order=1),
+    ]); db.session.commit()
+    login(make_user())
+
+    single = client.post(f'/offer/{page.token}/reserve',
+                         json={'session_id': 'single', 'product_id': prod_a.id, 'quantity': 1})
+    batch = client.post(f'/offer/{page.token}/reserve',
+                        json={'session_id': 'batch', 'items': [{'product_id': prod_b.id, 'quantity': 1}]})
+    assert single.status_code == 200 and batch.status_code == 200
+
+    deadlines = {r.session_id: r.expires_at for r in OfferReservation.query.all()}
+    assert scheduled == [(page.id, deadlines['single']), (page.id, deadlines['batch'])]
+    assert all(expires_at is not None for _, expires_at in scheduled)
@@ -0,0 +1,180 @@
+from decimal import Decimal
+import time
+
+import pytest
+
+
+@pytest.fixture
+def counters(app):
+    # Testy nie mają Redis → state jest in-memory; wymuszamy silnik liczników.
+    app.config['OFFERS_RESERVATION_ENGINE'] = 'counters'
+    return app
+
+
+def _ex_order_type(db):
+    from modules.orders.models import OrderType
+    ot = OrderType.query.filter_by(slug='exclusive').first()
+    if not ot:
+        ot = OrderType(slug='exclusive', name='Exclusive', prefix='EX')
+        db.session.add(ot); db.session.commit()
+    return ot
+
+
+def _page_with_product(db, make_user, make_product, max_quantity=3):
+    from modules.offers.models import OfferPage, OfferSection
+    make_user()  # created_by=1
+    page = OfferPage(name='Drop', token=OfferPage.generate_token(), status='active',
+                     page_type='exclusive', payment_stages=3, created_by=1)
+    db.session.add(page); db.session.commit()
+    prod = make_product(sale_price=Decimal('20.00'))
+    db.session.add(OfferSection(offer_page_id=page.id, section_type='product',
+                                product_id=prod.id, max_quantity=max_quantity, sort_order=0))
+    db.session.commit()
+    return page, prod
+
+
+def test_engine_selection(app):
+    from modules.offers import inventory
+    app.config['OFFERS_RESERVATION_ENGINE'] = 'auto'
+    assert inventory.is_enabled() is False          # in-memory → stara ścieżka z lockami
+    app.config['OFFERS_RESERVATION_ENGINE'] = 'counters'
+    assert inventory.is_enabled() is True
+    app.config['OFFERS_RESERVATION_ENGINE'] = 'locking'
+    assert inventory.is_enabled() is False
+
+
+def test_reserve_stops_at_section_limit(counters, db, make_user, make_product):
+    from modules.offers.reservation import reserve_product
+    from modules.offers.models import OfferReservation
+    page, prod = _page_with_product(db, make_user, make_product, max_quantity=3)
+
+    ok, res = reserve_product('sess-a', page.id, prod.id, 2, section_max=3, user_id=1)
+    assert ok and res['available_quantity'] == 1
+    ok, res = reserve_product('sess-b', page.id, prod.id, 2, section_max=3, user_id=1)
+    assert not ok
+    assert res['error'] == 'insufficient_availability'
+    assert res['available_quantity'] == 1
+    assert res['check_back_at'] is not None
+    ok, res = reserve_product('sess-b', page.id, prod.id, 1, section_max=3, user_id=1)
+    assert ok and res['available_quantity'] == 0
+
+    rows = {r.session_id: r.quantity for r in OfferReservation.query.all()}
+    assert rows == {'sess-a': 2, 'sess-b': 1}
+
+
+def test_batch_reserve_through_counters(counters, db, make_user, make_product):
+    from modules.offers.reservation import reserve_products
+    from modules.offers.inventory import get_counts
+    from modules.offers.models import OfferReservation
+    page, prod = _page_with_product(db, make_user, make_product, max_quantity=3)
+
+    ok, res = reserve_products('sess-a', page.id, [{'product_id': prod.id, 'quantity': 2}], user_id=1)
+    assert ok and res['reserved_count'] == 1 and res['results'][0]['available_quantity'] == 1
+    ok, res = reserve_products('sess-b', page.id, [{'product_id': prod.id, 'quantity': 2}], user_id=1)
+    assert ok and res['reserved_count'] == 0
+    assert res['results'][0]['error'] == 'insufficient_availability'
+
+    assert get_counts(page.id, prod.id) == (2, 0)
+    assert {r.session_id: r.quantity for r in OfferReservation.query.all()} == {'sess-a': 2}
+
+
+def test_cold_start_loads_existing_reservations(counters, db, make_user, make_product):
+    from modules.offers.reservation import reserve_product
+    from modules.offers.models import OfferReservation
+    page, prod = _page_with_product(db, make_user, make_product, max_quantity=2)
+    now = int(time.time())
+    # Aktywna rezerwacja zapisana w bazie przed pierwszym użyciem liczników
+    db.session.add(OfferReservation(session_id='sess-old', offer_page_id=page.id, product_id=prod.id,
+                                    quantity=2, reserved_at=now, expires_at=now + 60))
+    db.session.commit()
+
+    ok, res = reserve_product('sess-new', page.id, prod.id, 1, section_max=2, user_id=1)
+    assert not ok and res['available_quantity'] == 0
+
+
+def test_expired_entries_do_not_block(counters, db, make_user, make_product):
+    from modules.offers.reservation import reserve_product
+    from modules.offers.models import OfferReservation
+    page, prod = _page_with_product(db, make_user, make_product, max_quantity=1)
+    now = int(time.time())
+    db.session.add(OfferReservation(session_id='sess-old', offer_page_id=page.id, product_id=prod.id,
+                                    quantity=1, reserved_at=now - 300, expires_at=now - 180))
+    db.session.commit()
+
+    ok, _ = reserve_product('sess-new', page.id, prod.id, 1, section_max=1, user_id=1)
+    assert ok
+
+
+def test_release_returns_capacity(counters, db, make_user, make_product):
+    from modules.offers.reservation import reserve_product, release_product
+    page, prod = _page_with_product(db, make_user, make_product, max_quantity=1)
+
+    assert reserve_product('sess-a', page.id, prod.id, 1, section_max=1, user_id=1)[0]
+    assert not reserve_product('sess-b', page.id, prod.id, 1, section_max=1, user_id=1)[0]
+    release_product('sess-a', page.id, prod.id, 1)
+    assert reserve_product('sess-b', page.id, prod.id, 1, section_max=1, user_id=1)[0]
+
+
+def test_place_order_moves_reserved_to_ordered(counters, app, db, make_user, make_product):
+    from modules.offers.reservation import reserve_product
+    from modules.offers.place_order import place_offer_order
+    from modules.offers import inventory
+    _ex_order_type(db)
+    page, prod = _page_with_product(db, make_user, make_product, max_quantity=3)
+    user = make_user()
+
+    assert reserve_product('sess-a', page.id, prod.id, 2, section_max=3, user_id=user.id)[0]
+    with app.test_request_context():
+        ok, _ = place_offer_order(page=page, session_id='sess-a', user=user)
+    assert ok
+    assert inventory.get_counts(page.id, prod.id) == (0, 2)
+
+
+def test_reconcile_rebuilds_from_db(counters, db, make_user, make_product, monkeypatch):
+    from modules.offers.reservation import reserve_product
+    from modules.offers.models import OfferReservation
+    from modules.offers import inventory
+    monkeypatch.setattr(inventory, 'PENDING_GRANT_S', 0)   # przyznanie sess-a już nie jest świeże
+    page, prod = _page_with_product(db, make_user, make_product, max_quantity=2)
+
+    assert reserve_product('sess-a', page.id, prod.id, 2, section_max=2, user_id=1)[0]
+    # Zmiana z pominięciem liczników (np. ręczne usunięcie przez admina)
+    OfferReservation.query.delete(); db.session.commit()
+    assert inventory.get_counts(page.id, prod.id) == (2, 0)
+
+    assert inventory.reconcile_page(page.id) == 1
+    assert inventory.get_counts(page.id, prod.id) == (0, 0)
+    assert reserve_product('sess-b', page.id, prod.id, 2, section_max=2, user_id=1)[0]
+
+
+def test_cold_load_does_not_overwrite_loaded_counters(counters, db, make_user, make_product):
+    from modules.offers import inventory
+    page, prod = _page_with_product(db, make_user, make_product, max_quantity=2)
+    expires_at = int(time.time()) + 600
+
+    # Worker A: zimny start + przyznanie w liczniku, wiersz w bazie jeszcze niezatwierdzony
+    assert inventory.try_reserve(page.id, prod.id, 'sess-a', 2, 2, expires_at) == (True, 0)
+    # Worker B przeczytał bazę przed commitem A — jego load nie może zgubić przyznania
+    assert inventory.ensure_loaded(page.id, prod.id) is False
+    assert inventory.try_reserve(page.id, prod.id, 'sess-b', 1, 2, expires_at) == (False, 0)
+
+
+def test_reconcile_keeps_pending_grants_and_concurrent_orders(counters, db, make_user, make_product,
+                                                              monkeypatch):
+    from modules.offers import inventory
+    from modules.offers.redis_state import get_state
+    page, prod = _page_with_product(db, make_user, make_product, max_quantity=5)
+    expires_at = int(time.time()) + 600
+    assert inventory.try_reserve(page.id, prod.id, 'sess-a', 2, 5, expires_at)[0]
+
+    # Zamówienie zatwierdzone w trakcie reconcile (po odczycie bazy) trafia do licznika
+    load_from_db = inventory._load_from_db
+
+    def _load_then_order(page_id, product_ids):
+        result = load_from_db(page_id, product_ids)
+        get_state().inventory_commit_order(page.id, prod.id, None, 1)
+        return result
+
+    monkeypatch.setattr(inventory, '_load_from_db', _load_then_order)
+    assert inventory.reconcile_page(page.id) == 1
+    assert inventory.get_counts(page.id, prod.id) == (2, 1)
@@ -0,0 +1,108 @@
+def _page(db, make_user):
+    from modules.offers.models import OfferPage
+    make_user()  # created_by=1
+    page = OfferPage(name='Drop', token=OfferPage.generate_token(), status='active',
+                     page_type='exclusive', payment_stages=3, created_by=1)
+    db.session.add(page); db.session.commit()
+    return page
+
+
+def _variant_group(db, *products):
+    from modules.products.models import VariantGroup
+    group = VariantGroup(name='Kolory')
+    group.products = list(products)
+    db.session.add(group); db.session.commit()
+    return group
+
+
+def test_layout_resolves_limits_by_section_priority(app, db, make_user, make_product):
+    from modules.offers.models import OfferSection, OfferSetItem
+    from modules.offers.layout import get_layout
+    page = _page(db, make_user)
+    direct, in_group, inactive, set_only, bundle = (make_product() for _ in range(5))
+    inactive.is_active = False
+    group = _variant_group(db, direct, in_group, inactive)
+
+    set_section = OfferSection(offer_page_id=page.id, section_type='set', set_name='Zestaw',
+                               set_max_sets=4, set_product_id=bundle.id, sort_order=0)
+    db.session.add_all([
+        set_section,
+        OfferSection(offer_page_id=page.id, section_type='variant_group',
+                     variant_group_id=group.id, max_quantity=3, sort_order=1),
+        OfferSection(offer_page_id=page.id, section_type='product',
+                     product_id=direct.id, max_quantity=1, sort_order=2),
+    ])
+    db.session.flush()
+    db.session.add_all([
+        OfferSetItem(section_id=set_section.id, product_id=direct.id, quantity_per_set=2),
+        OfferSetItem(section_id=set_section.id, product_id=set_only.id, quantity_per_set=1),
+    ])
+    db.session.commit()
+
+    layout = get_layout(page.id)
+    assert layout.section_max(direct.id) == 1        # sekcja produktowa wygrywa z setem i grupą
+    assert layout.section_max(in_group.id) == 3
+    assert layout.section_max(inactive.id) == 3      # limit jest, ale poza mapą dostępności
+    assert layout.section_max(set_only.id) == 4
+    assert layout.section_products() == {direct.id: 1, in_group.id: 3, set_only.id: 4}
+    assert layout.set_info(direct.id) == {'section_id': set_section.id, 'quantity_per_set': 2}
+    assert layout.set_product_ids == {bundle.id}
+    assert layout.set_sections[set_section.id]['products'] == {direct.id: 2, set_only.id: 1}
+
+
+def test_layout_is_cached_until_invalidated(app, db, make_user, make_product):
+    from modules.offers.models import OfferSection
+    from modules.offers.layout import get_layout, invalidate
+    from modules.offers.reservation import get_section_max_for_product
+    page = _page(db, make_user)
+    prod = make_product()
+    section = OfferSection(offer_page_id=page.id, section_type='product',
+                           product_id=prod.id, max_quantity=2, sort_order=0)
+    db.session.add(section); db.session.commit()
+
+    first = get_layout(page.id)
+    assert get_layout(page.id) is first
+
+    section.max_quantity = 5
+    db.session.commit()
+    assert get_section_max_for_product(page.id, prod.id) == 2   # bez invalidate — stary układ
+
+    invalidate(page.id)
+    assert get_section_max_for_product(page.id, prod.id) == 5
+
+
+def test_layout_shared_through_state_between_workers(app, db, make_user, make_product, monkeypatch):
+    from modules.offers import layout
+    from modules.offers.models import OfferSection
+    page = _page(db, make_user)
+    prod = make_product()
+    db.session.add(OfferSection(offer_page_id=page.id, section_type='product',
+                                product_id=prod.id, max_quantity=2, sort_order=0))
+    db.session.commit()
+    layout.get_layout(page.id)
+
+    # Inny worker: pusty cache procesu, układ przychodzi ze state — bez budowania z bazy
+    monkeypatch.setattr(layout, '_local', {})
+    monkeypatch.setattr(layout, 'build', lambda page_id: (_ for _ in ()).throw(AssertionError('rebuilt')))
+    assert layout.get_layout(page.id).section_max(prod.id) == 2
+
+
+def test_save_sections_invalidates_layout(app, db, client, make_user, make_product, login):
+    from modules.offers.models import OfferPage, OfferSection
+    from modules.offers.reservation import get_section_max_for_product
+    admin = make_user(role='admin', profile_completed=True)
+    page = OfferPage(name='Drop', token=OfferPage.generate_token(), status='draft',
+                     page_type='exclusive', payment_stages=3, created_by=admin.id)
+    db.session.add(page); db.session.commit()
+    prod = make_product()
+    section = OfferSection(offer_page_id=page.id, section_type='product',
+                           product_id=prod.id, max_quantity=2, sort_order=0)
+    db.session.add(section); db.session.commit()
+    assert get_section_max_for_product(page.id, prod.id) == 2
+
+    login(admin)
+    resp = client.post(f'/admin/offers/{page.id}/save', json={'sections': [{
+        'id': section.id, 'type': 'product', 'product_id': prod.id, 'max_quantity': 7,
+    }]})
+    assert resp.status_code == 200
+    assert get_section_max_for_product(page.id, prod.id) == 7
@@ -0,0 +1,103 @@
+from decimal import Decimal
+
+from sqlalchemy import event
+
+
+class _QueryCounter:
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+def _seed_orders(db, make_user, make_order, make_product, count):
+    from modules.orders.models import (
+        OrderItem, OrderShipment, OrderStatus, PaymentConfirmation,
+    )
+    from modules.products.models import ProductImage
+    if not OrderStatus.query.filter_by(slug='nowe').first():
+        db.session.add(OrderStatus(slug='nowe', name='Nowe'))
+    product = make_product()
+    db.session.add(ProductImage(product_id=product.id, filename='a.jpg', path_original='a.jpg',
+                                path_compressed='uploads/a.jpg', is_primary=True))
+    order_ids = []
+    for n in range(count):
+        user = make_user(first_name='Jan', last_name=f'Nowak{n}')
+        order = make_order(user, order_type='pre_order', payment_stages=3, shipping_cost=Decimal('15.00'))
+        db.session.add(OrderItem(order_id=order.id, product_id=product.id, quantity=2,
+                                 price=Decimal('50.00'), total=Decimal('100.00')))
+        db.session.add(PaymentConfirmation(order_id=order.id, payment_stage='product',
+                                           amount=Decimal('100.00'), status='pending'))
+        if n % 2:
+            db.session.add(OrderShipment(order_id=order.id, tracking_number=f'TRK{n}', courier='inpost'))
+        order_ids.append(order.id)
+    db.session.commit()
+    return order_ids
+
+
+def _render_row(order):
+    return (
+        order.customer_name,
+        order.payment_icon_state,
+        order.payment_badge,
+        order.shipping_icon_state,
+        order.items_count,
+        order.status_display_name,
+        [item.product_image_url for item in order.sorted_items],
+        order.stage_3_status,
+        order.stage_4_status,
+    )
+
+
+def _load_rows(db, order_ids, preload):
+    from modules.orders.models import Order
+    from modules.orders.preload import preload_order_list
+    db.session.expunge_all()
+    with _QueryCounter(db.engine) as counter:
+        orders = Order.query.filter(Order.id.in_(order_ids)).order_by(Order.id).all()
+        if preload:
+            preload_order_list(orders)
+        rows = [_render_row(order) for order in orders]
+    return rows, counter.count
+
+
+def test_preload_matches_lazy_values(app, db, make_user, make_order, make_product):
+    order_ids = _seed_orders(db, make_user, make_order, make_product, count=4)
+
+    lazy_rows, _ = _load_rows(db, order_ids, preload=False)
+    preloaded_rows, _ = _load_rows(db, order_ids, preload=True)
+
+    assert preloaded_rows == lazy_rows
+    assert preloaded_rows[0][2]['state'] == 'pending'
+    assert preloaded_rows[1][3]['css_class'] == 'active'
+    assert preloaded_rows[0][6] == ['/static/uploads/a.jpg']
+
+
+def test_preload_query_count_does_not_grow_with_rows(app, db, make_user, make_order, make_product):
+    few = _seed_orders(db, make_user, make_order, make_product, count=2)
+    many = few + _seed_orders(db, make_user, make_order, make_product, count=10)
+
+    _, few_queries = _load_rows(db, few, preload=True)
+    _, many_queries = _load_rows(db, many, preload=True)
+    _, lazy_queries = _load_rows(db, many, preload=False)
+
+    assert many_queries == few_queries
+    assert many_queries < lazy_queries
+
+
+def test_admin_list_renders_with_preload(app, db, client, make_user, make_order, make_product, login):
+    _seed_orders(db, make_user, make_order, make_product, count=3)
+    admin = make_user(role='admin', profile_completed=True)
+    login(admin)
+    resp = client.get('/admin/orders')
+    assert resp.status_code == 200
+    assert 'PO/00000001' in resp.get_data(as_text=True)
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+
+
+def _orders_with_dates(db, make_user, make_order, count):
+    user = make_user()
+    base = datetime(2026, 1, 1, 12, 0)
+    orders = []
+    for n in range(count):
+        order = make_order(user)
+        # Co druga para z identycznym created_at — tiebreak po id musi trzymać kolejność
+        order.created_at = base + timedelta(minutes=n // 2)
+        orders.append(order)
+    db.session.commit()
+    return user, orders
+
+
+def _keys():
+    from modules.orders.models import Order
+    return [(Order.created_at, True), (Order.id, True)]
+
+
+def test_cursor_pages_match_offset_pages(app, db, make_user, make_order):
+    from modules.orders.models import Order
+    from utils.pagination import paginate_keyset
+    _orders_with_dates(db, make_user, make_order, count=7)
+    expected = [o.id for o in Order.query.order_by(Order.created_at.desc(), Order.id.desc())]
+
+    seen, cursor, page = [], None, 1
+    while True:
+        pagination = paginate_keyset(Order.query, _keys(), page=page, per_page=3, after=cursor)
+        seen.extend(o.id for o in pagination.items)
+        if not pagination.has_next:
+            break
+        cursor, page = pagination.next_cursor, pagination.next_num
+    assert seen == expected
+    assert pagination.total == 7 and pagination.pages == 3
+
+    # "Poprzednia" z ostatniej strony wraca do środkowej
+    back = paginate_keyset(Order.query, _keys(), page=2, per_page=3, before=pagination.prev_cursor)
+    assert [o.id for o in back.items] == expected[3:6]
+    assert back.has_next and back.page == 2
+
+
+def test_bad_cursor_falls_back_to_first_page(app, db, make_user, make_order):
+    from modules.orders.models import Order
+    from utils.pagination import paginate_keyset
+    _orders_with_dates(db, make_user, make_order, count=3)
+    pagination = paginate_keyset(Order.query, _keys(), per_page=2, after='not-a-cursor')
+    assert len(pagination.items) == 2 and pagination.has_next
+
+
+def test_count_cache_invalidated_on_commit(app, db, make_user, make_order):
+    from modules.orders.models import Order
+    from utils.pagination import cached_count
+    user, _ = _orders_with_dates(db, make_user, make_order, count=2)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return Order.query.count()
+
+    assert cached_count('orders', 'all', compute) == 2
+    assert cached_count('orders', 'all', compute) == 2
+    assert len(calls) == 1
+
+    make_order(user)  # commit zapisuje do orders → licznik wylatuje
+    assert cached_count('orders', 'all', compute) == 3
+    assert len(calls) == 2
+
+
+def test_admin_list_next_page_by_cursor(app, db, client, make_user, make_order, login):
+    import re
+    from html import unescape
+    _, orders = _orders_with_dates(db, make_user, make_order, count=25)
+    admin = make_user(role='admin', profile_completed=True)
+    login(admin)
+
+    first = client.get('/admin/orders?per_page=20').get_data(as_text=True)
+    next_url = unescape(re.search(r'href="([^"]*after=[^"]+)"', first).group(1))
+    second = client.get(next_url)
+    assert second.status_code == 200
+    body = second.get_data(as_text=True)
+    oldest = min(orders, key=lambda o: (o.created_at, o.id))
+    assert oldest.order_number in body
+
+
+def test_product_list_name_quantity_and_price_sorts_page_by_cursor(app, db, client, make_user, make_product, login):
+    import re
+    from html import unescape
+    products = [make_product(name=f'Figurka {n % 4}', quantity=n % 3, sale_price=10 + n % 2) for n in range(9)]
+    admin = make_user(role='admin', profile_completed=True)
+    login(admin)
+
+    for sort, order, key in (('name', 'asc', lambda p: (p.name, p.id)),
+                             ('quantity', 'desc', lambda p: (-p.quantity, -p.id)),
+                             ('price', 'asc', lambda p: (p.sale_price, p.id))):
+        url, seen = f'/admin/products/?sort={sort}&order={order}&per_page=4', []
+        while url:
+            body = client.get(url).get_data(as_text=True)
+            # Każdy produkt ma checkbox w kartach mobilnych i w tabeli
+            seen += [int(pid) for pid in dict.fromkeys(re.findall(r'class="product-checkbox" value="(\d+)"', body))]
+            match = re.search(r'href="([^"]*after=[^"]+)"[^>]*class="pagination-arrow"', body)
+            url = unescape(match.group(1)) if match else None
+            assert url is None or f'order={order}' in url
+        assert seen == [p.id for p in sorted(products, key=key)]
@@ -0,0 +1,223 @@
+"""Planer crona przypomnień (modules/orders/payment_reminder_planner.py)."""
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event
+
+from modules.orders.models import get_local_now
+
+
+def _poland_link(db, order, n, **deadlines):
+    """ProxyOrder -> PolandOrder (z terminami) -> PolandOrderItem -> PolandOrderItemOrder dla `order`."""
+    from modules.products.models import (
+        PolandOrder, PolandOrderItem, PolandOrderItemOrder, Product, ProxyOrder, ProxyOrderItem,
+    )
+
+    product = Product(name=f'Produkt {n}', sale_price=Decimal('10.00'), quantity=5)
+    proxy_order = ProxyOrder(order_number=f'PRX/{n:05d}', order_type='polska')
+    db.session.add_all([product, proxy_order])
+    db.session.flush()
+    proxy_item = ProxyOrderItem(proxy_order_id=proxy_order.id, product_id=product.id, order_id=order.id,
+                                quantity=1, unit_price=Decimal('10.00'), total_price=Decimal('10.00'))
+    poland_order = PolandOrder(order_number=f'PRX/PL/{n:05d}', proxy_order_id=proxy_order.id, **deadlines)
+    db.session.add_all([proxy_item, poland_order])
+    db.session.flush()
+    item = PolandOrderItem(poland_order_id=poland_order.id, proxy_order_item_id=proxy_item.id,
+                           product_id=product.id, order_id=order.id, quantity=1)
+    db.session.add(item)
+    db.session.flush()
+    db.session.add(PolandOrderItemOrder(poland_order_item_id=item.id, order_id=order.id, quantity=1))
+    db.session.commit()
+
+
+@pytest.fixture
+def scenario(db, make_user, make_order):
+    """Zamówienia pokrywające wszystkie etapy i powody pominięcia + reguły obu typów."""
+    from modules.offers.models import OfferPage
+    from modules.offers.reminder_models import PaymentReminderConfig, PaymentReminderLog
+    from modules.orders.models import PaymentConfirmation, ShippingRequest, ShippingRequestOrder
+
+    now = get_local_now()
+    admin = make_user(role='admin')
+    soon = OfferPage(name='Drop', token='drop', status='ended', created_by=admin.id,
+                     payment_deadline=now + timedelta(hours=10), is_fully_closed=True)
+    later = OfferPage(name='Drop 2', token='drop-2', status='ended', created_by=admin.id,
+                      payment_deadline=now + timedelta(days=30))
+    db.session.add_all([soon, later])
+    db.session.commit()
+
+    orders = {
+        'product_due': make_order(make_user(), order_type='exclusive', offer_page_id=soon.id),
+        'product_later': make_order(make_user(), order_type='exclusive', offer_page_id=later.id),
+        'product_paid': make_order(make_user(), order_type='exclusive', offer_page_id=soon.id),
+        'product_rejected': make_order(make_user(), order_type='exclusive', offer_page_id=soon.id),
+        'product_logged': make_order(make_user(), order_type='exclusive', offer_page_id=soon.id),
+        'cancelled': make_order(make_user(), status='anulowane', order_type='exclusive', offer_page_id=soon.id),
+        'on_hand_old': make_order(make_user(), order_type='on_hand', created_at=now - timedelta(hours=50)),
+        'on_hand_new': make_order(make_user(), order_type='on_hand', created_at=now - timedelta(hours=1)),
+        'exclusive_old': make_order(make_user(), order_type='exclusive', created_at=now - timedelta(hours=50)),
+        'kr_due': make_order(make_user(), total_amount=Decimal('0.00'), order_type='exclusive',
+                             payment_stages=4, proxy_shipping_cost=Decimal('15.00')),
+        'kr_zero': make_order(make_user(), total_amount=Decimal('0.00'), order_type='exclusive',
+                              payment_stages=4, proxy_shipping_cost=Decimal('0.00')),
+        'customs_due': make_order(make_user(), total_amount=Decimal('0.00'), order_type='exclusive',
+                                  customs_vat_sale_cost=Decimal('45.00')),
+        'customs_on_hand': make_order(make_user(), total_amount=Decimal('0.00'), order_type='on_hand',
+                                      customs_vat_sale_cost=Decimal('45.00')),
+        'domestic_due': make_order(make_user(), total_amount=Decimal('0.00'), shipping_cost=Decimal('20.00')),
+    }
+    _poland_link(db, orders['kr_due'], 1, payment_deadline=now - timedelta(hours=5))
+    _poland_link(db, orders['kr_due'], 2, payment_deadline=now + timedelta(days=20))
+    _poland_link(db, orders['kr_zero'], 3, payment_deadline=now - timedelta(hours=5))
+    _poland_link(db, orders['customs_due'], 4, customs_payment_deadline=now + timedelta(hours=2))
+    _poland_link(db, orders['customs_on_hand'], 5, customs_payment_deadline=now - timedelta(hours=2))
+
+    request = ShippingRequest(request_number='WYS/000001', payment_deadline=now + timedelta(hours=3))
+    db.session.add(request)
+    db.session.flush()
+    db.session.add(ShippingRequestOrder(shipping_request_id=request.id, order_id=orders['domestic_due'].id))
+
+    for key, status in (('product_paid', 'approved'), ('product_rejected', 'rejected')):
+        db.session.add(PaymentConfirmation(order_id=orders[key].id, payment_stage='product',
+                                           amount=Decimal('100.00'), status=status))
+    before = PaymentReminderConfig(reminder_type='before_deadline', hours=24, payment_stage='product', enabled=True)
+    after = PaymentReminderConfig(reminder_type='after_order_placed', hours=48, payment_stage='product', enabled=True)
+    db.session.add_all([before, after])
+    db.session.flush()
+    db.session.add(PaymentReminderLog(order_id=orders['product_logged'].id, config_id=before.id, stage='product'))
+    db.session.commit()
+    return {'now': now, 'orders': orders, 'rules': [before, after], 'pages': (soon, later)}
+
+
+def _reference_plan(rules, now):
+    """Dawna pętla crona po STAGE_DEFINITIONS — wzorzec dla planu zbiorczego."""
+    from modules.offers.reminder_models import PaymentReminderLog
+    from modules.orders.models import Order
+    from modules.orders.payment_overdue_service import STAGE_DEFINITIONS
+    from utils.offer_closure import CLOSED_ORDER_STATUSES
+
+    due = []
+    for order in Order.query.filter(~Order.status.in_(CLOSED_ORDER_STATUSES)).order_by(Order.id):
+        for stage, definition in STAGE_DEFINITIONS.items():
+            if not definition['applies'](order) or definition['status'](order) not in ('none', 'rejected'):
+                continue
+            amount = definition['amount'](order)
+            if not amount or amount <= 0:
+                continue
+            deadline = definition['deadline'](order)
+            for rule in rules:
+                if rule.reminder_type == 'before_deadline':
+                    if deadline is None:
+                        continue
+                    trigger_time = deadline - timedelta(hours=rule.hours)
+                elif stage == 'product' and order.order_type in ('on_hand', 'preorder'):
+                    trigger_time = order.created_at + timedelta(hours=rule.hours)
+                else:
+                    continue
+                if trigger_time <= now and not PaymentReminderLog.query.filter_by(
+                        order_id=order.id, config_id=rule.id, stage=stage).first():
+                    due.append((order.id, stage, rule.id, deadline))
+    return due
+
+
+def test_plan_matches_stage_definitions_loop(db, scenario):
+    from modules.orders.payment_reminder_planner import plan_payment_reminders
+    orders, (before, after) = scenario['orders'], scenario['rules']
+
+    timings = {}
+    due = plan_payment_reminders(scenario['rules'], scenario['now'], timings)
+
+    planned = [(r['order_id'], r['stage'], r['rule'].id, r['payment_deadline']) for r in due]
+    assert planned == _reference_plan(scenario['rules'], scenario['now'])
+    assert {(r['order_id'], r['stage'], r['rule'].id) for r in due} == {
+        (orders['product_due'].id, 'product', before.id),
+        (orders['product_rejected'].id, 'product', before.id),
+        (orders['on_hand_old'].id, 'product', after.id),
+        (orders['kr_due'].id, 'shipping_kr', before.id),
+        (orders['customs_due'].id, 'customs_vat', before.id),
+        (orders['domestic_due'].id, 'domestic_shipping', before.id),
+    }
+    assert set(timings) == {'candidates', 'preload', 'plan'}
+
+
+def test_planning_query_count_does_not_grow_with_orders(app, db, scenario, make_user, make_order):
+    from modules.orders.payment_reminder_planner import plan_payment_reminders
+    soon = scenario['pages'][0]
+
+    def _count_selects():
+        statements = []
+
+        def _on_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', _on_execute)
+        try:
+            planned = plan_payment_reminders(scenario['rules'], scenario['now'])
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', _on_execute)
+        return len(statements), len(planned)
+
+    baseline, planned = _count_selects()
+    for _ in range(40):
+        make_order(make_user(), order_type='exclusive', offer_page_id=soon.id)
+
+    assert _count_selects() == (baseline, planned + 40)
+
+
+def test_run_sends_in_chunks_and_records_only_delivered(app, db, scenario, monkeypatch):
+    from modules.admin.models import ActivityLog
+    from modules.offers.reminder_models import PaymentReminderLog
+    from modules.orders.payment_reminder_planner import run_payment_reminders
+    orders = scenario['orders']
+
+    batches = []
+
+    def _send(messages):
+        batches.append(len(messages))
+        return [msg.recipients != [orders['customs_due'].user.email] for msg in messages]
+
+    monkeypatch.setattr('utils.email_sender.send_email_batch_sync', _send)
+    monkeypatch.setattr('utils.push_manager.PushManager.notify_payment_reminder', lambda *a, **kw: None)
+    monkeypatch.setattr('utils.email_manager.EmailManager.notify_admin_deadline_exceeded', lambda *a, **kw: None)
+    before_logs = PaymentReminderLog.query.count()
+
+    with app.test_request_context():
+        result = run_payment_reminders(now=scenario['now'], echo=lambda line: None, chunk_size=4)
+
+    assert batches == [4, 2]
+    assert result['planned'] == 6 and result['sent'] == 5
+    assert {'rules', 'candidates', 'preload', 'plan', 'send', 'deadline_exceeded', 'total'} <= set(result['timings'])
+    assert PaymentReminderLog.query.filter(PaymentReminderLog.config_id.isnot(None)).count() == 1 + 5
+    assert ActivityLog.query.filter_by(action='payment_reminder_sent').count() == 5
+    # Strona `soon` zamknięta, ale termin jeszcze nie minął
+    assert result['exceeded'] == 0 and PaymentReminderLog.query.count() == before_logs + 5
+
+    # Kolejny przebieg: wraca tylko przypomnienie, którego mail nie doszedł
+    batches.clear()
+    with app.test_request_context():
+        again = run_payment_reminders(now=scenario['now'], echo=lambda line: None)
+    assert batches == [1] and again['planned'] == 1
+
+
+def test_deadline_exceeded_notifies_admin_once_per_order(app, db, scenario, monkeypatch):
+    from modules.offers.reminder_models import PaymentReminderLog
+    from modules.orders.payment_reminder_planner import run_payment_reminders
+    orders, soon = scenario['orders'], scenario['pages'][0]
+    soon.payment_deadline = scenario['now'] - timedelta(hours=1)
+    db.session.commit()
+
+    notified = []
+    monkeypatch.setattr('utils.email_manager.EmailManager.notify_admin_deadline_exceeded',
+                        lambda page, page_orders: notified.append((page.id, [o.id for o in page_orders])))
+    monkeypatch.setattr('utils.email_sender.send_email_batch_sync', lambda messages: [True] * len(messages))
+    monkeypatch.setattr('utils.push_manager.PushManager.notify_payment_reminder', lambda *a, **kw: None)
+
+    with app.test_request_context():
+        result = run_payment_reminders(now=scenario['now'], echo=lambda line: None)
+        again = run_payment_reminders(now=scenario['now'], echo=lambda line: None)
+
+    expected = sorted(orders[key].id for key in ('product_due', 'product_rejected', 'product_logged'))
+    assert result['exceeded'] == 3 and notified == [(soon.id, expected)]
+    assert again['exceeded'] == 0
+    assert PaymentReminderLog.query.filter_by(reminder_type='deadline_exceeded').count() == 3
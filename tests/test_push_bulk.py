@@ -0,0 +1,106 @@
+"""Masowa wysyłka push (utils/push_bulk.py): zapis notyfikacji, preferencje, wyniki, sesje."""
+import threading
+
+import pytest
+
+
+class _PushError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f'push failed: {status_code}')
+        self.response = type('Response', (), {'status_code': status_code})()
+
+
+@pytest.fixture
+def fake_push(app, monkeypatch):
+    """Podmienia pywebpush: wynik per endpoint, rejestruje użyte sesje."""
+    from utils import push_bulk
+    from utils.push_manager import PushManager
+
+    app.config['VAPID_PRIVATE_KEY'] = 'test-key'
+    monkeypatch.setattr(push_bulk, '_load_vapid', lambda key: f'vapid:{key}')
+    monkeypatch.setattr(PushManager, '_fcm_enabled', staticmethod(lambda: False))
+
+    calls = {'sessions': {}, 'status': {}, 'vapid': set()}
+    lock = threading.Lock()
+
+    def _send(endpoint, p256dh, auth, payload, vapid, claims_email, session=None, timeout=None):
+        host = endpoint.split('/')[2]
+        with lock:
+            calls['sessions'].setdefault(host, set()).add(id(session))
+            calls['vapid'].add(vapid)
+        status = calls['status'].get(endpoint)
+        if status:
+            raise _PushError(status)
+
+    monkeypatch.setattr(PushManager, '_send_single_raw', staticmethod(_send))
+    return calls
+
+
+def _subscribe(db, user, endpoint, failed_count=0):
+    from modules.notifications.models import PushSubscription
+    sub = PushSubscription(user_id=user.id, endpoint=endpoint, p256dh_key='p', auth_key='a',
+                           failed_count=failed_count)
+    db.session.add(sub)
+    db.session.commit()
+    return sub
+
+
+def test_send_to_users_applies_results_in_bulk(app, db, make_user, fake_push):
+    from modules.notifications.models import Notification, PushSubscription
+    from utils.push_manager import PushManager
+    users = [make_user() for _ in range(4)]
+    ok = _subscribe(db, users[0], 'https://fcm.googleapis.com/a')
+    ok2 = _subscribe(db, users[1], 'https://fcm.googleapis.com/b')
+    gone = _subscribe(db, users[2], 'https://updates.push.services.mozilla.com/c')
+    flaky = _subscribe(db, users[3], 'https://updates.push.services.mozilla.com/d', failed_count=4)
+    fake_push['status'] = {gone.endpoint: 410, flaky.endpoint: 500}
+
+    stats = PushManager.send_to_users([u.id for u in users], 'Tytuł', 'Treść', tag='broadcast-1')
+
+    assert Notification.query.filter_by(tag='broadcast-1').count() == 4
+    assert (stats['subscriptions'], stats['sent'], stats['failed'], stats['deactivated']) == (4, 2, 2, 2)
+    assert stats['errors'] == {'410': 1, '500': 1}
+    db.session.expire_all()
+    assert db.session.get(PushSubscription, ok.id).last_used_at is not None
+    assert db.session.get(PushSubscription, ok2.id).is_active
+    assert not db.session.get(PushSubscription, gone.id).is_active
+    flaky = db.session.get(PushSubscription, flaky.id)
+    assert flaky.failed_count == 5 and not flaky.is_active
+    # Jedna sesja keep-alive per host, klucz VAPID sparsowany raz
+    assert {host: len(ids) for host, ids in fake_push['sessions'].items()} == {
+        'fcm.googleapis.com': 1, 'updates.push.services.mozilla.com': 1}
+    assert fake_push['vapid'] == {'vapid:test-key'}
+
+
+def test_send_to_users_respects_preferences(app, db, make_user, fake_push):
+    from modules.notifications.models import NotificationPreference
+    from utils.push_manager import PushManager
+    opted_in, opted_out = make_user(), make_user()
+    _subscribe(db, opted_in, 'https://fcm.googleapis.com/in')
+    _subscribe(db, opted_out, 'https://fcm.googleapis.com/out')
+    db.session.add(NotificationPreference(user_id=opted_out.id, admin_alerts=False))
+    db.session.commit()
+
+    stats = PushManager.send_to_users([opted_in.id, opted_out.id, opted_in.id], 'T', 'B',
+                                      notification_type='admin_alerts')
+
+    assert stats['users'] == 2 and stats['skipped_preferences'] == 1
+    assert stats['subscriptions'] == 1 and stats['sent'] == 1
+
+
+def test_broadcast_stores_delivery_stats(app, db, make_user, fake_push):
+    from modules.admin.broadcasts import _send_broadcast
+    from modules.notifications.broadcast_models import AdminBroadcast
+    admin, client_user = make_user(role='admin'), make_user()
+    _subscribe(db, client_user, 'https://fcm.googleapis.com/x')
+    broadcast = AdminBroadcast(title='Nowa zbiórka', target_type='all', sent_count=1, sent_by=admin.id)
+    db.session.add(broadcast)
+    db.session.commit()
+    assert broadcast.delivery_rate is None
+
+    _send_broadcast(broadcast.id, [client_user.id])
+
+    db.session.expire_all()
+    broadcast = db.session.get(AdminBroadcast, broadcast.id)
+    assert broadcast.delivery_stats['sent'] == 1 and broadcast.read_count == 0
+    assert broadcast.delivery_rate is not None
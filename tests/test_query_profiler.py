@@ -0,0 +1,89 @@
+import pytest
+
+
+@pytest.fixture
+def profiled_app(monkeypatch):
+    import config
+    from app import create_app
+    from extensions import db
+    from utils.query_profiler import reset_stats
+    monkeypatch.setattr(config.TestingConfig, 'SQL_PROFILING_ENABLED', True, raising=False)
+    monkeypatch.setattr(config.TestingConfig, 'SQL_PROFILING_SERVER_TIMING', True, raising=False)
+    monkeypatch.setattr(config.TestingConfig, 'SQL_PROFILING_N_PLUS_ONE', 2, raising=False)
+    app = create_app('testing')
+    reset_stats()
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _admin_client(app):
+    from extensions import db
+    from modules.auth.models import User
+    admin = User(email='admin@example.com', role='admin', is_active=True,
+                 email_verified=True, profile_completed=True)
+    db.session.add(admin); db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(admin.id)
+        sess['_fresh'] = True
+    return client
+
+
+def test_statement_shape_strips_literals_and_in_lists():
+    from utils.query_profiler import statement_shape
+    a = statement_shape("SELECT * FROM orders WHERE id = 15 AND status = 'nowe'")
+    b = statement_shape("SELECT *  FROM orders\n WHERE id = 7 AND status = 'anulowane'")
+    assert a == b == 'SELECT * FROM orders WHERE id = ? AND status = ?'
+    assert statement_shape('SELECT id FROM t WHERE id IN (?, ?, ?)') == 'SELECT id FROM t WHERE id IN (?)'
+
+
+def test_request_is_profiled_with_server_timing_and_n_plus_one(profiled_app):
+    from extensions import db
+    from modules.auth.models import User
+
+    @profiled_app.route('/_n_plus_one_probe')
+    def _n_plus_one_probe():
+        # Ten sam kształt zapytania 4x (próg w fixture = 2)
+        for user_id in range(1, 5):
+            db.session.get(User, user_id)
+            db.session.expunge_all()
+        return 'ok'
+
+    client = _admin_client(profiled_app)
+    resp = client.get('/_n_plus_one_probe')
+    assert resp.status_code == 200
+    assert resp.headers['Server-Timing'].startswith('db;dur=')
+
+    stats = client.get('/admin/sql-profile').get_json()
+    assert stats['success'] is True
+    row = next(r for r in stats['endpoints'] if r['endpoint'] == '_n_plus_one_probe')
+    assert row['requests'] == 1 and row['queries_max'] >= 4
+    assert row['slowest'] and 'statement' in row['slowest'][0]
+    assert len(row['n_plus_one']) == 1 and 'FROM users' in row['n_plus_one'][0]['shape']
+
+
+def test_profile_endpoint_disabled_by_default(app, db, client, make_user, login):
+    admin = make_user(role='admin', profile_completed=True)
+    login(admin)
+    assert client.get('/admin/sql-profile').status_code == 404
+
+
+def test_failed_statement_leaves_no_timing_state_on_connection(profiled_app):
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+    from extensions import db
+
+    @profiled_app.route('/_failing_probe')
+    def _failing_probe():
+        conn = db.session.connection()
+        with pytest.raises(OperationalError):
+            conn.execute(text('SELECT * FROM no_such_table'))
+        db.session.rollback()
+        db.session.execute(text('SELECT 1'))
+        return 'ok' if 'sql_profile_start' not in db.session.connection().info else 'leak'
+
+    client = _admin_client(profiled_app)
+    assert client.get('/_failing_probe').get_data(as_text=True) == 'ok'
@@ -0,0 +1,103 @@
+def _order(db, make_order, user, number):
+    order = make_order(user)
+    order.order_number = number
+    db.session.commit()
+    return order
+
+
+def _search(query, limits, **kwargs):
+    from modules.search.service import search
+    return search(query, limits, **kwargs)
+
+
+def test_normalize_folds_polish_and_splits_words():
+    from modules.search.service import tokenize
+    assert tokenize('Żółta  Łódź-XL') == ['zolta', 'lodz', 'xl']
+
+
+def test_index_follows_writes(app, db, make_product):
+    product = make_product(name='Ateez Higher', sku='ATZ-01')
+
+    assert _search('ateez hig', {'product': 5}) == {'product': [product.id]}
+    assert _search('atz', {'product': 5}) == {'product': [product.id]}
+
+    product.name = 'Stray Kids Maxident'
+    db.session.commit()
+    assert _search('ateez', {'product': 5}) == {}
+    assert _search('maxi', {'product': 5}) == {'product': [product.id]}
+
+    product.is_active = False
+    db.session.commit()
+    assert _search('maxi', {'product': 5}) == {}
+
+    db.session.rollback()
+    db.session.delete(product)
+    db.session.commit()
+    from modules.search.models import SearchTerm
+    assert SearchTerm.query.filter_by(entity_id=product.id, entity_type='product').count() == 0
+
+
+def test_typo_tolerance_ranks_exact_first(app, db, make_product):
+    exact = make_product(name='Higer Album')
+    typo = make_product(name='Higher Album')
+
+    assert _search('higer', {'product': 5}) == {'product': [exact.id, typo.id]}
+    assert _search('higer', {'product': 5}, fuzzy=False) == {'product': [exact.id]}
+
+
+def test_categories_limits_and_owner_in_one_query(app, db, make_user, make_order):
+    from sqlalchemy import event
+    owner = make_user(first_name='Żaneta', last_name='Kowalska', email='zaneta@example.com')
+    other = make_user(first_name='Anna', last_name='Nowak')
+    own = [_order(db, make_order, owner, f'PO/0000004{n}') for n in range(3)]
+    _order(db, make_order, other, 'PO/00000049')
+
+    executed = []
+
+    def count(*args):
+        executed.append(1)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        hits = _search('zaneta', {'order': 2, 'client': 2})
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    assert len(executed) == 1
+    assert hits == {'client': [owner.id]}
+
+    hits = _search('po 4', {'order': 2})
+    assert len(hits['order']) == 2
+
+    hits = _search('42', {'order': 5}, owner_id=owner.id)
+    assert hits == {'order': [own[2].id]}
+    assert _search('49', {'order': 5}, owner_id=owner.id) == {}
+
+
+def test_global_search_uses_index(app, db, client, make_user, make_order, make_product, login):
+    user = make_user(first_name='Łucja', last_name='Wiśniewska')
+    _order(db, make_order, user, 'PO/00000077')
+    make_product(name='Łucja figurka')
+    admin = make_user(role='admin', profile_completed=True)
+    login(admin)
+
+    results = client.get('/api/search?q=lucja').get_json()['results']
+    assert [r['title'] for r in results['clients']] == ['Łucja Wiśniewska']
+    assert [r['title'] for r in results['products']] == ['Łucja figurka']
+
+    results = client.get('/api/search?q=77').get_json()['results']
+    assert [r['title'] for r in results['orders']] == ['PO/00000077']
+
+
+def test_anonymized_owner_drops_out_of_owner_search(app, db, make_user):
+    from modules.orders.models import ShippingRequest
+    owner = make_user()
+    request = ShippingRequest(request_number='WYS/000061', user_id=owner.id)
+    db.session.add(request)
+    db.session.commit()
+    assert _search('61', {'shipping_request': 5}, owner_id=owner.id) == {'shipping_request': [request.id]}
+
+    owner.anonymize()
+    db.session.commit()
+
+    assert _search('61', {'shipping_request': 5}, owner_id=owner.id) == {}
+    assert _search('61', {'shipping_request': 5}) == {'shipping_request': [request.id]}
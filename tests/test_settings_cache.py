@@ -0,0 +1,57 @@
+from sqlalchemy import text
+
+
+def test_get_value_served_from_memory_until_invalidated(app, db):
+    from modules.auth.models import Settings
+    from utils import settings_cache
+    Settings.set_value('warehouse_image_quality', 85, type='integer')
+    assert Settings.get_value('warehouse_image_quality') == 85
+
+    # Zapis z pominięciem ORM (bez eventów sesji) — cache go nie widzi
+    db.session.execute(text("UPDATE settings SET value = '70' WHERE key = 'warehouse_image_quality'"))
+    db.session.commit()
+    assert Settings.get_value('warehouse_image_quality') == 85
+
+    settings_cache.invalidate()
+    assert Settings.get_value('warehouse_image_quality') == 70
+    assert Settings.get_value('missing_key', 'fallback') == 'fallback'
+
+
+def test_direct_orm_write_invalidates_after_commit(app, db):
+    from modules.auth.models import Settings
+    Settings.set_value('maintenance_mode', 'false', type='boolean')
+    assert Settings.get_value('maintenance_mode') is False
+
+    setting = Settings.query.filter_by(key='maintenance_mode').first()
+    setting.value = 'true'
+    db.session.commit()
+    assert Settings.get_value('maintenance_mode') is True
+
+    db.session.add(Settings(key='maintenance_message', value='Przerwa', type='string'))
+    db.session.commit()
+    assert Settings.get_value('maintenance_message') == 'Przerwa'
+
+
+def test_json_values_are_copied(app, db):
+    from modules.auth.models import Settings
+    Settings.set_value('email_toggles', '{"payment_reminder": true}', type='json')
+    value = Settings.get_value('email_toggles')
+    value['payment_reminder'] = False
+    assert Settings.get_value('email_toggles') == {'payment_reminder': True}
+
+
+def test_commit_publishes_invalidation(app, db, monkeypatch):
+    from modules.auth.models import Settings
+    from utils import settings_cache
+
+    class _Recorder:
+        def __init__(self):
+            self.published = []
+
+        def publish(self, channel, message):
+            self.published.append(channel)
+
+    recorder = _Recorder()
+    monkeypatch.setattr(settings_cache, '_redis', recorder)
+    Settings.set_value('maintenance_eta', '15:00')
+    assert recorder.published == [settings_cache.SETTINGS_CHANNEL]
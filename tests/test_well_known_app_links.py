@@ -8,7 +8,6 @@ Platformy mają twarde wymagania, które łatwo zepsuć refaktorem:
 - AASA celowo BEZ rozszerzenia .json w nazwie,
 - katalog /.well-known/ musi działać też w trybie maintenance.
 """
-import time
 
 
 def test_aasa_contract(client):
@@ -41,11 +40,9 @@ def test_assetlinks_contract(client):
 
 def test_well_known_bypasses_maintenance(app, client):
     """W trybie konserwacji walidatory Apple/Google muszą dostać 200, nie 503."""
-    app.maintenance_cache = {'enabled': True, 'checked_at': time.time()}
-    try:
-        for url in ('/.well-known/apple-app-site-association',
-                    '/.well-known/assetlinks.json'):
-            r = client.get(url)
-            assert r.status_code == 200, f'{url} -> {r.status_code}'
-    finally:
-        app.maintenance_cache = {'enabled': False, 'checked_at': 0}
+    from modules.auth.models import Settings
+    Settings.set_value('maintenance_mode', True, type='boolean')
+    for url in ('/.well-known/apple-app-site-association',
+                '/.well-known/assetlinks.json'):
+        r = client.get(url)
+        assert r.status_code == 200, f'{url} -> {r.status_code}'
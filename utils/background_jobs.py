@@ -0,0 +1,196 @@
+"""
+Background jobs — wspólny runtime zadań w tle (Flask-Executor)
+===============================================================
+
+Zadania w tle (OCR potwierdzeń, import CSV) budowały przy KAŻDYM zadaniu
+nową aplikację: `from app import create_app; app = create_app()`. To
+ponowna rejestracja wszystkich blueprintów, init Redis state, OAuth,
+Socket.IO, hooków Sentry i — najdroższe — nowy engine SQLAlchemy z własną
+pulą połączeń. Seria uploadów potwierdzeń = seria pul połączeń do MySQL.
+
+submit() uruchamia zadanie na wspólnym `executor` z extensions.py, w
+kontekście aplikacji, która je zleciła (ten sam engine i pula):
+- limit współbieżności per typ zadania (BACKGROUND_JOBS_CONCURRENCY) — np.
+  OCR nie zajmie wszystkich wątków executora; nadmiarowe zadania czekają
+  w kolejce tego typu, nie blokując wątków,
+- ograniczona kolejka (BACKGROUND_JOBS_MAX_QUEUE oczekujących zadań łącznie) —
+  po przepełnieniu submit() zwraca False zamiast rosnąć bez końca,
+- metryki per typ: liczniki, czas oczekiwania w kolejce i czas wykonania
+  → /admin/background-jobs.
+
+Stan jest per proces (każdy worker gunicorna ma własny executor).
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# Domyślne wartości, nadpisywane z configu przez init_background_jobs()
+_DEFAULT_MAX_QUEUE = 100
+_DEFAULT_CONCURRENCY = 2
+
+_max_queue = _DEFAULT_MAX_QUEUE
+_concurrency = {}
+_types = {}             # {job_type: _JobType}
+_lock = threading.Lock()
+
+
+class _Job:
+    __slots__ = ('job_type', 'fn', 'args', 'kwargs', 'app', 'submitted_at')
+
+    def __init__(self, job_type, fn, args, kwargs, app):
+        self.job_type = job_type
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.app = app
+        self.submitted_at = time.monotonic()
+
+
+class _JobType:
+    """Kolejka, licznik uruchomionych i metryki jednego typu zadań."""
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self.pending = deque()
+        self.running = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.run_total = 0.0
+        self.run_max = 0.0
+        self.last_finished_at = None
+
+    def take_startable(self):
+        """Zadania, które mieszczą się w limicie (wołać pod _lock)."""
+        jobs = []
+        while self.pending and self.running < self.limit:
+            jobs.append(self.pending.popleft())
+            self.running += 1
+        return jobs
+
+    def to_dict(self):
+        finished = self.completed + self.failed
+        return {
+            'job_type': self.name,
+            'concurrency': self.limit,
+            'running': self.running,
+            'pending': len(self.pending),
+            'submitted': self.submitted,
+            'rejected': self.rejected,
+            'completed': self.completed,
+            'failed': self.failed,
+            'avg_wait_ms': round(self.wait_total / finished * 1000, 1) if finished else 0.0,
+            'max_wait_ms': round(self.wait_max * 1000, 1),
+            'avg_run_ms': round(self.run_total / finished * 1000, 1) if finished else 0.0,
+            'max_run_ms': round(self.run_max * 1000, 1),
+            'last_finished_at': self.last_finished_at,
+        }
+
+
+def _job_type(name):
+    state = _types.get(name)
+    if state is None:
+        state = _types[name] = _JobType(name, _concurrency.get(name, _DEFAULT_CONCURRENCY))
+    return state
+
+
+def submit(job_type, fn, *args, **kwargs):
+    """
+    Zleca fn(*args, **kwargs) w tle, w kontekście bieżącej aplikacji.
+
+    Args:
+        job_type (str): Typ zadania ('ocr', 'csv_import', ...) — limit i metryki
+        fn: Funkcja zadania (dostaje app context i pusty request context)
+
+    Returns:
+        bool: False gdy kolejka jest pełna (zadanie odrzucone)
+    """
+    job = _Job(job_type, fn, args, kwargs, current_app._get_current_object())
+    with _lock:
+        state = _job_type(job_type)
+        if sum(len(t.pending) for t in _types.values()) >= _max_queue:
+            state.rejected += 1
+            logger.warning(f"Background jobs: queue full ({_max_queue}), rejected '{job_type}' job")
+            return False
+        state.pending.append(job)
+        state.submitted += 1
+        startable = state.take_startable()
+
+    for ready in startable:
+        _start(ready)
+    return True
+
+
+def _start(job):
+    from extensions import executor
+    # executor.submit() kopiuje bieżący request i app context — kolejne zadanie
+    # z kolejki startuje z wątku zadania, które właśnie się skończyło, więc
+    # kontekst podajemy jawnie: aplikacja, która zleciła zadanie, i pusty
+    # request (zadanie nie dostaje kopii requestu klienta, który je zlecił).
+    with job.app.test_request_context():
+        executor.submit(_run, job)
+
+
+def _run(job):
+    started = time.monotonic()
+    failed = False
+    try:
+        with job.app.app_context():
+            job.fn(*job.args, **job.kwargs)
+    except Exception:
+        failed = True
+        logger.exception(f"Background job '{job.job_type}' failed")
+    finally:
+        finished = time.monotonic()
+        with _lock:
+            state = _job_type(job.job_type)
+            state.running -= 1
+            if failed:
+                state.failed += 1
+            else:
+                state.completed += 1
+            wait, run = started - job.submitted_at, finished - started
+            state.wait_total += wait
+            state.wait_max = max(state.wait_max, wait)
+            state.run_total += run
+            state.run_max = max(state.run_max, run)
+            state.last_finished_at = time.time()
+            startable = state.take_startable()
+
+        for ready in startable:
+            _start(ready)
+
+
+def get_stats():
+    """Metryki per typ zadania (ten proces)."""
+    with _lock:
+        return [state.to_dict() for state in sorted(_types.values(), key=lambda t: t.name)]
+
+
+def reset_stats():
+    """Zeruje metryki (kolejki i uruchomione zadania zostają)."""
+    with _lock:
+        for name, state in list(_types.items()):
+            fresh = _JobType(name, state.limit)
+            fresh.pending, fresh.running = state.pending, state.running
+            _types[name] = fresh
+
+
+def init_background_jobs(app):
+    """Czyta limity z configu (wołane z create_app)."""
+    global _max_queue, _concurrency
+    _max_queue = app.config.get('BACKGROUND_JOBS_MAX_QUEUE', _DEFAULT_MAX_QUEUE)
+    _concurrency = dict(app.config.get('BACKGROUND_JOBS_CONCURRENCY', {}))
+    with _lock:
+        for name, state in _types.items():
+            state.limit = _concurrency.get(name, _DEFAULT_CONCURRENCY)
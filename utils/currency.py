@@ -170,20 +170,20 @@ def get_cached_rate(currency_code, allow_stale=False):
 
         # Fallback to old exchange_rate_* keys for backward compatibility
         key = f'exchange_rate_{currency_code.lower()}'
-        rate_setting = Settings.query.filter_by(key=key).first()
+        rate_value = Settings.get_value(key, None)
 
-        if not rate_setting:
+        if not rate_value:
             return None
 
         # Get cached timestamp
         timestamp_key = f'exchange_rate_{currency_code.lower()}_timestamp'
-        timestamp_setting = Settings.query.filter_by(key=timestamp_key).first()
+        timestamp_value = Settings.get_value(timestamp_key, None)
 
-        if not timestamp_setting:
+        if not timestamp_value:
             return None
 
         # Check if cache is fresh based on update frequency
-        cached_at = datetime.fromisoformat(timestamp_setting.value)
+        cached_at = datetime.fromisoformat(timestamp_value)
         if cached_at.tzinfo is None:
             cached_at = cached_at.replace(tzinfo=POLAND_TZ)
         age = datetime.now(tz=POLAND_TZ) - cached_at
@@ -192,11 +192,11 @@ def get_cached_rate(currency_code, allow_stale=False):
             return None
 
         return {
-            'rate': float(rate_setting.value),
+            'rate': float(rate_value),
             'currency': currency_code,
             'date': cached_at.strftime('%Y-%m-%d'),
             'cached': True,
-            'cached_at': timestamp_setting.value,
+            'cached_at': timestamp_value,
             'cache_age_hours': int(age.total_seconds() / 3600)
         }
 
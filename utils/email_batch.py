@@ -0,0 +1,248 @@
+"""
+Email batch — masowe przygotowanie maili z jednego szablonu
+============================================================
+
+prepare_email dla każdego odbiorcy osobno: wyszukanie szablonu .html i .txt
+(brak .txt nie jest cache'owany przez Jinję — za każdym razem przejście po
+loaderach wszystkich blueprintów), context processors, pełny render, odczyt
+logo z dysku, a przy zapisie do outboxu serializacja MIME (Message.as_bytes —
+najdroższy krok, ~10x render, czysty Python).
+
+prepare_email_batch robi to raz na batch:
+- szablony wyszukane i skompilowane raz, context processors raz (kontekst
+  wspólny: `shared`),
+- gdy kontekst odbiorcy to same niepuste stringi (imię, numer zamówienia),
+  szablon renderowany RAZ ze znacznikami w miejscu tych zmiennych, a per
+  odbiorca tylko sklejane fragmenty z escapowanymi wartościami; inaczej
+  (listy produktów, warunki) — render per odbiorca na gotowym kontekście,
+- logo czytane raz,
+- MIME (Message.mime) liczone w puli procesów (EMAIL_RENDER_WORKERS) od
+  EMAIL_MIME_POOL_MIN wiadomości — outbox zapisuje gotowe bajty.
+
+Benchmark: scripts/email_batch_benchmark.py.
+"""
+
+import os
+import re
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+from markupsafe import escape
+
+logger = logging.getLogger(__name__)
+
+_TEXT_FALLBACK = "Sprawdź email w kliencie obsługującym HTML."
+_MARKER = '\x1e{}\x1e'
+_MARKER_RE = re.compile('\x1e([^\x1e]+)\x1e')
+# Klucze odbiorcy, które nie są kontekstem szablonu
+_RECIPIENT_FIELDS = ('to', 'subject', 'idempotency_key')
+_MIME_CHUNK = 25
+
+
+class _BatchTemplate:
+    """Szablon .html (+ opcjonalny .txt) skompilowany raz, z gotowym kontekstem wspólnym."""
+
+    def __init__(self, app, template, shared):
+        env = app.jinja_env
+        self.html = env.get_template(f'emails/{template}.html')
+        try:
+            self.text = env.get_template(f'emails/{template}.txt')
+        except Exception:
+            self.text = None
+        self.context = dict(shared)
+        app.update_template_context(self.context)
+        self._autoescape = {
+            'html': app.select_jinja_autoescape(self.html.name),
+            'text': self.text is not None and app.select_jinja_autoescape(self.text.name),
+        }
+        self._parts = {}
+
+    def split(self, keys, sample):
+        """
+        Render raz ze znacznikami zamiast zmiennych `keys`: [tekst, klucz, tekst, ...].
+        Gdy szablon przetwarza którąś zmienną (filtr, warunek) i znacznik nie
+        przetrwał, zmienił klucz (np. `|upper` — KeyError przy wypełnianiu)
+        albo wynik dla `sample` różni się od pełnego renderu — tryb z renderem
+        per odbiorca.
+        """
+        markers = {key: _MARKER.format(key) for key in keys}
+        for kind in ('html', 'text'):
+            template = getattr(self, kind)
+            if template is not None:
+                self._parts[kind] = _MARKER_RE.split(template.render({**self.context, **markers}))
+        expected = self._render_full(sample)
+        try:
+            split_ok = set(keys) <= set(self._parts['html'][1::2]) and self.render(sample) == expected
+        except KeyError:
+            split_ok = False
+        if split_ok:
+            return True
+        self._parts = {}
+        return False
+
+    def _fill(self, kind, values):
+        parts = self._parts[kind]
+        if self._autoescape[kind]:
+            values = {key: str(escape(value)) for key, value in values.items()}
+        out = parts[:]
+        out[1::2] = [values[key] for key in parts[1::2]]
+        return ''.join(out)
+
+    def render(self, values):
+        """(html, text) dla kontekstu odbiorcy."""
+        if self._parts:
+            html = self._fill('html', values)
+            text = self._fill('text', values) if self.text is not None else _TEXT_FALLBACK
+            return html, text
+        return self._render_full(values)
+
+    def _render_full(self, values):
+        context = {**self.context, **values}
+        html = self.html.render(context)
+        text = self.text.render(context) if self.text is not None else _TEXT_FALLBACK
+        return html, text
+
+
+def _load_logo(app):
+    logo_path = os.path.join(app.root_path, 'static', 'img', 'icons', 'logo-full-black-email.png')
+    if not os.path.exists(logo_path):
+        return None
+    with app.open_resource(logo_path, 'rb') as fp:
+        return fp.read()
+
+
+def _attach_logo(msg, logo):
+    msg.attach(
+        filename='logo.png',
+        content_type='image/png',
+        data=logo,
+        disposition='inline',
+        headers=[('Content-ID', '<logo@thunderorders>')],
+    )
+
+
+def prepare_email_batch(template, subject, recipients, shared=None, workers=None):
+    """
+    Przygotowuje Message dla wielu odbiorców jednego szablonu (jak prepare_email).
+
+    Args:
+        template (str): szablon emails/<template>.html (+ opcjonalnie .txt)
+        subject (str): temat wspólny (odbiorca może nadpisać kluczem 'subject')
+        recipients (list[dict]): per odbiorca 'to', opcjonalnie 'subject' i
+            'idempotency_key'; pozostałe klucze to kontekst szablonu odbiorcy
+        shared (dict): kontekst wspólny dla wszystkich odbiorców
+        workers (int): procesy serializacji MIME (domyślnie EMAIL_RENDER_WORKERS)
+
+    Returns:
+        list[Message]: wiadomości z gotowym MIME (msg.mime), bez odbiorców bez adresu
+    """
+    from flask_mail import Message
+
+    recipients = [r for r in recipients if r.get('to')]
+    if not recipients:
+        return []
+
+    app = current_app._get_current_object()
+    started = time.perf_counter()
+    batch = _BatchTemplate(app, template, shared or {})
+    contexts = [{key: value for key, value in r.items() if key not in _RECIPIENT_FIELDS} for r in recipients]
+    keys = {key for values in contexts for key in values}
+    fast = all(isinstance(values.get(key), str) and values.get(key) for values in contexts for key in keys)
+    fast = fast and batch.split(keys, contexts[0])
+    logo = _load_logo(app)
+    sender = app.config['MAIL_DEFAULT_SENDER']
+
+    messages = []
+    for recipient, values in zip(recipients, contexts):
+        try:
+            html, text = batch.render(values)
+        except Exception as e:
+            logger.error(f"[EMAIL] Batch render FAILED to={recipient['to']}, template={template}, "
+                         f"error={type(e).__name__}: {e}")
+            continue
+        msg = Message(subject=recipient.get('subject', subject), recipients=[recipient['to']], sender=sender)
+        msg.idempotency_key = recipient.get('idempotency_key')
+        msg.html = html
+        msg.body = text
+        msg.date = time.time()
+        if logo is not None:
+            _attach_logo(msg, logo)
+        messages.append(msg)
+    rendered = time.perf_counter()
+
+    _serialize(messages, logo, workers)
+    logger.info(
+        f"[EMAIL] Batch '{template}': {len(messages)} messages "
+        f"({'shared render' if fast else 'per-recipient render'}), "
+        f"render={(rendered - started) * 1000:.0f}ms, mime={(time.perf_counter() - rendered) * 1000:.0f}ms"
+    )
+    return messages
+
+
+# ============================================
+# Serializacja MIME (pula procesów)
+# ============================================
+
+_worker_logo = None
+
+
+def _mime_worker_init(logo, ascii_attachments):
+    """Proces puli: minimalna aplikacja z Flask-Mail (Message.as_bytes czyta config z current_app)."""
+    global _worker_logo
+    from flask import Flask
+    from flask_mail import Mail
+
+    app = Flask('email-mime')
+    app.config['MAIL_ASCII_ATTACHMENTS'] = ascii_attachments
+    Mail(app)
+    app.app_context().push()
+    _worker_logo = logo
+
+
+def _mime_bytes(payload):
+    from flask_mail import Message
+
+    msg = Message(subject=payload['subject'], recipients=payload['recipients'], sender=payload['sender'])
+    msg.html = payload['html']
+    msg.body = payload['body']
+    msg.date = payload['date']
+    msg.msgId = payload['msg_id']
+    if payload['logo'] and _worker_logo is not None:
+        _attach_logo(msg, _worker_logo)
+    return msg.as_bytes()
+
+
+def _payload(msg, logo):
+    return {
+        'subject': msg.subject, 'recipients': msg.recipients, 'sender': msg.sender,
+        'html': msg.html, 'body': msg.body, 'date': msg.date, 'msg_id': msg.msgId,
+        'logo': logo is not None,
+    }
+
+
+def _serialize(messages, logo, workers=None):
+    """Ustawia msg.mime (bajty MIME) — w puli procesów dla dużych batchy."""
+    config = current_app.config
+    workers = workers or config.get('EMAIL_RENDER_WORKERS') or os.cpu_count() or 1
+    if workers > 1 and len(messages) >= config.get('EMAIL_MIME_POOL_MIN', 200):
+        ascii_attachments = current_app.extensions['mail'].ascii_attachments
+        try:
+            # spawn: procesy puli nie dziedziczą aplikacji ani połączeń DB
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_mime_worker_init,
+                initargs=(logo, ascii_attachments),
+            ) as pool:
+                raws = list(pool.map(_mime_bytes, [_payload(m, logo) for m in messages], chunksize=_MIME_CHUNK))
+            for msg, raw in zip(messages, raws):
+                msg.mime = raw
+            return
+        except Exception as e:
+            logger.warning(f"[EMAIL] MIME pool failed ({type(e).__name__}: {e}), serializing in process")
+
+    for msg in messages:
+        msg.mime = msg.as_bytes()
@@ -754,29 +754,28 @@ class EmailManager:
             current_app.logger.info("Email notification 'notify_new_offer_page' is disabled, skipping")
             return 0
 
-        from utils.email_sender import send_new_offer_page_email
+        from utils.email_batch import prepare_email_batch
+        from utils.email_sender import send_email_batch
 
         page_url = url_for('offers.order_page', token=page.token, _external=True)
-        sent_count = 0
-
-        for client in clients:
-            email = client.email
-            if not email:
-                continue
-
-            name = client.first_name or 'Kliencie'
-
-            try:
-                send_new_offer_page_email(
-                    user_email=email,
-                    user_name=name,
-                    page_name=page.name,
-                    page_url=page_url
-                )
-                sent_count += 1
-            except Exception as e:
-                current_app.logger.error(f"Failed to send new offer page email to {email}: {e}")
+        # Szablon renderowany raz dla całego batcha — per klient tylko imię
+        messages = prepare_email_batch(
+            'new_offer_page',
+            subject=f'Nowy drop: {page.name} - ThunderOrders',
+            shared={'page_name': page.name, 'page_url': page_url},
+            recipients=[
+                {
+                    'to': client.email,
+                    'idempotency_key': f'new-offer-page:{page.id}:{client.id}',
+                    'user_name': client.first_name or 'Kliencie',
+                }
+                for client in clients
+            ],
+        )
 
+        # Jeden batch (outbox / jedno połączenie SMTP) zamiast wątku per klient
+        send_email_batch(messages)
+        sent_count = len(messages)
         current_app.logger.info(f"New offer page emails sent: {sent_count}/{len(clients)} for '{page.name}'")
         return sent_count
 
@@ -800,41 +799,35 @@ class EmailManager:
             )
             return 0
 
-        from utils.email_sender import send_sale_end_date_changed_email
+        from utils.email_batch import prepare_email_batch
+        from utils.email_sender import send_email_batch
 
         def _format_date(dt):
             if dt is None:
                 return 'bez limitu czasowego'
             return dt.strftime('%d.%m.%Y, %H:%M')
 
-        old_display = _format_date(old_ends_at)
-        new_display = _format_date(new_ends_at)
-
         page_url = url_for('offers.order_page', token=page.token, _external=True)
-        sent_count = 0
-
-        for client in recipients:
-            email = client.email
-            if not email:
-                continue
-
-            name = client.first_name or 'Kliencie'
-
-            try:
-                ok = send_sale_end_date_changed_email(
-                    user_email=email,
-                    user_name=name,
-                    page_name=page.name,
-                    old_ends_at_display=old_display,
-                    new_ends_at_display=new_display,
-                    page_url=page_url,
-                )
-                if ok:
-                    sent_count += 1
-            except Exception as e:
-                current_app.logger.error(
-                    f"Failed to send sale end date changed email to {email}: {e}"
-                )
+        try:
+            messages = prepare_email_batch(
+                'sale_end_date_changed',
+                subject=f'Zaktualizowano datę zakończenia sprzedaży — {page.name}',
+                shared={
+                    'page_name': page.name,
+                    'old_ends_at_display': _format_date(old_ends_at),
+                    'new_ends_at_display': _format_date(new_ends_at),
+                    'page_url': page_url,
+                },
+                recipients=[
+                    {'to': client.email, 'user_name': client.first_name or 'Kliencie'}
+                    for client in recipients
+                ],
+            )
+            send_email_batch(messages)
+            sent_count = len(messages)
+        except Exception as e:
+            current_app.logger.error(f"Failed to send sale end date changed emails for '{page.name}': {e}")
+            sent_count = 0
 
         current_app.logger.info(
             f"Sale end date changed emails sent: {sent_count}/{len(recipients)} for '{page.name}'"
@@ -0,0 +1,416 @@
+"""
+Email outbox — trwała kolejka emaili z osobnym procesem wysyłki
+================================================================
+
+send_email_batch wysyłał w wątku daemon web workera z `time.sleep(2)` między
+mailami: 600 maili po zamknięciu strony ofertowej to 20+ minut w procesie
+gunicorna, a wszystko, co nie zdążyło wyjść, ginęło przy deployu/restarcie.
+
+send_email / send_email_batch (i przez nie EmailManager.*) tylko zapisują
+gotową wiadomość MIME w tabeli email_outbox (enqueue — osobna transakcja,
+niezależna od sesji wołającego). Wysyła `flask email-sender` (run_sender):
+
+- jedno połączenie SMTP na wiele wiadomości (jeden AUTH), odnawiane po
+  EMAIL_SMTP_MAX_PER_CONNECTION mailach, po błędzie i po bezczynności,
+- token bucket (EMAIL_RATE_PER_MINUTE, EMAIL_RATE_BURST) zamiast stałego
+  sleep — po przerwie seria wychodzi od razu, średnio nie szybciej niż limit,
+- retry z backoffem dla błędów tymczasowych (_is_retryable_smtp_error),
+  trwałe błędy i wyczerpane próby → 'failed' (ponowienie z panelu admina),
+- dedup: wiadomość z idempotency_key (prepare_email/send_email) trafia do
+  kolejki tylko raz — powtórzone zamknięcie strony nie wyśle maili drugi raz,
+- metryki (get_stats): głębokość kolejki, wiek najstarszego maila, tempo
+  wysyłki → /admin/email-outbox.
+"""
+
+import time
+import logging
+from datetime import timedelta
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# Wysłane wiadomości (z treścią MIME) czyszczone po tylu dniach
+_DEFAULT_RETENTION_DAYS = 7
+_PURGE_INTERVAL = 3600
+_MAX_RETRY_DELAY = 3600
+
+
+def enabled():
+    """Czy emaile idą przez outbox (EMAIL_OUTBOX_ENABLED), a nie wątek web workera."""
+    return current_app.config.get('EMAIL_OUTBOX_ENABLED', False)
+
+
+def _row(msg, now):
+    from flask_mail import sanitize_address, sanitize_addresses
+
+    if msg.date is None:
+        msg.date = time.time()
+    return {
+        'idempotency_key': getattr(msg, 'idempotency_key', None),
+        'sender': sanitize_address(msg.sender),
+        'recipients': list(sanitize_addresses(msg.send_to)),
+        'subject': (msg.subject or '')[:255],
+        # MIME policzone wcześniej (prepare_email_batch) albo teraz
+        'message': getattr(msg, 'mime', None) or msg.as_bytes(),
+        'status': 'pending',
+        'attempts': 0,
+        'available_at': now,
+        'created_at': now,
+    }
+
+
+def enqueue(messages):
+    """
+    Zapisuje przygotowane Message (prepare_email) w outboxie.
+
+    Osobna transakcja na własnym połączeniu — mail nie czeka na commit
+    wołającego i nie commituje jego sesji. Wiadomości z idempotency_key,
+    który już jest w outboxie, są pomijane.
+
+    Returns:
+        int: liczba nowych wiadomości w kolejce
+    """
+    from sqlalchemy import insert, select
+    from sqlalchemy.exc import IntegrityError
+    from extensions import db
+    from modules.notifications.models import EmailOutbox, get_local_now
+
+    now = get_local_now()
+    rows, keys = [], set()
+    for msg in messages:
+        if msg is None:
+            continue
+        row = _row(msg, now)
+        if row['idempotency_key']:
+            if row['idempotency_key'] in keys:
+                continue
+            keys.add(row['idempotency_key'])
+        rows.append(row)
+    if not rows:
+        return 0
+
+    try:
+        with db.engine.begin() as conn:
+            if keys:
+                existing = set(conn.execute(
+                    select(EmailOutbox.idempotency_key).where(EmailOutbox.idempotency_key.in_(keys))
+                ).scalars())
+                rows = [r for r in rows if r['idempotency_key'] not in existing]
+            if rows:
+                conn.execute(insert(EmailOutbox), rows)
+        return len(rows)
+    except IntegrityError:
+        # Ten sam klucz dopisany równolegle przez inny proces — wiersz po wierszu
+        added = 0
+        for row in rows:
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(insert(EmailOutbox), [row])
+                added += 1
+            except IntegrityError:
+                logger.info(f"[EMAIL-OUTBOX] Duplicate idempotency_key={row['idempotency_key']}, skipped")
+        return added
+
+
+def claim(limit):
+    """
+    Pobiera do `limit` wiadomości gotowych do wysyłki (pending → sending).
+    Warunkowy UPDATE — przy kilku procesach wiadomość dostaje tylko jeden.
+
+    Returns:
+        list[int]: id wiadomości w kolejności wysyłki
+    """
+    from sqlalchemy import update
+    from extensions import db
+    from modules.notifications.models import EmailOutbox, get_local_now
+
+    now = get_local_now()
+    candidates = db.session.query(EmailOutbox.id).filter(
+        EmailOutbox.status == 'pending',
+        EmailOutbox.available_at <= now,
+    ).order_by(EmailOutbox.id).limit(limit).all()
+
+    claimed = []
+    for (outbox_id,) in candidates:
+        result = db.session.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id == outbox_id, EmailOutbox.status == 'pending')
+            .values(status='sending', started_at=now, attempts=EmailOutbox.attempts + 1)
+        )
+        if result.rowcount:
+            claimed.append(outbox_id)
+    db.session.commit()
+    return claimed
+
+
+def requeue_stale(timeout):
+    """Wiadomości 'sending' dłużej niż timeout (sender padł w trakcie) wracają do kolejki."""
+    from extensions import db
+    from modules.notifications.models import EmailOutbox, get_local_now
+
+    now = get_local_now()
+    count = EmailOutbox.query.filter(
+        EmailOutbox.status == 'sending',
+        EmailOutbox.started_at < now - timedelta(seconds=timeout),
+    ).update({'status': 'pending', 'available_at': now}, synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+def retry_failed():
+    """Przywraca wiadomości 'failed' do kolejki (panel admina). Zwraca ich liczbę."""
+    from extensions import db
+    from modules.notifications.models import EmailOutbox, get_local_now
+
+    count = EmailOutbox.query.filter_by(status='failed').update(
+        {'status': 'pending', 'attempts': 0, 'available_at': get_local_now()},
+        synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+def purge_sent(days):
+    """Usuwa wysłane wiadomości starsze niż `days` dni (treść MIME z załącznikami)."""
+    from extensions import db
+    from modules.notifications.models import EmailOutbox, get_local_now
+
+    count = EmailOutbox.query.filter(
+        EmailOutbox.status == 'sent',
+        EmailOutbox.sent_at < get_local_now() - timedelta(days=days),
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+# ============================================
+# Wysyłka
+# ============================================
+
+class TokenBucket:
+    """
+    Limiter tempa: `rate` wiadomości/s średnio, do `burst` od razu po przerwie.
+    Zamiast stałego odstępu 2 s — czeka tylko, gdy limit jest wyczerpany.
+    """
+
+    def __init__(self, rate, burst, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+
+    def acquire(self):
+        """Pobiera token (blokuje, gdy brak). Zwraca czas oczekiwania w sekundach."""
+        waited = 0.0
+        while True:
+            now = self._clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return waited
+            delay = (1 - self.tokens) / self.rate
+            self._sleep(delay)
+            waited += delay
+
+
+def _open_smtp():
+    """smtplib.SMTP wg configu Flask-Mail (login raz); None gdy wysyłka wyłączona (MAIL_SUPPRESS_SEND)."""
+    from extensions import mail
+
+    connection = mail.connect()
+    if connection.mail.suppress:
+        return None
+    return connection.configure_host()
+
+
+class SmtpConnection:
+    """
+    Jedno połączenie SMTP dla kolejnych wiadomości. Zamykane po
+    `max_messages` mailach, po błędzie wysyłki i po `idle_timeout` s bezczynności.
+    """
+
+    def __init__(self, max_messages, idle_timeout):
+        self.max_messages = max_messages
+        self.idle_timeout = idle_timeout
+        self._host = None
+        self._open = False
+        self._count = 0
+        self._last_used = 0.0
+
+    def send(self, sender, recipients, raw):
+        if not self._open:
+            self._host = _open_smtp()
+            self._open = True
+            self._count = 0
+        try:
+            if self._host is not None:
+                self._host.sendmail(sender, recipients, raw)
+        except Exception:
+            self.close()
+            raise
+        self._count += 1
+        self._last_used = time.monotonic()
+        if self.max_messages and self._count >= self.max_messages:
+            self.close()
+
+    def close_if_idle(self):
+        if self._open and time.monotonic() - self._last_used >= self.idle_timeout:
+            self.close()
+
+    def close(self):
+        if self._host is not None:
+            try:
+                self._host.quit()
+            except Exception:
+                pass
+        self._host = None
+        self._open = False
+
+
+def _retry_delay(attempts):
+    """Backoff: SMTP_RETRY_DELAYS, dalej podwajany (maks. godzina)."""
+    from utils.email_sender import SMTP_RETRY_DELAYS
+
+    if attempts <= len(SMTP_RETRY_DELAYS):
+        return SMTP_RETRY_DELAYS[attempts - 1]
+    return min(SMTP_RETRY_DELAYS[-1] * 2 ** (attempts - len(SMTP_RETRY_DELAYS)), _MAX_RETRY_DELAY)
+
+
+def _fail(outbox_id, exc):
+    """Błąd wysyłki: retry z backoffem (błąd tymczasowy) albo 'failed'."""
+    from extensions import db
+    from modules.notifications.models import EmailOutbox, get_local_now
+    from utils.email_sender import _is_retryable_smtp_error
+
+    db.session.rollback()
+    row = db.session.get(EmailOutbox, outbox_id)
+    now = get_local_now()
+    row.error = f'{type(exc).__name__}: {exc}'[:2000]
+    max_attempts = current_app.config.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 8)
+    if _is_retryable_smtp_error(exc) and row.attempts < max_attempts:
+        delay = _retry_delay(row.attempts)
+        row.status = 'pending'
+        row.available_at = now + timedelta(seconds=delay)
+        outcome = 'retried'
+        logger.warning(f"[EMAIL-OUTBOX] RETRY {row.attempts}/{max_attempts} to={row.recipients}, "
+                       f"error={row.error}, retrying in {delay}s")
+    else:
+        row.status = 'failed'
+        outcome = 'failed'
+        logger.error(f"[EMAIL-OUTBOX] FAILED to={row.recipients}, subject='{row.subject}', "
+                     f"attempt={row.attempts}, error={row.error}")
+    db.session.commit()
+    return outcome
+
+
+def _deliver(smtp, outbox_id):
+    from extensions import db
+    from modules.notifications.models import EmailOutbox, get_local_now
+
+    row = db.session.get(EmailOutbox, outbox_id)
+    try:
+        smtp.send(row.sender, row.recipients, row.message)
+    except Exception as e:
+        return _fail(outbox_id, e)
+    row.status = 'sent'
+    row.sent_at = get_local_now()
+    row.error = None
+    db.session.commit()
+    return 'sent'
+
+
+def claim_limit(batch_size, rate, timeout):
+    """
+    Rozmiar pobieranej porcji: tyle, ile limit tempa przepuści w połowie
+    EMAIL_OUTBOX_SENDING_TIMEOUT (reszta to zapas na SMTP). Większa porcja
+    czekałaby na token bucket tak długo, że końcówka przekroczyłaby timeout,
+    a requeue_stale innego procesu wysłałby te maile drugi raz.
+
+    Args:
+        batch_size (int): górna granica porcji
+        rate (float): maili na sekundę (EMAIL_RATE_PER_MINUTE / 60)
+        timeout (int): EMAIL_OUTBOX_SENDING_TIMEOUT w sekundach
+    """
+    return max(1, min(batch_size, int(rate * timeout / 2)))
+
+
+def run_sender(once=False, poll_interval=2.0, batch_size=50):
+    """
+    Pętla `flask email-sender`: wysyła wiadomości z outboxu.
+
+    Args:
+        once (bool): zakończ, gdy kolejka jest pusta (cron, testy)
+        poll_interval (float): odstęp odpytywania pustej kolejki (s)
+        batch_size (int): ile wiadomości pobierać naraz (górna granica — patrz claim_limit)
+
+    Returns:
+        dict: liczniki {'sent', 'failed', 'retried'}
+    """
+    config = current_app.config
+    rate = config.get('EMAIL_RATE_PER_MINUTE', 30) / 60.0
+    bucket = TokenBucket(rate, config.get('EMAIL_RATE_BURST', 5))
+    smtp = SmtpConnection(config.get('EMAIL_SMTP_MAX_PER_CONNECTION', 100),
+                          config.get('EMAIL_SMTP_IDLE_TIMEOUT', 30))
+    timeout = config.get('EMAIL_OUTBOX_SENDING_TIMEOUT', 300)
+    batch_size = claim_limit(batch_size, rate, timeout)
+    retention = config.get('EMAIL_OUTBOX_RETENTION_DAYS', _DEFAULT_RETENTION_DAYS)
+    stats = {'sent': 0, 'failed': 0, 'retried': 0}
+    last_purge = 0.0
+
+    try:
+        while True:
+            requeue_stale(timeout)
+            if time.monotonic() - last_purge >= _PURGE_INTERVAL:
+                purge_sent(retention)
+                last_purge = time.monotonic()
+
+            claimed = claim(batch_size)
+            if not claimed:
+                smtp.close_if_idle()
+                if once:
+                    return stats
+                time.sleep(poll_interval)
+                continue
+
+            for outbox_id in claimed:
+                bucket.acquire()
+                stats[_deliver(smtp, outbox_id)] += 1
+            logger.info(f"[EMAIL-OUTBOX] Batch done: {stats['sent']} sent, {stats['retried']} retried, "
+                        f"{stats['failed']} failed so far")
+    finally:
+        smtp.close()
+
+
+def get_stats():
+    """Głębokość kolejki i tempo wysyłki (wspólne dla wszystkich procesów — z bazy)."""
+    from sqlalchemy import func
+    from extensions import db
+    from modules.notifications.models import EmailOutbox, get_local_now
+
+    now = get_local_now()
+    by_status = dict(db.session.query(EmailOutbox.status, func.count(EmailOutbox.id))
+                     .group_by(EmailOutbox.status).all())
+    oldest = db.session.query(func.min(EmailOutbox.created_at)).filter(
+        EmailOutbox.status.in_(('pending', 'sending'))).scalar()
+
+    def _sent_since(minutes):
+        return db.session.query(func.count(EmailOutbox.id)).filter(
+            EmailOutbox.status == 'sent',
+            EmailOutbox.sent_at >= now - timedelta(minutes=minutes)).scalar()
+
+    sent_15 = _sent_since(15)
+    return {
+        'pending': by_status.get('pending', 0),
+        'sending': by_status.get('sending', 0),
+        'failed': by_status.get('failed', 0),
+        'sent': by_status.get('sent', 0),
+        'oldest_pending_seconds': int((now - oldest).total_seconds()) if oldest else None,
+        'sent_last_minute': _sent_since(1),
+        'sent_last_15_minutes': sent_15,
+        'sent_last_hour': _sent_since(60),
+        'rate_per_minute': round(sent_15 / 15, 1),
+        'rate_limit_per_minute': current_app.config.get('EMAIL_RATE_PER_MINUTE', 30),
+    }
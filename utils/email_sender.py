@@ -1,6 +1,10 @@
 """
 Email Sender Module
 Funkcje do wysyłania emaili (rejestracja, reset hasła, powiadomienia)
+
+send_email / send_email_batch zapisują wiadomości w outboxie
+(utils/email_outbox.py, wysyła `flask email-sender`), gdy EMAIL_OUTBOX_ENABLED;
+inaczej — wątek w procesie aplikacji. *_sync wysyłają zawsze od razu.
 """
 
 from flask import current_app, render_template
@@ -24,14 +28,17 @@ SMTP_RETRYABLE_CODES = {421, 450, 451, 452, 454}
 def _is_retryable_smtp_error(exc):
     """Check if an SMTP exception is transient and worth retrying."""
     import smtplib
-    if isinstance(exc, (smtplib.SMTPServerDisconnected, ConnectionError, OSError)):
+    if isinstance(exc, smtplib.SMTPServerDisconnected):
         return True
     if isinstance(exc, smtplib.SMTPSenderRefused):
         # SMTPSenderRefused stores code in .smtp_code
         return exc.smtp_code in SMTP_RETRYABLE_CODES
     if isinstance(exc, smtplib.SMTPResponseException):
         return exc.smtp_code in SMTP_RETRYABLE_CODES
-    return False
+    if isinstance(exc, smtplib.SMTPException):
+        # SMTPException dziedziczy po OSError — odrzuceni odbiorcy itp. to błędy trwałe
+        return False
+    return isinstance(exc, (ConnectionError, OSError))
 
 
 def send_async_email(app, msg):
@@ -165,7 +172,7 @@ def send_email_batch_sync(messages):
     return results
 
 
-def send_email(to, subject, template, **kwargs):
+def send_email(to, subject, template, idempotency_key=None, **kwargs):
     """
     Wysyła email z templatem HTML
 
@@ -173,10 +180,11 @@ def send_email(to, subject, template, **kwargs):
         to (str): Adres odbiorcy
         subject (str): Temat emaila
         template (str): Ścieżka do template HTML (bez .html)
+        idempotency_key (str): Klucz deduplikacji w outboxie (ten sam klucz = jeden mail)
         **kwargs: Dodatkowe zmienne przekazywane do template
 
     Returns:
-        bool: True jeśli email został wysłany, False w przypadku błędu
+        bool: True jeśli email został przyjęty do wysyłki, False w przypadku błędu
     """
     app = current_app._get_current_object()
 
@@ -185,6 +193,7 @@ def send_email(to, subject, template, **kwargs):
         recipients=[to],
         sender=app.config['MAIL_DEFAULT_SENDER']
     )
+    msg.idempotency_key = idempotency_key
 
     try:
         # Renderuj HTML template
@@ -210,7 +219,14 @@ def send_email(to, subject, template, **kwargs):
                     headers=[('Content-ID', '<logo@thunderorders>')],
                 )
 
-        # Wysyłka asynchroniczna (nie blokuje aplikacji)
+        # Trwała kolejka — wysyła proces `flask email-sender`
+        from utils import email_outbox
+        if email_outbox.enabled():
+            email_outbox.enqueue([msg])
+            logger.info(f"[EMAIL] Queued in outbox to={to}, subject='{subject}'")
+            return True
+
+        # Bez outboxu: wysyłka asynchroniczna w wątku (nie blokuje aplikacji)
         logger.info(f"[EMAIL] Queuing email to={to}, subject='{subject}', smtp={app.config.get('MAIL_SERVER')}:{app.config.get('MAIL_PORT')}")
         Thread(
             target=send_async_email,
@@ -291,11 +307,14 @@ def send_email_sync(to, subject, template, **kwargs):
         return False
 
 
-def prepare_email(to, subject, template, **kwargs):
+def prepare_email(to, subject, template, idempotency_key=None, **kwargs):
     """
     Przygotowuje obiekt Message bez wysyłania.
     Używane przez send_email_batch() do batch'owego wysyłania.
 
+    Args:
+        idempotency_key (str): Klucz deduplikacji w outboxie (ten sam klucz = jeden mail)
+
     Returns:
         Message lub None w przypadku błędu
     """
@@ -306,6 +325,7 @@ def prepare_email(to, subject, template, **kwargs):
         recipients=[to],
         sender=app.config['MAIL_DEFAULT_SENDER']
     )
+    msg.idempotency_key = idempotency_key
 
     try:
         msg.html = render_template(f'emails/{template}.html', **kwargs)
@@ -335,7 +355,8 @@ def prepare_email(to, subject, template, **kwargs):
 
 def send_email_batch(messages):
     """
-    Wysyła listę przygotowanych Message w jednym wątku z jednym połączeniem SMTP.
+    Wysyła listę przygotowanych Message: do outboxu (EMAIL_OUTBOX_ENABLED)
+    albo w jednym wątku z jednym połączeniem SMTP.
 
     Args:
         messages (list): Lista obiektów Message (z prepare_email())
@@ -344,6 +365,15 @@ def send_email_batch(messages):
     if not messages:
         return
 
+    from utils import email_outbox
+    if email_outbox.enabled():
+        try:
+            added = email_outbox.enqueue(messages)
+            logger.info(f"[EMAIL-BATCH] Queued {added}/{len(messages)} emails in outbox")
+        except Exception as e:
+            logger.error(f"[EMAIL-BATCH] Outbox enqueue FAILED for {len(messages)} emails: {type(e).__name__}: {e}")
+        return
+
     app = current_app._get_current_object()
     logger.info(f"[EMAIL-BATCH] Queuing batch of {len(messages)} emails")
     Thread(
@@ -1179,6 +1209,12 @@ def send_packing_photo_email(user_email, user_name, order_number, photo_path):
                 headers=[('Content-ID', '<packing_photo@thunderorders>')],
             )
 
+        from utils import email_outbox
+        if email_outbox.enabled():
+            email_outbox.enqueue([msg])
+            logger.info(f"[EMAIL] Queued packing photo email in outbox to={user_email}, order={order_number}")
+            return True
+
         logger.info(f"[EMAIL] Queuing packing photo email to={user_email}, order={order_number}")
         Thread(
             target=send_async_email,
@@ -1253,7 +1253,7 @@ def generate_offers_bulk_report(pages):
     summaries = {}
     for page in pages:
         try:
-            summaries[page.id] = get_live_summary(page.id, include_financials=True)
+            summaries[page.id] = get_live_summary(page.id, include_financials=True, include_orders=False)
         except Exception:
             import traceback
             traceback.print_exc()
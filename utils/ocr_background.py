@@ -2,8 +2,10 @@
 Background OCR Payment Verification
 ====================================
 
-Runs OCR verification in a background thread via Flask-Executor.
-After processing, updates PaymentConfirmation records and emits WebSocket events.
+Runs OCR verification in a background thread via utils/background_jobs (Flask-Executor)
+when the OCR queue is disabled (OCR_QUEUE_ENABLED=False). With the queue, OCR runs in the
+`flask ocr-worker` process pool (utils/ocr_queue.py), which stores results through the same
+apply_ocr_result(): updates PaymentConfirmation records, notifications and WebSocket events.
 """
 
 import os
@@ -35,15 +37,24 @@ def _is_permanent_ocr_error(exc):
 
 def _verify_with_retry(verify_kwargs):
     """
-    Uruchamia verify_payment_proof z retry/backoff dla transient errors.
+    Uruchamia weryfikację (OCR + scoring) z retry/backoff dla transient errors.
+    Tekst OCR idzie przez utils/ocr_cache.py i jest pamiętany między
+    próbami — retry po błędzie scoringu lub bazy nie OCR-uje pliku drugi raz.
     Zwraca dict z wynikiem OCR lub None gdy się nie udało.
     """
-    from utils.ocr_verifier import verify_payment_proof
+    from utils import ocr_cache
+    from utils.ocr_verifier import score_proof_text
 
+    score_args = dict(verify_kwargs)
+    filepath = score_args.pop('filepath')
+
+    text = None
     last_error = None
     for attempt in range(1, MAX_OCR_RETRIES + 1):
         try:
-            return verify_payment_proof(**verify_kwargs)
+            if text is None:
+                text = ocr_cache.read_text(filepath)
+            return score_proof_text(text, **score_args)
         except Exception as e:
             last_error = e
             if _is_permanent_ocr_error(e):
@@ -63,7 +74,8 @@ def _verify_with_retry(verify_kwargs):
 
 def process_ocr_verification(task_data):
     """
-    Background OCR verification task. Runs via executor.submit().
+    Background OCR verification task. Runs via background_jobs.submit('ocr', ...)
+    in the submitting app's context (shared engine, no create_app() per task).
 
     Args:
         task_data: dict with keys:
@@ -73,63 +85,71 @@ def process_ocr_verification(task_data):
             - order_numbers: list[str]
             - total_expected: float
     """
-    from app import create_app
-    app = create_app()
-
-    with app.app_context():
-        _process_ocr_internal(task_data)
+    _process_ocr_internal(task_data)
 
 
 def _process_ocr_internal(task_data):
     """Internal OCR processing within app context."""
-    from extensions import db
-    from modules.orders.models import PaymentConfirmation, get_local_now
-    from modules.payments.models import PaymentMethod
-    from modules.auth.models import Settings
     from utils.ocr_verifier import TESSERACT_AVAILABLE
 
-    saved_filename = task_data['saved_filename']
-    payment_method_id = task_data.get('payment_method_id')
-    user_id = task_data['user_id']
-    order_numbers = task_data.get('order_numbers', [])
-    total_expected = Decimal(str(task_data.get('total_expected', 0)))
-
     if not TESSERACT_AVAILABLE:
         logger.warning("Tesseract not available — skipping background OCR")
         return
 
-    # Ścieżka do pliku
-    upload_folder = os.path.join(
-        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
-        'uploads', 'payment_confirmations'
-    )
-    proof_filepath = os.path.join(upload_folder, saved_filename)
-
+    proof_filepath = proof_path(task_data['saved_filename'])
     if not os.path.exists(proof_filepath):
         logger.error(f"OCR background: proof file not found: {proof_filepath}")
         return
 
-    # Pobierz obiekt metody płatności
-    pm_obj = None
-    if payment_method_id:
-        pm_obj = db.session.get(PaymentMethod, payment_method_id)
-
-    # Pobierz wszystkie aktywne metody (do fallback w score_recipient)
-    all_methods = PaymentMethod.get_active()
-
     # Uruchom OCR z retry dla transient errors (Tesseract crash, DB deadlock)
-    ocr_result = _verify_with_retry({
-        'filepath': proof_filepath,
-        'expected_amount': total_expected,
-        'order_numbers': order_numbers,
-        'payment_method': pm_obj,
-        'all_payment_methods': all_methods,
-    })
+    ocr_result = _verify_with_retry({'filepath': proof_filepath, **score_kwargs(task_data)})
 
     if ocr_result is None:
         # Wszystkie retry wyczerpane lub permanent error — moderator zweryfikuje ręcznie
         return
 
+    apply_ocr_result(task_data, ocr_result)
+
+
+def proof_path(saved_filename):
+    """Ścieżka pliku potwierdzenia w uploads/payment_confirmations."""
+    upload_folder = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        'uploads', 'payment_confirmations'
+    )
+    return os.path.join(upload_folder, saved_filename)
+
+
+def score_kwargs(task_data):
+    """Argumenty scoringu OCR (kwota, numery zamówień, metody płatności) z task_data."""
+    from extensions import db
+    from modules.payments.models import PaymentMethod
+
+    payment_method_id = task_data.get('payment_method_id')
+    return {
+        'expected_amount': Decimal(str(task_data.get('total_expected', 0))),
+        'order_numbers': task_data.get('order_numbers', []),
+        'payment_method': db.session.get(PaymentMethod, payment_method_id) if payment_method_id else None,
+        # Wszystkie aktywne metody (do fallback w score_recipient)
+        'all_payment_methods': PaymentMethod.get_active(),
+    }
+
+
+def apply_ocr_result(task_data, ocr_result):
+    """
+    Zapisuje wynik OCR w potwierdzeniach pliku, auto-zatwierdza (score >= próg,
+    chyba że task_data['auto_approve'] is False — backfill reprocess-ocr),
+    wysyła powiadomienia i event WebSocket.
+
+    Returns:
+        list[PaymentConfirmation]: zaktualizowane potwierdzenia
+    """
+    from extensions import db
+    from modules.orders.models import PaymentConfirmation, get_local_now
+    from modules.auth.models import Settings
+
+    saved_filename = task_data['saved_filename']
+    user_id = task_data.get('user_id')
     ocr_score = ocr_result.get('score')
     ocr_details_json = json.dumps(ocr_result.get('details', {}), ensure_ascii=False)
 
@@ -140,8 +160,9 @@ def _process_ocr_internal(task_data):
 
     if not confirmations:
         logger.warning(f"OCR background: no confirmations found for {saved_filename}")
-        return
+        return []
 
+    auto_approve = task_data.get('auto_approve', True)
     auto_threshold = Settings.get_value('ocr_auto_approve_threshold', 90)
     now = get_local_now()
     auto_approved_confs = []
@@ -151,7 +172,8 @@ def _process_ocr_internal(task_data):
         conf.ocr_details = ocr_details_json
 
         # Auto-approve jeśli score >= próg
-        if ocr_score is not None and ocr_score >= auto_threshold and conf.status == 'pending':
+        if (auto_approve and ocr_score is not None and ocr_score >= auto_threshold
+                and conf.status == 'pending'):
             conf.status = 'approved'
             conf.auto_approved = True
             conf.updated_at = now
@@ -170,6 +192,25 @@ def _process_ocr_internal(task_data):
 
     # Powiadomienia i WebSocket po commit
     _send_notifications(auto_approved_confs, user_id)
+    _emit_result(confirmations, user_id, ocr_score)
+    return confirmations
+
+
+def _emit_result(confirmations, user_id, ocr_score):
+    """Event WebSocket 'payment_ocr_result' (klient + panel moderatorów)."""
+    try:
+        from modules.client.payment_socket_events import notify_ocr_result
+        notify_ocr_result(user_id, {
+            'proof_file': confirmations[0].proof_file,
+            'ocr_score': ocr_score,
+            'confirmations': [
+                {'id': c.id, 'order_id': c.order_id, 'payment_stage': c.payment_stage,
+                 'status': c.status, 'auto_approved': c.auto_approved}
+                for c in confirmations
+            ],
+        })
+    except Exception as e:
+        logger.error(f"OCR background WebSocket notify error: {e}")
 
 
 def _send_notifications(auto_approved_confs, user_id):
@@ -178,6 +219,7 @@ def _send_notifications(auto_approved_confs, user_id):
         return
 
     try:
+        from extensions import db
         from utils.email_manager import EmailManager
         from utils.push_manager import PushManager
         from utils.activity_logger import log_activity
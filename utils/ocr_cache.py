@@ -0,0 +1,89 @@
+"""
+OCR cache — tekst OCR po SHA-256 zawartości pliku
+==================================================
+
+Tesseract to najdroższa część weryfikacji potwierdzenia, a ten sam plik bywa
+OCR-owany wielokrotnie: retry w _verify_with_retry, `flask reprocess-ocr`,
+ponowny upload tego samego screenshota pod inną nazwą. Tekst zależy tylko od
+zawartości pliku i trybu OCR (OCR_MODE: 'full' / 'staged'), więc jest
+cache'owany w zadaniach kolejki (ocr_jobs.ocr_text + ocr_mode, po file_hash) —
+plik bez zadania w kolejce nie ma gdzie zostawić tekstu i przy następnym
+odczycie jest OCR-owany od nowa. Scoring (kwota, tytuł, odbiorca) liczony
+jest zawsze od nowa, bo zależy od aktualnych zamówień i metod płatności.
+"""
+
+import time
+import hashlib
+
+from flask import current_app
+
+
+def current_mode():
+    """Tryb OCR z configu (OCR_MODE)."""
+    return current_app.config.get('OCR_MODE', 'full')
+
+
+def file_hash(filepath):
+    """SHA-256 zawartości pliku (klucz cache)."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get(hash_value, mode):
+    """Tekst z cache (najnowsze zadanie pliku w tym trybie, z niepustym tekstem) albo None."""
+    from extensions import db
+    from modules.orders.models import OcrJob
+
+    return db.session.query(OcrJob.ocr_text).filter(
+        OcrJob.file_hash == hash_value,
+        OcrJob.ocr_mode == mode,
+        OcrJob.ocr_text.isnot(None),
+        OcrJob.ocr_text != '',
+    ).order_by(OcrJob.id.desc()).limit(1).scalar()
+
+
+def put(hash_value, mode, text, ocr_ms=None):
+    """
+    Zapisuje tekst w zadaniach pliku, które go jeszcze nie mają — w
+    transakcji wołającego, bez commitu.
+
+    Returns:
+        int: liczba zadań, które dostały tekst (0 = plik spoza kolejki)
+    """
+    from sqlalchemy import update
+    from extensions import db
+    from modules.orders.models import OcrJob
+
+    return db.session.execute(
+        update(OcrJob)
+        .where(OcrJob.file_hash == hash_value, OcrJob.ocr_text.is_(None))
+        .values(ocr_text=text, ocr_mode=mode, ocr_ms=ocr_ms)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def read_text(filepath, mode=None):
+    """
+    read_proof_text z cache: OCR tylko przy pierwszym odczycie danej zawartości.
+    Tekst trafia do cache w transakcji wołającego — commit po jego stronie.
+
+    Returns:
+        str | None: jak read_proof_text (None = pliku nie da się załadować)
+    """
+    from utils.ocr_verifier import read_proof_text
+
+    mode = mode or current_mode()
+    hash_value = file_hash(filepath)
+    text = get(hash_value, mode)
+    if text is not None:
+        return text
+
+    started = time.perf_counter()
+    text = read_proof_text(filepath, mode)
+    # Pusty tekst bez cache — to też objaw braku binarki Tesseracta (extract_text łyka błąd)
+    if text and text.strip():
+        put(hash_value, mode, text, int((time.perf_counter() - started) * 1000))
+    return text
@@ -0,0 +1,338 @@
+"""
+OCR queue — kolejka OCR potwierdzeń płatności poza web workerem
+================================================================
+
+verify_payment_proof (Tesseract pol+eng, preprocessing PIL, pdf2image 300 DPI)
+to czyste CPU — w wątku gthread web workera konkuruje z requestami, a crash
+lub OOM Tesseracta kładzie cały worker. Web worker tylko dopisuje zadanie do
+tabeli ocr_jobs (enqueue); `flask ocr-worker` (run_worker) pobiera zadania
+i liczy tekst w puli procesów wielkości liczby rdzeni:
+
+- priorytety: świeże uploady (PRIORITY_UPLOAD) przed backfillem
+  `flask reprocess-ocr` (PRIORITY_BACKFILL),
+- dedup: ponowny upload pliku odświeża czekające zadanie zamiast dodawać
+  drugie; zadania z tym samym SHA-256 pliku dzielą jedno OCR,
+- cache: tekst OCR zostaje w ocr_jobs.ocr_text (utils/ocr_cache.py, po
+  file_hash i trybie OCR) — ten sam plik nie jest OCR-owany drugi raz.
+  Scoring (kwota, tytuł, odbiorca) liczony zawsze od nowa, bo zależy od
+  aktualnych zamówień i metod płatności,
+- izolacja: crash/OOM procesu OCR psuje tylko pulę (BrokenProcessPool) —
+  worker zakłada nową, zadanie wraca do kolejki z backoffem; plik liczony
+  dłużej niż OCR_TASK_TIMEOUT (zawieszony Tesseract) — worker zabija pulę,
+- wynik: apply_ocr_result (utils/ocr_background.py) — potwierdzenia,
+  auto-approve, powiadomienia i event WebSocket 'payment_ocr_result'
+  (do procesu WS przez SOCKETIO_MESSAGE_QUEUE).
+"""
+
+import os
+import time
+import logging
+import multiprocessing
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_UPLOAD = 0
+PRIORITY_BACKFILL = 10
+
+# Proces OCR odnawiany co N plików (pamięć Tesseracta/PIL nie rośnie bez końca)
+_MAX_TASKS_PER_CHILD = 50
+
+
+def enabled():
+    """Czy OCR idzie przez kolejkę (OCR_QUEUE_ENABLED), a nie wątek web workera."""
+    return current_app.config.get('OCR_QUEUE_ENABLED', False)
+
+
+def enqueue(task_data, priority=PRIORITY_UPLOAD):
+    """
+    Dopisuje plik potwierdzenia do kolejki OCR (commit).
+
+    Args:
+        task_data (dict): jak process_ocr_verification — saved_filename,
+            payment_method_id, user_id, order_numbers, total_expected
+            (+ opcjonalnie auto_approve=False dla backfillu)
+        priority (int): PRIORITY_UPLOAD / PRIORITY_BACKFILL
+
+    Returns:
+        OcrJob | None: nowe lub odświeżone czekające zadanie; None gdy brak pliku
+    """
+    from extensions import db
+    from modules.orders.models import OcrJob, get_local_now
+    from utils.ocr_background import proof_path
+    from utils.ocr_cache import file_hash
+
+    saved_filename = task_data['saved_filename']
+    filepath = proof_path(saved_filename)
+    if not os.path.exists(filepath):
+        logger.error(f"OCR queue: proof file not found: {filepath}")
+        return None
+
+    job = OcrJob.query.filter_by(proof_file=saved_filename, status='pending').first()
+    if job is not None and priority > job.priority:
+        # Backfill na czekający upload — upload ma pierwszeństwo (i auto-approve)
+        return job
+    if job is None:
+        job = OcrJob(proof_file=saved_filename, priority=priority, status='pending', attempts=0)
+        db.session.add(job)
+    job.priority = priority
+    job.file_hash = file_hash(filepath)
+    job.payload = dict(task_data)
+    job.available_at = get_local_now()
+    db.session.commit()
+    return job
+
+
+def claim(limit):
+    """
+    Pobiera do `limit` dostępnych zadań wg priorytetu (pending → running).
+    Warunkowy UPDATE — przy kilku workerach zadanie dostaje tylko jeden.
+    """
+    from sqlalchemy import update
+    from extensions import db
+    from modules.orders.models import OcrJob, get_local_now
+
+    now = get_local_now()
+    candidates = db.session.query(OcrJob.id).filter(
+        OcrJob.status == 'pending',
+        OcrJob.available_at <= now,
+    ).order_by(OcrJob.priority, OcrJob.id).limit(limit).all()
+
+    claimed = []
+    for (job_id,) in candidates:
+        result = db.session.execute(
+            update(OcrJob)
+            .where(OcrJob.id == job_id, OcrJob.status == 'pending')
+            .values(status='running', started_at=now, attempts=OcrJob.attempts + 1)
+        )
+        if result.rowcount:
+            claimed.append(job_id)
+    db.session.commit()
+
+    if not claimed:
+        return []
+    return OcrJob.query.filter(OcrJob.id.in_(claimed)).order_by(OcrJob.priority, OcrJob.id).all()
+
+
+def requeue_stale(timeout, exclude_ids=()):
+    """
+    Zadania 'running' dłużej niż timeout (worker padł w trakcie) wracają do
+    kolejki; po wyczerpaniu prób — 'failed'.
+
+    exclude_ids — zadania wciąż liczone przez ten worker (pilnuje ich
+    OCR_TASK_TIMEOUT); bez tego wróciłyby do kolejki i skończyły się dwa razy.
+    """
+    from extensions import db
+    from modules.orders.models import OcrJob, get_local_now
+    from utils.ocr_background import MAX_OCR_RETRIES
+
+    now = get_local_now()
+    stale = OcrJob.query.filter(
+        OcrJob.status == 'running',
+        OcrJob.started_at < now - timedelta(seconds=timeout),
+    )
+    if exclude_ids:
+        stale = stale.filter(OcrJob.id.notin_(list(exclude_ids)))
+    failed = stale.filter(OcrJob.attempts >= MAX_OCR_RETRIES).update(
+        {'status': 'failed', 'finished_at': now, 'error': 'timeout'}, synchronize_session=False)
+    requeued = stale.filter(OcrJob.attempts < MAX_OCR_RETRIES).update(
+        {'status': 'pending', 'available_at': now}, synchronize_session=False)
+    db.session.commit()
+    return failed + requeued
+
+
+def _read_timed(filepath, mode):
+    """Zadanie procesu OCR: (tekst, czas OCR w ms)."""
+    from utils.ocr_verifier import read_proof_text
+    started = time.perf_counter()
+    text = read_proof_text(filepath, mode)
+    return text, int((time.perf_counter() - started) * 1000)
+
+
+def _complete(job_id, text, mode=None, ocr_ms=None):
+    """
+    Scoring tekstu, zapis wyniku (apply_ocr_result) i zamknięcie zadania.
+    Zadanie zawsze zachowuje swój tekst; z ocr_ms (świeży OCR, nie z cache)
+    niepusty tekst dostają też inne zadania tego pliku.
+    """
+    from extensions import db
+    from modules.orders.models import OcrJob, get_local_now
+    from utils import ocr_cache
+    from utils.ocr_verifier import score_proof_text
+    from utils.ocr_background import score_kwargs, apply_ocr_result
+
+    job = db.session.get(OcrJob, job_id)
+    try:
+        result = score_proof_text(text, **score_kwargs(job.payload))
+        if ocr_ms is not None and text and text.strip():
+            ocr_cache.put(job.file_hash, mode, text, ocr_ms)
+        job.ocr_text, job.ocr_mode, job.ocr_ms = text, mode or ocr_cache.current_mode(), ocr_ms
+        job.status = 'done'
+        job.error = None
+        job.finished_at = get_local_now()
+        # apply_ocr_result commituje potwierdzenia razem ze statusem zadania
+        apply_ocr_result(job.payload, result)
+        db.session.commit()
+    except Exception as e:
+        return _fail(job_id, e)
+    return 'done'
+
+
+def _fail(job_id, exc):
+    """Błąd zadania: retry z backoffem albo 'failed' (trwały błąd / limit prób)."""
+    from extensions import db
+    from modules.orders.models import OcrJob, get_local_now
+    from utils.ocr_background import MAX_OCR_RETRIES, _is_permanent_ocr_error
+
+    db.session.rollback()
+    job = db.session.get(OcrJob, job_id)
+    now = get_local_now()
+    job.error = str(exc)[:2000]
+    if job.attempts >= MAX_OCR_RETRIES or _is_permanent_ocr_error(exc):
+        job.status = 'failed'
+        job.finished_at = now
+        outcome = 'failed'
+    else:
+        job.status = 'pending'
+        job.available_at = now + timedelta(seconds=2 ** job.attempts)
+        outcome = 'retried'
+    db.session.commit()
+    logger.warning(f"OCR queue: job {job_id} ({job.proof_file}) {outcome}: {exc}")
+    return outcome
+
+
+def _release(job_ids):
+    """Zadania przerwane razem z zabitą pulą (nie z własnej winy) — do kolejki bez zużycia próby."""
+    from extensions import db
+    from modules.orders.models import OcrJob, get_local_now
+
+    db.session.query(OcrJob).filter(
+        OcrJob.id.in_(job_ids),
+        OcrJob.status == 'running',
+    ).update({'status': 'pending', 'available_at': get_local_now(), 'attempts': OcrJob.attempts - 1},
+             synchronize_session=False)
+    db.session.commit()
+
+
+def _kill_pool(pool):
+    """
+    Zabija procesy puli — ProcessPoolExecutor nie przerywa trwającego zadania,
+    a zawieszony Tesseract nie skończy się sam (kill_workers() dopiero od Pythona 3.14).
+    """
+    for process in list((getattr(pool, '_processes', None) or {}).values()):
+        process.kill()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _new_pool(processes):
+    # spawn: procesy OCR nie dziedziczą aplikacji ani połączeń DB rodzica
+    return ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context('spawn'),
+        max_tasks_per_child=_MAX_TASKS_PER_CHILD,
+    )
+
+
+def run_worker(processes=None, once=False, poll_interval=2.0):
+    """
+    Pętla `flask ocr-worker`: pobiera zadania i liczy OCR w puli procesów.
+
+    Args:
+        processes (int): rozmiar puli (domyślnie OCR_WORKER_PROCESSES lub liczba rdzeni)
+        once (bool): zakończ, gdy kolejka jest pusta (cron, testy)
+        poll_interval (float): odstęp odpytywania pustej kolejki (s)
+
+    Returns:
+        dict: liczniki {'done', 'failed', 'retried', 'cached'}
+    """
+    from utils import ocr_cache
+    from utils.ocr_background import proof_path
+
+    mode = ocr_cache.current_mode()
+    processes = processes or current_app.config.get('OCR_WORKER_PROCESSES') or os.cpu_count() or 1
+    timeout = current_app.config.get('OCR_JOB_TIMEOUT', 600)
+    task_timeout = current_app.config.get('OCR_TASK_TIMEOUT', 180)
+    stats = {'done': 0, 'failed': 0, 'retried': 0, 'cached': 0}
+    pool = None
+    running = {}        # future -> (file_hash, [job_id, ...]) — jedno OCR na plik
+    by_hash = {}        # file_hash -> future
+    deadlines = {}      # future -> time.monotonic(), po którym proces OCR uznajemy za zawieszony
+
+    try:
+        while True:
+            requeue_stale(timeout, exclude_ids=[job_id for _, ids in running.values() for job_id in ids])
+
+            free = processes - len(running)
+            for job in claim(free) if free > 0 else []:
+                if job.file_hash in by_hash:
+                    running[by_hash[job.file_hash]][1].append(job.id)
+                    continue
+                text = ocr_cache.get(job.file_hash, mode)
+                if text is not None:
+                    stats['cached'] += 1
+                    stats[_complete(job.id, text, mode)] += 1
+                    continue
+                if pool is None:
+                    pool = _new_pool(processes)
+                future = pool.submit(_read_timed, proof_path(job.proof_file), mode)
+                running[future] = (job.file_hash, [job.id])
+                by_hash[job.file_hash] = future
+                deadlines[future] = time.monotonic() + task_timeout
+
+            if not running:
+                if once:
+                    return stats
+                time.sleep(poll_interval)
+                continue
+
+            done, _ = wait(list(running), timeout=poll_interval, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                hash_value, job_ids = running.pop(future)
+                by_hash.pop(hash_value, None)
+                deadlines.pop(future, None)
+                try:
+                    text, ocr_ms = future.result()
+                except BrokenProcessPool as e:
+                    broken = True
+                    outcomes = [_fail(job_id, e) for job_id in job_ids]
+                except Exception as e:
+                    outcomes = [_fail(job_id, e) for job_id in job_ids]
+                else:
+                    outcomes = [_complete(job_id, text, mode, ocr_ms) for job_id in job_ids]
+                for outcome in outcomes:
+                    stats[outcome] += 1
+
+            if broken and pool is not None:
+                # Proces OCR padł (crash/OOM) — pozostałe futures starej puli
+                # skończą się BrokenProcessPool w kolejnych obiegach
+                logger.error("OCR worker: process pool broken, starting a new one")
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = None
+
+            now = time.monotonic()
+            hung = [future for future in running if deadlines.get(future, now) < now]
+            if hung:
+                # Zawieszony Tesseract: zabij pulę; zawieszone pliki — błąd (retry z backoffem),
+                # pozostałe przerwane zadania wracają do kolejki bez zużycia próby
+                logger.error(f"OCR worker: {len(hung)} file(s) exceeded {task_timeout}s, killing process pool")
+                if pool is not None:
+                    _kill_pool(pool)
+                    pool = None
+                for future, (_, job_ids) in list(running.items()):
+                    if future in hung:
+                        error = TimeoutError(f'OCR exceeded {task_timeout}s')
+                        for job_id in job_ids:
+                            stats[_fail(job_id, error)] += 1
+                    else:
+                        _release(job_ids)
+                running.clear()
+                by_hash.clear()
+                deadlines.clear()
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
@@ -61,10 +61,10 @@ def preprocess_image(image):
     return img
 
 
-def load_image_from_file(filepath):
+def load_image_from_file(filepath, dpi=300):
     """
     Ładuje obraz z pliku. Obsługuje JPG, PNG, PDF.
-    Dla PDF konwertuje pierwszą stronę.
+    Dla PDF konwertuje pierwszą stronę (w rozdzielczości dpi).
     Returns:
         PIL.Image object lub None
     """
@@ -75,7 +75,7 @@ def load_image_from_file(filepath):
             logger.warning("pdf2image not available, cannot process PDF")
             return None
         try:
-            pages = convert_from_path(filepath, first_page=1, last_page=1, dpi=300)
+            pages = convert_from_path(filepath, first_page=1, last_page=1, dpi=dpi)
             return pages[0] if pages else None
         except Exception as e:
             logger.error(f"Error converting PDF to image: {e}")
@@ -112,6 +112,97 @@ def extract_text(image):
         return ""
 
 
+# ========================
+# STAGED OCR (REGIONY)
+# ========================
+
+# Tryb 'staged': zamiast OCR całej strony — tani przebieg w małej rozdzielczości
+# lokalizuje linie z kwotą / tytułem / odbiorcą, a pełny OCR idzie tylko po tych
+# pasach. Na screenshotach przelewów większość pikseli to logo, menu i tło.
+OCR_MODES = ('full', 'staged')
+STAGED_LOCATE_WIDTH = 800       # szerokość obrazu dla przebiegu lokalizującego (px)
+STAGED_PDF_DPI = 200            # PDF w trybie staged (zamiast 300 DPI)
+STAGED_MAX_COVERAGE = 0.7       # pasy > 70% wysokości → OCR całości (bez zysku)
+
+# Linie warte pełnego OCR: cyfry (kwoty, numery zamówień, rachunki) lub słowa kluczowe
+_ROI_KEYWORDS = (
+    'kwot', 'zł', 'zl', 'pln', 'tytu', 'odbior', 'rachun', 'konto', 'nazwa',
+    'przelew', 'amount', 'title', 'recipient', 'iban', 'blik',
+)
+
+
+def _regions_from_words(data, scale, height):
+    """
+    Pasy (top, bottom) w pikselach oryginału z wyniku image_to_data przebiegu
+    lokalizującego. Pas obejmuje linię i linię pod nią (etykieta nad wartością,
+    typowe w aplikacjach bankowych). Nakładające się pasy są łączone.
+    """
+    lines = {}
+    for i, word in enumerate(data['text']):
+        word = (word or '').strip()
+        if not word:
+            continue
+        key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        top, bottom = data['top'][i], data['top'][i] + data['height'][i]
+        line = lines.setdefault(key, {'words': [], 'top': top, 'bottom': bottom})
+        line['words'].append(word.lower())
+        line['top'] = min(line['top'], top)
+        line['bottom'] = max(line['bottom'], bottom)
+
+    bands = []
+    for line in lines.values():
+        text = ' '.join(line['words'])
+        if not (any(ch.isdigit() for ch in text) or any(k in text for k in _ROI_KEYWORDS)):
+            continue
+        line_height = line['bottom'] - line['top']
+        top = (line['top'] - line_height * 0.5) / scale
+        bottom = (line['bottom'] + line_height * 2) / scale
+        bands.append((max(0, int(top)), min(height, int(bottom) + 1)))
+
+    merged = []
+    for top, bottom in sorted(bands):
+        if merged and top <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], bottom))
+        else:
+            merged.append((top, bottom))
+    return merged
+
+
+def locate_regions(image):
+    """
+    Etap 1 trybu staged: tani OCR (skala szarości, STAGED_LOCATE_WIDTH px)
+    z pozycjami słów. Returns: list[(top, bottom)] w pikselach obrazu.
+    """
+    gray = image.convert('L')
+    scale = min(1.0, STAGED_LOCATE_WIDTH / gray.width)
+    if scale < 1.0:
+        gray = gray.resize((int(gray.width * scale), int(gray.height * scale)), Image.BILINEAR)
+    try:
+        data = pytesseract.image_to_data(gray, lang='pol+eng', output_type=pytesseract.Output.DICT)
+    except Exception as e:
+        logger.error(f"Tesseract locate pass error: {e}")
+        return []
+    return _regions_from_words(data, scale, image.height)
+
+
+def extract_text_staged(image):
+    """
+    Etap 2 trybu staged: pełny OCR tylko pasów z locate_regions().
+    Fallback na OCR całej strony, gdy pasów brak, pokrywają prawie cały obraz
+    albo w tekście pasów nie ma żadnej kwoty.
+    """
+    bands = locate_regions(image)
+    covered = sum(bottom - top for top, bottom in bands)
+    if bands and covered <= image.height * STAGED_MAX_COVERAGE:
+        text = '\n'.join(
+            extract_text(preprocess_image(image.crop((0, top, image.width, bottom))))
+            for top, bottom in bands
+        )
+        if extract_amounts(text):
+            return text
+    return extract_text(preprocess_image(image))
+
+
 # ========================
 # AMOUNT PARSING
 # ========================
@@ -445,49 +536,42 @@ def score_readability(text):
 # MAIN VERIFY FUNCTION
 # ========================
 
-def verify_payment_proof(filepath, expected_amount, order_numbers, payment_method=None, all_payment_methods=None):
+def read_proof_text(filepath, mode='full'):
     """
-    Główna funkcja weryfikacji potwierdzenia płatności.
+    Etap CPU weryfikacji: załadowanie pliku, preprocessing i Tesseract.
+    Nie dotyka bazy ani aplikacji — można go uruchomić w osobnym procesie
+    (utils/ocr_queue.py, pula procesów `flask ocr-worker`).
 
     Args:
-        filepath: str — ścieżka do pliku (JPG/PNG/PDF)
-        expected_amount: Decimal — oczekiwana kwota sumaryczna
-        order_numbers: list[str] — numery zamówień (np. ['EX/00000002', 'EX/00000001'])
-        payment_method: PaymentMethod object lub None
-        all_payment_methods: list[PaymentMethod] lub None — do fallback w score_recipient
+        mode: 'full' (cała strona, PDF 300 DPI) lub 'staged' (regiony, PDF 200 DPI)
 
     Returns:
-        dict: {
-            'score': int (0-100),
-            'details': {
-                'amount': {...},
-                'title': {...},
-                'recipient': {...},
-                'readability': {...},
-                'raw_text_preview': str (first 500 chars)
-            }
-        }
+        str: wyciągnięty tekst (pusty gdy OCR nic nie znalazł)
+        None: gdy pliku nie da się załadować
     """
-    if not TESSERACT_AVAILABLE:
-        return {
-            'score': None,
-            'details': {'error': 'Tesseract not available'}
-        }
+    if mode == 'staged':
+        image = load_image_from_file(filepath, dpi=STAGED_PDF_DPI)
+        if image is None:
+            return None
+        return extract_text_staged(image)
 
-    # 1. Załaduj obraz
     image = load_image_from_file(filepath)
     if image is None:
+        return None
+    return extract_text(preprocess_image(image))
+
+
+def score_proof_text(text, expected_amount, order_numbers, payment_method=None, all_payment_methods=None):
+    """
+    Etap scoringu weryfikacji: ocena tekstu z read_proof_text().
+    Argumenty i wynik jak w verify_payment_proof().
+    """
+    if text is None:
         return {
             'score': None,
             'details': {'error': 'Cannot load image'}
         }
 
-    # 2. Preprocessing
-    processed = preprocess_image(image)
-
-    # 3. OCR
-    text = extract_text(processed)
-
     if not text.strip():
         return {
             'score': 0,
@@ -500,7 +584,7 @@ def verify_payment_proof(filepath, expected_amount, order_numbers, payment_metho
             }
         }
 
-    # 4. Scoring
+    # Scoring
     amount_score, amount_details = score_amount(
         extract_amounts(text),
         expected_amount
@@ -512,7 +596,7 @@ def verify_payment_proof(filepath, expected_amount, order_numbers, payment_metho
 
     readability_score, readability_details = score_readability(text)
 
-    # 5. Łączny score
+    # Łączny score
     total_score = amount_score + title_score + recipient_score + readability_score
 
     return {
@@ -525,3 +609,39 @@ def verify_payment_proof(filepath, expected_amount, order_numbers, payment_metho
             'raw_text_preview': text[:500],
         }
     }
+
+
+def verify_payment_proof(filepath, expected_amount, order_numbers, payment_method=None, all_payment_methods=None):
+    """
+    Główna funkcja weryfikacji potwierdzenia płatności.
+
+    Args:
+        filepath: str — ścieżka do pliku (JPG/PNG/PDF)
+        expected_amount: Decimal — oczekiwana kwota sumaryczna
+        order_numbers: list[str] — numery zamówień (np. ['EX/00000002', 'EX/00000001'])
+        payment_method: PaymentMethod object lub None
+        all_payment_methods: list[PaymentMethod] lub None — do fallback w score_recipient
+
+    Returns:
+        dict: {
+            'score': int (0-100),
+            'details': {
+                'amount': {...},
+                'title': {...},
+                'recipient': {...},
+                'readability': {...},
+                'raw_text_preview': str (first 500 chars)
+            }
+        }
+    """
+    if not TESSERACT_AVAILABLE:
+        return {
+            'score': None,
+            'details': {'error': 'Tesseract not available'}
+        }
+
+    # 1. Załaduj obraz, preprocessing, OCR
+    text = read_proof_text(filepath)
+
+    # 2. Scoring
+    return score_proof_text(text, expected_amount, order_numbers, payment_method, all_payment_methods)
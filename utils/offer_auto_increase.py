@@ -204,7 +204,11 @@ def check_and_apply_auto_increase(page_id):
 
         # Broadcast nowej dostępności do kupujących (kupony się reaktywują)
         try:
+            from modules.offers.availability import invalidate as invalidate_availability
+            from modules.offers.layout import invalidate as invalidate_layout
             from modules.offers.socket_events import broadcast_availability_update
+            invalidate_layout(page_id)        # zmienione limity sekcji
+            invalidate_availability(page_id)
             broadcast_availability_update(page_id)
             print(f"[AUTO-INCREASE] Broadcasted availability update for page {page_id}")
         except Exception as e:
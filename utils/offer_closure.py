@@ -3,34 +3,146 @@ Offer Page Closure Module
 =========================
 
 Zawiera logikę całkowitego zamykania stron Offer:
-- Algorytm alokacji setów (które zamówienia dostają produkty)
+- Algorytm alokacji setów (które zamówienia dostają produkty) — liczony
+  w pamięci, zapis zbiorczy, z panelu w tle z postępem (run_offer_closure)
 - Generowanie podsumowania sprzedaży
 - Wysyłka emaili do klientów
 """
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from collections import defaultdict
 from decimal import Decimal
 from flask import current_app, url_for
+from sqlalchemy import select
 from extensions import db
-from modules.offers.models import OfferPage, OfferSection, OfferSetItem
+from modules.offers.models import OfferPage
 from modules.orders.models import Order, OrderItem, OrderComment, PaymentConfirmation
 from modules.auth.models import Settings, User
-from utils.transfer_title import render_transfer_title
 
 
-def calculate_set_fulfillment(page_id):
+# ============================================
+# Zamknięcie strony — pipeline na zbiorach
+# ============================================
+#
+# close_offer_page ładował zamówienia strony trzy razy, order.items leniwie
+# per zamówienie, przeliczał sumy i logował aktywność (log_activity — z
+# commitem!) zamówienie po zamówieniu, a send_closure_emails ładował wszystko
+# jeszcze raz. Przy tysiącach zamówień request admina dostawał timeout.
+# Teraz etapy:
+#
+# 1. loading    — zamówienia + pozycje strony jednym zapytaniem (wiersze, nie ORM),
+# 2. allocating — alokacja setów, gratisy, statusy i sumy liczone w pamięci,
+# 3. saving     — bulk UPDATE pozycji i zamówień, bulk INSERT pozycji ze splitu
+#                 i ActivityLog, flaga zamknięcia — jedna transakcja,
+# 4. notifying  — maile i push po commicie, zamówienia doładowane raz.
+#
+# Zamknięcie z panelu idzie w tle (background_jobs 'offer_closure',
+# run_offer_closure), postęp w OfferPage.closure_state — modal go odpytuje.
+
+# Pola pozycji zmieniane przez alokację i gratisy (bulk UPDATE)
+_ITEM_FIELDS = ('quantity', 'price', 'total', 'is_set_fulfilled', 'set_section_id', 'fulfilled_quantity')
+
+# Stan 'queued'/'running' starszy niż tyle = proces zadania padł (np. deploy)
+_CLOSURE_STALE_AFTER = timedelta(minutes=15)
+_NOTIFY_PROGRESS_EVERY = 100
+
+
+def _load_closure_orders(page_id):
+    """
+    Zamówienia strony z pozycjami — jedno zapytanie (LEFT JOIN).
+
+    Returns:
+        list[dict]: {'id', 'status', 'created_at', 'total_amount', 'items': [...]};
+            pozycja to słownik kolumn OrderItem + 'changed' (do zapisu)
+    """
+    rows = db.session.execute(
+        select(
+            Order.id.label('order_id'), Order.status, Order.created_at, Order.total_amount,
+            OrderItem.id.label('item_id'), OrderItem.product_id, OrderItem.quantity,
+            OrderItem.price, OrderItem.total, OrderItem.is_bonus, OrderItem.is_set_fulfilled,
+            OrderItem.set_section_id, OrderItem.fulfilled_quantity, OrderItem.selected_size,
+        )
+        .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+        .where(Order.offer_page_id == page_id)
+        .order_by(Order.id, OrderItem.id)
+    ).mappings()
+
+    orders = {}
+    for row in rows:
+        order = orders.get(row['order_id'])
+        if order is None:
+            order = orders[row['order_id']] = {
+                'id': row['order_id'],
+                'status': row['status'],
+                'created_at': row['created_at'],
+                'total_amount': row['total_amount'],
+                'items': [],
+            }
+        if row['item_id'] is not None:
+            order['items'].append({
+                'id': row['item_id'],
+                'order_id': row['order_id'],
+                'product_id': row['product_id'],
+                'quantity': row['quantity'],
+                'price': row['price'],
+                'total': row['total'],
+                'is_bonus': bool(row['is_bonus']),
+                'is_set_fulfilled': row['is_set_fulfilled'],
+                'set_section_id': row['set_section_id'],
+                'fulfilled_quantity': row['fulfilled_quantity'],
+                'selected_size': row['selected_size'],
+                'changed': False,
+            })
+    return list(orders.values())
+
+
+def _layout_set_sections(page_id):
+    """Sekcje setów strony z układu (modules/offers/layout.get_layout), po id sekcji.
+
+    Returns:
+        list: [(section_id, set_section, members)] — set_section to wpis
+        layout.set_sections, members = [{product_id, product_name,
+        quantity_per_set}] w kolejności elementów setu (grupy wariantowe
+        rozwinięte na aktywne produkty). Nazwy produktów — także produktów
+        pełnego setu (set_product_name) — jednym zapytaniem.
+    """
+    from modules.offers.layout import get_layout
+    from modules.products.models import Product
+
+    set_sections = get_layout(page_id).set_sections
+    product_ids = {pid for section in set_sections.values() for pid in section['products']}
+    product_ids |= {section['set_product_id'] for section in set_sections.values() if section['set_product_id']}
+    names = dict(
+        db.session.query(Product.id, Product.name).filter(Product.id.in_(product_ids)).all()
+    ) if product_ids else {}
+
+    result = []
+    for section_id in sorted(set_sections):
+        section = dict(set_sections[section_id], set_product_name=names.get(set_sections[section_id]['set_product_id']))
+        members = [
+            {'product_id': pid, 'product_name': names.get(pid), 'quantity_per_set': qps}
+            for pid, qps in section['products'].items()
+        ]
+        result.append((section_id, section, members))
+    return result
+
+
+def calculate_set_fulfillment(page_id, orders=None):
     """
     Główna funkcja obliczająca alokację produktów w setach.
 
     Algorytm dla każdego SET:
-    1. Pobierz wszystkie produkty w secie z quantity_per_set
+    1. Pobierz produkty setu z quantity_per_set (układ strony, modules/offers/layout)
     2. Dla każdego produktu policz łączną zamówioną ilość
     3. Oblicz complete_sets = MIN(total_ordered / qty_per_set) dla wszystkich produktów
     4. Przydziel produkty do zamówień posortowanych po created_at (najstarsze pierwsze)
 
+    Liczy w pamięci — zmienia słowniki pozycji w `orders` (i dopisuje pozycje
+    ze splitu), zapis robi close_offer_page.
+
     Args:
         page_id: ID strony Offer
+        orders: zamówienia z _load_closure_orders (domyślnie wczytane tutaj)
 
     Returns:
         dict: Słownik z wynikami alokacji
@@ -54,61 +166,55 @@ def calculate_set_fulfillment(page_id):
     if not page:
         raise ValueError(f"Strona Offer o ID {page_id} nie istnieje")
 
-    # Pobierz wszystkie zamówienia dla tej strony (bez anulowanych)
-    orders = Order.query.filter_by(offer_page_id=page_id).filter(
-        Order.status != 'anulowane'
-    ).order_by(Order.created_at.asc()).all()
+    if orders is None:
+        orders = _load_closure_orders(page_id)
+
+    # Zamówienia bez anulowanych, najstarsze pierwsze
+    active_orders = sorted(
+        (order for order in orders if order['status'] != 'anulowane'),
+        key=lambda order: (order['created_at'] or datetime.min, order['id'])
+    )
 
     result = {
         'page_id': page_id,
         'page_name': page.name,
         'sets': [],
-        'total_orders': len(orders),
+        'total_orders': len(active_orders),
         'total_fulfilled': 0,
         'total_unfulfilled': 0,
     }
 
-    # Pobierz sekcje typu 'set'
-    set_sections = page.sections.filter_by(section_type='set').all()
-
-    for section in set_sections:
-        set_result = process_set_section(section, orders)
+    # Sekcje typu 'set' i ich elementy z układu strony
+    for section_id, section, members in _layout_set_sections(page_id):
+        set_result = process_set_section(section_id, section, members, active_orders)
         result['sets'].append(set_result)
         result['total_fulfilled'] += set_result['fulfilled_count']
         result['total_unfulfilled'] += set_result['unfulfilled_count']
 
+    # Pozycje ze splitu dołączane po wszystkich setach — kolejne sekcje ich nie alokują
+    for order in active_orders:
+        order['items'].extend(order.pop('split_items', []))
+
     return result
 
 
-def process_set_section(section, orders):
+def process_set_section(section_id, section, set_products, orders):
     """
     Przetwarza pojedynczą sekcję SET i alokuje produkty do zamówień.
 
     Args:
-        section: OfferSection typu 'set'
-        orders: Lista zamówień posortowana po created_at
+        section_id: ID sekcji typu 'set'
+        section: wpis sekcji z układu strony (_layout_set_sections)
+        set_products: elementy setu [{product_id, product_name, quantity_per_set}]
+        orders: Lista zamówień (słowniki z _load_closure_orders) posortowana po created_at
 
     Returns:
         dict: Wyniki alokacji dla tego setu
     """
-    set_items = section.get_set_items_ordered()
-
-    # Zbierz wszystkie produkty z setu (z grup wariantowych rozwijamy na pojedyncze produkty)
-    set_products = []  # [(product_id, quantity_per_set), ...]
-    for item in set_items:
-        products = item.get_products()
-        for product in products:
-            set_products.append({
-                'product_id': product.id,
-                'product_name': product.name,
-                'quantity_per_set': item.quantity_per_set,
-                'set_item_id': item.id,
-            })
-
     if not set_products:
         return {
-            'section_id': section.id,
-            'set_name': section.set_name or 'Bez nazwy',
+            'section_id': section_id,
+            'set_name': section['set_name'] or 'Bez nazwy',
             'complete_sets': 0,
             'products': [],
             'allocations': [],
@@ -117,21 +223,22 @@ def process_set_section(section, orders):
         }
 
     # Zbierz zamówienia dla każdego produktu w secie
-    # Struktura: {product_id: [(order_id, order_item, quantity, created_at), ...]}
+    # Struktura: {product_id: [{order, order_item, quantity, created_at}, ...]}
     product_orders = defaultdict(list)
 
     for order in orders:
-        for item in order.items:
+        for item in order['items']:
             # Skip bonus items — they don't count toward set fulfillment
-            if item.is_bonus:
+            if item['is_bonus']:
                 continue
             for sp in set_products:
-                if item.product_id == sp['product_id']:
+                if item['product_id'] == sp['product_id']:
                     product_orders[sp['product_id']].append({
-                        'order_id': order.id,
+                        'order': order,
+                        'order_id': order['id'],
                         'order_item': item,
-                        'quantity': item.quantity,
-                        'created_at': order.created_at,
+                        'quantity': item['quantity'],
+                        'created_at': order['created_at'] or datetime.min,
                     })
 
     # Oblicz liczbę dostępnych kompletnych setów
@@ -178,21 +285,21 @@ def process_set_section(section, orders):
             remaining_capacity = max_to_fulfill - fulfilled_so_far
 
             if remaining_capacity <= 0:
-                # Brak miejsca - całość poza setem
-                order_item.is_set_fulfilled = False
-                order_item.set_section_id = section.id
-                order_item.fulfilled_quantity = 0
-
-                # NOWE: Zeruj cenę, total i quantity
-                order_item.price = Decimal('0.00')
-                order_item.total = Decimal('0.00')
-                order_item.quantity = 0
-
+                # Brak miejsca - całość poza setem, zerowane cena, total i quantity
+                order_item.update(
+                    is_set_fulfilled=False,
+                    set_section_id=section_id,
+                    fulfilled_quantity=0,
+                    price=Decimal('0.00'),
+                    total=Decimal('0.00'),
+                    quantity=0,
+                    changed=True,
+                )
                 unfulfilled_count += qty
 
                 allocations.append({
                     'order_id': po['order_id'],
-                    'order_item_id': order_item.id,
+                    'order_item_id': order_item['id'],
                     'product_id': product_id,
                     'product_name': sp['product_name'],
                     'quantity': qty,
@@ -201,15 +308,18 @@ def process_set_section(section, orders):
                 })
             elif qty <= remaining_capacity:
                 # Całość mieści się
-                order_item.is_set_fulfilled = True
-                order_item.set_section_id = section.id
-                order_item.fulfilled_quantity = qty
+                order_item.update(
+                    is_set_fulfilled=True,
+                    set_section_id=section_id,
+                    fulfilled_quantity=qty,
+                    changed=True,
+                )
                 fulfilled_so_far += qty
                 fulfilled_count += qty
 
                 allocations.append({
                     'order_id': po['order_id'],
-                    'order_item_id': order_item.id,
+                    'order_item_id': order_item['id'],
                     'product_id': product_id,
                     'product_name': sp['product_name'],
                     'quantity': qty,
@@ -217,34 +327,35 @@ def process_set_section(section, orders):
                     'is_fulfilled': True,
                 })
             else:
-                # CZĘŚCIOWE ZREALIZOWANIE - rozdziel na 2 OrderItems
+                # CZĘŚCIOWE ZREALIZOWANIE - rozdziel na 2 pozycje
                 fulfilled_qty = remaining_capacity
                 unfulfilled_qty = qty - remaining_capacity
 
-                # MODYFIKUJ ISTNIEJĄCY ITEM → część fulfilled
-                original_price = order_item.price  # Zachowaj oryginalną cenę
-                order_item.quantity = fulfilled_qty
-                order_item.fulfilled_quantity = fulfilled_qty
-                order_item.is_set_fulfilled = True
-                order_item.set_section_id = section.id
-                order_item.total = original_price * fulfilled_qty  # Przelicz total
-
-                # STWÓRZ NOWY ITEM → część unfulfilled
-                unfulfilled_item = OrderItem(
-                    order_id=order_item.order_id,
-                    product_id=order_item.product_id,
-                    quantity=0,  # Wyzerowane
-                    price=Decimal('0.00'),  # Wyzerowane
-                    total=Decimal('0.00'),  # Wyzerowane
-                    is_set_fulfilled=False,
-                    set_section_id=section.id,
-                    fulfilled_quantity=0,
-                    selected_size=order_item.selected_size,
-                    picked=False,
-                    picked_at=None,
-                    picked_by=None
+                # MODYFIKUJ ISTNIEJĄCĄ POZYCJĘ → część fulfilled (oryginalna cena)
+                order_item.update(
+                    quantity=fulfilled_qty,
+                    fulfilled_quantity=fulfilled_qty,
+                    is_set_fulfilled=True,
+                    set_section_id=section_id,
+                    total=order_item['price'] * fulfilled_qty,
+                    changed=True,
                 )
-                db.session.add(unfulfilled_item)
+
+                # NOWA POZYCJA → część unfulfilled (wyzerowana, INSERT przy zapisie)
+                po['order'].setdefault('split_items', []).append({
+                    'id': None,
+                    'order_id': order_item['order_id'],
+                    'product_id': order_item['product_id'],
+                    'quantity': 0,
+                    'price': Decimal('0.00'),
+                    'total': Decimal('0.00'),
+                    'is_bonus': False,
+                    'is_set_fulfilled': False,
+                    'set_section_id': section_id,
+                    'fulfilled_quantity': 0,
+                    'selected_size': order_item['selected_size'],
+                    'changed': True,
+                })
 
                 fulfilled_so_far += fulfilled_qty
                 fulfilled_count += fulfilled_qty
@@ -253,7 +364,7 @@ def process_set_section(section, orders):
                 # Allocation dla fulfilled part
                 allocations.append({
                     'order_id': po['order_id'],
-                    'order_item_id': order_item.id,
+                    'order_item_id': order_item['id'],
                     'product_id': product_id,
                     'product_name': sp['product_name'],
                     'quantity': fulfilled_qty,
@@ -261,10 +372,10 @@ def process_set_section(section, orders):
                     'is_fulfilled': True,
                 })
 
-                # Allocation dla unfulfilled part
+                # Allocation dla unfulfilled part (id nadaje dopiero zapis)
                 allocations.append({
                     'order_id': po['order_id'],
-                    'order_item_id': unfulfilled_item.id,
+                    'order_item_id': None,
                     'product_id': product_id,
                     'product_name': sp['product_name'],
                     'quantity': unfulfilled_qty,
@@ -273,8 +384,8 @@ def process_set_section(section, orders):
                 })
 
     return {
-        'section_id': section.id,
-        'set_name': section.set_name or 'Bez nazwy',
+        'section_id': section_id,
+        'set_name': section['set_name'] or 'Bez nazwy',
         'complete_sets': complete_sets,
         'products': products_summary,
         'allocations': allocations,
@@ -283,23 +394,69 @@ def process_set_section(section, orders):
     }
 
 
-def auto_update_order_statuses(page_id, admin_user_id=None):
+def _deactivate_orphan_bonuses(orders):
+    """Gratisy w zamówieniach bez żadnej zrealizowanej pozycji są zerowane (w pamięci)."""
+    for order in orders:
+        has_fulfilled = any(
+            not item['is_bonus'] and item['is_set_fulfilled'] is not False and item['quantity'] > 0
+            for item in order['items']
+        )
+        if has_fulfilled:
+            continue
+        for item in order['items']:
+            if item['is_bonus'] and item['quantity'] > 0:
+                item.update(
+                    quantity=0,
+                    price=Decimal('0.00'),
+                    total=Decimal('0.00'),
+                    is_set_fulfilled=False,
+                    fulfilled_quantity=0,
+                    changed=True,
+                )
+
+
+def get_closure_status_settings():
+    """
+    Statusy docelowe po closure (jedno zapytanie do Settings).
+
+    Returns:
+        dict: {'fully_fulfilled', 'partially_fulfilled', 'not_fulfilled'} → slug statusu,
+            'not_fulfilled_configured' — czy ustawienie statusu 'not_fulfilled' istnieje
+    """
+    keys = {
+        'fully_fulfilled': ('offer_closure_status_fully_fulfilled', 'oczekujace'),
+        'partially_fulfilled': ('offer_closure_status_partially_fulfilled', 'oczekujace'),
+        'not_fulfilled': ('offer_closure_status_not_fulfilled', 'anulowane'),
+    }
+    values = dict(db.session.query(Settings.key, Settings.value).filter(
+        Settings.key.in_([key for key, _ in keys.values()])
+    ).all())
+    statuses = {name: values.get(key, default) for name, (key, default) in keys.items()}
+    statuses['not_fulfilled_configured'] = keys['not_fulfilled'][0] in values
+    return statuses
+
+
+def auto_update_order_statuses(orders, statuses):
     """
-    Automatycznie aktualizuje statusy zamówień po closure Offer.
+    Automatycznie aktualizuje statusy zamówień po closure Offer (w pamięci).
 
     Zamówienia są klasyfikowane jako:
     - Fully fulfilled: wszystkie items są fulfilled
     - Partially fulfilled: część items fulfilled, część unfulfilled
     - Not fulfilled: żaden item nie jest fulfilled
 
-    Statusy docelowe są konfigurowalne przez ustawienia:
+    Statusy docelowe są konfigurowalne przez ustawienia
+    (get_closure_status_settings):
     - offer_closure_status_fully_fulfilled
     - offer_closure_status_partially_fulfilled
     - offer_closure_status_not_fulfilled
 
+    Zmienione zamówienie dostaje 'old_status' — zapis, activity log i
+    powiadomienia robi close_offer_page.
+
     Args:
-        page_id: ID OfferPage
-        admin_user_id: ID użytkownika wykonującego closure (dla activity log)
+        orders: zamówienia z _load_closure_orders (po alokacji)
+        statuses: wynik get_closure_status_settings()
 
     Returns:
         Dict with counts: {
@@ -309,28 +466,6 @@ def auto_update_order_statuses(page_id, admin_user_id=None):
             'updated_order_ids': [...]
         }
     """
-    from utils.activity_logger import log_activity
-
-    page = db.session.get(OfferPage, page_id)
-    if not page:
-        return {
-            'fully_fulfilled': 0,
-            'partially_fulfilled': 0,
-            'not_fulfilled': 0,
-            'updated_order_ids': []
-        }
-
-    # Pobierz ustawienia statusów z bazy
-    def get_status_setting(key, default):
-        setting = Settings.query.filter_by(key=key).first()
-        return setting.value if setting else default
-
-    status_fully = get_status_setting('offer_closure_status_fully_fulfilled', 'oczekujace')
-    status_partially = get_status_setting('offer_closure_status_partially_fulfilled', 'oczekujace')
-    status_not = get_status_setting('offer_closure_status_not_fulfilled', 'anulowane')
-
-    orders = Order.query.filter_by(offer_page_id=page_id).all()
-
     counts = {
         'fully_fulfilled': 0,
         'partially_fulfilled': 0,
@@ -340,94 +475,140 @@ def auto_update_order_statuses(page_id, admin_user_id=None):
 
     for order in orders:
         # Klasyfikacja zamówienia (pomijamy bonus items)
-        non_bonus_items = [item for item in order.items if not item.is_bonus]
-        fulfilled_items = [item for item in non_bonus_items if item.is_set_fulfilled is not False]
-        unfulfilled_items = [item for item in non_bonus_items if item.is_set_fulfilled is False]
-
-        total_items = len(non_bonus_items)
-        fulfilled_count = len(fulfilled_items)
+        non_bonus_items = [item for item in order['items'] if not item['is_bonus']]
+        fulfilled_count = sum(1 for item in non_bonus_items if item['is_set_fulfilled'] is not False)
 
         # Określ typ realizacji
         if fulfilled_count == 0:
             # Żaden produkt nie przeszedł
             fulfillment_type = 'not_fulfilled'
-            new_status = status_not
-        elif fulfilled_count == total_items:
+        elif fulfilled_count == len(non_bonus_items):
             # Wszystkie produkty przeszły
             fulfillment_type = 'fully_fulfilled'
-            new_status = status_fully
         else:
             # Część produktów przeszła
             fulfillment_type = 'partially_fulfilled'
-            new_status = status_partially
+        new_status = statuses[fulfillment_type]
 
         # Aktualizuj status jeśli się zmienił
-        if order.status != new_status:
-            old_status = order.status
-            old_status_name = order.status_display_name
-            order.status = new_status
-            order.updated_at = datetime.now()
-
+        if order['status'] != new_status:
+            order['old_status'] = order['status']
+            order['status'] = new_status
             counts[fulfillment_type] += 1
-            counts['updated_order_ids'].append(order.id)
+            counts['updated_order_ids'].append(order['id'])
 
-            # Kolejkuj email o zmianie statusu
-            if order.customer_email:
-                counts.setdefault('_email_queue', []).append({
-                    'order': order,
-                    'old_status_name': old_status_name,
-                })
+    return counts
 
-            # Log activity
-            if admin_user_id:
-                from modules.auth.models import User
-                admin_user = db.session.get(User, admin_user_id)
-                if admin_user:
-                    log_activity(
-                        user=admin_user,
-                        action='order_status_auto_updated',
-                        entity_type='order',
-                        entity_id=order.id,
-                        old_value={'status': old_status},
-                        new_value={'status': new_status}
-                    )
 
-    # Wyslij emaile o zmianie statusu (flush zeby status_display_name zwrocil nowa nazwe)
-    email_queue = counts.pop('_email_queue', [])
-    if email_queue:
-        from utils.email_manager import EmailManager
-        from utils.push_manager import PushManager
-        db.session.flush()
-        for data in email_queue:
-            EmailManager.notify_status_change(
-                data['order'],
-                data['old_status_name'],
-                data['order'].status_display_name
-            )
-            PushManager.notify_status_change(
-                data['order'],
-                data['old_status_name'],
-                data['order'].status_display_name
-            )
+def _save_closure(page, orders, user_id, old_totals):
+    """
+    Etap zapisu: bulk UPDATE pozycji i zamówień, bulk INSERT pozycji ze splitu
+    i ActivityLog, flaga zamknięcia strony. Commit po stronie wołającego.
+    """
+    import json as _json
+    from flask import has_request_context, request
+    from modules.admin.models import ActivityLog
+
+    now = datetime.now()
+    # Jak log_activity: IP i User-Agent requestu (w tle — przekazane przez run_offer_closure)
+    request_meta = {'ip_address': None, 'user_agent': None}
+    if has_request_context():
+        request_meta = {
+            'ip_address': request.remote_addr,
+            'user_agent': request.headers.get('User-Agent', '')[:500] or None,
+        }
+    changed_items = [item for order in orders for item in order['items'] if item['changed']]
+
+    updates = [
+        {'id': item['id'], **{field: item[field] for field in _ITEM_FIELDS}}
+        for item in changed_items if item['id'] is not None
+    ]
+    if updates:
+        db.session.bulk_update_mappings(OrderItem, updates)
+
+    inserts = [
+        {
+            'order_id': item['order_id'],
+            'product_id': item['product_id'],
+            'selected_size': item['selected_size'],
+            'is_bonus': False,
+            'picked': False,
+            **{field: item[field] for field in _ITEM_FIELDS},
+        }
+        for item in changed_items if item['id'] is None
+    ]
+    if inserts:
+        db.session.bulk_insert_mappings(OrderItem, inserts)
 
-    return counts
+    order_updates = []
+    logs = []
+    for order in orders:
+        mapping = {'id': order['id'], 'total_amount': order['new_total']}
+        if 'old_status' in order:
+            mapping.update(status=order['status'], updated_at=now)
+            logs.append({
+                'user_id': user_id,
+                'action': 'order_status_auto_updated',
+                'entity_type': 'order',
+                'entity_id': order['id'],
+                'old_value': _json.dumps({'status': order['old_status']}, ensure_ascii=False),
+                'new_value': _json.dumps({'status': order['status']}, ensure_ascii=False),
+                'created_at': now,
+                **request_meta,
+            })
+        order_updates.append(mapping)
+
+        # Log fulfillment per order
+        non_bonus = [item for item in order['items'] if not item['is_bonus']]
+        fulfilled_count = sum(1 for item in non_bonus if item['is_set_fulfilled'] is not False)
+        old_total = old_totals.get(order['id'], 0)
+        logs.append({
+            'user_id': user_id,
+            'action': 'offer_closure_fulfillment',
+            'entity_type': 'order',
+            'entity_id': order['id'],
+            'old_value': _json.dumps({'total_amount': old_total}),
+            'new_value': _json.dumps({
+                'total_items': len(non_bonus),
+                'fulfilled_items': fulfilled_count,
+                'unfulfilled_items': len(non_bonus) - fulfilled_count,
+                'old_total_amount': old_total,
+                'new_total_amount': float(order['new_total']),
+                'offer_page_name': page.name,
+            }),
+            'created_at': now,
+            **request_meta,
+        })
+
+    if order_updates:
+        db.session.bulk_update_mappings(Order, order_updates)
+    if logs:
+        db.session.bulk_insert_mappings(ActivityLog, logs)
+
+    # Ustaw flagę zamknięcia
+    page.is_fully_closed = True
+    page.closed_at = now
+    page.closed_by_id = user_id
 
 
-def close_offer_page(page_id, user_id, send_emails=True):
+def close_offer_page(page_id, user_id, send_emails=True, progress=None):
     """
     Całkowicie zamyka stronę Offer.
 
     1. Sprawdza czy strona może być zamknięta (status='ended', not is_fully_closed)
-    2. Wykonuje algorytm alokacji setów (zerowanie unfulfilled, split partial)
-    3. Auto-anuluje zamówienia bez fulfilled items
-    4. Przelicza total_amount dla wszystkich zamówień
-    5. Zapisuje wyniki w bazie (atomowa transakcja)
-    6. Opcjonalnie wysyła emaile do klientów
+    2. Wczytuje zamówienia z pozycjami jednym zapytaniem
+    3. Liczy w pamięci alokację setów (zerowanie unfulfilled, split partial),
+       gratisy, statusy (auto-anulowanie bez fulfilled items) i total_amount
+    4. Zapisuje wyniki zbiorczo (atomowa transakcja)
+    5. Po commicie wysyła powiadomienia o zmianie statusu i opcjonalnie
+       emaile do klientów
 
     Args:
         page_id: ID strony Offer
         user_id: ID użytkownika wykonującego zamknięcie
         send_emails: Czy wysyłać emaile do klientów (domyślnie True)
+        progress: opcjonalnie callable(stage, done=None, total=None) —
+            wołane między etapami (ClosureProgress w run_offer_closure)
 
     Returns:
         dict: Wyniki zamknięcia
@@ -443,171 +624,362 @@ def close_offer_page(page_id, user_id, send_emails=True):
     if page.is_fully_closed:
         raise ValueError("Strona została już całkowicie zamknięta")
 
-    try:
-        # Zachowaj stare total_amount przed alokacją (do logowania)
-        orders = Order.query.filter_by(offer_page_id=page_id).all()
-        old_totals = {order.id: float(order.total_amount) if order.total_amount else 0 for order in orders}
+    from modules.offers import sales_stats
 
-        # 1. Wykonaj algorytm alokacji (ZMODYFIKOWANY - zeruje ceny, splituje partial)
-        allocation_result = calculate_set_fulfillment(page_id)
+    report = progress or (lambda stage, done=None, total=None: None)
 
-        # 2. Dezaktywuj gratisy w zamówieniach bez fulfilled items
-        orders = Order.query.filter_by(offer_page_id=page_id).all()
-        for order in orders:
-            non_bonus = [item for item in order.items if not item.is_bonus]
-            has_fulfilled = any(
-                item.is_set_fulfilled is not False and item.quantity > 0
-                for item in non_bonus
-            )
-            if not has_fulfilled:
-                for item in order.items:
-                    if item.is_bonus and item.quantity > 0:
-                        item.quantity = 0
-                        item.price = Decimal('0.00')
-                        item.total = Decimal('0.00')
-                        item.is_set_fulfilled = False
-                        item.fulfilled_quantity = 0
-
-        # 2b. NOWE: Auto-aktualizuj statusy zamówień (konfigurowalne)
-        status_update_result = auto_update_order_statuses(page_id, user_id)
-
-        # 3. NOWE: Przelicz total_amount dla wszystkich zamówień
-        orders = Order.query.filter_by(offer_page_id=page_id).all()
-        for order in orders:
-            order.recalculate_total_amount()
+    try:
+        # 1. Zamówienia z pozycjami — jedno zapytanie
+        report('loading')
+        orders = _load_closure_orders(page_id)
+        old_totals = {
+            order['id']: float(order['total_amount']) if order['total_amount'] else 0
+            for order in orders
+        }
 
-        # 3b. Log fulfillment per order (inline, przed commit)
-        import json as _json
-        from modules.admin.models import ActivityLog
+        # 2. Alokacja, gratisy, statusy i sumy — w pamięci
+        report('allocating', total=len(orders))
+        allocation_result = calculate_set_fulfillment(page_id, orders)
+        _deactivate_orphan_bonuses(orders)
+        statuses = get_closure_status_settings()
+        status_update_result = auto_update_order_statuses(orders, statuses)
         for order in orders:
-            non_bonus = [item for item in order.items if not item.is_bonus]
-            fulfilled_items = [item for item in non_bonus if item.is_set_fulfilled is not False]
-            unfulfilled_items = [item for item in non_bonus if item.is_set_fulfilled is False]
-            total_items = len(non_bonus)
-            fulfilled_count = len(fulfilled_items)
-            new_total = float(order.total_amount) if order.total_amount else 0
-            old_total = old_totals.get(order.id, 0)
-
-            db.session.add(ActivityLog(
-                user_id=user_id,
-                action='offer_closure_fulfillment',
-                entity_type='order',
-                entity_id=order.id,
-                old_value=_json.dumps({'total_amount': old_total}),
-                new_value=_json.dumps({
-                    'total_items': total_items,
-                    'fulfilled_items': fulfilled_count,
-                    'unfulfilled_items': len(unfulfilled_items),
-                    'old_total_amount': old_total,
-                    'new_total_amount': new_total,
-                    'offer_page_name': page.name,
-                }),
-            ))
-
-        # 4. Ustaw flagę zamknięcia
-        page.is_fully_closed = True
-        page.closed_at = datetime.now()
-        page.closed_by_id = user_id
+            order['new_total'] = sum(
+                (Decimal(str(item['total'])) for item in order['items'] if item['total']),
+                Decimal('0.00')
+            )
 
-        # 5. COMMIT - atomowa transakcja
+        # 3. Zapis zbiorczy — atomowa transakcja
+        report('saving', total=len(orders))
+        page = db.session.get(OfferPage, page_id)
+        _save_closure(page, orders, user_id, old_totals)
+        sales_stats.invalidate(page_id)
         db.session.commit()
 
-        current_app.logger.info(f"Offer page {page_id} closed successfully. "
-                                f"Status updates: fully={status_update_result['fully_fulfilled']}, "
-                                f"partially={status_update_result['partially_fulfilled']}, "
-                                f"not_fulfilled={status_update_result['not_fulfilled']}")
-
-        # 6. Wysyłka emaili (PO commit, żeby nie rollbackować przy błędzie email)
-        if send_emails:
-            try:
-                # Email o closure (istniejący)
-                send_closure_emails(page_id, payment_deadline=page.payment_deadline)
-
-                # NOWE: Email o anulowaniu (tylko dla zamówień not_fulfilled)
-                status_not_fulfilled_setting = Settings.query.filter_by(
-                    key='offer_closure_status_not_fulfilled'
-                ).first()
-
-                if status_not_fulfilled_setting:
-                    status_not = status_not_fulfilled_setting.value
-                    not_fulfilled_orders = [
-                        oid for oid in status_update_result['updated_order_ids']
-                        if db.session.get(Order, oid).status == status_not
-                    ]
-                    if not_fulfilled_orders:
-                        send_cancellation_emails(page_id, not_fulfilled_orders)
-
-            except Exception as e:
-                current_app.logger.error(f"Błąd wysyłki emaili dla strony {page_id}: {str(e)}")
-                # NIE rollbackuj - zamknięcie już się dokonało!
-
-        return {
-            'success': True,
-            'page_id': page_id,
-            'allocation': allocation_result,
-            'status_updates': status_update_result,
-        }
-
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Błąd zamykania strony Offer {page_id}: {str(e)}")
         raise
 
+    # Bulk UPDATE/INSERT omija unit of work (after_flush) — liczniki list ręcznie,
+    # agregaty sprzedaży przebudowane od razu (podsumowanie otwiera się zaraz po zamknięciu)
+    from utils.pagination import invalidate_counts
+    invalidate_counts('orders', 'order_items', 'activity_log')
+    sales_stats.rebuild_safe(page_id)
+
+    current_app.logger.info(f"Offer page {page_id} closed successfully. "
+                            f"Status updates: fully={status_update_result['fully_fulfilled']}, "
+                            f"partially={status_update_result['partially_fulfilled']}, "
+                            f"not_fulfilled={status_update_result['not_fulfilled']}")
+
+    # 4. Powiadomienia (PO commit, żeby nie rollbackować przy błędzie wysyłki)
+    _notify_closure(page_id, orders, statuses, send_emails, report)
+
+    return {
+        'success': True,
+        'page_id': page_id,
+        'allocation': allocation_result,
+        'status_updates': status_update_result,
+    }
+
+
+def _notify_closure(page_id, orders, statuses, send_emails, report):
+    """Etap powiadomień: zmiana statusu (zawsze), podsumowanie i anulowanie (send_emails)."""
+    from sqlalchemy.orm import joinedload
+    from modules.orders.models import OrderStatus
+    from utils.email_manager import EmailManager
+    from utils.push_manager import PushManager
+
+    changed = {order['id']: order for order in orders if 'old_status' in order}
+    report('notifying', done=0, total=len(changed))
+
+    if changed:
+        names = dict(db.session.query(OrderStatus.slug, OrderStatus.name).all())
+        changed_orders = Order.query.options(joinedload(Order.user)).filter(
+            Order.id.in_(list(changed))
+        ).order_by(Order.id).all()
+        for done, order in enumerate(changed_orders, start=1):
+            old_status_name = names.get(changed[order.id]['old_status'], changed[order.id]['old_status'])
+            new_status_name = names.get(order.status, order.status)
+            if order.customer_email:
+                try:
+                    EmailManager.notify_status_change(order, old_status_name, new_status_name)
+                    PushManager.notify_status_change(order, old_status_name, new_status_name)
+                except Exception as e:
+                    current_app.logger.error(
+                        f"Powiadomienie o zmianie statusu {order.order_number} nie poszło: {e}"
+                    )
+            if done % _NOTIFY_PROGRESS_EVERY == 0:
+                report('notifying', done=done, total=len(changed))
+
+    if not send_emails:
+        return
+
+    page = db.session.get(OfferPage, page_id)
+    try:
+        # Email o closure
+        send_closure_emails(page_id, payment_deadline=page.payment_deadline)
+
+        # Email o anulowaniu (tylko gdy status 'not_fulfilled' jest skonfigurowany)
+        if statuses['not_fulfilled_configured']:
+            not_fulfilled_orders = [
+                order_id for order_id, order in changed.items()
+                if order['status'] == statuses['not_fulfilled']
+            ]
+            if not_fulfilled_orders:
+                send_cancellation_emails(page_id, not_fulfilled_orders)
+
+    except Exception as e:
+        current_app.logger.error(f"Błąd wysyłki emaili dla strony {page_id}: {str(e)}")
+        # NIE rollbackuj - zamknięcie już się dokonało!
+
+
+# ============================================
+# Zamknięcie w tle (background_jobs)
+# ============================================
+
+class ClosureProgress:
+    """
+    Postęp zamykania w OfferPage.closure_state — callable przekazywany do
+    close_offer_page. Każda aktualizacja to commit, więc wołana tylko między
+    etapami (nigdy w trakcie transakcji zapisu).
+    """
+
+    def __init__(self, page_id):
+        self.page_id = page_id
+        self.state = {}
+
+    def __call__(self, stage, done=None, total=None):
+        self.update(status='running', stage=stage, done=done, total=total)
+
+    def update(self, **fields):
+        from sqlalchemy import update
+        from modules.offers.models import get_local_now
+
+        self.state.update(fields, updated_at=get_local_now().isoformat())
+        db.session.execute(
+            update(OfferPage).where(OfferPage.id == self.page_id).values(closure_state=dict(self.state))
+        )
+        db.session.commit()
+
+
+def claim_offer_closure(page):
+    """
+    Atomowo oznacza stronę jako zamykaną: warunkowy UPDATE przechodzi tylko,
+    gdy zamknięcie nie czeka w kolejce ani nie trwa (stan bez zmian od 15 min
+    = proces padł). Dwa równoległe kliknięcia — wygrywa jedno. Commit po
+    stronie wołającego (queue_offer_closure).
+
+    Returns:
+        bool: False gdy zamknięcie strony już trwa
+    """
+    from sqlalchemy import or_, update
+    from modules.offers.models import get_local_now
+
+    now = get_local_now()
+    status = OfferPage.closure_state['status'].as_string()
+    updated_at = OfferPage.closure_state['updated_at'].as_string()
+    claimed = db.session.execute(
+        update(OfferPage)
+        .where(
+            OfferPage.id == page.id,
+            OfferPage.is_fully_closed.isnot(True),
+            or_(
+                status.is_(None),
+                status.notin_(('queued', 'running')),
+                updated_at.is_(None),
+                updated_at < (now - _CLOSURE_STALE_AFTER).isoformat(),
+            ),
+        )
+        .values(closure_state={
+            'status': 'queued', 'stage': 'queued',
+            'queued_at': now.isoformat(), 'updated_at': now.isoformat(),
+        })
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    return claimed == 1
+
+
+def queue_offer_closure(page, user_id, send_emails, base_url, ip_address=None, user_agent=None):
+    """
+    Zatwierdza stan 'queued' (claim_offer_closure) i zleca run_offer_closure w tle.
+
+    ip_address / user_agent — z requestu admina, trafiają do ActivityLog
+    zapisywanych przez zadanie (w tle nie ma prawdziwego requestu).
+
+    Returns:
+        bool: False gdy kolejka zadań w tle jest pełna (stan strony wyczyszczony)
+    """
+    from utils import background_jobs
+
+    db.session.commit()
+
+    if background_jobs.submit('offer_closure', run_offer_closure, page.id, user_id, send_emails, base_url,
+                              ip_address, user_agent):
+        return True
+    page.closure_state = None
+    db.session.commit()
+    return False
 
-def get_page_summary(page_id, include_financials=True):
+
+def run_offer_closure(page_id, user_id, send_emails=True, base_url=None, ip_address=None, user_agent=None):
+    """
+    Zadanie w tle (background_jobs 'offer_closure'): close_offer_page z postępem
+    w OfferPage.closure_state.
+
+    base_url (request.url_root panelu admina) — test_request_context, żeby
+    url_for(_external=True) w mailach działał bez SERVER_NAME. ip_address /
+    user_agent admina trafiają do tego kontekstu, więc ActivityLog zadania
+    (bulk w _save_closure i log_activity) mają je jak przy zamykaniu w requeście.
+    """
+    import os
+    from modules.offers.models import get_local_now
+
+    base_url = base_url or os.getenv('APP_BASE_URL', 'https://thunderorders.cloud')
+    progress = ClosureProgress(page_id)
+    progress.update(status='running', stage='loading', started_at=get_local_now().isoformat())
+
+    with current_app.test_request_context(base_url=base_url,
+                                          headers={'User-Agent': user_agent} if user_agent else None,
+                                          environ_base={'REMOTE_ADDR': ip_address} if ip_address else None):
+        try:
+            result = close_offer_page(page_id, user_id, send_emails=send_emails, progress=progress)
+        except Exception as e:
+            db.session.rollback()
+            progress.update(status='failed', error=str(e), finished_at=get_local_now().isoformat())
+            raise
+
+    allocation = result['allocation']
+    progress.update(
+        status='done',
+        stage='done',
+        finished_at=get_local_now().isoformat(),
+        result={
+            'total_orders': allocation['total_orders'],
+            'total_fulfilled': allocation['total_fulfilled'],
+            'total_unfulfilled': allocation['total_unfulfilled'],
+            'sets': [
+                {key: s[key] for key in ('set_name', 'complete_sets', 'fulfilled_count', 'unfulfilled_count')}
+                for s in allocation['sets']
+            ],
+            'status_updates': {
+                key: value for key, value in result['status_updates'].items() if key != 'updated_order_ids'
+            },
+        },
+    )
+    return result
+
+
+def _sales_by_product(product_rows):
+    """Sprzedane sztuki per product_id (bez gratisów, wszystkie rozmiary) z agregatów."""
+    ordered = defaultdict(int)
+    for row in product_rows:
+        if row['product_id']:
+            ordered[row['product_id']] += row['quantity'] - row['bonus_quantity']
+    return ordered
+
+
+def _bonus_items_by_section(page_id):
+    """Gratisy per sekcja-źródło (bonus_source_section_id) — jedno GROUP BY."""
+    rows = db.session.query(
+        OrderItem.bonus_source_section_id,
+        db.func.coalesce(db.func.sum(OrderItem.quantity), 0)
+    ).join(Order, OrderItem.order_id == Order.id
+    ).filter(
+        Order.offer_page_id == page_id,
+        Order.status != 'anulowane',
+        OrderItem.is_bonus == True,
+        OrderItem.bonus_source_section_id.isnot(None),
+    ).group_by(OrderItem.bonus_source_section_id).all()
+    return {section_id: int(qty) for section_id, qty in rows}
+
+
+def _order_timestamps(page_id):
+    """created_at zamówień strony (bez anulowanych) — do wykresów, bez ładowania zamówień."""
+    return list(db.session.scalars(
+        select(Order.created_at).where(
+            Order.offer_page_id == page_id,
+            Order.status != 'anulowane',
+            Order.created_at.isnot(None),
+        ).order_by(Order.created_at.asc())
+    ))
+
+
+def _full_set_customers(page_id, set_product_id):
+    """
+    Lista osób, które zakupiły pełny set — per użytkownik z sumą szt.
+    (bez pozycji gratisowych, by suma zgadzała się z liczbą sprzedanych setów)
+    """
+    rows = db.session.query(
+        User.first_name,
+        User.last_name,
+        User.email,
+        db.func.coalesce(db.func.sum(OrderItem.quantity), 0).label('qty')
+    ).join(Order, OrderItem.order_id == Order.id
+    ).join(User, Order.user_id == User.id
+    ).filter(
+        OrderItem.product_id == set_product_id,
+        OrderItem.is_bonus != True,
+        Order.offer_page_id == page_id,
+        Order.status != 'anulowane',
+    ).group_by(User.id).order_by(db.func.min(OrderItem.id).asc()).all()
+
+    customers = []
+    for fname, lname, email, qty in rows:
+        name = f'{fname} {lname}'.strip() if (fname or lname) else email
+        customers.append({'name': name, 'quantity': int(qty)})
+    return customers
+
+
+def get_page_summary(page_id, include_financials=True, include_orders=True):
     """
     Generuje podsumowanie sprzedaży dla zamkniętej strony Offer.
 
+    Sumy (przychód, sztuki, produkty, klienci) pochodzą z agregatów
+    modules/offers/sales_stats.py; zamówienia z pozycjami ładowane są tylko
+    dla listy zamówień (include_orders).
+
     Args:
         page_id: ID strony Offer
         include_financials: Czy uwzględniać dane finansowe (tylko Admin)
+        include_orders: Czy dołączyć listę zamówień z pozycjami
 
     Returns:
         dict: Podsumowanie sprzedaży
     """
+    from collections import Counter
+    from modules.offers import sales_stats
+
     page = db.session.get(OfferPage, page_id)
     if not page:
         raise ValueError(f"Strona Offer o ID {page_id} nie istnieje")
 
-    orders = Order.query.filter_by(offer_page_id=page_id).filter(
-        Order.status != 'anulowane'
-    ).order_by(Order.created_at.asc()).all()
+    totals, product_rows = sales_stats.get_page_stats(page_id)
 
     # Podstawowe statystyki
-    total_orders = len(orders)
-    unique_customers = len(set(
-        order.user_id for order in orders if order.user_id
-    ))
+    total_orders = totals['orders_count']
+    unique_customers = totals['customers_count']
 
     # Przychód liczony tylko z produktów zrealizowanych (bez bonusów)
     # is_set_fulfilled = True -> zrealizowane w secie
     # is_set_fulfilled = None -> produkt spoza setu (zawsze realizowany)
     # is_set_fulfilled = False -> NIE zrealizowane (nie liczymy)
-    total_revenue = 0.0
-    total_bonus_items = 0
-    for order in orders:
-        for item in order.items:
-            if item.is_bonus:
-                total_bonus_items += item.quantity
-                continue
-            # Liczymy tylko zrealizowane produkty (True lub None)
-            if item.is_set_fulfilled is not False:
-                total_revenue += float(item.total) if item.total else 0
+    total_revenue = float(sum(
+        (row['revenue'] - row['unfulfilled_revenue'] for row in product_rows), Decimal('0.00')
+    ))
+    total_bonus_items = sum(row['bonus_quantity'] for row in product_rows)
+
+    ordered_by_product = _sales_by_product(product_rows)
+    bonus_by_section = _bonus_items_by_section(page_id)
 
     # Zbierz informacje o setach (z macierzą slotów jak w live)
     sets_info = []
-    set_sections = page.sections.filter_by(section_type='set').all()
-
-    for section in set_sections:
-        set_items = section.get_set_items_ordered()
-        max_sets = section.set_max_sets or 0
+    for section_id, section, set_members in _layout_set_sections(page_id):
+        max_sets = section['set_max_sets'] or 0
         products_in_set = []
 
         # Collect all product IDs in this set section
-        all_set_product_ids = []
-        for item in set_items:
-            for product in item.get_products():
-                all_set_product_ids.append(product.id)
+        all_set_product_ids = [member['product_id'] for member in set_members]
 
         # Query slot data: customer names + fulfillment status per product
         # Build sequential mapping from ALL OrderItems (chronologically)
@@ -653,89 +1025,59 @@ def get_page_summary(page_id, include_financials=True):
             max_slots = max((max(slots.keys()) if slots else 0) for slots in slot_data_map.values()) if slot_data_map else 0
             effective_max_sets = max_slots
 
-        for item in set_items:
-            for product in item.get_products():
-                product_slots = slot_data_map.get(product.id, {})
-                slots = []
-                total_ordered = 0
-                fulfilled = 0
-                unfulfilled = 0
-
-                if effective_max_sets > 0:
-                    for i in range(effective_max_sets):
-                        set_num = i + 1  # 1-based
-                        sd = product_slots.get(set_num)
-                        if sd:
-                            total_ordered += 1
-                            if sd['fulfilled']:
-                                fulfilled += 1
-                            else:
-                                unfulfilled += 1
-                            slots.append({
-                                'filled': True,
-                                'fulfilled': sd['fulfilled'],
-                                'customer': sd['customer'],
-                            })
+        for member in set_members:
+            product_slots = slot_data_map.get(member['product_id'], {})
+            slots = []
+            total_ordered = 0
+            fulfilled = 0
+            unfulfilled = 0
+
+            if effective_max_sets > 0:
+                for i in range(effective_max_sets):
+                    set_num = i + 1  # 1-based
+                    sd = product_slots.get(set_num)
+                    if sd:
+                        total_ordered += 1
+                        if sd['fulfilled']:
+                            fulfilled += 1
                         else:
-                            slots.append({
-                                'filled': False,
-                                'fulfilled': None,
-                                'customer': None,
-                            })
-
-                products_in_set.append({
-                    'product_id': product.id,
-                    'product_name': product.name,
-                    'quantity_per_set': item.quantity_per_set,
-                    'total_ordered': total_ordered,
-                    'fulfilled': fulfilled,
-                    'unfulfilled': unfulfilled,
-                    'reserved': 0,
-                    'slots': slots,
-                    'is_full_set': False,
-                })
+                            unfulfilled += 1
+                        slots.append({
+                            'filled': True,
+                            'fulfilled': sd['fulfilled'],
+                            'customer': sd['customer'],
+                        })
+                    else:
+                        slots.append({
+                            'filled': False,
+                            'fulfilled': None,
+                            'customer': None,
+                        })
+
+            products_in_set.append({
+                'product_id': member['product_id'],
+                'product_name': member['product_name'],
+                'quantity_per_set': member['quantity_per_set'],
+                'total_ordered': total_ordered,
+                'fulfilled': fulfilled,
+                'unfulfilled': unfulfilled,
+                'reserved': 0,
+                'slots': slots,
+                'is_full_set': False,
+            })
 
         # Full set product (set_product_id) — dodatkowy wiersz
         full_set_sold = 0
         full_set_customers = []  # lista kupujących pełny set: [{'name', 'quantity'}]
-        if section.set_product_id and section.set_product:
-            full_set_qty = db.session.query(
-                db.func.coalesce(db.func.sum(OrderItem.quantity), 0)
-            ).filter(
-                OrderItem.product_id == section.set_product_id,
-                OrderItem.is_bonus != True,
-                OrderItem.order_id.in_(
-                    db.session.query(Order.id).filter(
-                        Order.offer_page_id == page_id,
-                        Order.status != 'anulowane'
-                    )
-                )
-            ).scalar()
-            full_set_qty = int(full_set_qty)
+        set_product_id = section['set_product_id']
+        if set_product_id and section['set_product_name'] is not None:
+            full_set_qty = ordered_by_product.get(set_product_id, 0)
             full_set_sold = full_set_qty
-
-            # Lista osób, które zakupiły pełny set — per użytkownik z sumą szt.
-            # (bez pozycji gratisowych, by suma zgadzała się z full_set_qty wyżej)
-            full_set_buyer_rows = db.session.query(
-                User.first_name,
-                User.last_name,
-                User.email,
-                db.func.coalesce(db.func.sum(OrderItem.quantity), 0).label('qty')
-            ).join(Order, OrderItem.order_id == Order.id
-            ).join(User, Order.user_id == User.id
-            ).filter(
-                OrderItem.product_id == section.set_product_id,
-                OrderItem.is_bonus != True,
-                Order.offer_page_id == page_id,
-                Order.status != 'anulowane',
-            ).group_by(User.id).order_by(db.func.min(OrderItem.id).asc()).all()
-            for fname, lname, email, qty in full_set_buyer_rows:
-                name = f'{fname} {lname}'.strip() if (fname or lname) else email
-                full_set_customers.append({'name': name, 'quantity': int(qty)})
+            full_set_customers = _full_set_customers(page_id, set_product_id)
 
             products_in_set.append({
-                'product_id': section.set_product_id,
-                'product_name': section.set_product.name,
+                'product_id': set_product_id,
+                'product_name': section['set_product_name'],
                 'quantity_per_set': 1,
                 'total_ordered': full_set_qty,
                 'fulfilled': full_set_qty,
@@ -761,29 +1103,17 @@ def get_page_summary(page_id, include_financials=True):
         total_set_ordered = sum(p['total_ordered'] for p in products_in_set if not p['is_full_set'])
         total_set_fulfilled = sum(p['fulfilled'] for p in products_in_set if not p['is_full_set'])
 
-        # Bonus items for this section
-        bonus_items_count = db.session.query(
-            db.func.coalesce(db.func.sum(OrderItem.quantity), 0)
-        ).join(Order, OrderItem.order_id == Order.id
-        ).filter(
-            Order.offer_page_id == page_id,
-            Order.status != 'anulowane',
-            OrderItem.is_bonus == True,
-            OrderItem.bonus_source_section_id == section.id,
-        ).scalar()
-        bonus_items_count = int(bonus_items_count)
-
         sets_info.append({
-            'section_id': section.id,
-            'set_name': section.set_name or 'Bez nazwy',
-            'set_image': section.set_image,
+            'section_id': section_id,
+            'set_name': section['set_name'] or 'Bez nazwy',
+            'set_image': section.get('set_image'),
             'set_max_sets': effective_max_sets,
             'has_limit': max_sets > 0,
             'ordered_sets': ordered_sets,
             'full_set_sold': full_set_sold,
             'full_set_customers': full_set_customers,
             'total_sets_sold': total_sets_sold,
-            'bonus_items_count': bonus_items_count,
+            'bonus_items_count': bonus_by_section.get(section_id, 0),
             'complete_sets': ordered_sets,
             'products': products_in_set,
             'fulfillment_pct': round((total_set_fulfilled / total_set_ordered) * 100, 1) if total_set_ordered > 0 else 0,
@@ -791,138 +1121,100 @@ def get_page_summary(page_id, include_financials=True):
             'total_fulfilled': total_set_fulfilled,
         })
 
-    # Lista zamówień z detalami
+    # Lista zamówień z detalami (drill-down — tylko na żądanie)
     orders_list = []
-    for order in orders:
-        items_details = []
-        fulfilled_amount = 0.0  # Wartość tylko zrealizowanych produktów
+    if include_orders:
+        orders = Order.query.filter_by(offer_page_id=page_id).filter(
+            Order.status != 'anulowane'
+        ).order_by(Order.created_at.asc()).all()
 
-        for item in order.items:
-            item_total = float(item.total) if item.total else 0
+        for order in orders:
+            items_details = []
+            fulfilled_amount = 0.0  # Wartość tylko zrealizowanych produktów
 
-            # Liczymy wartość tylko zrealizowanych produktów (bez bonusów)
-            if not item.is_bonus and item.is_set_fulfilled is not False:
-                fulfilled_amount += item_total
+            for item in order.items:
+                item_total = float(item.total) if item.total else 0
 
-            item_data = {
-                'product_id': item.product_id,
-                'product_name': item.product_name,
-                'selected_size': item.selected_size,
-                'quantity': item.quantity,
-                'price': float(item.price) if item.price else 0,
-                'total': item_total,
-                'is_set_fulfilled': item.is_set_fulfilled,
-                'set_section_id': item.set_section_id,
-                'is_full_set': item.is_full_set,
-                'is_custom': item.is_custom,
-                'is_bonus': item.is_bonus,
-            }
-            items_details.append(item_data)
+                # Liczymy wartość tylko zrealizowanych produktów (bez bonusów)
+                if not item.is_bonus and item.is_set_fulfilled is not False:
+                    fulfilled_amount += item_total
 
-        order_data = {
-            'order_id': order.id,
-            'order_number': order.order_number,
-            'customer_name': order.customer_name,
-            'customer_email': order.customer_email,
-            'customer_phone': order.user.phone if order.user else None,
-            'created_at': order.created_at,
-            'total_amount': fulfilled_amount,  # Tylko zrealizowane produkty
-            'order_items': items_details,
-            'created_by_admin_id': order.created_by_admin_id,
-            'payment_badge': order.payment_badge,
-            # Dla masowego anulowania: status decyduje, czy zamówienie da się
-            # zaznaczyć, is_paid — do której grupy trafi (anulowane / do zwrotu).
-            'status': order.status,
-            'is_paid': order_has_payment(order),
-        }
-        orders_list.append(order_data)
+                item_data = {
+                    'product_id': item.product_id,
+                    'product_name': item.product_name,
+                    'selected_size': item.selected_size,
+                    'quantity': item.quantity,
+                    'price': float(item.price) if item.price else 0,
+                    'total': item_total,
+                    'is_set_fulfilled': item.is_set_fulfilled,
+                    'set_section_id': item.set_section_id,
+                    'is_full_set': item.is_full_set,
+                    'is_custom': item.is_custom,
+                    'is_bonus': item.is_bonus,
+                }
+                items_details.append(item_data)
+
+            order_data = {
+                'order_id': order.id,
+                'order_number': order.order_number,
+                'customer_name': order.customer_name,
+                'customer_email': order.customer_email,
+                'customer_phone': order.user.phone if order.user else None,
+                'created_at': order.created_at,
+                'total_amount': fulfilled_amount,  # Tylko zrealizowane produkty
+                'order_items': items_details,
+                'created_by_admin_id': order.created_by_admin_id,
+                'payment_badge': order.payment_badge,
+                # Dla masowego anulowania: status decyduje, czy zamówienie da się
+                # zaznaczyć, is_paid — do której grupy trafi (anulowane / do zwrotu).
+                'status': order.status,
+                'is_paid': order_has_payment(order),
+            }
+            orders_list.append(order_data)
 
     # === Nowe metryki ===
 
-    # Total items (zrealizowane, bez bonusów)
-    total_items = 0
-    for order in orders:
-        for item in order.items:
-            if item.is_bonus:
-                continue
-            if item.is_set_fulfilled is not False:
-                total_items += item.quantity
+    # Total items (zrealizowane, bez bonusów). Gratisy niezrealizowane mają
+    # po zamknięciu quantity=0, więc unfulfilled_quantity to same produkty.
+    total_items = sum(
+        row['quantity'] - row['bonus_quantity'] - row['unfulfilled_quantity']
+        for row in product_rows
+    )
 
     # Fulfillment % (realizacja setów)
-    total_set_items_qty = 0
-    fulfilled_set_items_qty = 0
-    for order in orders:
-        for item in order.items:
-            if item.is_set_fulfilled is not None:
-                total_set_items_qty += item.quantity
-                if item.is_set_fulfilled:
-                    fulfilled_set_items_qty += item.quantity
+    fulfilled_set_items_qty = sum(row['fulfilled_quantity'] for row in product_rows)
+    total_set_items_qty = fulfilled_set_items_qty + sum(row['unfulfilled_quantity'] for row in product_rows)
 
     fulfillment_pct = round((fulfilled_set_items_qty / total_set_items_qty) * 100, 1) if total_set_items_qty > 0 else 100.0
 
-    # Orders by date (do wykresu) - zachowujemy dla kompatybilności
-    from collections import Counter
-    orders_by_date = Counter()
-    for order in orders:
-        if order.created_at:
-            date_key = order.created_at.strftime('%Y-%m-%d')
-            orders_by_date[date_key] += 1
+    created_ats = _order_timestamps(page_id)
 
-    sorted_dates = sorted(orders_by_date.items())
-    orders_by_date_list = [{'date': d, 'count': c} for d, c in sorted_dates]
+    # Orders by date (do wykresu) - zachowujemy dla kompatybilności
+    orders_by_date = Counter(created_at.strftime('%Y-%m-%d') for created_at in created_ats)
+    orders_by_date_list = [{'date': d, 'count': c} for d, c in sorted(orders_by_date.items())]
 
     # Order timestamps (do Chart.js line chart - pełne ISO timestamps)
-    order_timestamps = []
-    for order in orders:
-        if order.created_at:
-            order_timestamps.append(order.created_at.isoformat())
+    order_timestamps = [created_at.isoformat() for created_at in created_ats]
 
     # Products aggregated (do Tab Produkty)
-    products_agg = {}
-    for order in orders:
-        for item in order.items:
-            key = (item.product_id, item.selected_size) if item.product_id else f"custom_{item.product_name}"
-
-            if key not in products_agg:
-                products_agg[key] = {
-                    'product_id': item.product_id,
-                    'product_name': item.product_name,
-                    'selected_size': item.selected_size,
-                    'total_quantity': 0,
-                    'fulfilled_quantity': 0,
-                    'unfulfilled_quantity': 0,
-                    'non_set_quantity': 0,
-                    'revenue': 0.0,
-                    'order_count': 0,
-                    'is_custom': item.is_custom,
-                    'is_full_set': item.is_full_set,
-                    'is_bonus': item.is_bonus,
-                }
-
-            p = products_agg[key]
-            p['total_quantity'] += item.quantity
-            p['order_count'] += 1
-
-            if item.is_set_fulfilled is True:
-                p['fulfilled_quantity'] += item.quantity
-            elif item.is_set_fulfilled is False:
-                p['unfulfilled_quantity'] += item.quantity
-            else:
-                p['non_set_quantity'] += item.quantity
-
-            if include_financials:
-                item_total = float(item.total) if item.total else 0
-                if not item.is_bonus and item.is_set_fulfilled is not False:
-                    p['revenue'] += item_total
-
-    for key, p in products_agg.items():
-        set_total = p['fulfilled_quantity'] + p['unfulfilled_quantity']
-        if set_total > 0:
-            p['fulfillment_pct'] = round((p['fulfilled_quantity'] / set_total) * 100, 1)
-        else:
-            p['fulfillment_pct'] = None
-
-    products_aggregated = sorted(products_agg.values(), key=lambda x: x['total_quantity'], reverse=True)
+    products_aggregated = []
+    for row in product_rows:
+        set_total = row['fulfilled_quantity'] + row['unfulfilled_quantity']
+        products_aggregated.append({
+            'product_id': row['product_id'],
+            'product_name': row['product_name'],
+            'selected_size': row['selected_size'],
+            'total_quantity': row['quantity'],
+            'fulfilled_quantity': row['fulfilled_quantity'],
+            'unfulfilled_quantity': row['unfulfilled_quantity'],
+            'non_set_quantity': row['quantity'] - set_total,
+            'revenue': float(row['revenue'] - row['unfulfilled_revenue']) if include_financials else 0.0,
+            'order_count': row['item_count'],
+            'is_custom': row['is_custom'],
+            'is_full_set': row['is_full_set'],
+            'is_bonus': row['is_bonus'],
+            'fulfillment_pct': round((row['fulfilled_quantity'] / set_total) * 100, 1) if set_total > 0 else None,
+        })
 
     result = {
         'page_id': page_id,
@@ -952,46 +1244,43 @@ def get_page_summary(page_id, include_financials=True):
     return result
 
 
-def get_live_summary(page_id, include_financials=True):
+def get_live_summary(page_id, include_financials=True, include_orders=True):
     """
     Generuje podsumowanie LIVE dla aktywnej/wstrzymanej/zakończonej strony Offer.
     W odróżnieniu od get_page_summary() — nie filtruje po is_set_fulfilled
     i nie wymaga is_fully_closed.
 
+    Sumy pochodzą z agregatów modules/offers/sales_stats.py — odświeżenie
+    statystyk (emit po każdym zamówieniu, raport zbiorczy) z include_orders=False
+    nie ładuje zamówień wcale.
+
     Args:
         page_id: ID strony Offer
         include_financials: Czy uwzględniać dane finansowe (tylko Admin)
+        include_orders: Czy dołączyć listę zamówień z pozycjami
 
     Returns:
         dict: Podsumowanie LIVE
     """
-    from collections import Counter
+    from modules.offers import sales_stats
 
     page = db.session.get(OfferPage, page_id)
     if not page:
         raise ValueError(f"Strona Offer o ID {page_id} nie istnieje")
 
-    orders = Order.query.filter_by(offer_page_id=page_id).filter(
-        Order.status != 'anulowane'
-    ).order_by(Order.created_at.asc()).all()
+    totals, product_rows = sales_stats.get_page_stats(page_id)
 
     # Podstawowe statystyki
-    total_orders = len(orders)
-    unique_customers = len(set(
-        order.user_id for order in orders if order.user_id
-    ))
+    total_orders = totals['orders_count']
+    unique_customers = totals['customers_count']
 
     # Revenue = suma WSZYSTKICH itemów (bez filtrowania po fulfillment, bez bonusów)
-    total_revenue = 0.0
-    total_items = 0
-    total_bonus_items = 0
-    for order in orders:
-        for item in order.items:
-            if item.is_bonus:
-                total_bonus_items += item.quantity
-                continue
-            total_revenue += float(item.total) if item.total else 0
-            total_items += item.quantity
+    total_revenue = float(sum((row['revenue'] for row in product_rows), Decimal('0.00')))
+    total_items = sum(row['quantity'] - row['bonus_quantity'] for row in product_rows)
+    total_bonus_items = sum(row['bonus_quantity'] for row in product_rows)
+
+    ordered_by_product = _sales_by_product(product_rows)
+    bonus_by_section = _bonus_items_by_section(page_id)
 
     # Aktywne rezerwacje
     from modules.offers.models import OfferReservation
@@ -1001,7 +1290,6 @@ def get_live_summary(page_id, include_financials=True):
 
     # Aktywne rezerwacje per product (ilości + imiona do tooltipów) — jedno zapytanie
     import time as _time
-    from modules.auth.models import User
     now_ts = int(_time.time())
     active_reservations_by_product = {}
     reservation_customers_by_product = {}
@@ -1023,18 +1311,12 @@ def get_live_summary(page_id, include_financials=True):
 
     # Sety — macierz slotów (ordered vs available)
     sets_info = []
-    set_sections = page.sections.filter_by(section_type='set').all()
-
-    for section in set_sections:
-        set_items = section.get_set_items_ordered()
-        max_sets = section.set_max_sets or 0
+    for section_id, section, set_members in _layout_set_sections(page_id):
+        max_sets = section['set_max_sets'] or 0
         products_matrix = []
 
         # Collect all product IDs in this set section
-        all_set_product_ids = []
-        for item in set_items:
-            for product in item.get_products():
-                all_set_product_ids.append(product.id)
+        all_set_product_ids = [member['product_id'] for member in set_members]
 
         # Query customer names per product — build sequential slot mapping
         # from ALL OrderItems (chronologically), excluding bonus items
@@ -1066,23 +1348,8 @@ def get_live_summary(page_id, include_financials=True):
                     slot_customer_map[pid][slot_counter[pid]] = name
                     slot_counter[pid] += 1
 
-        # First pass: collect ordered quantities (excluding bonus) to determine effective_max_sets
-        product_ordered_qtys = {}
-        for item in set_items:
-            for product in item.get_products():
-                ordered_qty = db.session.query(
-                    db.func.coalesce(db.func.sum(OrderItem.quantity), 0)
-                ).filter(
-                    OrderItem.product_id == product.id,
-                    OrderItem.is_bonus != True,
-                    OrderItem.order_id.in_(
-                        db.session.query(Order.id).filter(
-                            Order.offer_page_id == page_id,
-                            Order.status != 'anulowane'
-                        )
-                    )
-                ).scalar()
-                product_ordered_qtys[product.id] = int(ordered_qty)
+        # Ordered quantities (excluding bonus) to determine effective_max_sets
+        product_ordered_qtys = {pid: ordered_by_product.get(pid, 0) for pid in all_set_product_ids}
 
         # When max_sets is 0 (no limit), use the highest ordered quantity as effective columns
         if max_sets > 0:
@@ -1090,80 +1357,50 @@ def get_live_summary(page_id, include_financials=True):
         else:
             effective_max_sets = max(product_ordered_qtys.values()) if product_ordered_qtys else 0
 
-        for item in set_items:
-            for product in item.get_products():
-                ordered_qty = product_ordered_qtys[product.id]
-
-                # Slots: objects with filled status + customer name
-                product_customers = slot_customer_map.get(product.id, {})
-                slots = []
-                if effective_max_sets > 0:
-                    for i in range(effective_max_sets):
-                        set_num = i + 1  # 1-based
-                        filled = i < ordered_qty
-                        slots.append({
-                            'filled': filled,
-                            'customer': product_customers.get(set_num) if filled else None,
-                        })
+        for member in set_members:
+            product_id = member['product_id']
+            ordered_qty = product_ordered_qtys[product_id]
+
+            # Slots: objects with filled status + customer name
+            product_customers = slot_customer_map.get(product_id, {})
+            slots = []
+            if effective_max_sets > 0:
+                for i in range(effective_max_sets):
+                    set_num = i + 1  # 1-based
+                    filled = i < ordered_qty
+                    slots.append({
+                        'filled': filled,
+                        'customer': product_customers.get(set_num) if filled else None,
+                    })
 
-                reserved_qty = active_reservations_by_product.get(product.id, 0)
-
-                products_matrix.append({
-                    'product_id': product.id,
-                    'product_name': product.name,
-                    'quantity_per_set': item.quantity_per_set,
-                    'total_ordered': ordered_qty,
-                    'reserved': reserved_qty,
-                    'reserved_customers': reservation_customers_by_product.get(product.id, []),
-                    'slots': slots,
-                    'is_full_set': False,
-                })
+            reserved_qty = active_reservations_by_product.get(product_id, 0)
+
+            products_matrix.append({
+                'product_id': product_id,
+                'product_name': member['product_name'],
+                'quantity_per_set': member['quantity_per_set'],
+                'total_ordered': ordered_qty,
+                'reserved': reserved_qty,
+                'reserved_customers': reservation_customers_by_product.get(product_id, []),
+                'slots': slots,
+                'is_full_set': False,
+            })
 
         # Full set product (set_product_id) — dodatkowy wiersz
         full_set_customers = []  # lista kupujących pełny set: [{'name', 'quantity'}]
-        if section.set_product_id and section.set_product:
-            full_set_qty = db.session.query(
-                db.func.coalesce(db.func.sum(OrderItem.quantity), 0)
-            ).filter(
-                OrderItem.product_id == section.set_product_id,
-                OrderItem.is_bonus != True,
-                OrderItem.order_id.in_(
-                    db.session.query(Order.id).filter(
-                        Order.offer_page_id == page_id,
-                        Order.status != 'anulowane'
-                    )
-                )
-            ).scalar()
-            full_set_qty = int(full_set_qty)
-
-            # Lista osób, które zakupiły pełny set — per użytkownik z sumą szt.
-            # (bez pozycji gratisowych, by suma zgadzała się z full_set_qty wyżej)
-            full_set_buyer_rows = db.session.query(
-                User.first_name,
-                User.last_name,
-                User.email,
-                db.func.coalesce(db.func.sum(OrderItem.quantity), 0).label('qty')
-            ).join(Order, OrderItem.order_id == Order.id
-            ).join(User, Order.user_id == User.id
-            ).filter(
-                OrderItem.product_id == section.set_product_id,
-                OrderItem.is_bonus != True,
-                Order.offer_page_id == page_id,
-                Order.status != 'anulowane',
-            ).group_by(User.id).order_by(db.func.min(OrderItem.id).asc()).all()
-            for fname, lname, email, qty in full_set_buyer_rows:
-                name = f'{fname} {lname}'.strip() if (fname or lname) else email
-                full_set_customers.append({'name': name, 'quantity': int(qty)})
-
-            full_set_reserved = active_reservations_by_product.get(section.set_product_id, 0)
+        set_product_id = section['set_product_id']
+        if set_product_id and section['set_product_name'] is not None:
+            full_set_qty = ordered_by_product.get(set_product_id, 0)
+            full_set_customers = _full_set_customers(page_id, set_product_id)
+            full_set_reserved = active_reservations_by_product.get(set_product_id, 0)
 
             products_matrix.append({
-                'product_id': section.set_product_id,
-                'product_name': section.set_product.name,
+                'product_id': set_product_id,
+                'product_name': section['set_product_name'],
                 'quantity_per_set': 1,
                 'total_ordered': full_set_qty,
                 'reserved': full_set_reserved,
-                'reserved_customers': reservation_customers_by_product.get(section.set_product_id, []),
+                'reserved_customers': reservation_customers_by_product.get(set_product_id, []),
                 'slots': [{'filled': full_set_qty > 0, 'customer': None}],
                 'is_full_set': True,
             })
@@ -1187,96 +1424,75 @@ def get_live_summary(page_id, include_financials=True):
         full_set_sold = full_set_entries[0]['total_ordered'] if full_set_entries else 0
         total_sets_sold = ordered_sets + full_set_sold
 
-        # Bonus items for this section
-        bonus_items_count = db.session.query(
-            db.func.coalesce(db.func.sum(OrderItem.quantity), 0)
-        ).join(Order, OrderItem.order_id == Order.id
-        ).filter(
-            Order.offer_page_id == page_id,
-            Order.status != 'anulowane',
-            OrderItem.is_bonus == True,
-            OrderItem.bonus_source_section_id == section.id,
-        ).scalar()
-        bonus_items_count = int(bonus_items_count)
-
         sets_info.append({
-            'section_id': section.id,
-            'set_name': section.set_name or 'Bez nazwy',
-            'set_image': section.set_image,
+            'section_id': section_id,
+            'set_name': section['set_name'] or 'Bez nazwy',
+            'set_image': section.get('set_image'),
             'set_max_sets': effective_max_sets,
             'has_limit': max_sets > 0,
             'ordered_sets': ordered_sets,
             'full_set_sold': full_set_sold,
             'full_set_customers': full_set_customers,
             'total_sets_sold': total_sets_sold,
-            'bonus_items_count': bonus_items_count,
+            'bonus_items_count': bonus_by_section.get(section_id, 0),
             'progress_pct': round((ordered_sets / max_sets) * 100, 1) if max_sets > 0 else 0,
             'products': products_matrix,
         })
 
     # Order timestamps (do Chart.js)
-    order_timestamps = []
-    for order in orders:
-        if order.created_at:
-            order_timestamps.append(order.created_at.isoformat())
+    order_timestamps = [created_at.isoformat() for created_at in _order_timestamps(page_id)]
 
     # Products aggregated
-    products_agg = {}
-    for order in orders:
-        for item in order.items:
-            key = (item.product_id, item.selected_size) if item.product_id else f"custom_{item.product_name}"
+    products_aggregated = [{
+        'product_id': row['product_id'],
+        'product_name': row['product_name'],
+        'selected_size': row['selected_size'],
+        'total_quantity': row['quantity'],
+        'revenue': float(row['revenue']) if include_financials else 0.0,
+        'order_count': row['item_count'],
+        'is_custom': row['is_custom'],
+        'is_full_set': row['is_full_set'],
+        'is_bonus': row['is_bonus'],
+    } for row in product_rows]
+
+    # Lista zamówień (drill-down — tylko na żądanie)
+    orders_list = []
+    if include_orders:
+        orders = Order.query.filter_by(offer_page_id=page_id).filter(
+            Order.status != 'anulowane'
+        ).order_by(Order.created_at.asc()).all()
+
+        # Pozycje, klienci i potwierdzenia (payment_badge) wszystkich zamówień naraz
+        from modules.orders.preload import preload_order_list
+        preload_order_list(orders)
 
-            if key not in products_agg:
-                products_agg[key] = {
+        for order in orders:
+            items_details = []
+            for item in order.items:
+                items_details.append({
                     'product_id': item.product_id,
                     'product_name': item.product_name,
                     'selected_size': item.selected_size,
-                    'total_quantity': 0,
-                    'revenue': 0.0,
-                    'order_count': 0,
-                    'is_custom': item.is_custom,
+                    'quantity': item.quantity,
+                    'price': float(item.price) if item.price else 0,
+                    'total': float(item.total) if item.total else 0,
                     'is_full_set': item.is_full_set,
+                    'is_custom': item.is_custom,
                     'is_bonus': item.is_bonus,
-                }
-
-            p = products_agg[key]
-            p['total_quantity'] += item.quantity
-            p['order_count'] += 1
-
-            if include_financials and not item.is_bonus:
-                p['revenue'] += float(item.total) if item.total else 0
-
-    products_aggregated = sorted(products_agg.values(), key=lambda x: x['total_quantity'], reverse=True)
+                })
 
-    # Lista zamówień
-    orders_list = []
-    for order in orders:
-        items_details = []
-        for item in order.items:
-            items_details.append({
-                'product_id': item.product_id,
-                'product_name': item.product_name,
-                'selected_size': item.selected_size,
-                'quantity': item.quantity,
-                'price': float(item.price) if item.price else 0,
-                'total': float(item.total) if item.total else 0,
-                'is_full_set': item.is_full_set,
-                'is_custom': item.is_custom,
-                'is_bonus': item.is_bonus,
+            orders_list.append({
+                'order_id': order.id,
+                'order_number': order.order_number,
+                'customer_name': order.customer_name,
+                'customer_email': order.customer_email,
+                'customer_phone': order.user.phone if order.user else None,
+                'created_at': order.created_at,
+                'total_amount': float(order.total_amount) if order.total_amount else 0,
+                'order_items': items_details,
+                'payment_badge': order.payment_badge,
             })
 
-        orders_list.append({
-            'order_id': order.id,
-            'order_number': order.order_number,
-            'customer_name': order.customer_name,
-            'customer_email': order.customer_email,
-            'customer_phone': order.user.phone if order.user else None,
-            'created_at': order.created_at,
-            'total_amount': float(order.total_amount) if order.total_amount else 0,
-            'order_items': items_details,
-            'payment_badge': order.payment_badge,
-        })
-
     result = {
         'page_id': page_id,
         'page_name': page.name,
@@ -1313,14 +1529,18 @@ def send_cancellation_emails(page_id, cancelled_order_ids):
     from utils.email_manager import EmailManager
     from utils.push_manager import PushManager
 
+    from sqlalchemy.orm import joinedload, selectinload
+
     page = db.session.get(OfferPage, page_id)
     if not page:
         return
 
-    for order_id in cancelled_order_ids:
-        order = db.session.get(Order, order_id)
-        if not order:
-            continue
+    orders = Order.query.filter(Order.id.in_(cancelled_order_ids)).options(
+        selectinload(Order.items).joinedload(OrderItem.product),
+        joinedload(Order.user),
+    ).order_by(Order.id).all()
+
+    for order in orders:
 
         # Przygotuj listę anulowanych produktów
         cancelled_items = []
@@ -1354,21 +1574,36 @@ def send_closure_emails(page_id, payment_deadline=None):
         page_id: ID strony Offer
         payment_deadline: Termin płatności (datetime, opcjonalny) — do użycia w szablonie emaila (Task 11)
     """
-    from utils.email_sender import prepare_email, send_email_batch
+    from utils.email_batch import prepare_email_batch
+    from utils.email_sender import send_email_batch
     from utils.push_manager import PushManager
     from modules.payments.models import PaymentMethod
     from decimal import Decimal
 
+    from sqlalchemy.orm import joinedload, selectinload
+
     page = db.session.get(OfferPage, page_id)
     if not page:
         return
 
-    orders = Order.query.filter_by(offer_page_id=page_id).all()
+    # Pozycje, produkty i klienci jednym przebiegiem — bez lazy load per zamówienie
+    orders = Order.query.filter_by(offer_page_id=page_id).options(
+        selectinload(Order.items).joinedload(OrderItem.product),
+        joinedload(Order.user),
+    ).all()
 
-    # Pobierz aktywne metody płatności
-    payment_methods_raw = PaymentMethod.get_active()
+    # Metody płatności raz na całą stronę — szablon pokazuje tylko ich nazwy
+    # (tytuł przelewu per zamówienie jest w szczegółach zamówienia)
+    payment_methods = [{
+        'name': method.name,
+        'recipient': method.recipient,
+        'account_number': method.account_number,
+        'account_number_label': method.account_number_label,
+        'code': method.code,
+        'code_label': method.code_label,
+    } for method in PaymentMethod.get_active()]
 
-    email_messages = []
+    recipients = []
 
     for order in orders:
         if not order.customer_email:
@@ -1424,57 +1659,47 @@ def send_closure_emails(page_id, payment_deadline=None):
         shipping_cost = Decimal(str(order.shipping_cost)) if order.shipping_cost else Decimal('0.00')
         grand_total = fulfilled_total + shipping_cost
 
-        # Przygotuj metody płatności z podstawionymi placeholderami
-        payment_methods = []
-        for method in payment_methods_raw:
-            title = render_transfer_title(method.transfer_title, order)
-            additional = render_transfer_title(method.additional_info, order)
-
-            payment_methods.append({
-                'name': method.name,
-                'recipient': method.recipient,
-                'account_number': method.account_number,
-                'account_number_label': method.account_number_label,
-                'code': method.code,
-                'code_label': method.code_label,
-                'transfer_title': title,
-                'additional_info': additional
-            })
-
         # Przygotuj URL do uploadu płatności
         upload_payment_url = url_for('orders.client_detail',
                                      order_id=order.id,
                                      _external=True) + '?action=upload_payment'
 
-        # Przygotuj email (bez wysyłania)
-        msg = prepare_email(
-            to=order.customer_email,
-            subject=f'Podsumowanie zamówienia - {page.name} - ThunderOrders',
-            template='offer_closure',
-            customer_name=order.customer_name,
-            page_name=page.name,
-            items=items,
-            fulfilled_items=[{
+        # Kontekst odbiorcy — reszta szablonu (strona, metody płatności) wspólna
+        recipients.append({
+            'to': order.customer_email,
+            # Ponowne wywołanie dla tego samego zamknięcia nie wyśle maila drugi raz
+            'idempotency_key': (
+                f'offer-closure:{order.id}:{page.closed_at:%Y%m%d%H%M%S}' if page.closed_at else None
+            ),
+            'customer_name': order.customer_name,
+            'items': items,
+            'fulfilled_items': [{
                 'product_name': fi.product_name,
                 'quantity': fi.fulfilled_quantity if fi.fulfilled_quantity is not None else fi.quantity,
                 'price': float(fi.price) if fi.price else 0.0,
             } for fi in fulfilled_items],
-            fulfilled_total=fulfilled_total,
-            shipping_cost=shipping_cost,
-            grand_total=grand_total,
-            order_number=order.order_number,
-            payment_methods=payment_methods,
-            upload_payment_url=upload_payment_url,
-            payment_deadline=payment_deadline
-        )
-        if msg:
-            email_messages.append(msg)
+            'fulfilled_total': fulfilled_total,
+            'shipping_cost': shipping_cost,
+            'grand_total': grand_total,
+            'order_number': order.order_number,
+            'upload_payment_url': upload_payment_url,
+        })
 
         # Push notification (nie wymaga SMTP)
         PushManager.notify_offer_closure(order, grand_total=grand_total)
 
     # Wyślij wszystkie emaile batch'em (jedno połączenie SMTP)
-    if email_messages:
+    if recipients:
+        email_messages = prepare_email_batch(
+            'offer_closure',
+            subject=f'Podsumowanie zamówienia - {page.name} - ThunderOrders',
+            recipients=recipients,
+            shared={
+                'page_name': page.name,
+                'payment_methods': payment_methods,
+                'payment_deadline': payment_deadline,
+            },
+        )
         current_app.logger.info(f"Sending {len(email_messages)} closure emails in batch for page {page_id}")
         send_email_batch(email_messages)
 
@@ -1522,6 +1747,7 @@ def cancel_offer_orders(page_id, order_ids, reason, admin_user_id, notify=True):
         ValueError: pusty powód, pusta lista, nieistniejąca strona, ID spoza strony
     """
     from utils.activity_logger import log_activity
+    from modules.offers import sales_stats
 
     reason = (reason or '').strip()
     if not reason:
@@ -1556,6 +1782,7 @@ def cancel_offer_orders(page_id, order_ids, reason, admin_user_id, notify=True):
         old_status = order.status
         new_status = 'do_zwrotu' if order_has_payment(order) else 'anulowane'
 
+        sales_stats.track(order)
         order.status = new_status
         order.updated_at = datetime.now()
 
@@ -1573,9 +1800,21 @@ def cancel_offer_orders(page_id, order_ids, reason, admin_user_id, notify=True):
 
         changed.append((order, old_status, new_status))
 
+    # Agregaty sprzedaży: 'anulowane' wypada z podsumowań, 'do_zwrotu' w nich zostaje
+    sales_stats.apply_orders(
+        page_id, [order for order, _old, new_status in changed if new_status == 'anulowane'], sign=-1
+    )
+
     # Jedna transakcja na całość — albo wszystko, albo nic.
     db.session.commit()
 
+    # Anulowane sztuki wracają do puli — liczniki rezerwacji i snapshot dostępności
+    # przebudowujemy z bazy.
+    from modules.offers.inventory import reconcile_page_safe
+    from modules.offers.availability import invalidate as invalidate_availability
+    reconcile_page_safe(page_id)
+    invalidate_availability(page_id)
+
     # log_activity robi własny commit, więc dopiero po zapisaniu statusów —
     # inaczej rozbiłby transakcję na kawałki i przy błędzie w połowie pętli
     # część zamówień zostałaby zmieniona.
@@ -1611,41 +1850,29 @@ def notify_cancelled_orders(changed, reason, page):
     Returns:
         int: liczba klientów, do których poszła wiadomość
     """
-    from utils.email_sender import prepare_email, send_email_batch
+    from utils.email_batch import prepare_email_batch
+    from utils.email_sender import send_email_batch
     from utils.push_manager import PushManager
 
-    messages = []
-    notified = 0
+    # Dwa warianty treści (z obietnicą zwrotu i bez) — batch per wariant,
+    # w każdym per klient tylko temat, imię i numer zamówienia
+    recipients = {True: [], False: []}
 
     for order, _old_status, new_status in changed:
         refund_pending = new_status == 'do_zwrotu'
 
         if order.customer_email:
-            subject = (
-                f'Zamówienie {order.order_number} anulowane — zwrot wpłaty'
-                if refund_pending
-                else f'Zamówienie {order.order_number} zostało anulowane'
-            )
-            try:
-                msg = prepare_email(
-                    to=order.customer_email,
-                    subject=subject,
-                    template='offer_order_cancelled',
-                    customer_name=order.customer_name,
-                    order_number=order.order_number,
-                    page_name=page.name,
-                    reason=reason,
-                    refund_pending=refund_pending,
-                )
-            except Exception as exc:
-                current_app.logger.error(
-                    f'Nie udało się przygotować maila o anulowaniu {order.order_number}: {exc}'
-                )
-                msg = None
-
-            if msg is not None:
-                messages.append(msg)
-                notified += 1
+            recipients[refund_pending].append({
+                'to': order.customer_email,
+                'subject': (
+                    f'Zamówienie {order.order_number} anulowane — zwrot wpłaty'
+                    if refund_pending
+                    else f'Zamówienie {order.order_number} zostało anulowane'
+                ),
+                'idempotency_key': f'offer-order-cancelled:{order.id}:{new_status}',
+                'customer_name': order.customer_name,
+                'order_number': order.order_number,
+            })
 
         try:
             PushManager.notify_order_cancelled(order, refund_pending=refund_pending)
@@ -1654,7 +1881,23 @@ def notify_cancelled_orders(changed, reason, page):
                 f'Push o anulowaniu {order.order_number} nie poszedł: {exc}'
             )
 
+    messages = []
+    for refund_pending, group in recipients.items():
+        if not group:
+            continue
+        try:
+            messages.extend(prepare_email_batch(
+                'offer_order_cancelled',
+                subject=None,
+                recipients=group,
+                shared={'page_name': page.name, 'reason': reason, 'refund_pending': refund_pending},
+            ))
+        except Exception as exc:
+            current_app.logger.error(
+                f'Nie udało się przygotować maili o anulowaniu ({len(group)} zamówień): {exc}'
+            )
+
     if messages:
         send_email_batch(messages)
 
-    return notified
+    return len(messages)
@@ -0,0 +1,283 @@
+"""
+Pagination — kursor (keyset) zamiast OFFSET + cache liczników list
+
+query.paginate() na dużych listach (zamówienia, produkty) robi dwie drogie
+rzeczy przy KAŻDYM wyświetleniu strony:
+- COUNT(*) po całym przefiltrowanym zapytaniu (joiny, LIKE, podzapytania IN),
+- OFFSET (page-1)*per_page — baza i tak przechodzi wszystkie pominięte wiersze,
+  więc głębokie strony są liniowo wolniejsze.
+
+paginate_keyset():
+- "Następna"/"Poprzednia" niosą kursor (wartości klucza sortowania ostatniego/
+  pierwszego wiersza, np. (created_at, id)) → WHERE (created_at, id) < kursor,
+  bez OFFSET; koszt strony nie zależy od jej numeru,
+- skok na konkretny numer strony (brak kursora) nadal używa OFFSET,
+- liczba wyników (total) przychodzi z cached_count() zamiast COUNT-a per request.
+
+Zwracany KeysetPagination ma interfejs zgodny z Pagination z Flask-SQLAlchemy
+(items, page, pages, total, has_prev/has_next, prev_num/next_num, iter_pages),
+więc szablony zmieniają się tylko o kursory w linkach.
+
+cached_count(): wyniki liczników (total listy, liczniki statusów) trzymane per
+proces przez LIST_COUNT_CACHE_TTL sekund; commit zmieniający wiersze tabeli
+(eventy sesji SQLAlchemy) czyści liczniki tej tabeli od razu w tym workerze.
+Pozostałe workery widzą nową wartość najpóźniej po TTL — liczniki na listach
+są orientacyjne, same wiersze zawsze idą z bazy.
+"""
+
+import json
+import math
+import time
+import base64
+import threading
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import DateTime, Numeric, and_, or_
+
+# Domyślny TTL liczników (s), nadpisywany z configu przez init_count_cache()
+_DEFAULT_COUNT_TTL = 30
+
+_count_ttl = _DEFAULT_COUNT_TTL
+_counts = {}            # {table: {key: (expires_at, value)}}
+_counts_lock = threading.Lock()
+
+
+# ====================
+# KURSORY
+# ====================
+
+def encode_cursor(values):
+    """Wartości klucza sortowania → nieprzezroczysty token do URL-a."""
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values], default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, columns):
+    """
+    Token → lista wartości w typach kolumn albo None, gdy token jest uszkodzony
+    (ręcznie edytowany URL — wtedy po prostu pierwsza strona, nie 500).
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        if not isinstance(values, list) or len(values) != len(columns):
+            return None
+        return [_typed(col, v) for col, v in zip(columns, values)]
+    except (ValueError, TypeError, ArithmeticError):
+        return None
+
+
+def _typed(column, value):
+    if value is None:
+        return None
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, Numeric):
+        return Decimal(value)
+    return value
+
+
+def _seek_condition(keys, values, forward):
+    """
+    WHERE dla wierszy za kursorem: (a, b) < (va, vb) rozpisane na OR/AND
+    (porównanie krotek nie korzysta z indeksu w MySQL).
+    """
+    conditions = []
+    for i, (column, descending) in enumerate(keys):
+        after = (column < values[i]) if descending == forward else (column > values[i])
+        equal_prefix = [keys[j][0] == values[j] for j in range(i)]
+        conditions.append(and_(*equal_prefix, after) if equal_prefix else after)
+    return or_(*conditions)
+
+
+def _order_by(keys, forward):
+    return [col.desc() if descending == forward else col.asc() for col, descending in keys]
+
+
+class KeysetPagination:
+    """Strona wyników — interfejs zgodny z flask_sqlalchemy.pagination.Pagination."""
+
+    def __init__(self, items, page, per_page, total, has_next, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.has_next = has_next
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        # Total z cache może być chwilę nieaktualny — nie pozwalamy mu przeczyć temu, co widać
+        known = (page - 1) * per_page + len(items)
+        self.total = max(total or 0, known + (1 if has_next else 0))
+
+    @property
+    def pages(self):
+        if not self.per_page or not self.total:
+            return 0
+        return math.ceil(self.total / self.per_page)
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+
+    @property
+    def first(self):
+        return (self.page - 1) * self.per_page + 1 if self.items else 0
+
+    @property
+    def last(self):
+        return (self.page - 1) * self.per_page + len(self.items)
+
+    def iter_pages(self, *, left_edge=2, left_current=2, right_current=4, right_edge=2):
+        """Numery stron do widgetu paginacji (None = przerwa) — jak w Flask-SQLAlchemy."""
+        pages_end = self.pages + 1
+        if pages_end == 1:
+            return
+        left_end = min(1 + left_edge, pages_end)
+        yield from range(1, left_end)
+        if left_end == pages_end:
+            return
+        mid_start = max(left_end, self.page - left_current)
+        mid_end = min(self.page + right_current + 1, pages_end)
+        if mid_start - left_end > 0:
+            yield None
+        yield from range(mid_start, mid_end)
+        if mid_end == pages_end:
+            return
+        right_start = max(mid_end, pages_end - right_edge)
+        if right_start - mid_end > 0:
+            yield None
+        yield from range(right_start, pages_end)
+
+
+def paginate_keyset(query, keys, page=1, per_page=20, after=None, before=None, total=None,
+                    cursors=True):
+    """
+    Paginacja po kluczu sortowania.
+
+    Args:
+        query: Zapytanie z filtrami (jego order_by jest zastępowane sortowaniem z `keys`)
+        keys (list[tuple]): [(kolumna, descending)], ostatnia kolumna unikalna (id)
+        page (int): Numer strony (do wyświetlania; bez kursora → OFFSET)
+        per_page (int): Wierszy na stronę
+        after (str): Kursor "następna strona" (wiersze za tym kursorem)
+        before (str): Kursor "poprzednia strona" (wiersze przed tym kursorem)
+        total (int): Liczba wyników (np. z cached_count), None = nieznana
+        cursors (bool): False = tylko OFFSET (sortowanie po kolumnach z NULL-ami,
+            dla których porównanie z kursorem gubiłoby wiersze)
+
+    Returns:
+        KeysetPagination
+    """
+    query = query.order_by(None)
+    columns = [col for col, _ in keys]
+    page = max(page or 1, 1)
+    after_values = decode_cursor(after, columns) if cursors else None
+    before_values = decode_cursor(before, columns) if cursors and after_values is None else None
+
+    if before_values is not None:
+        rows = (query.filter(_seek_condition(keys, before_values, forward=False))
+                .order_by(*_order_by(keys, forward=False))
+                .limit(per_page + 1).all())
+        more_before = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_next = True
+        if not more_before:
+            page = 1
+    else:
+        ordered = query.order_by(*_order_by(keys, forward=True))
+        if after_values is not None:
+            ordered = ordered.filter(_seek_condition(keys, after_values, forward=True))
+        else:
+            ordered = ordered.offset((page - 1) * per_page)
+        rows = ordered.limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        items = rows[:per_page]
+
+    def cursor_of(item):
+        if not cursors:
+            return None
+        return encode_cursor([getattr(item, col.key) for col in columns])
+
+    return KeysetPagination(
+        items, page, per_page, total, has_next,
+        next_cursor=cursor_of(items[-1]) if items and has_next else None,
+        prev_cursor=cursor_of(items[0]) if items and page > 1 else None,
+    )
+
+
+# ====================
+# CACHE LICZNIKÓW
+# ====================
+
+def cached_count(table, key, compute):
+    """
+    Wynik compute() (liczba, słownik liczników) z cache per proces.
+
+    Args:
+        table (str): Nazwa tabeli, której zapis unieważnia wpis ('orders', 'products')
+        key: Hashowalny klucz (np. krotka z filtrami listy)
+        compute: Funkcja licząca wartość przy braku/wygaśnięciu wpisu
+    """
+    now = time.monotonic()
+    with _counts_lock:
+        entry = _counts.get(table, {}).get(key)
+        if entry and entry[0] > now:
+            return entry[1]
+
+    value = compute()
+    if _count_ttl > 0:
+        with _counts_lock:
+            _counts.setdefault(table, {})[key] = (now + _count_ttl, value)
+    return value
+
+
+def invalidate_counts(*tables):
+    """Czyści liczniki podanych tabel (bez argumentów — wszystkie)."""
+    with _counts_lock:
+        if not tables:
+            _counts.clear()
+        for table in tables:
+            _counts.pop(table, None)
+
+
+def _on_after_flush(session, flush_context):
+    changed = session.info.setdefault('count_cache_tables', set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table:
+            changed.add(table)
+
+
+def _on_after_commit(session):
+    tables = session.info.pop('count_cache_tables', None)
+    if tables:
+        invalidate_counts(*tables)
+
+
+def _on_after_rollback(session):
+    session.info.pop('count_cache_tables', None)
+
+
+def init_count_cache(app):
+    """Ustawia TTL i podpina unieważnianie po commicie (wołane z create_app)."""
+    global _count_ttl
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    _count_ttl = app.config.get('LIST_COUNT_CACHE_TTL', _DEFAULT_COUNT_TTL)
+    invalidate_counts()
+
+    if not event.contains(Session, 'after_flush', _on_after_flush):
+        event.listen(Session, 'after_flush', _on_after_flush)
+        event.listen(Session, 'after_commit', _on_after_commit)
+        event.listen(Session, 'after_rollback', _on_after_rollback)
@@ -0,0 +1,342 @@
+"""
+Push bulk — masowa wysyłka Web Push + FCM
+==========================================
+
+PushManager.send_to_user obsługuje JEDNEGO usera: zapis Notification + cleanup,
+SELECT preferencji, SELECT subskrypcji, sekwencyjny webpush (pywebpush bez
+sesji = nowe połączenie TLS przy każdym wywołaniu) i mikro-transakcja per
+subskrypcja. Broadcast do kilku tysięcy userów w pętli to minuty i tysiące
+transakcji.
+
+send_bulk(user_ids, ...) robi to samo hurtowo (PushManager.send_to_users):
+1. Notification dla wszystkich userów jednym INSERT (executemany) + cleanup
+   starszych niż 30 dni jednym DELETE per porcja,
+2. preferencje, subskrypcje i urządzenia FCM — po jednym zapytaniu IN (...)
+   na porcję PUSH_BULK_CHUNK userów,
+3. wysyłka w ograniczonej puli wątków (PUSH_BULK_WORKERS) z keep-alive —
+   jedna requests.Session (pula połączeń) per host push service, klucz VAPID
+   parsowany raz,
+4. wyniki zbiorczymi UPDATE ... WHERE id IN (...) — reguły jak w send_to_user
+   (410 → deaktywacja, 5 kolejnych błędów → deaktywacja; FCM wg D8).
+
+Zwraca statystyki: liczby, błędy wg statusu HTTP, czas i przepustowość.
+"""
+
+import os
+import json
+import time
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_WORKERS = 16
+_DEFAULT_CHUNK = 500
+# Deaktywacja subskrypcji po tylu błędach (jak PushManager._handle_send_error_by_id)
+_MAX_FAILED_COUNT = 5
+_SEND_TIMEOUT = 10
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _new_session(pool_size):
+    """requests.Session z pulą keep-alive na `pool_size` równoległych wysyłek."""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def _status_code(error):
+    return (
+        getattr(error, 'status_code', None)
+        or getattr(getattr(error, 'response', None), 'status_code', None)
+    )
+
+
+def _load_vapid(private_key):
+    """Klucz VAPID sparsowany raz na wysyłkę (pywebpush parsuje string przy każdym webpush)."""
+    from py_vapid import Vapid
+
+    if os.path.isfile(private_key):
+        return Vapid.from_file(private_key_file=private_key)
+    return Vapid.from_string(private_key=private_key)
+
+
+def _execute_chunked(make_statement, ids, chunk):
+    """
+    UPDATE/DELETE per porcja id — krótkie transakcje z retry przy 1205 lock
+    wait timeout (jak mikro-transakcje PushManager). Zwraca łączny rowcount.
+    """
+    from extensions import db
+    from utils.push_manager import _is_lock_timeout, _SUB_UPDATE_MAX_RETRIES
+
+    total = 0
+    for part in _chunks(ids, chunk):
+        for attempt in range(1, _SUB_UPDATE_MAX_RETRIES + 1):
+            try:
+                total += db.session.execute(make_statement(part)).rowcount
+                db.session.commit()
+                break
+            except Exception as e:
+                db.session.rollback()
+                if _is_lock_timeout(e) and attempt < _SUB_UPDATE_MAX_RETRIES:
+                    time.sleep(0.1 * attempt)
+                    continue
+                current_app.logger.warning(f'Bulk push: batched update failed: {e}')
+                break
+    return total
+
+
+# ========================================
+# DB: notyfikacje, preferencje, odbiorcy
+# ========================================
+
+def _store_notifications(user_ids, title, body, url, tag, notification_type, chunk):
+    """Notification dla każdego usera (centrum powiadomień) + cleanup > 30 dni."""
+    from sqlalchemy import insert
+    from extensions import db
+    from modules.notifications.models import Notification
+
+    try:
+        cutoff = datetime.utcnow() - timedelta(days=30)
+        for part in _chunks(user_ids, chunk):
+            db.session.execute(insert(Notification), [
+                {'user_id': uid, 'title': title, 'body': body, 'url': url,
+                 'notification_type': notification_type, 'tag': tag}
+                for uid in part
+            ])
+            Notification.query.filter(
+                Notification.user_id.in_(part),
+                Notification.created_at < cutoff
+            ).delete(synchronize_session=False)
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning(f'Bulk push: failed to store notifications: {e}')
+
+
+def _opted_out(user_ids, notification_type, chunk):
+    """Userzy z wyłączoną preferencją (brak wiersza/pola = zgoda, jak send_to_user)."""
+    from extensions import db
+    from modules.notifications.models import NotificationPreference
+
+    column = getattr(NotificationPreference, notification_type, None) if notification_type else None
+    if column is None:
+        return set()
+
+    opted_out = set()
+    for part in _chunks(user_ids, chunk):
+        opted_out.update(uid for (uid,) in db.session.query(NotificationPreference.user_id).filter(
+            NotificationPreference.user_id.in_(part),
+            column == False  # noqa: E712
+        ))
+    return opted_out
+
+
+def _load_targets(user_ids, chunk, with_devices):
+    """Aktywne subskrypcje Web Push i urządzenia FCM — snapshot bez ORM."""
+    from extensions import db
+    from modules.notifications.models import PushSubscription
+
+    subs, devices = [], []
+    for part in _chunks(user_ids, chunk):
+        subs.extend(db.session.query(
+            PushSubscription.id, PushSubscription.endpoint,
+            PushSubscription.p256dh_key, PushSubscription.auth_key
+        ).filter(
+            PushSubscription.user_id.in_(part),
+            PushSubscription.is_active == True  # noqa: E712
+        ).all())
+        if with_devices:
+            from modules.api_mobile.models import MobileDevice
+            devices.extend(db.session.query(MobileDevice.id, MobileDevice.fcm_token).filter(
+                MobileDevice.user_id.in_(part)
+            ).all())
+    # Zwolnij transakcję czytania zanim zaczną się wolne calle HTTP
+    db.session.commit()
+    return subs, devices
+
+
+# ========================================
+# Wysyłka (pula wątków, bez sesji DB)
+# ========================================
+
+def _send_webpush(subs, payload, workers):
+    """Returns: [(sub_id, error_or_None)]."""
+    from utils.push_manager import PushManager
+
+    private_key = current_app.config.get('VAPID_PRIVATE_KEY')
+    if not private_key:
+        current_app.logger.warning('VAPID_PRIVATE_KEY not configured, skipping push')
+        return []
+    vapid = _load_vapid(private_key)
+    claims_email = current_app.config.get('VAPID_CLAIMS_EMAIL')
+    sessions = {host: _new_session(workers) for host in {urlsplit(s.endpoint).netloc for s in subs}}
+
+    def _one(sub):
+        try:
+            PushManager._send_single_raw(
+                sub.endpoint, sub.p256dh_key, sub.auth_key, payload, vapid, claims_email,
+                session=sessions[urlsplit(sub.endpoint).netloc], timeout=_SEND_TIMEOUT,
+            )
+            return sub.id, None
+        except Exception as e:
+            return sub.id, e
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(_one, subs))
+    finally:
+        for session in sessions.values():
+            session.close()
+
+
+def _send_fcm(devices, title, body, url, tag, workers):
+    """Returns: [(device_id, response_or_None)]."""
+    from utils.push_manager import PushManager
+
+    project_id = PushManager._get_fcm_project_id()
+    access_token = PushManager._get_fcm_access_token() if project_id else None
+    if not access_token:
+        current_app.logger.warning('FCM: brak project_id/access tokenu — pomijam fan-out')
+        return []
+    session = _new_session(workers)
+
+    def _one(device):
+        try:
+            message = PushManager._build_fcm_message(device.fcm_token, title, body, url, tag)
+            return device.id, PushManager._send_fcm_raw(
+                device.fcm_token, message, access_token, project_id, session=session)
+        except Exception as e:
+            logger.warning(f'FCM send error for device {device.id}: {e}')
+            return device.id, None
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(_one, devices))
+    finally:
+        session.close()
+
+
+# ========================================
+# Zapis wyników (zbiorcze UPDATE)
+# ========================================
+
+def _apply_webpush_results(results, chunk, stats):
+    from sqlalchemy import update
+    from modules.notifications.models import PushSubscription as Sub
+
+    now = datetime.utcnow()
+    ok = [sub_id for sub_id, error in results if error is None]
+    gone = [sub_id for sub_id, error in results if error is not None and _status_code(error) == 410]
+    failed = [sub_id for sub_id, error in results if error is not None and _status_code(error) != 410]
+    for _, error in results:
+        if error is not None:
+            stats['errors'][str(_status_code(error) or type(error).__name__)] += 1
+
+    _execute_chunked(lambda part: update(Sub).where(Sub.id.in_(part)).values(
+        last_used_at=now, failed_count=0), ok, chunk)
+    deactivated = _execute_chunked(lambda part: update(Sub).where(
+        Sub.id.in_(part), Sub.is_active == True  # noqa: E712
+    ).values(is_active=False), gone, chunk)
+    _execute_chunked(lambda part: update(Sub).where(
+        Sub.id.in_(part), Sub.is_active == True  # noqa: E712
+    ).values(failed_count=Sub.failed_count + 1), failed, chunk)
+    deactivated += _execute_chunked(lambda part: update(Sub).where(
+        Sub.id.in_(part), Sub.is_active == True, Sub.failed_count >= _MAX_FAILED_COUNT  # noqa: E712
+    ).values(is_active=False), failed, chunk)
+
+    stats['sent'] = len(ok)
+    stats['failed'] = len(gone) + len(failed)
+    stats['deactivated'] = deactivated
+
+
+def _apply_fcm_results(results, chunk, stats):
+    from sqlalchemy import update, delete
+    from modules.api_mobile.models import MobileDevice
+    from utils.push_manager import PushManager
+
+    ok, stale = [], []
+    for device_id, resp in results:
+        action = PushManager._classify_fcm_response(resp) if resp is not None else 'keep'
+        if action == 'success':
+            ok.append(device_id)
+        elif action == 'delete':
+            stale.append(device_id)
+        if action != 'success':
+            stats['errors'][f'fcm_{getattr(resp, "status_code", None) or "error"}'] += 1
+
+    now = datetime.utcnow()
+    _execute_chunked(lambda part: update(MobileDevice).where(
+        MobileDevice.id.in_(part)).values(last_used_at=now), ok, chunk)
+    stats['devices_deleted'] = _execute_chunked(
+        lambda part: delete(MobileDevice).where(MobileDevice.id.in_(part)), stale, chunk)
+    stats['devices_sent'] = len(ok)
+
+
+def send_bulk(user_ids, title, body, url='/', tag='default', notification_type=None):
+    """
+    Push do wielu userów naraz (Web Push + FCM), semantyka jak send_to_user.
+
+    Args:
+        user_ids (iterable[int]): odbiorcy
+        notification_type (str|None): pole NotificationPreference; None = bez sprawdzania
+
+    Returns:
+        dict: users, skipped_preferences, subscriptions, sent, failed, deactivated,
+              devices, devices_sent, devices_deleted, errors {status: n},
+              duration_ms, per_second (wysyłek/s)
+    """
+    from utils.push_manager import PushManager
+
+    started = time.perf_counter()
+    user_ids = list(dict.fromkeys(user_ids))
+    workers = current_app.config.get('PUSH_BULK_WORKERS', _DEFAULT_WORKERS)
+    chunk = current_app.config.get('PUSH_BULK_CHUNK', _DEFAULT_CHUNK)
+    stats = {
+        'users': len(user_ids), 'skipped_preferences': 0, 'subscriptions': 0,
+        'sent': 0, 'failed': 0, 'deactivated': 0,
+        'devices': 0, 'devices_sent': 0, 'devices_deleted': 0, 'errors': Counter(),
+    }
+
+    if user_ids:
+        _store_notifications(user_ids, title, body, url, tag, notification_type, chunk)
+
+        opted_out = _opted_out(user_ids, notification_type, chunk)
+        stats['skipped_preferences'] = len(opted_out)
+        targets = [uid for uid in user_ids if uid not in opted_out]
+
+        subs, devices = _load_targets(targets, chunk, PushManager._fcm_enabled())
+        stats['subscriptions'], stats['devices'] = len(subs), len(devices)
+
+        if devices:
+            _apply_fcm_results(_send_fcm(devices, title, body, url, tag, workers), chunk, stats)
+        if subs:
+            payload = json.dumps({'title': title, 'body': body, 'url': url, 'tag': tag})
+            _apply_webpush_results(_send_webpush(subs, payload, workers), chunk, stats)
+
+    elapsed = time.perf_counter() - started
+    deliveries = stats['subscriptions'] + stats['devices']
+    stats['errors'] = dict(stats['errors'])
+    stats['duration_ms'] = int(elapsed * 1000)
+    stats['per_second'] = round(deliveries / elapsed, 1) if elapsed > 0 else 0.0
+
+    current_app.logger.info(
+        f"Bulk push '{tag}': {stats['users']} users, {stats['sent']}/{stats['subscriptions']} web push, "
+        f"{stats['devices_sent']}/{stats['devices']} FCM, {stats['failed']} failed, "
+        f"{stats['duration_ms']} ms ({stats['per_second']}/s)"
+    )
+    return stats
@@ -204,8 +204,25 @@ class PushManager:
         return sent
 
     @staticmethod
-    def _send_single_raw(endpoint, p256dh, auth, payload, vapid_private_key, vapid_claims_email):
-        """Wysyła pojedynczy push przez pywebpush — bez referencji do ORM."""
+    def send_to_users(user_ids, title, body, url='/', tag='default',
+                      notification_type=None):
+        """
+        Push do wielu userów naraz — hurtowy odpowiednik send_to_user
+        (utils/push_bulk.py: kilka zapytań, pula wątków z keep-alive per host,
+        zbiorcze UPDATE wyników). Blokujące — wołać z wątku/zadania w tle.
+
+        Returns:
+            dict: statystyki wysyłki (push_bulk.send_bulk)
+        """
+        from utils.push_bulk import send_bulk
+        return send_bulk(user_ids, title, body, url=url, tag=tag,
+                         notification_type=notification_type)
+
+    @staticmethod
+    def _send_single_raw(endpoint, p256dh, auth, payload, vapid_private_key, vapid_claims_email,
+                         session=None, timeout=None):
+        """Wysyła pojedynczy push przez pywebpush — bez referencji do ORM.
+        session: requests.Session z keep-alive (wysyłka hurtowa), None = nowe połączenie."""
         from pywebpush import webpush
 
         webpush(
@@ -218,7 +235,9 @@ class PushManager:
             },
             data=payload,
             vapid_private_key=vapid_private_key,
-            vapid_claims={'sub': vapid_claims_email or 'mailto:noreply@thunderorders.cloud'}
+            vapid_claims={'sub': vapid_claims_email or 'mailto:noreply@thunderorders.cloud'},
+            requests_session=session,
+            timeout=timeout,
         )
 
     @staticmethod
@@ -387,12 +406,13 @@ class PushManager:
         }
 
     @staticmethod
-    def _send_fcm_raw(token, message, access_token, project_id):
+    def _send_fcm_raw(token, message, access_token, project_id, session=None):
         """Wysyła pojedynczy push przez FCM HTTP v1 — bez referencji do ORM.
-        Zwraca obiekt odpowiedzi requests (status_code/json do mapowania D8)."""
+        Zwraca obiekt odpowiedzi requests (status_code/json do mapowania D8).
+        session: requests.Session z keep-alive (wysyłka hurtowa)."""
         import requests
 
-        return requests.post(
+        return (session or requests).post(
             _FCM_ENDPOINT.format(project_id=project_id),
             json={'message': message},
             headers={'Authorization': f'Bearer {access_token}',
@@ -998,15 +1018,14 @@ class PushManager:
 
         def _send_all():
             with app.app_context():
-                for uid in admin_ids:
-                    PushManager.send_to_user(
-                        user_id=uid,
-                        title=f'Nowe zlecenie wysyłki: {request_number}',
-                        body=f'Od: {user_name}',
-                        url=url,
-                        tag=f'admin-shipping-{request_id}',
-                        notification_type='admin_alerts'
-                    )
+                PushManager.send_to_users(
+                    admin_ids,
+                    title=f'Nowe zlecenie wysyłki: {request_number}',
+                    body=f'Od: {user_name}',
+                    url=url,
+                    tag=f'admin-shipping-{request_id}',
+                    notification_type='admin_alerts'
+                )
 
         thread = threading.Thread(target=_send_all)
         thread.daemon = True
@@ -1028,15 +1047,14 @@ class PushManager:
 
         def _send_all():
             with app.app_context():
-                for uid in user_ids:
-                    PushManager.send_to_user(
-                        user_id=uid,
-                        title='Nowa strona sprzedaży!',
-                        body=page_name,
-                        url=page_url,
-                        tag=f'offer-page-{page_id}',
-                        notification_type='new_offer_pages'
-                    )
+                PushManager.send_to_users(
+                    user_ids,
+                    title='Nowa strona sprzedaży!',
+                    body=page_name,
+                    url=page_url,
+                    tag=f'offer-page-{page_id}',
+                    notification_type='new_offer_pages'
+                )
 
         thread = threading.Thread(target=_send_all)
         thread.daemon = True
@@ -1093,15 +1111,14 @@ class PushManager:
 
         def _send_all():
             with app.app_context():
-                for uid in admin_ids:
-                    PushManager.send_to_user(
-                        user_id=uid,
-                        title=f'Nowe zamówienie: {order_number}',
-                        body=f'Od: {customer_name}',
-                        url=detail_url,
-                        tag=f'admin-order-{order_id}',
-                        notification_type='admin_alerts'
-                    )
+                PushManager.send_to_users(
+                    admin_ids,
+                    title=f'Nowe zamówienie: {order_number}',
+                    body=f'Od: {customer_name}',
+                    url=detail_url,
+                    tag=f'admin-order-{order_id}',
+                    notification_type='admin_alerts'
+                )
 
         thread = threading.Thread(target=_send_all)
         thread.daemon = True
@@ -1127,15 +1144,14 @@ class PushManager:
 
         def _send_all():
             with app.app_context():
-                for uid in admin_ids:
-                    PushManager.send_to_user(
-                        user_id=uid,
-                        title=f'Nowa płatność: {order_number}',
-                        body=f'{customer_name} - {stage_names}',
-                        url=review_url,
-                        tag=f'admin-payment-{order_id}',
-                        notification_type='admin_alerts'
-                    )
+                PushManager.send_to_users(
+                    admin_ids,
+                    title=f'Nowa płatność: {order_number}',
+                    body=f'{customer_name} - {stage_names}',
+                    url=review_url,
+                    tag=f'admin-payment-{order_id}',
+                    notification_type='admin_alerts'
+                )
 
         thread = threading.Thread(target=_send_all)
         thread.daemon = True
@@ -1155,9 +1171,11 @@ class PushManager:
             new_ends_at: datetime lub None — nowa data
             user_ids: lista ID użytkowników do powiadomienia
 
+        Wołane z wątku dispatchera (modules/admin/offers.py) — wysyłka
+        synchroniczna przez send_to_users (pula połączeń, batch zapisów).
+
         Returns:
-            int: liczba użytkowników, do których push został wystrzelony
-                 (sukces dostarczenia weryfikuje się asynchronicznie)
+            int: liczba dostarczonych pushy (Web Push)
         """
         from flask import url_for
 
@@ -1173,26 +1191,15 @@ class PushManager:
         except Exception:
             url = '/'
 
-        tag = f'sale-date-{page.id}'
-        sent = 0
-
-        for user_id in user_ids:
-            try:
-                PushManager._fire_and_forget(
-                    user_id=user_id,
-                    title=title,
-                    body=body,
-                    url=url,
-                    tag=tag,
-                    notification_type='sale_date_changes',
-                )
-                sent += 1
-            except Exception as e:
-                current_app.logger.error(
-                    f"Failed to fire sale_date_changes push for user {user_id}: {e}"
-                )
-
+        stats = PushManager.send_to_users(
+            user_ids,
+            title=title,
+            body=body,
+            url=url,
+            tag=f'sale-date-{page.id}',
+            notification_type='sale_date_changes',
+        )
         current_app.logger.info(
-            f"Sale end date changed push fired for {sent}/{len(user_ids)} users (page={page.id})"
+            f"Sale end date changed push sent for {stats['users']} users (page={page.id})"
         )
-        return sent
+        return stats['sent']
@@ -0,0 +1,204 @@
+"""
+Query Profiler — liczenie zapytań SQL i wolnych zapytań per endpoint
+
+Opt-in (SQL_PROFILING_ENABLED). Podpina się pod eventy SQLAlchemy
+before_cursor_execute / after_cursor_execute i dla każdego requestu zbiera:
+- liczbę zapytań i łączny czas w bazie,
+- najwolniejsze zapytania,
+- "kształty" zapytań (SQL bez literałów) — ten sam kształt powtórzony więcej
+  niż SQL_PROFILING_N_PLUS_ONE razy w jednym requeście to podejrzenie N+1.
+
+Po requeście dane trafiają do agregatów per endpoint (per worker — jak
+metryki broadcastów ofert), dostępnych w /admin/sql-profile. Opcjonalnie
+(SQL_PROFILING_SERVER_TIMING) odpowiedź dostaje nagłówek Server-Timing,
+widoczny w DevTools przeglądarki.
+
+Zapytania spoza requestu (wątki w tle, CLI) nie są liczone.
+"""
+
+import re
+import time
+import logging
+import threading
+from collections import Counter
+
+from flask import g, request, has_request_context
+
+logger = logging.getLogger(__name__)
+
+# Normalizacja SQL do kształtu: literały → ?, listy IN (...) → (?)
+_RE_STRING = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_RE_IN_LIST = re.compile(r'\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)')
+_RE_SPACES = re.compile(r'\s+')
+
+# Maks. długość SQL przechowywanego w agregatach
+_MAX_STATEMENT_LEN = 500
+
+_stats = {}             # {endpoint: dict} — patrz _empty_endpoint_stats()
+_stats_lock = threading.Lock()
+
+
+def statement_shape(statement):
+    """Kształt zapytania — SQL bez literałów i z listami IN zwiniętymi do (?)."""
+    shape = _RE_STRING.sub('?', statement)
+    shape = _RE_NUMBER.sub('?', shape)
+    shape = _RE_IN_LIST.sub('(?)', shape)
+    return _RE_SPACES.sub(' ', shape).strip()
+
+
+def _abbreviate(statement):
+    """Skraca długi SQL do wyświetlenia: początek + końcówka (WHERE bywa na końcu)."""
+    if len(statement) <= _MAX_STATEMENT_LEN:
+        return statement
+    half = _MAX_STATEMENT_LEN // 2
+    return f'{statement[:half]} … {statement[-half:]}'
+
+
+def _empty_endpoint_stats():
+    return {
+        'requests': 0,
+        'queries': 0,
+        'queries_max': 0,
+        'db_ms': 0.0,
+        'db_ms_max': 0.0,
+        'slowest': [],          # [(ms, statement)] malejąco, max top_n
+        'n_plus_one': Counter(),  # {shape: liczba requestów z powtórzeniem > K}
+    }
+
+
+class _RequestProfile:
+    """Dane jednego requestu (trzymane w flask.g)."""
+
+    __slots__ = ('count', 'db_ms', 'slowest', 'shapes')
+
+    def __init__(self):
+        self.count = 0
+        self.db_ms = 0.0
+        self.slowest = []
+        self.shapes = Counter()
+
+
+def _on_before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Start na kontekście wykonania, nie na konekcji: after_cursor_execute nie
+    # przychodzi dla zapytania, które rzuciło wyjątek, a kontekst ginie razem z nim.
+    if context is not None and has_request_context() and 'sql_profile' in g:
+        context._sql_profile_start = time.perf_counter()
+
+
+def _on_after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_sql_profile_start', None)
+    if start is None or not has_request_context() or 'sql_profile' not in g:
+        return
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    profile = g.sql_profile
+    profile.count += 1
+    profile.db_ms += elapsed_ms
+    profile.shapes[statement_shape(statement)] += 1
+    profile.slowest.append((elapsed_ms, _abbreviate(statement)))
+
+
+def _record(endpoint, profile, top_n, n_plus_one_threshold):
+    """Dokłada profil requestu do agregatów endpointu. Zwraca wykryte kształty N+1."""
+    repeated = [shape for shape, count in profile.shapes.items() if count > n_plus_one_threshold]
+    slowest = sorted(profile.slowest, reverse=True)[:top_n]
+
+    with _stats_lock:
+        stats = _stats.setdefault(endpoint, _empty_endpoint_stats())
+        stats['requests'] += 1
+        stats['queries'] += profile.count
+        stats['queries_max'] = max(stats['queries_max'], profile.count)
+        stats['db_ms'] += profile.db_ms
+        stats['db_ms_max'] = max(stats['db_ms_max'], profile.db_ms)
+        stats['slowest'] = sorted(stats['slowest'] + slowest, reverse=True)[:top_n]
+        for shape in repeated:
+            stats['n_plus_one'][shape] += 1
+    return repeated
+
+
+def get_stats():
+    """
+    Agregaty per endpoint w tym workerze, posortowane po łącznym czasie w bazie.
+
+    Returns:
+        list[dict]: endpoint, requests, queries_avg, queries_max, db_ms_avg,
+                    db_ms_max, slowest [{ms, statement}], n_plus_one [{shape, requests}]
+    """
+    with _stats_lock:
+        snapshot = {endpoint: dict(stats, n_plus_one=Counter(stats['n_plus_one']))
+                    for endpoint, stats in _stats.items()}
+
+    rows = []
+    for endpoint, stats in snapshot.items():
+        requests_count = stats['requests'] or 1
+        rows.append({
+            'endpoint': endpoint,
+            'requests': stats['requests'],
+            'queries_avg': round(stats['queries'] / requests_count, 1),
+            'queries_max': stats['queries_max'],
+            'db_ms_total': round(stats['db_ms'], 1),
+            'db_ms_avg': round(stats['db_ms'] / requests_count, 2),
+            'db_ms_max': round(stats['db_ms_max'], 2),
+            'slowest': [{'ms': round(ms, 2), 'statement': sql} for ms, sql in stats['slowest']],
+            'n_plus_one': [{'shape': _abbreviate(shape), 'requests': count}
+                           for shape, count in stats['n_plus_one'].most_common()],
+        })
+    rows.sort(key=lambda r: r['db_ms_total'], reverse=True)
+    return rows
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def init_query_profiler(app):
+    """
+    Podpina profiler pod aplikację (wołane z create_app, gdy SQL_PROFILING_ENABLED).
+
+    Eventy silnika rejestrujemy w app context (db.engine wymaga aplikacji).
+    """
+    from sqlalchemy import event
+    from extensions import db
+
+    top_n = app.config.get('SQL_PROFILING_TOP_N', 5)
+    n_plus_one_threshold = app.config.get('SQL_PROFILING_N_PLUS_ONE', 10)
+    slow_request_ms = app.config.get('SQL_PROFILING_SLOW_MS', 500)
+    server_timing = app.config.get('SQL_PROFILING_SERVER_TIMING', False)
+
+    with app.app_context():
+        engine = db.engine
+        if not event.contains(engine, 'before_cursor_execute', _on_before_cursor_execute):
+            event.listen(engine, 'before_cursor_execute', _on_before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _on_after_cursor_execute)
+
+    @app.before_request
+    def _sql_profile_start():
+        g.sql_profile = _RequestProfile()
+
+    @app.after_request
+    def _sql_profile_finish(response):
+        profile = g.pop('sql_profile', None)
+        if profile is None or request.endpoint == 'static':
+            return response
+
+        # 404-ki bez endpointu zbieramy razem — ścieżka jako klucz rosłaby bez ograniczeń
+        endpoint = request.endpoint or '<unmatched>'
+        repeated = _record(endpoint, profile, top_n, n_plus_one_threshold)
+
+        if repeated:
+            logger.warning(
+                f"[SQL PROFILE] Possible N+1 on {endpoint}: {len(repeated)} statement shape(s) "
+                f"repeated > {n_plus_one_threshold}x ({profile.count} queries)"
+            )
+        if profile.db_ms > slow_request_ms:
+            logger.warning(
+                f"[SQL PROFILE] Slow DB time on {endpoint}: {profile.db_ms:.0f} ms in {profile.count} queries"
+            )
+        if server_timing:
+            response.headers.add(
+                'Server-Timing', f'db;dur={profile.db_ms:.1f};desc="{profile.count} queries"'
+            )
+        return response
+
+    logger.info(f"Query profiler enabled (N+1 threshold={n_plus_one_threshold}, Server-Timing={server_timing})")
@@ -0,0 +1,230 @@
+"""
+Settings Cache — cała tabela settings w pamięci procesu
+
+Settings.get_value() był osobnym SELECT-em przy każdym wywołaniu (ustawienia
+zdjęć, kursy walut, maintenance w każdym requeście, przypomnienia o płatności,
+przełączniki maili...). Teraz pierwszy odczyt ładuje CAŁĄ tabelę jednym
+zapytaniem, a kolejne są obsługiwane z pamięci.
+
+Unieważnianie:
+- każdy commit, który zmienił/dodał/usunął wiersz Settings (Settings.set_value,
+  ale też bezpośrednie Settings(...) / setting.value = ... w routach) czyści
+  cache lokalnie i publikuje wiadomość na kanale Redis SETTINGS_CHANNEL,
+- wątek-subskrybent w każdym procesie (workery HTTP i WS) po odebraniu
+  wiadomości czyści swój cache — zmiana admina jest widoczna wszędzie
+  w milisekundach,
+- siatka bezpieczeństwa: cache starszy niż SETTINGS_CACHE_MAX_AGE sekund jest
+  przeładowywany (zgubione wiadomości, brak Redis przy wielu workerach).
+
+Bez Redis (dev, testy) działa tylko unieważnianie lokalne + max age.
+SETTINGS_CACHE_MAX_AGE = 0 wyłącza cache (każdy odczyt = SELECT jak dawniej).
+"""
+
+import copy
+import json
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SETTINGS_CHANNEL = 'settings:invalidate'
+
+# Domyślny maks. wiek cache (s), nadpisywany z configu przez init_settings_cache()
+_DEFAULT_MAX_AGE = 60
+
+# Jak długo subskrybent czeka po błędzie Redis przed ponownym połączeniem (s)
+_RECONNECT_DELAY = 5
+
+# Identyfikator procesu w wiadomościach — własnych nie przetwarzamy drugi raz
+_instance_id = f'{os.getpid()}-{id(object())}'
+
+_max_age = _DEFAULT_MAX_AGE
+_rows = None            # {key: (type, raw_value)} albo None = do załadowania
+_typed = {}             # {key: wartość po konwersji} — konwersja leniwa, raz na klucz
+_loaded_at = 0.0
+_generation = 0         # rośnie przy każdym unieważnieniu
+_lock = threading.Lock()
+
+_redis = None
+_subscriber = None
+
+
+def convert_value(value_type, raw):
+    """Konwersja surowej wartości z bazy na typ ustawienia (jak dawniej w Settings.get_value)."""
+    if value_type == 'boolean':
+        return raw.lower() in ('true', '1', 'yes')
+    elif value_type == 'integer':
+        return int(raw)
+    elif value_type == 'json':
+        return json.loads(raw)
+    else:  # string
+        return raw
+
+
+def _load_rows():
+    from extensions import db
+    from modules.auth.models import Settings
+    rows = db.session.query(Settings.key, Settings.type, Settings.value).all()
+    return {key: (value_type, raw) for key, value_type, raw in rows}
+
+
+def _current_rows():
+    """Aktualny słownik wierszy — z cache albo świeżo z bazy."""
+    global _rows, _typed, _loaded_at
+
+    with _lock:
+        if _rows is not None and time.time() - _loaded_at < _max_age:
+            return _rows, _typed
+        generation = _generation
+
+    rows = _load_rows()
+    typed = {}
+
+    with _lock:
+        # Unieważnienie w trakcie ładowania → wynik mógł być nieaktualny, nie zapisujemy
+        if generation == _generation:
+            _rows, _typed, _loaded_at = rows, typed, time.time()
+    return rows, typed
+
+
+def get(key, default=None):
+    """
+    Wartość ustawienia z cache (skonwertowana na typ) lub default.
+
+    Wartości json są kopiowane — wywołujący może je modyfikować bez
+    wpływu na cache.
+    """
+    if _max_age <= 0:
+        from modules.auth.models import Settings
+        setting = Settings.query.filter_by(key=key).first()
+        if not setting:
+            return default
+        return convert_value(setting.type, setting.value)
+
+    rows, typed = _current_rows()
+    if key not in rows:
+        return default
+
+    if key in typed:
+        value = typed[key]
+    else:
+        value_type, raw = rows[key]
+        value = convert_value(value_type, raw)
+        typed[key] = value
+
+    if isinstance(value, (dict, list)):
+        return copy.deepcopy(value)
+    return value
+
+
+def invalidate(publish=False):
+    """Czyści cache tego procesu; publish=True powiadamia też pozostałe procesy."""
+    global _rows, _typed, _generation
+
+    with _lock:
+        _generation += 1
+        _rows = None
+        _typed = {}
+
+    if publish and _redis is not None:
+        try:
+            _redis.publish(SETTINGS_CHANNEL, _instance_id)
+        except Exception as e:
+            logger.warning(f"SettingsCache: publish failed ({e}), other workers refresh after max age")
+
+
+def _on_after_flush(session, flush_context):
+    from modules.auth.models import Settings
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Settings):
+            session.info['settings_changed'] = True
+            return
+
+
+def _on_after_commit(session):
+    if session.info.pop('settings_changed', False):
+        invalidate(publish=True)
+
+
+def _on_after_rollback(session):
+    # Po flushu cache mógł się przeładować w tej samej sesji (z niezatwierdzonymi zmianami)
+    if session.info.pop('settings_changed', False):
+        invalidate()
+
+
+class _Subscriber:
+    """Wątek nasłuchujący na SETTINGS_CHANNEL — jeden na proces."""
+
+    def __init__(self, client):
+        self._client = client
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='settings-cache', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            pubsub = None
+            try:
+                pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(SETTINGS_CHANNEL)
+                # Wiadomości sprzed (ponownego) połączenia mogły przepaść
+                invalidate()
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get('data') != _instance_id:
+                        invalidate()
+            except Exception as e:
+                logger.warning(f"SettingsCache: subscriber error ({e}), reconnecting in {_RECONNECT_DELAY}s")
+                time.sleep(_RECONNECT_DELAY)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+
+def init_settings_cache(app):
+    """
+    Inicjalizuje cache ustawień (wołane z create_app).
+
+    Rejestruje eventy sesji SQLAlchemy (unieważnianie po commicie) i — gdy
+    Redis jest dostępny — startuje subskrybenta kanału unieważnień.
+    """
+    global _max_age, _redis, _subscriber
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    _max_age = app.config.get('SETTINGS_CACHE_MAX_AGE', _DEFAULT_MAX_AGE)
+    invalidate()
+
+    if not event.contains(Session, 'after_flush', _on_after_flush):
+        event.listen(Session, 'after_flush', _on_after_flush)
+        event.listen(Session, 'after_commit', _on_after_commit)
+        event.listen(Session, 'after_rollback', _on_after_rollback)
+
+    redis_url = app.config.get('REDIS_URL')
+    if _max_age <= 0 or not redis_url or _subscriber is not None:
+        return
+
+    try:
+        import redis
+        client = redis.Redis.from_url(redis_url, decode_responses=True,
+                                      socket_timeout=2, socket_connect_timeout=2)
+        client.ping()
+    except Exception as e:
+        logger.warning(f"SettingsCache: Redis unavailable ({e}), invalidation is local to this process")
+        return
+
+    # Subskrybent blokuje na get_message — osobny klient bez socket_timeout
+    _redis = client
+    _subscriber = _Subscriber(redis.Redis.from_url(redis_url, decode_responses=True,
+                                                   socket_connect_timeout=2))
+    _subscriber.start()
+    logger.info(f"SettingsCache: cross-worker invalidation via Redis channel '{SETTINGS_CHANNEL}'")